@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Dict, List, Union
+
+from pydantic import BaseModel, Field
+
+
+class StatementStatsSchema(BaseModel):
+    """一条语句（按调用方区分）的执行统计"""
+    statement: str = Field(description='SQL语句')
+    caller: str = Field(description='发起调用的仓储方法，"-" 表示非仓储调用')
+    count: int = Field(description='执行次数')
+    total_ms: float = Field(description='总耗时（毫秒，执行 + 取数）')
+    avg_ms: float = Field(description='平均耗时（毫秒）')
+    max_ms: float = Field(description='单次最大耗时（毫秒）')
+    rows: int = Field(description='累计行数（查询为取回的行数，写操作为影响的行数）')
+    slow: int = Field(description='超过慢查询阈值的次数')
+
+
+class SqlReportSchema(BaseModel):
+    """SQL执行统计报表"""
+    slow_query_ms: Union[float, None] = Field(description='慢查询阈值（毫秒）', default=None)
+    statements: List[StatementStatsSchema] = Field(description='按排序字段降序的语句统计', default=[])
+    statement_cache: Dict[str, Dict[str, int]] = Field(description='预编译语句的编译缓存命中统计', default={})
+    query_cache: Union[dict, None] = Field(description='查询结果缓存统计，未开启时为空', default=None)
+
+
+class PoolStatsSchema(BaseModel):
+    """一个连接池的签出等待统计"""
+    checkouts: int = Field(description='签出次数')
+    total_wait_ms: float = Field(description='累计等待时间（毫秒）')
+    avg_wait_ms: float = Field(description='平均等待时间（毫秒）')
+    max_wait_ms: float = Field(description='最长等待时间（毫秒）')
+
+
+class ReferenceTableSchema(BaseModel):
+    """一张参考表在进程内快照中的占用"""
+    rows: int = Field(description='行数')
+    bytes: int = Field(description='内存占用（字节，含索引）')
+
+
+class ReferenceDataSchema(BaseModel):
+    """进程内参考数据（机场、机型、座位）的状态"""
+    enabled: bool = Field(description='是否开启 reference_data')
+    loaded: bool = Field(description='是否已加载（版本表不存在时仓储回退到数据库查询）')
+    loaded_at: Union[datetime, None] = Field(description='加载时间', default=None)
+    versions: Dict[str, int] = Field(description='加载时各参考表的版本号', default={})
+    loads: int = Field(description='累计加载次数')
+    checks: int = Field(description='累计版本号检查次数')
+    tables: Dict[str, ReferenceTableSchema] = Field(description='各参考表的行数与内存占用', default={})
+    total_bytes: int = Field(description='内存占用合计（字节）')
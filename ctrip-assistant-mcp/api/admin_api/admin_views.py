@@ -0,0 +1,67 @@
+from typing import Dict, Literal
+
+from fastapi import APIRouter, Query
+
+from config import CONFIG, get_logger
+from api.admin_api.admin_schemas import PoolStatsSchema, ReferenceDataSchema, SqlReportSchema
+from app.dao.query_cache import get_query_cache
+from app.dao.reference_data import load_reference_data, reference_data_report
+from app.dao.session import get_pool_stats, reset_pool_stats
+from app.dao.sql_metrics import get_sql_report, reset_sql_report
+from app.dao.statement_cache import get_statement_cache_stats, reset_statement_cache_stats
+
+# 创建分路由
+router = APIRouter()
+
+log = get_logger(__name__)
+
+
+@router.get('/admin/sql-report/', description='按总耗时等字段排序的SQL执行统计，以及语句缓存、查询缓存的命中情况',
+            summary='SQL执行统计', response_model=SqlReportSchema)
+def sql_report(
+        limit: int = Query(20, ge=1, le=500, description='返回的语句数'),
+        order_by: Literal['total_ms', 'avg_ms', 'max_ms', 'count', 'rows', 'slow'] = Query(
+            'total_ms', description='排序字段（降序）'),
+):
+    cache = get_query_cache()
+    return {
+        'slow_query_ms': CONFIG['database'].get('slow_query_ms'),
+        'statements': get_sql_report(limit, order_by),
+        'statement_cache': get_statement_cache_stats(),
+        'query_cache': cache.stats().to_dict() if cache is not None else None,
+    }
+
+
+@router.post('/admin/sql-report/reset/', description='清空SQL执行统计与语句缓存统计', summary='清空SQL执行统计')
+def reset_report():
+    reset_sql_report()
+    reset_statement_cache_stats()
+    log.info('SQL执行统计已清空')
+    return {'reset': True}
+
+
+@router.get('/admin/pool-stats/', description='各连接池（writer、reader，异步引擎带 _async 后缀）的签出等待时间',
+            summary='连接池统计', response_model=Dict[str, PoolStatsSchema])
+def pool_stats():
+    return get_pool_stats()
+
+
+@router.post('/admin/pool-stats/reset/', description='清空连接池签出等待统计', summary='清空连接池统计')
+def reset_pool_report():
+    reset_pool_stats()
+    log.info('连接池统计已清空')
+    return {'reset': True}
+
+
+@router.get('/admin/reference-data/', description='进程内参考数据（机场、机型、座位）的加载状态、版本号与内存占用',
+            summary='参考数据状态', response_model=ReferenceDataSchema)
+def reference_data():
+    return reference_data_report()
+
+
+@router.post('/admin/reference-data/reload/', description='立即重新加载进程内参考数据', summary='重新加载参考数据',
+             response_model=ReferenceDataSchema)
+def reload_reference_data():
+    load_reference_data()
+    log.info('参考数据已重新加载')
+    return reference_data_report()
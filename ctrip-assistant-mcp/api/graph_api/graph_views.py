@@ -35,6 +35,8 @@ def execute_graph(request: Request, obj_in: BaseGraphSchema):
     user_input = obj_in.user_input
     config = obj_in.config.model_dump()
     
+    # 工作单元由工具节点开启（见 create_tool_node_with_fallback）：每个工具节点的写入在节点结束时提交，
+    # 模型调用期间不持有数据库会话与 SQLite 写锁
     result = ''
     current_state = graph.get_state(config)
     pending_nodes = set(current_state.next or ())
@@ -64,7 +66,7 @@ def execute_graph(request: Request, obj_in: BaseGraphSchema):
                 events = graph.stream({"messages": [("user", user_input)]}, config, stream_mode='updates')
     else:
         events = graph.stream({"messages": [("user", user_input)]}, config, stream_mode='updates')
-        
+    
     for event in events:
         print_event(event, _printed)
         message = event.get("messages")
@@ -85,6 +87,7 @@ def execute_graph(request: Request, obj_in: BaseGraphSchema):
     if pending_nodes & INTERRUPT_NODES:
         result = "AI助手马上根据你要求，执行相关操作。您是否批准上述操作？输入'y'继续；否则，请说明您请求的更改。\n"
     
+
     return GraphResponseSchema( assistant=result )
 
 
@@ -2,6 +2,7 @@ from fastapi import APIRouter, FastAPI
 
 from api.user_api import user_views
 from api.graph_api import graph_views
+from api.admin_api import admin_views
 
 def router_v1():
     # 主路由
@@ -9,6 +10,7 @@ def router_v1():
     # 加载所有的分路由
     root_router.include_router(user_views.router, tags=['用户管理'])
     root_router.include_router(graph_views.router, tags=['工作流调用'])
+    root_router.include_router(admin_views.router, tags=['运维监控'])
     return root_router
 
 def init_routers(app: FastAPI):
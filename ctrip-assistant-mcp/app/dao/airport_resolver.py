@@ -0,0 +1,512 @@
+"""城市/机场名称解析：把用户说的城市名、机场名解析为机场代码
+
+航班工具只接受机场代码，而用户通常说城市名（"北京"、"Shanghai"、"莫斯科"）。解析器由 airports_data
+（city、airport_name、airport_code）编译为进程内的查找结构，别名来自两处：
+
+- 由 airports_data 推导（derive_aliases）：机场名称去掉"International""Airport"等通用词、去掉城市名后的部分
+  （"Shanghai Pudong International Airport" -> pudong），只出现在一个机场名称中的词（"Sheremetyevo"、"Capital"），
+  以及 "St." 开头的城市的 Saint/Sankt 写法与去掉前缀的写法（"St. Petersburg" -> petersburg）；
+- 无法推导的中文名、拼音与外语写法：本模块的 ALIAS_OVERRIDES，配置 airport_resolver.aliases 可补充或覆盖。
+
+查找顺序（键为规范化后的文本：casefold、去掉声调与变音符号、空白与标点，去掉"机场""市""airport"等后缀）：
+
+- 精确匹配（exact）：机场代码（不区分大小写）、城市名、机场名称；
+- 别名（alias）：以上别名，以及城市 + 该城市的机场名称或别名（"上海浦东"、"Beijing Capital"）；
+- 前缀匹配（prefix）：规范化键的字典树，前缀下的所有键都指向同一目标时才采用（"shang" -> 上海，"s" 有歧义不采用）；
+- 模糊匹配（fuzzy）：以上都没有结果时，用 difflib 在所有键中找相似度不低于 fuzzy_cutoff 的唯一目标（拼写错误）。
+
+城市名解析为该城市的全部机场，机场名解析为单个机场；无法解析的文本原样返回，由搜索按机场代码处理。
+前缀与模糊匹配是猜测，解析结果的 kind 标明匹配类别，航班搜索在 relaxation_note 中提示模型向用户确认。
+
+解析器随参考数据快照重建（开启 reference_data 时），否则从数据库加载后保留 ttl_seconds。
+配置见 airport_resolver（均有默认值）。
+
+用法：
+    python -m app.dao.airport_resolver 北京 shanghai 上海浦东 Zurcih        # 打印解析结果
+"""
+import difflib
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import select
+
+from app.dao.models.flight_models import AirportData
+from app.dao.projection import model_columns
+from app.dao.reference_data import AirportRow, get_reference_data
+from app.dao.session import get_read_engine
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+_DEFAULTS = {
+    "min_prefix_length": 2,
+    "fuzzy_cutoff": 0.8,
+    "ttl_seconds": 300,
+}
+
+# 无法由 airports_data 推导的名称（中文名、拼音与外语写法）：城市（airports_data.city）或机场代码 -> 别名；
+# airports_data 中没有的城市、机场在构建时忽略
+ALIAS_OVERRIDES: dict[str, tuple[str, ...]] = {
+    "Basel": ("巴塞尔", "basaier", "bâle"),
+    "Beijing": ("北京", "peking", "京"),
+    "Chengdu": ("成都",),
+    "Guangzhou": ("广州", "canton", "穗"),
+    "Hangzhou": ("杭州",),
+    "Moscow": ("莫斯科", "mosike", "moskva", "moskau"),
+    "Shanghai": ("上海", "沪", "申"),
+    "Shenzhen": ("深圳", "鹏城"),
+    "St. Petersburg": ("圣彼得堡", "彼得堡", "shengbidebao"),
+    "Zurich": ("苏黎世", "sulishi", "zuerich"),
+    "PEK": ("首都", "shoudu"),
+    "PKX": ("大兴",),
+    "SHA": ("虹桥",),
+    "PVG": ("浦东",),
+    "CAN": ("白云",),
+    "SZX": ("宝安",),
+    "SVO": ("谢列梅捷沃",),
+    "DME": ("多莫杰多沃",),
+    "VKO": ("伏努科沃",),
+    "LED": ("普尔科沃",),
+    "BSL": ("欧洲机场",),
+    "ZRH": ("kloten",),
+}
+
+# 机场名称中不指向具体机场的词，推导别名时去掉
+_GENERIC_WORDS = frozenset({
+    "international", "intl", "airport", "airfield", "aerodrome", "aeroport", "regional", "municipal", "national",
+})
+
+# 推导单词别名的最短长度
+_MIN_WORD_LENGTH = 4
+
+_IGNORED = re.compile(r"[\s.\-'’·,，、()（）]+")
+_WORD = re.compile(r"[^\W_]+")
+_SAINT = re.compile(r"^st\.?\s+", re.IGNORECASE)
+
+# 规范化时去掉的后缀（按长度从长到短尝试，只去掉一个）
+_SUFFIXES = ("internationalairport", "国际机场", "airport", "机场", "intl", "市")
+
+# 匹配方式 -> 匹配类别
+_MATCH_KINDS = {
+    "code": "exact",
+    "city": "exact",
+    "airport": "exact",
+    "alias": "alias",
+    "city_airport": "alias",
+    "prefix": "prefix",
+    "fuzzy": "fuzzy",
+}
+
+
+def _fold(text: str) -> str:
+    """casefold 并去掉声调与变音符号"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def normalize(text: str) -> str:
+    """规范化名称：casefold、去掉声调与变音符号、空白与标点，再去掉一个常见后缀"""
+    key = _IGNORED.sub("", _fold(text))
+    for suffix in _SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            return key[:-len(suffix)]
+    return key
+
+
+def _words(text: str | None) -> list[str]:
+    """名称中的词（casefold、去掉变音符号，按空白与标点切分，撇号连接的部分合为一词）"""
+    return _WORD.findall(_fold(text or "").replace("'", "").replace("’", ""))
+
+
+def derive_aliases(airports: Iterable[AirportRow]) -> dict[str, set[str]]:
+    """由 airports_data 推导别名
+
+    Args:
+        airports: 机场
+
+    Returns:
+        城市或机场代码 -> 别名（结构同 ALIAS_OVERRIDES）
+    """
+    airports = tuple(airport for airport in airports if airport.city is not None)
+    words = {
+        airport.airport_code: [word for word in _words(airport.airport_name) if word not in _GENERIC_WORDS]
+        for airport in airports
+    }
+    # 只出现在一个机场名称中的词才能指向该机场
+    occurrences = Counter(word for airport_words in words.values() for word in set(airport_words))
+
+    aliases: dict[str, set[str]] = {}
+    for airport in airports:
+        city_words = set(_words(airport.city))
+        names = aliases.setdefault(airport.airport_code, set())
+        airport_words = words[airport.airport_code]
+        distinctive = [word for word in airport_words if word not in city_words]
+        if airport_words:
+            names.add("".join(airport_words))
+        if distinctive:
+            names.add("".join(distinctive))
+        names.update(
+            word for word in distinctive if len(word) >= _MIN_WORD_LENGTH and occurrences[word] == 1
+        )
+
+    for city in {airport.city for airport in airports}:
+        if _SAINT.match(city):
+            rest = _SAINT.sub("", city)
+            aliases.setdefault(city, set()).update((rest, f"saint {rest}", f"sankt {rest}"))
+    return aliases
+
+
+@dataclass(frozen=True, slots=True)
+class _Target:
+    """查找结构中键指向的目标：城市与机场代码"""
+    city: str
+    airport_codes: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class AirportResolution:
+    """一次解析的结果
+
+    Attributes:
+        query: 原始文本
+        city: 所在城市（airports_data.city）
+        airport_codes: 机场代码，城市名解析为该城市的全部机场
+        matched_by: 匹配方式（code、city、airport、alias、city_airport、prefix、fuzzy）
+    """
+    query: str
+    city: str
+    airport_codes: tuple[str, ...]
+    matched_by: str
+
+    @property
+    def kind(self) -> str:
+        """匹配类别：exact（机场代码、城市名、机场名称）、alias（别名）、prefix、fuzzy"""
+        return _MATCH_KINDS[self.matched_by]
+
+    @property
+    def is_guess(self) -> bool:
+        """前缀或模糊匹配：解析结果是猜测，应向用户确认"""
+        return self.kind in ("prefix", "fuzzy")
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "query": self.query,
+            "city": self.city,
+            "airport_codes": list(self.airport_codes),
+            "matched_by": self.matched_by,
+            "kind": self.kind,
+        }
+
+
+class _TrieNode:
+    """字典树节点：target 为子树中所有键共同指向的目标（有歧义时为 None）"""
+    __slots__ = ("children", "terminal", "target")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.terminal: _Target | None = None
+        self.target: _Target | None = None
+
+
+def _compile_trie(keys: dict[str, _Target], cities: dict[str, _Target]) -> _TrieNode:
+    """建立字典树，并自底向上计算每个节点子树的共同目标
+
+    子树中的键指向同一城市的不同机场（或城市本身）时，共同目标为该城市（"shang" -> 上海的全部机场）。
+    """
+    root = _TrieNode()
+    for key, target in keys.items():
+        node = root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        node.terminal = target
+
+    # 迭代后序遍历，避免长键递归过深
+    stack: list[tuple[_TrieNode, bool]] = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children.values())
+            continue
+        targets = {child.target for child in node.children.values()}
+        if node.terminal is not None:
+            targets.add(node.terminal)
+        if len(targets) == 1:
+            node.target = targets.pop()
+        else:
+            cities_of = {target.city if target is not None else None for target in targets}
+            node.target = cities[cities_of.pop()] if len(cities_of) == 1 and None not in cities_of else None
+    return root
+
+
+class AirportResolver:
+    """编译后的城市/机场名称查找结构（构建后只读）
+
+    Attributes:
+        built_at: 构建时间（time.monotonic()）
+        versions: 构建所用参考数据快照的版本号，从数据库加载时为 None
+    """
+
+    def __init__(
+        self,
+        airports: Iterable[AirportRow],
+        min_prefix_length: int = 2,
+        fuzzy_cutoff: float = 0.8,
+        versions: tuple[int, ...] | None = None,
+        aliases: dict[str, Iterable[str]] | None = None,
+    ) -> None:
+        """
+        Args:
+            airports: 机场
+            min_prefix_length: 前缀匹配的最短长度
+            fuzzy_cutoff: 模糊匹配的最低相似度
+            versions: 参考数据快照的版本号
+            aliases: 补充 ALIAS_OVERRIDES 的别名（城市或机场代码 -> 别名），与之冲突时以此为准
+        """
+        self.min_prefix_length = min_prefix_length
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.versions = versions
+        self.built_at = time.monotonic()
+        airports = tuple(airport for airport in airports if airport.city is not None)
+
+        by_city: dict[str, list[str]] = {}
+        self._airport_city: dict[str, str] = {}
+        for airport in airports:
+            by_city.setdefault(airport.city, []).append(airport.airport_code)
+            self._airport_city[airport.airport_code] = airport.city
+        self._cities = {city: _Target(city, tuple(codes)) for city, codes in by_city.items()}
+        self._codes = {code.upper(): _Target(city, (code,)) for code, city in self._airport_city.items()}
+
+        # 精确的城市名与机场名称
+        self._city_names = {normalize(city): target for city, target in self._cities.items()}
+        self._airport_names: dict[str, _Target] = {}
+        for airport in airports:
+            if airport.airport_name:
+                self._airport_names.setdefault(
+                    normalize(airport.airport_name), self._codes[airport.airport_code.upper()],
+                )
+
+        # 别名：同一别名指向不同目标时，配置优先于 ALIAS_OVERRIDES，二者优先于推导的别名
+        self._city_aliases: dict[str, _Target] = {}
+        self._airport_aliases: dict[str, _Target] = {}
+        for source in (aliases or {}, ALIAS_OVERRIDES, derive_aliases(airports)):
+            for name, names in source.items():
+                city_target = self._cities.get(name)
+                target = city_target or self._codes.get(name.upper())
+                if target is None:
+                    continue
+                keys = self._city_aliases if city_target is not None else self._airport_aliases
+                for alias in names:
+                    key = normalize(alias)
+                    if key:
+                        keys.setdefault(key, target)
+        self._aliases = {**self._airport_aliases, **self._city_aliases}
+
+        # 所有键：城市名优先于机场名称，机场名称优先于别名
+        self._keys = {**self._aliases, **self._airport_names, **self._city_names}
+        self._city_keys = {**self._city_aliases, **self._city_names}
+        self._airport_keys = {**self._airport_aliases, **self._airport_names}
+        self._trie = _compile_trie(self._keys, self._cities)
+        self._city_trie = _compile_trie(self._city_keys, self._cities)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def resolve(self, text: str | None) -> AirportResolution | None:
+        """解析城市名、机场名或机场代码
+
+        Args:
+            text: 用户输入的城市名、机场名或机场代码
+
+        Returns:
+            解析结果；无法解析时返回 None
+        """
+        if not text or not text.strip():
+            return None
+        query = text.strip()
+        target = self._codes.get(query.upper())
+        if target is not None:
+            return AirportResolution(query, target.city, target.airport_codes, "code")
+
+        key = normalize(query)
+        if not key:
+            return None
+        # 机场代码带"机场""airport"等后缀（"ZRH airport"）
+        target = self._codes.get(key.upper())
+        if target is not None:
+            return AirportResolution(query, target.city, target.airport_codes, "code")
+        for matched_by, keys in (("city", self._city_names), ("airport", self._airport_names), ("alias", self._aliases)):
+            target = keys.get(key)
+            if target is not None:
+                return AirportResolution(query, target.city, target.airport_codes, matched_by)
+
+        target = self._city_airport(key)
+        if target is not None:
+            return AirportResolution(query, target.city, target.airport_codes, "city_airport")
+        target = self._prefix(key)
+        if target is not None:
+            return AirportResolution(query, target.city, target.airport_codes, "prefix")
+        target = self._fuzzy(key)
+        if target is not None:
+            return AirportResolution(query, target.city, target.airport_codes, "fuzzy")
+        return None
+
+    def _city_airport(self, key: str) -> _Target | None:
+        """城市名 + 该城市的机场名（"上海浦东"）：沿城市字典树找出所有作为前缀的城市键"""
+        node = self._city_trie
+        for position, char in enumerate(key):
+            node = node.children.get(char)
+            if node is None:
+                return None
+            if node.terminal is not None:
+                target = self._airport_keys.get(key[position + 1:])
+                if target is not None and target.city == node.terminal.city:
+                    return target
+        return None
+
+    def _prefix(self, key: str) -> _Target | None:
+        """键的前缀匹配：前缀下的所有键都指向同一目标时采用"""
+        if len(key) < self.min_prefix_length:
+            return None
+        node = self._trie
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node.target
+
+    def _fuzzy(self, key: str) -> _Target | None:
+        """相似度最高且不低于 fuzzy_cutoff 的键；并列的键指向不同目标时视为歧义"""
+        if len(key) < 3:
+            return None
+        matcher = difflib.SequenceMatcher(b=key)
+        best, targets = self.fuzzy_cutoff, set()
+        for candidate, target in self._keys.items():
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < best or matcher.quick_ratio() < best:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best:
+                best, targets = ratio, {target}
+            elif ratio == best:
+                targets.add(target)
+        return targets.pop() if len(targets) == 1 else None
+
+    def airport_codes(self, text: str | None) -> tuple[str | None, ...]:
+        """文本 -> 机场代码元组；无法解析时原样返回（去掉首尾空白）"""
+        if text is None:
+            return (None,)
+        resolution = self.resolve(text)
+        return resolution.airport_codes if resolution is not None else (text.strip(),)
+
+    def city_airports(self, airport_code: str) -> tuple[str, ...]:
+        """机场所在城市的全部机场（原机场在前）；未知机场只返回其本身"""
+        city = self._airport_city.get(airport_code)
+        if city is None:
+            return (airport_code,)
+        return (airport_code, *(code for code in self._cities[city].airport_codes if code != airport_code))
+
+    def footprint(self) -> dict[str, int]:
+        """查找结构的规模"""
+        return {
+            "cities": len(self._cities),
+            "airports": len(self._codes),
+            "aliases": len(self._aliases),
+            "keys": len(self._keys),
+        }
+
+
+def _settings() -> dict:
+    return {**_DEFAULTS, **(CONFIG.get("airport_resolver") or {})}
+
+
+_resolver: AirportResolver | None = None
+_lock = threading.Lock()
+_stats = {"builds": 0}
+
+
+def _build(airports: tuple[AirportRow, ...], versions: tuple[int, ...] | None) -> AirportResolver:
+    settings = _settings()
+    resolver = AirportResolver(
+        airports,
+        min_prefix_length=int(settings["min_prefix_length"]),
+        fuzzy_cutoff=float(settings["fuzzy_cutoff"]),
+        versions=versions,
+        aliases=settings.get("aliases"),
+    )
+    _stats["builds"] += 1
+    logger.info("机场名称解析器已构建: %s", resolver.footprint())
+    return resolver
+
+
+def get_airport_resolver() -> AirportResolver:
+    """获取解析器：开启参考数据时随快照版本重建，否则从数据库加载并保留 ttl_seconds"""
+    global _resolver
+    data = get_reference_data()
+    resolver = _resolver
+    if data is not None:
+        if resolver is not None and resolver.versions == data.versions:
+            return resolver
+    elif resolver is not None and resolver.versions is None and (
+        time.monotonic() - resolver.built_at < float(_settings()["ttl_seconds"])
+    ):
+        return resolver
+
+    with _lock:
+        if _resolver is not resolver:
+            return _resolver
+        if data is not None:
+            _resolver = _build(data.airports, data.versions)
+        else:
+            with get_read_engine().connect() as conn:
+                airports = tuple(AirportRow(*row) for row in conn.execute(
+                    select(*model_columns(AirportData)).order_by(AirportData.airport_code)
+                ))
+            _resolver = _build(airports, None)
+        return _resolver
+
+
+def resolve_airport(text: str | None) -> AirportResolution | None:
+    """解析城市名、机场名或机场代码，无法解析时返回 None（见 AirportResolver.resolve）"""
+    if text is None or not text.strip():
+        return None
+    return get_airport_resolver().resolve(text)
+
+
+def resolve_airports(text: str | None) -> tuple[str | None, ...]:
+    """城市名、机场名或机场代码 -> 机场代码元组（城市名为该城市的全部机场），无法解析时原样返回"""
+    if text is None:
+        return (None,)
+    return get_airport_resolver().airport_codes(text)
+
+
+def reset_airport_resolver() -> None:
+    """丢弃解析器，下次使用时重新构建"""
+    global _resolver
+    with _lock:
+        _resolver = None
+
+
+def airport_resolver_report() -> dict[str, Any]:
+    """解析器的规模与构建次数"""
+    resolver = _resolver
+    return {
+        "built": resolver is not None,
+        "footprint": resolver.footprint() if resolver is not None else {},
+        **_stats,
+    }
+
+
+if __name__ == '__main__':
+    resolver = get_airport_resolver()
+    print(resolver.footprint())
+    for text in sys.argv[1:]:
+        resolution = resolver.resolve(text)
+        print(text, "->", resolution.to_dict() if resolution is not None else None)
@@ -0,0 +1,369 @@
+"""异步基础仓储类"""
+from collections.abc import AsyncIterator, Iterable, Sequence
+from typing import Any, Generic, TypeVar
+
+from sqlalchemy import Row, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from .base_repository import BaseRepository
+from .bulk import DEFAULT_CHUNK_SIZE, chunked, in_chunk_size, key_in, missing_keys
+from .pagination import Page, key_attributes, key_columns, keyset_stmt, make_page
+from .projection import projection_stmt, row_type
+from .query_cache import cached_query, invalidate
+from .session import (
+    commit_async_session,
+    get_async_read_session_factory,
+    get_async_session,
+    read_routed,
+    route_read_methods,
+    write_transaction,
+)
+from .statement_cache import PreparedStatement
+
+ModelType = TypeVar("ModelType")
+
+
+class AsyncBaseRepository(Generic[ModelType]):
+    """异步基础仓储类，提供通用的CRUD操作
+
+    与 BaseRepository 的接口保持一致，所有方法均为协程，
+    供 MCP 处理函数等异步调用方 await，避免占用线程池。
+    """
+
+    # 同名写方法所在的同步仓储类，None 表示 BaseRepository(model)
+    sync_repository_class: type[BaseRepository] | None = None
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """search_*/fetch_* 读方法路由到读连接池，语义同 BaseRepository.__init_subclass__"""
+        super().__init_subclass__(**kwargs)
+        route_read_methods(cls)
+
+    def __init__(self, model: type[ModelType]) -> None:
+        """初始化仓储
+
+        Args:
+            model: SQLAlchemy模型类
+        """
+        self.model = model
+
+    def sync_repository(self) -> BaseRepository[ModelType]:
+        """对应的同步仓储，写调度模式下异步写方法转交其同名方法在写线程中执行"""
+        if self.sync_repository_class is None:
+            return BaseRepository(self.model)
+        return self.sync_repository_class()
+
+    def _filtered(self, stmt: Select, **filters: Any) -> Select:
+        """按字段等值条件追加过滤"""
+        for key, value in filters.items():
+            if hasattr(self.model, key):
+                stmt = stmt.where(getattr(self.model, key) == value)
+        return stmt
+
+    def _to_rows(self, rows: Iterable[Row], as_tuples: bool = False) -> list[Any]:
+        """把按模型列顺序选择的结果行转换为行类型或元组"""
+        if as_tuples:
+            return [tuple(row) for row in rows]
+        row_cls = row_type(self.model)
+        return [row_cls(*row) for row in rows]
+
+    async def _project(self, session: AsyncSession, stmt: Select, as_tuples: bool = False) -> list[Any]:
+        """在已有会话中以行投影执行语句，见 project"""
+        return self._to_rows(await session.execute(projection_stmt(self.model, stmt)), as_tuples)
+
+    async def _fetch_rows(
+        self,
+        session: AsyncSession,
+        prepared: PreparedStatement,
+        as_tuples: bool = False,
+    ) -> list[Any]:
+        """在会话的 Core 连接上执行预编译语句，语义同 BaseRepository._fetch_rows"""
+        conn = await session.connection()
+        return self._to_rows(await conn.execute(*prepared), as_tuples)
+
+    async def project(self, stmt: Select, as_tuples: bool = False) -> list[Any]:
+        """以轻量行投影执行 select(model) 语句，语义同 BaseRepository.project"""
+        async with get_async_session() as session:
+            return await self._project(session, stmt, as_tuples)
+
+    @cached_query()
+    async def get(self, id: int) -> ModelType | None:
+        """根据ID获取单条记录
+
+        Args:
+            id: 记录ID
+
+        Returns:
+            模型实例或None
+        """
+        async with get_async_session() as session:
+            result = await session.scalars(select(self.model).where(self.model.id == id).limit(1))
+            return result.first()
+
+    @cached_query()
+    async def get_by(self, **filters: Any) -> ModelType | None:
+        """根据条件获取单条记录
+
+        Args:
+            **filters: 过滤条件
+
+        Returns:
+            模型实例或None
+        """
+        async with get_async_session() as session:
+            result = await session.scalars(self._filtered(select(self.model), **filters).limit(1))
+            return result.first()
+
+    @cached_query()
+    async def list(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        **filters: Any,
+    ) -> list[ModelType]:
+        """获取记录列表
+
+        Args:
+            skip: 跳过记录数
+            limit: 返回记录数
+            **filters: 过滤条件
+
+        Returns:
+            模型实例列表
+        """
+        async with get_async_session() as session:
+            stmt = self._filtered(select(self.model), **filters).offset(skip).limit(limit)
+            result = await session.scalars(stmt)
+            return list(result.all())
+
+    @read_routed
+    async def paginate(
+        self,
+        limit: int = 100,
+        token: str | None = None,
+        **filters: Any,
+    ) -> Page[ModelType]:
+        """按主键的键集分页获取记录列表，语义同 BaseRepository.paginate
+
+        Args:
+            limit: 每页记录数
+            token: 上一页返回的续页令牌，None 表示第一页
+            **filters: 过滤条件，翻页时需与第一页保持一致
+
+        Returns:
+            本页模型实例与下一页的续页令牌
+
+        Raises:
+            ValueError: 续页令牌无效
+        """
+        async with get_async_session() as session:
+            stmt = keyset_stmt(self.model, self._filtered(select(self.model), **filters), token, limit)
+            result = await session.scalars(stmt)
+            return make_page(self.model, list(result.all()), limit)
+
+    async def iterate(
+        self,
+        batch_size: int = 1000,
+        as_tuples: bool = False,
+        **filters: Any,
+    ) -> AsyncIterator[Any]:
+        """按主键顺序流式遍历记录，语义同 BaseRepository.iterate（服务端游标 + yield_per）
+
+        Args:
+            batch_size: 每批从数据库取回的行数
+            as_tuples: 为True时返回元组，否则返回行类型
+            **filters: 过滤条件
+
+        Yields:
+            行类型实例或元组
+        """
+        stmt = projection_stmt(self.model, self._filtered(select(self.model), **filters))
+        stmt = stmt.order_by(*key_columns(self.model)).execution_options(yield_per=batch_size)
+        async with get_async_read_session_factory()() as session:
+            conn = await session.connection()
+            result = await conn.stream(stmt)
+            async for partition in result.partitions():
+                for row in self._to_rows(partition, as_tuples):
+                    yield row
+
+    @write_transaction
+    async def create(self, obj_in: dict[str, Any]) -> ModelType:
+        """创建新记录
+
+        Args:
+            obj_in: 创建数据字典
+
+        Returns:
+            创建的模型实例
+        """
+        async with get_async_session() as session:
+            db_obj = self.model(**obj_in)
+            session.add(db_obj)
+            await commit_async_session(session)
+            invalidate(session, self.model.__tablename__)
+            await session.refresh(db_obj)
+            return db_obj
+
+    @write_transaction
+    async def update(
+        self,
+        id: int,
+        obj_in: dict[str, Any],
+    ) -> ModelType | None:
+        """更新记录
+
+        Args:
+            id: 记录ID
+            obj_in: 更新数据字典
+
+        Returns:
+            更新后的模型实例或None
+        """
+        async with get_async_session() as session:
+            result = await session.scalars(select(self.model).where(self.model.id == id).limit(1))
+            db_obj = result.first()
+            if db_obj is None:
+                return None
+
+            for field, value in obj_in.items():
+                if hasattr(db_obj, field):
+                    setattr(db_obj, field, value)
+
+            await commit_async_session(session)
+            invalidate(session, self.model.__tablename__)
+            await session.refresh(db_obj)
+            return db_obj
+
+    @write_transaction
+    async def delete(self, id: int) -> bool:
+        """删除记录
+
+        Args:
+            id: 记录ID
+
+        Returns:
+            是否删除成功
+        """
+        async with get_async_session() as session:
+            result = await session.scalars(select(self.model).where(self.model.id == id).limit(1))
+            db_obj = result.first()
+            if db_obj is None:
+                return False
+
+            await session.delete(db_obj)
+            await commit_async_session(session)
+            invalidate(session, self.model.__tablename__)
+            return True
+
+    @read_routed
+    async def get_many(self, ids: Sequence[Any]) -> "list[ModelType]":
+        """按主键批量获取记录，语义同 BaseRepository.get_many
+
+        Args:
+            ids: 主键列表，复合主键为与主键列顺序一致的元组
+
+        Returns:
+            模型实例列表，不存在的主键被忽略
+        """
+        if not ids:
+            return []
+        async with get_async_session() as session:
+            size = in_chunk_size(self.model, session.get_bind().dialect.name)
+            objs = []
+            for chunk in chunked(ids, size):
+                objs.extend(await session.scalars(select(self.model).where(key_in(self.model, chunk))))
+            return objs
+
+    @write_transaction
+    async def bulk_create(self, objs_in: Sequence[dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """批量创建记录，语义同 BaseRepository.bulk_create
+
+        Args:
+            objs_in: 创建数据字典列表
+            chunk_size: 每次 executemany 的行数
+
+        Returns:
+            创建的记录数
+        """
+        if not objs_in:
+            return 0
+        async with get_async_session() as session:
+            for chunk in chunked(objs_in, chunk_size):
+                await session.execute(insert(self.model), chunk)
+            await commit_async_session(session)
+            invalidate(session, self.model.__tablename__)
+            return len(objs_in)
+
+    @write_transaction
+    async def bulk_update(self, objs_in: Sequence[dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """按主键批量更新记录，语义同 BaseRepository.bulk_update
+
+        Args:
+            objs_in: 更新数据字典列表（每行包含主键）
+            chunk_size: 每次 executemany 的行数
+
+        Returns:
+            提交的更新行数
+
+        Raises:
+            ValueError: 有行缺少主键
+        """
+        missing = missing_keys(self.model, objs_in)
+        if missing:
+            raise ValueError(f"按主键批量更新的每行都需包含主键 {key_attributes(self.model)}: {missing[0]}")
+        if not objs_in:
+            return 0
+        async with get_async_session() as session:
+            for chunk in chunked(objs_in, chunk_size):
+                await session.execute(update(self.model), chunk)
+            await commit_async_session(session)
+            invalidate(session, self.model.__tablename__)
+            return len(objs_in)
+
+    @write_transaction
+    async def bulk_delete(self, ids: Sequence[Any]) -> int:
+        """按主键批量删除记录，语义同 BaseRepository.bulk_delete
+
+        Args:
+            ids: 主键列表，复合主键为与主键列顺序一致的元组
+
+        Returns:
+            删除的记录数
+        """
+        if not ids:
+            return 0
+        async with get_async_session() as session:
+            size = in_chunk_size(self.model, session.get_bind().dialect.name)
+            deleted = 0
+            for chunk in chunked(ids, size):
+                stmt = delete(self.model).where(key_in(self.model, chunk))
+                result = await session.execute(stmt, execution_options={"synchronize_session": False})
+                deleted += result.rowcount
+            await commit_async_session(session)
+            invalidate(session, self.model.__tablename__)
+            return deleted
+
+    @cached_query()
+    async def count(self, **filters: Any) -> int:
+        """统计记录数
+
+        Args:
+            **filters: 过滤条件
+
+        Returns:
+            记录数量
+        """
+        async with get_async_session() as session:
+            stmt = self._filtered(select(func.count()).select_from(self.model), **filters)
+            return await session.scalar(stmt)
+
+    async def exists(self, **filters: Any) -> bool:
+        """检查记录是否存在
+
+        Args:
+            **filters: 过滤条件
+
+        Returns:
+            是否存在
+        """
+        return await self.count(**filters) > 0
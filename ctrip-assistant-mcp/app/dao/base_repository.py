@@ -1,9 +1,25 @@
 """基础仓储类"""
+from collections.abc import Iterable, Iterator, Sequence
 from typing import Any, Generic, TypeVar
 
 from pydantic import BaseModel
-
-from .session import get_session
+from sqlalchemy import Row, delete, insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from .bulk import DEFAULT_CHUNK_SIZE, chunked, in_chunk_size, key_in, missing_keys
+from .pagination import Page, key_attributes, key_columns, keyset_stmt, make_page
+from .projection import projection_stmt, row_type
+from .query_cache import cached_query, invalidate
+from .session import (
+    commit_session,
+    get_read_session_factory,
+    get_session,
+    read_routed,
+    route_read_methods,
+    write_transaction,
+)
+from .statement_cache import PreparedStatement
 
 ModelType = TypeVar("ModelType")
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
@@ -13,6 +29,11 @@ UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 class BaseRepository(Generic[ModelType]):
     """基础仓储类，提供通用的CRUD操作"""
 
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """search_*/fetch_* 读方法路由到读连接池，book/cancel/update 等写方法仍使用写连接"""
+        super().__init_subclass__(**kwargs)
+        route_read_methods(cls)
+
     def __init__(self, model: type[ModelType]) -> None:
         """初始化仓储
 
@@ -21,6 +42,44 @@ class BaseRepository(Generic[ModelType]):
         """
         self.model = model
 
+    def _filtered(self, stmt: Select, **filters: Any) -> Select:
+        """按字段等值条件追加过滤"""
+        for key, value in filters.items():
+            if hasattr(self.model, key):
+                stmt = stmt.where(getattr(self.model, key) == value)
+        return stmt
+
+    def _to_rows(self, rows: Iterable[Row], as_tuples: bool = False) -> list[Any]:
+        """把按模型列顺序选择的结果行转换为行类型或元组"""
+        if as_tuples:
+            return [tuple(row) for row in rows]
+        row_cls = row_type(self.model)
+        return [row_cls(*row) for row in rows]
+
+    def _project(self, session: Session, stmt: Select, as_tuples: bool = False) -> list[Any]:
+        """在已有会话中以行投影执行语句，见 project"""
+        return self._to_rows(session.execute(projection_stmt(self.model, stmt)), as_tuples)
+
+    def _fetch_rows(self, session: Session, prepared: PreparedStatement, as_tuples: bool = False) -> list[Any]:
+        """在会话的 Core 连接上执行预编译语句（模板已按模型列顺序选择），返回行投影"""
+        return self._to_rows(session.connection().execute(*prepared), as_tuples)
+
+    def project(self, stmt: Select, as_tuples: bool = False) -> list[Any]:
+        """以轻量行投影执行 select(model) 语句
+
+        通过 Core 只选择模型的列，不创建ORM实例、不进入身份映射，适合只读的搜索路径。
+
+        Args:
+            stmt: 针对本仓储模型的 select 语句（可带条件、联表、排序与分页）
+            as_tuples: 为True时返回元组，否则返回行类型（带 __slots__ 的 dataclass，提供 to_dict）
+
+        Returns:
+            行列表
+        """
+        with get_session() as session:
+            return self._project(session, stmt, as_tuples)
+
+    @cached_query()
     def get(self, id: int) -> ModelType | None:
         """根据ID获取单条记录
 
@@ -33,6 +92,7 @@ class BaseRepository(Generic[ModelType]):
         with get_session() as session:
             return session.query(self.model).filter(self.model.id == id).first()
 
+    @cached_query()
     def get_by(
         self, **filters: Any
     ) -> ModelType | None:
@@ -51,6 +111,7 @@ class BaseRepository(Generic[ModelType]):
                     query = query.filter(getattr(self.model, key) == value)
             return query.first()
 
+    @cached_query()
     def list(
         self,
         skip: int = 0,
@@ -74,6 +135,59 @@ class BaseRepository(Generic[ModelType]):
                     query = query.filter(getattr(self.model, key) == value)
             return query.offset(skip).limit(limit).all()
 
+    @read_routed
+    def paginate(
+        self,
+        limit: int = 100,
+        token: str | None = None,
+        **filters: Any,
+    ) -> Page[ModelType]:
+        """按主键的键集分页获取记录列表（深翻页不退化，适合替代 list 的 skip）
+
+        Args:
+            limit: 每页记录数
+            token: 上一页返回的续页令牌，None 表示第一页
+            **filters: 过滤条件，翻页时需与第一页保持一致
+
+        Returns:
+            本页模型实例与下一页的续页令牌
+
+        Raises:
+            ValueError: 续页令牌无效
+        """
+        with get_session() as session:
+            stmt = keyset_stmt(self.model, self._filtered(select(self.model), **filters), token, limit)
+            return make_page(self.model, list(session.scalars(stmt).all()), limit)
+
+    def iterate(
+        self,
+        batch_size: int = 1000,
+        as_tuples: bool = False,
+        **filters: Any,
+    ) -> Iterator[Any]:
+        """按主键顺序流式遍历记录（导出、后台扫描），内存占用与总行数无关
+
+        以 yield_per 分批取数并返回行投影（不创建ORM实例）；使用独立的读会话，不加入工作单元，
+        遍历期间不占用工作单元的会话。
+
+        Args:
+            batch_size: 每批从数据库取回的行数
+            as_tuples: 为True时返回元组，否则返回行类型
+            **filters: 过滤条件
+
+        Yields:
+            行类型实例或元组
+        """
+        stmt = projection_stmt(self.model, self._filtered(select(self.model), **filters))
+        stmt = stmt.order_by(*key_columns(self.model)).execution_options(yield_per=batch_size)
+        session = get_read_session_factory()()
+        try:
+            for partition in session.connection().execute(stmt).partitions():
+                yield from self._to_rows(partition, as_tuples)
+        finally:
+            session.close()
+
+    @write_transaction
     def create(self, obj_in: dict[str, Any]) -> ModelType:
         """创建新记录
 
@@ -86,10 +200,12 @@ class BaseRepository(Generic[ModelType]):
         with get_session() as session:
             db_obj = self.model(**obj_in)
             session.add(db_obj)
-            session.commit()
+            commit_session(session)
+            invalidate(session, self.model.__tablename__)
             session.refresh(db_obj)
             return db_obj
 
+    @write_transaction
     def update(
         self,
         id: int,
@@ -113,10 +229,12 @@ class BaseRepository(Generic[ModelType]):
                 if hasattr(db_obj, field):
                     setattr(db_obj, field, value)
 
-            session.commit()
+            commit_session(session)
+            invalidate(session, self.model.__tablename__)
             session.refresh(db_obj)
             return db_obj
 
+    @write_transaction
     def delete(self, id: int) -> bool:
         """删除记录
 
@@ -132,9 +250,99 @@ class BaseRepository(Generic[ModelType]):
                 return False
 
             session.delete(db_obj)
-            session.commit()
+            commit_session(session)
+            invalidate(session, self.model.__tablename__)
             return True
 
+    @read_routed
+    def get_many(self, ids: Sequence[Any]) -> "list[ModelType]":
+        """按主键批量获取记录（IN 条件，按数据库的绑定参数上限分块）
+
+        Args:
+            ids: 主键列表，复合主键为与主键列顺序一致的元组
+
+        Returns:
+            模型实例列表，不存在的主键被忽略
+        """
+        if not ids:
+            return []
+        with get_session() as session:
+            size = in_chunk_size(self.model, session.get_bind().dialect.name)
+            return [
+                obj
+                for chunk in chunked(ids, size)
+                for obj in session.scalars(select(self.model).where(key_in(self.model, chunk)))
+            ]
+
+    @write_transaction
+    def bulk_create(self, objs_in: Sequence[dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """批量创建记录：executemany 分块插入，所有分块在一个事务中提交
+
+        Args:
+            objs_in: 创建数据字典列表
+            chunk_size: 每次 executemany 的行数
+
+        Returns:
+            创建的记录数
+        """
+        if not objs_in:
+            return 0
+        with get_session() as session:
+            for chunk in chunked(objs_in, chunk_size):
+                session.execute(insert(self.model), chunk)
+            commit_session(session)
+            invalidate(session, self.model.__tablename__)
+            return len(objs_in)
+
+    @write_transaction
+    def bulk_update(self, objs_in: Sequence[dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """按主键批量更新记录：每行字典包含主键与要更新的字段，executemany 分块执行，在一个事务中提交
+
+        Args:
+            objs_in: 更新数据字典列表
+            chunk_size: 每次 executemany 的行数
+
+        Returns:
+            提交的更新行数
+
+        Raises:
+            ValueError: 有行缺少主键
+        """
+        missing = missing_keys(self.model, objs_in)
+        if missing:
+            raise ValueError(f"按主键批量更新的每行都需包含主键 {key_attributes(self.model)}: {missing[0]}")
+        if not objs_in:
+            return 0
+        with get_session() as session:
+            for chunk in chunked(objs_in, chunk_size):
+                session.execute(update(self.model), chunk)
+            commit_session(session)
+            invalidate(session, self.model.__tablename__)
+            return len(objs_in)
+
+    @write_transaction
+    def bulk_delete(self, ids: Sequence[Any]) -> int:
+        """按主键批量删除记录（IN 条件分块，在一个事务中提交）
+
+        Args:
+            ids: 主键列表，复合主键为与主键列顺序一致的元组
+
+        Returns:
+            删除的记录数
+        """
+        if not ids:
+            return 0
+        with get_session() as session:
+            size = in_chunk_size(self.model, session.get_bind().dialect.name)
+            deleted = 0
+            for chunk in chunked(ids, size):
+                stmt = delete(self.model).where(key_in(self.model, chunk))
+                deleted += session.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+            commit_session(session)
+            invalidate(session, self.model.__tablename__)
+            return deleted
+
+    @cached_query()
     def count(self, **filters: Any) -> int:
         """统计记录数
 
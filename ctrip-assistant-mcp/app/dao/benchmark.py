@@ -0,0 +1,944 @@
+"""数据访问层性能基准
+
+用法（在项目根目录执行，数据库取自配置文件）：
+    python -m app.dao.benchmark async
+    python -m app.dao.benchmark fts
+    python -m app.dao.benchmark projection
+    python -m app.dao.benchmark statements
+    python -m app.dao.benchmark writes
+    python -m app.dao.benchmark dates
+    python -m app.dao.benchmark bulk
+    python -m app.dao.benchmark profiles
+    python -m app.dao.benchmark reference
+    python -m app.dao.benchmark flight_index
+    python -m app.dao.benchmark connections
+    python -m app.dao.benchmark seats
+    python -m app.dao.benchmark rebooking
+"""
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine, create_engine, delete, func, inspect, insert, lambda_stmt, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.dao import flight_index, fts, rebooking, reference_data, route_graph, seat_availability
+from app.dao.models.hotel_models import Hotel
+from app.dao.models.booking_models import BoardingPass, Ticket, TicketFlight
+from app.dao.models.flight_models import Flight, Seat
+from app.dao.repositories.flight_repository import (
+    AirportRepository,
+    AsyncFlightRepository,
+    FlightRepository,
+    SeatRepository,
+    TicketRepository,
+    _indexed_search,
+    _search_flights_stmt,
+    _user_flight_information_stmt,
+    seconds_until_departure,
+)
+from app.dao.query_cache import invalidate
+from app.dao.session import get_read_engine, get_session, get_sync_engine, get_write_dispatcher
+from app.dao.sqlite_profiles import DEFAULT_PROFILE_NAME
+from app.dao.statement_cache import get_statement_cache_stats, reset_statement_cache_stats
+from app.multi_agent.workflow.init_db import FLIGHT_DATETIME_COLUMNS, shift_dates
+from app.dao.repositories.hotel_repository import HotelRepository, _search_hotels_stmt
+from config import CONFIG
+
+
+def _print_table(title: str, header: list[str], rows: list[list]) -> None:
+    """以对齐的表格打印基准结果"""
+    print(f"\n== {title} ==")
+    widths = [max(len(str(x)) for x in col) for col in zip(header, *rows)]
+    for row in [header, *rows]:
+        print("  ".join(str(x).rjust(w) for x, w in zip(row, widths)))
+
+
+def bench_async_vs_sync(
+    concurrency_levels: tuple[int, ...] = (1, 10, 50, 200),
+    requests_per_level: int = 400,
+    threadpool_size: int = 40,
+) -> None:
+    """对比同步仓储（线程池）与异步仓储（事件循环）在并发请求下的吞吐量
+
+    同步路径模拟 FastAPI/AnyIO 默认的 40 个工作线程；异步路径直接在事件循环中 await。
+    """
+    sync_repo = FlightRepository()
+    async_repo = AsyncFlightRepository()
+    sample = sync_repo.list(limit=1)
+    departure = sample[0].departure_airport if sample else None
+
+    async def run_sync(concurrency: int) -> float:
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        with ThreadPoolExecutor(max_workers=threadpool_size) as executor:
+            async def one():
+                async with semaphore:
+                    await loop.run_in_executor(executor, lambda: sync_repo.search_flights(departure_airport=departure))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(requests_per_level)))
+            return time.perf_counter() - start
+
+    async def run_async(concurrency: int) -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await async_repo.search_flights(departure_airport=departure)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests_per_level)))
+        return time.perf_counter() - start
+
+    async def main():
+        # 预热连接池
+        await run_sync(1)
+        await run_async(1)
+        rows = []
+        for concurrency in concurrency_levels:
+            sync_elapsed = await run_sync(concurrency)
+            async_elapsed = await run_async(concurrency)
+            rows.append([
+                concurrency,
+                f"{requests_per_level / sync_elapsed:.0f}",
+                f"{requests_per_level / async_elapsed:.0f}",
+            ])
+        _print_table("search_flights 并发吞吐量 (req/s)", ["并发数", "同步+线程池", "异步"], rows)
+
+    asyncio.run(main())
+
+
+_CITIES = [
+    "Basel", "Zurich", "Geneva", "Lucerne", "Bern", "Lugano", "Shanghai", "Beijing",
+    "Hangzhou", "Chengdu", "Moscow", "Berlin", "Paris", "London", "Tokyo", "Seoul",
+]
+_BRANDS = ["Hilton", "Marriott", "Hyatt", "Radisson", "Holiday Inn", "Four Seasons", "Ibis", "Novotel"]
+_TIERS = ["Midscale", "Upper Midscale", "Upscale", "Upper Upscale", "Luxury"]
+
+
+@contextmanager
+def _synthetic_hotels(rows: int, rng: random.Random) -> Generator[Engine]:
+    """在临时 SQLite 文件中生成 rows 行合成酒店数据，退出时删除"""
+    path = os.path.join(tempfile.mkdtemp(), "bench_hotels.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        Hotel.__table__.create(engine)
+        with engine.begin() as conn:
+            batch = 50_000
+            for offset in range(0, rows, batch):
+                conn.execute(Hotel.__table__.insert(), [
+                    {
+                        "id": i + 1,
+                        "name": f"{rng.choice(_BRANDS)} {rng.choice(_CITIES)} {i}",
+                        "location": rng.choice(_CITIES),
+                        "price_tier": rng.choice(_TIERS),
+                        "checkin_date": "2024-04-25",
+                        "checkout_date": "2024-04-27",
+                        "booked": 0,
+                    }
+                    for i in range(offset, min(offset + batch, rows))
+                ])
+        yield engine
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+def bench_fts(rows: int = 1_000_000, queries: int = 50, seed: int = 42) -> None:
+    """对比 LIKE 与 FTS5 的酒店搜索耗时
+
+    在临时 SQLite 文件中生成 rows 行合成酒店数据，使用与仓储相同的语句构建函数，
+    分别以 LIKE 模糊匹配和 FTS5 前缀匹配 + bm25 排序执行相同的查询。
+    高频词下 LIKE 借助 LIMIT 提前结束，而 bm25 需要对全部命中行打分排序；
+    高选择性或无结果的查询则相反。
+    """
+    rng = random.Random(seed)
+    with _synthetic_hotels(rows, rng) as engine:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            fts.ensure_fts(conn)
+        build_elapsed = time.perf_counter() - start
+
+        cases = {
+            "location": lambda: {"location": rng.choice(_CITIES)},
+            "name": lambda: {"name": rng.choice(_BRANDS).split()[0]},
+            "location+name": lambda: {"location": rng.choice(_CITIES), "name": rng.choice(_BRANDS).split()[0]},
+            "prefix": lambda: {"location": rng.choice(_CITIES)[:3]},
+            # 高选择性 / 无结果：LIKE 必须扫描整表
+            "selective": lambda: {"name": f"{rng.choice(_BRANDS).split()[0]} {rng.randrange(rows)}"},
+            "miss": lambda: {"location": "Atlantis"},
+        }
+        result_rows = []
+        with engine.connect() as conn:
+            for case, make_params in cases.items():
+                params = [make_params() for _ in range(queries)]
+                elapsed = {}
+                for use_fts in (False, True):
+                    start = time.perf_counter()
+                    for p in params:
+                        conn.execute(_search_hotels_stmt(limit=20, use_fts=use_fts, **p)).all()
+                    elapsed[use_fts] = (time.perf_counter() - start) / queries * 1000
+                result_rows.append([
+                    case,
+                    f"{elapsed[False]:.2f}",
+                    f"{elapsed[True]:.2f}",
+                    f"{elapsed[False] / elapsed[True]:.1f}x",
+                ])
+        _print_table(
+            f"酒店搜索单次耗时 (ms)，{rows} 行，FTS 建索引 {build_elapsed:.1f}s",
+            ["查询", "LIKE", "FTS5+bm25", "加速"],
+            result_rows,
+        )
+
+
+def bench_projection(rows: int = 200_000, limit: int = 5_000, rounds: int = 10, seed: int = 42) -> None:
+    """对比 ORM 实例 + to_dict 与行投影的读取吞吐量 (rows/s)
+
+    "ORM + inspect" 为改造前的路径：每行创建ORM实例，to_dict 逐行调用 inspect() 取列属性。
+    """
+    rng = random.Random(seed)
+    repo = HotelRepository()
+    stmt = select(Hotel).where(Hotel.booked == 0).limit(limit)
+
+    def orm_inspect(session: Session) -> list[dict]:
+        return [
+            {c.key: getattr(h, c.key) for c in inspect(h).mapper.column_attrs}
+            for h in session.scalars(stmt)
+        ]
+
+    cases = {
+        "ORM + inspect (改造前)": orm_inspect,
+        "ORM + 缓存列清单": lambda session: [h.to_dict() for h in session.scalars(stmt)],
+        "行投影 + to_dict": lambda session: [r.to_dict() for r in repo._project(session, stmt)],
+        "元组投影": lambda session: repo._project(session, stmt, as_tuples=True),
+    }
+    with _synthetic_hotels(rows, rng) as engine:
+        result_rows = []
+        baseline = None
+        for case, run in cases.items():
+            # 每轮使用新会话，避免身份映射命中
+            with Session(engine) as session:
+                run(session)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                with Session(engine) as session:
+                    run(session)
+            throughput = limit * rounds / (time.perf_counter() - start)
+            baseline = baseline or throughput
+            result_rows.append([case, f"{throughput:,.0f}", f"{throughput / baseline:.1f}x"])
+        _print_table(f"search 结果读取吞吐量，每次 {limit} 行", ["方式", "rows/s", "相对改造前"], result_rows)
+
+
+def bench_statements(calls: int = 2_000) -> None:
+    """对比热点查询每次调用的开销（μs/次）
+
+    同一条SQL分别以 Query 链式构建（改造前）、select() 构建、lambda_stmt
+    与预编译语句模板（仓储当前的实现）执行；结果集很小，耗时差异主要来自
+    语句构建、缓存键计算、编译与 ORM 执行层。
+    """
+    sample_flight = FlightRepository().list(limit=1)
+    sample_ticket = TicketRepository().list(limit=1)
+    departure = sample_flight[0].departure_airport if sample_flight else "SVO"
+    passenger_id = sample_ticket[0].passenger_id if sample_ticket else "3442 587242"
+
+    def search_query(session: Session, dep: str):
+        return session.query(Flight).filter(Flight.departure_airport == dep).limit(5).all()
+
+    def search_select(session: Session, dep: str):
+        return session.scalars(select(Flight).where(Flight.departure_airport == dep).limit(5)).all()
+
+    def search_lambda(session: Session, dep: str):
+        stmt = lambda_stmt(lambda: select(Flight))
+        stmt += lambda s: s.where(Flight.departure_airport == dep)
+        stmt += lambda s: s.limit(5)
+        return session.scalars(stmt).all()
+
+    def search_prepared(session: Session, dep: str):
+        return session.connection().execute(*_search_flights_stmt(departure_airport=dep, limit=5)).all()
+
+    def itinerary_select(pid: str):
+        return select(
+            Ticket.ticket_no, Ticket.book_ref, Flight.flight_id, Flight.flight_no,
+            Flight.departure_airport, Flight.arrival_airport, Flight.scheduled_departure,
+            Flight.scheduled_arrival, BoardingPass.seat_no, TicketFlight.fare_conditions,
+        ).join(
+            TicketFlight, Ticket.ticket_no == TicketFlight.ticket_no
+        ).join(
+            Flight, TicketFlight.flight_id == Flight.flight_id
+        ).join(
+            BoardingPass,
+            (BoardingPass.ticket_no == Ticket.ticket_no) & (BoardingPass.flight_id == Flight.flight_id)
+        ).where(Ticket.passenger_id == pid)
+
+    def itinerary_query(session: Session, pid: str):
+        return session.query(
+            Ticket.ticket_no, Ticket.book_ref, Flight.flight_id, Flight.flight_no,
+            Flight.departure_airport, Flight.arrival_airport, Flight.scheduled_departure,
+            Flight.scheduled_arrival, BoardingPass.seat_no, TicketFlight.fare_conditions,
+        ).join(
+            TicketFlight, Ticket.ticket_no == TicketFlight.ticket_no
+        ).join(
+            Flight, TicketFlight.flight_id == Flight.flight_id
+        ).join(
+            BoardingPass,
+            (BoardingPass.ticket_no == Ticket.ticket_no) & (BoardingPass.flight_id == Flight.flight_id)
+        ).filter(Ticket.passenger_id == pid).all()
+
+    def itinerary_lambda(session: Session, pid: str):
+        return session.execute(lambda_stmt(lambda: itinerary_select(pid))).all()
+
+    def itinerary_prepared(session: Session, pid: str):
+        return session.connection().execute(*_user_flight_information_stmt(pid)).all()
+
+    cases = [
+        ("search_flights", "Query 链式 (改造前)", search_query, departure),
+        ("search_flights", "select() 构建", search_select, departure),
+        ("search_flights", "lambda_stmt", search_lambda, departure),
+        ("search_flights", "预编译模板", search_prepared, departure),
+        ("fetch_user_flight_information", "Query 链式 (改造前)", itinerary_query, passenger_id),
+        ("fetch_user_flight_information", "select() 构建",
+         lambda session, pid: session.execute(itinerary_select(pid)).all(), passenger_id),
+        ("fetch_user_flight_information", "lambda_stmt", itinerary_lambda, passenger_id),
+        ("fetch_user_flight_information", "预编译模板", itinerary_prepared, passenger_id),
+    ]
+    reset_statement_cache_stats()
+    result_rows = []
+    with get_session() as session:
+        for query, method, run, arg in cases:
+            run(session, arg)
+            start = time.perf_counter()
+            for _ in range(calls):
+                run(session, arg)
+            per_call = (time.perf_counter() - start) / calls * 1_000_000
+            result_rows.append([query, method, f"{per_call:.0f}"])
+    _print_table("热点查询单次调用开销", ["查询", "构建方式", "μs/次"], result_rows)
+
+    stats = get_statement_cache_stats()
+    _print_table(
+        "编译缓存命中（预编译模板）",
+        ["语句", "hit", "miss", "uncached"],
+        [[name, s["hit"], s["miss"], s["uncached"]] for name, s in stats.items()],
+    )
+
+
+def bench_writes(writers: int = 50, writes_per_writer: int = 40) -> None:
+    """对比各线程直接提交与单写线程合并提交的写吞吐量
+
+    writers 个线程并发对不同酒店交替执行 book_hotel/cancel_hotel（结束后状态不变），
+    统计每秒完成的写事务数与 "database is locked" 失败次数。
+    """
+    repo = HotelRepository()
+    hotel_ids = [hotel.id for hotel in repo.list(limit=writers)]
+    settings = CONFIG["database"].setdefault("write_dispatcher", {})
+    original = settings.get("enabled", False)
+
+    def writer(hotel_id: int) -> int:
+        failures = 0
+        for i in range(writes_per_writer):
+            try:
+                (repo.book_hotel if i % 2 == 0 else repo.cancel_hotel)(hotel_id)
+            except OperationalError:
+                failures += 1
+        return failures
+
+    rows = []
+    try:
+        for mode, enabled in (("各线程直接提交", False), ("单写线程合并提交", True)):
+            settings["enabled"] = enabled
+            with ThreadPoolExecutor(max_workers=writers) as executor:
+                start = time.perf_counter()
+                failures = sum(executor.map(writer, (hotel_ids[i % len(hotel_ids)] for i in range(writers))))
+                elapsed = time.perf_counter() - start
+            total = writers * writes_per_writer
+            dispatcher = get_write_dispatcher()
+            batch = dispatcher.stats()["avg_batch_size"] if dispatcher is not None else 1
+            rows.append([mode, f"{(total - failures) / elapsed:.0f}", failures, batch])
+    finally:
+        settings["enabled"] = original
+    _print_table(
+        f"{writers} 个并发写线程的写吞吐量",
+        ["模式", "写事务/s", "locked 失败", "平均批大小"],
+        rows,
+    )
+
+
+def _update_dates_pandas(conn: sqlite3.Connection) -> None:
+    """改造前的 update_dates：整表读入 pandas 平移后 to_sql(if_exists="replace") 写回"""
+    import pandas as pd
+
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type='table';", conn).name.tolist()
+    tdf = {t: pd.read_sql(f"SELECT * from {t}", conn) for t in tables}
+    example_time = pd.to_datetime(tdf["flights"]["actual_departure"].replace("\\N", pd.NaT)).max()
+    current_time = pd.to_datetime("now").tz_localize(example_time.tz)
+    time_diff = current_time + pd.Timedelta(days=1) - example_time
+    tdf["bookings"]["book_date"] = (
+        pd.to_datetime(tdf["bookings"]["book_date"].replace("\\N", pd.NaT), utc=True) + time_diff
+    )
+    for column in FLIGHT_DATETIME_COLUMNS:
+        tdf["flights"][column] = pd.to_datetime(tdf["flights"][column].replace("\\N", pd.NaT)) + time_diff
+    for table_name, df in tdf.items():
+        df.to_sql(table_name, conn, if_exists="replace", index=False)
+    conn.commit()
+
+
+def bench_update_dates(scale: int = 100) -> None:
+    """对比 update_dates 改造前后（pandas 整表重写 / SQLite 内 UPDATE）的耗时与 Python 堆内存峰值
+
+    以配置目录下的 travel_backup.sqlite 为样本，每张表复制为 scale 倍行数，
+    每种方式在独立的副本上执行；内存峰值由 tracemalloc 统计（含 numpy 数组）。
+    """
+    backup_file = os.path.join(os.path.dirname(CONFIG["database"]["url"]), "travel_backup.sqlite")
+    workdir = tempfile.mkdtemp()
+    scaled = os.path.join(workdir, "scaled.sqlite")
+    shutil.copy(backup_file, scaled)
+    with sqlite3.connect(scaled) as conn:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        for table in tables:
+            conn.execute(
+                f"WITH RECURSIVE k(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM k WHERE n < {scale - 1}) "
+                f"INSERT INTO {table} SELECT {table}.* FROM {table}, k"
+            )
+        flights = conn.execute("SELECT COUNT(*) FROM flights").fetchone()[0]
+
+    def run(update) -> list:
+        path = os.path.join(workdir, "run.sqlite")
+        shutil.copy(scaled, path)
+        conn = sqlite3.connect(path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            update(conn)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            conn.close()
+        indexes = sqlite3.connect(path).execute("SELECT COUNT(*) FROM sqlite_master WHERE type='index'").fetchone()[0]
+        return [f"{elapsed:.2f}", f"{peak / 2 ** 20:.1f}", indexes]
+
+    def set_based(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute("CREATE INDEX idx_bench_flights ON flights(flight_id)")
+            shift_dates(conn)
+
+    def pandas_rewrite(conn: sqlite3.Connection) -> None:
+        conn.execute("CREATE INDEX idx_bench_flights ON flights(flight_id)")
+        _update_dates_pandas(conn)
+
+    rows = [["SQLite UPDATE", *run(set_based)]]
+    try:
+        rows.append(["pandas + to_sql", *run(pandas_rewrite)])
+    except ImportError:
+        rows.append(["pandas + to_sql", "未安装 pandas", "-", "-"])
+    shutil.rmtree(workdir, ignore_errors=True)
+    _print_table(
+        f"update_dates（{scale} 倍数据，flights {flights} 行）",
+        ["方式", "耗时 (s)", "内存峰值 (MB)", "完成后索引数"],
+        rows,
+    )
+
+
+def bench_bulk(rows: int = 2_000) -> None:
+    """对比逐行调用 create/get/update/delete 与批量方法的耗时
+
+    在 hotels 表中写入 rows 行合成酒店（ID 接在现有最大ID之后），依次查询、更新、删除，结束后数据不变。
+    逐行方法每行一个事务（一次提交），批量方法每种操作一个事务。
+    """
+    repo = HotelRepository()
+    with get_session() as session:
+        start_id = (session.scalar(select(func.max(Hotel.id))) or 0) + 1
+    ids = list(range(start_id, start_id + rows))
+    hotels = [
+        {"id": i, "name": f"Bench Hotel {i}", "location": "Basel", "price_tier": "Midscale",
+         "checkin_date": "2024-04-02", "checkout_date": "2024-04-05", "booked": 0}
+        for i in ids
+    ]
+    changes = [{"id": i, "booked": 1} for i in ids]
+
+    def timed(func, *args) -> float:
+        start = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - start
+
+    looped = [
+        timed(lambda: [repo.create(hotel) for hotel in hotels]),
+        timed(lambda: [repo.get(i) for i in ids]),
+        timed(lambda: [repo.update(change["id"], change) for change in changes]),
+        timed(lambda: [repo.delete(i) for i in ids]),
+    ]
+    bulk = [
+        timed(repo.bulk_create, hotels),
+        timed(repo.get_many, ids),
+        timed(repo.bulk_update, changes),
+        timed(repo.bulk_delete, ids),
+    ]
+    _print_table(
+        f"批量操作（hotels，{rows} 行）",
+        ["操作", "逐行 (s)", "批量 (s)", "加速比"],
+        [
+            [name, f"{a:.3f}", f"{b:.3f}", f"{a / b:.1f}x"]
+            for name, a, b in zip(["create", "get", "update", "delete"], looped, bulk)
+        ],
+    )
+
+
+def bench_profiles(calls: int = 500) -> None:
+    """对比各 SQLite PRAGMA 配置档（database.sqlite_profiles）在仓储负载下的吞吐量 (次/s)
+
+    每个配置档重建连接池后依次执行：航线+时间的航班搜索、乘客行程查询、酒店全文搜索、
+    酒店预订/取消（写事务，结束后状态不变）与航班全表流式遍历。查询结果缓存在测试期间关闭。
+    """
+    db_config = CONFIG["database"]
+    profiles = list(db_config.get("sqlite_profiles") or {DEFAULT_PROFILE_NAME: None})
+    original_profile = db_config.get("sqlite_profile")
+    cache_settings = CONFIG.setdefault("query_cache", {})
+    original_cache = cache_settings.get("enabled", False)
+
+    flight_repo, ticket_repo, hotel_repo = FlightRepository(), TicketRepository(), HotelRepository()
+    sample = flight_repo.list(limit=1)[0]
+    passenger_id = ticket_repo.list(limit=1)[0].passenger_id
+    hotel_id = hotel_repo.list(limit=1)[0].id
+    start = sample.scheduled_departure - timedelta(days=30)
+    end = sample.scheduled_departure + timedelta(days=30)
+
+    def writes() -> None:
+        for i in range(calls):
+            (hotel_repo.book_hotel if i % 2 == 0 else hotel_repo.cancel_hotel)(hotel_id)
+
+    workloads = {
+        "search_flights": lambda: [
+            flight_repo.search_flights(sample.departure_airport, sample.arrival_airport, start, end) for _ in range(calls)
+        ],
+        "fetch_user_flight_information": lambda: [
+            ticket_repo.fetch_user_flight_information(passenger_id) for _ in range(calls)
+        ],
+        "search_hotels(fts)": lambda: [
+            hotel_repo.search_hotels(location="Basel", search_mode="fts") for _ in range(calls)
+        ],
+        "book/cancel": writes,
+    }
+
+    rows = []
+    try:
+        cache_settings["enabled"] = False
+        for name in profiles:
+            db_config["sqlite_profile"] = name
+            get_sync_engine().dispose()
+            get_read_engine().dispose()
+            row = [name]
+            for workload in workloads.values():
+                started = time.perf_counter()
+                workload()
+                row.append(f"{calls / (time.perf_counter() - started):.0f}")
+            started = time.perf_counter()
+            scanned = sum(1 for _ in flight_repo.iterate())
+            row.append(f"{scanned / (time.perf_counter() - started):.0f}")
+            rows.append(row)
+    finally:
+        cache_settings["enabled"] = original_cache
+        if original_profile is None:
+            db_config.pop("sqlite_profile", None)
+        else:
+            db_config["sqlite_profile"] = original_profile
+        get_sync_engine().dispose()
+        get_read_engine().dispose()
+    _print_table(
+        "SQLite 配置档吞吐量（次/s，全表遍历为行/s）",
+        ["配置档", *workloads, "iterate(flights)"],
+        rows,
+    )
+
+
+def bench_reference_data(calls: int = 2_000) -> None:
+    """对比机场/座位查询访问数据库与读取进程内参考数据的开销（μs/次），并打印参考数据的内存占用
+
+    两种方式都关闭查询结果缓存。
+    """
+    airport_repo = AirportRepository()
+    seat_repo = SeatRepository()
+    reference_settings = CONFIG.setdefault("reference_data", {})
+    cache_settings = CONFIG.setdefault("query_cache", {})
+    original_reference = reference_settings.get("enabled", False)
+    original_cache = cache_settings.get("enabled", False)
+    sample = airport_repo.list(limit=1)
+    airport = sample[0] if sample else None
+    code = airport.airport_code if airport else "SVO"
+    city = airport.city if airport else "Moscow"
+    keyword = (airport.airport_name or "")[:4] if airport else "Sher"
+    seats = seat_repo.list(limit=1)
+    aircraft_code = seats[0].aircraft_code if seats else "773"
+    seat_no = seats[0].seat_no if seats else "1A"
+
+    cases = {
+        "airport.get_by_code": lambda: airport_repo.get_by_code(code),
+        "airport.search_by_city": lambda: airport_repo.search_by_city(city),
+        "airport.search_by_name": lambda: airport_repo.search_by_name(keyword),
+        "seat.get_seat": lambda: seat_repo.get_seat(aircraft_code, seat_no),
+        "seat.search_by_aircraft": lambda: seat_repo.search_by_aircraft(aircraft_code),
+        "seat.count_by_fare_conditions": lambda: seat_repo.count_by_fare_conditions(aircraft_code),
+    }
+    timings: dict[str, list[str]] = {name: [name] for name in cases}
+    try:
+        cache_settings["enabled"] = False
+        for enabled in (False, True):
+            reference_settings["enabled"] = enabled
+            reference_data.load_reference_data()
+            for name, run in cases.items():
+                run()
+                started = time.perf_counter()
+                for _ in range(calls):
+                    run()
+                timings[name].append(f"{(time.perf_counter() - started) / calls * 1_000_000:.1f}")
+        report = reference_data.reference_data_report()
+    finally:
+        cache_settings["enabled"] = original_cache
+        reference_settings["enabled"] = original_reference
+        reference_data.reset_reference_data()
+    _print_table("参考数据查询单次调用开销（μs/次）", ["查询", "数据库", "进程内参考数据"], list(timings.values()))
+    _print_table(
+        "参考数据内存占用",
+        ["表", "行数", "字节"],
+        [[table, item["rows"], item["bytes"]] for table, item in report["tables"].items()]
+        + [["合计", "", report["total_bytes"]]],
+    )
+
+
+@contextmanager
+def _synthetic_flights(rows: int, airports: int, rng: random.Random, days: int = 365) -> Generator[Engine]:
+    """在临时 SQLite 文件中生成 rows 行合成航班数据（含 search_flights 使用的索引与航班索引变更表），退出时删除
+
+    航班的计划起飞时间均匀分布在 2024-01-01 起的 days 天内，飞行时间为2小时。
+    """
+    path = os.path.join(tempfile.mkdtemp(), "bench_flights.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    codes = [f"{chr(65 + i // 260 % 26)}{chr(65 + i // 10 % 26)}{i % 10}" for i in range(airports)]
+    base = datetime(2024, 1, 1)
+    try:
+        Flight.__table__.create(engine)
+        with engine.begin() as conn:
+            batch = 100_000
+            for offset in range(0, rows, batch):
+                values = []
+                for i in range(offset, min(offset + batch, rows)):
+                    departure, arrival = rng.sample(codes, 2)
+                    scheduled = base + timedelta(minutes=5 * rng.randrange(days * 288))
+                    values.append((
+                        i + 1, f"PG{i % 10000:04d}", f"{scheduled:%Y-%m-%d %H:%M:%S}.000+03:00",
+                        f"{scheduled + timedelta(hours=2):%Y-%m-%d %H:%M:%S}.000+03:00",
+                        departure, arrival, "Scheduled", "773",
+                    ))
+                conn.exec_driver_sql(
+                    "INSERT INTO flights (flight_id, flight_no, scheduled_departure, scheduled_arrival, "
+                    "departure_airport, arrival_airport, status, aircraft_code) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    values,
+                )
+            conn.exec_driver_sql(
+                "CREATE INDEX idx_flights_route_departure ON flights (departure_airport, arrival_airport, scheduled_departure)"
+            )
+            conn.exec_driver_sql("CREATE INDEX idx_flights_scheduled_departure ON flights (scheduled_departure)")
+            flight_index.ensure_flight_changes(conn)
+            conn.exec_driver_sql("ANALYZE")
+        yield engine
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+def bench_flight_index(
+    sizes: tuple[int, ...] = (1_000_000, 10_000_000),
+    airports: int = 300,
+    queries: int = 200,
+    changes: int = 1_000,
+    seed: int = 42,
+) -> None:
+    """对比航班搜索的 SQL 路径与列式内存航班索引（ms/次），并打印索引的构建耗时、增量刷新耗时与内存占用
+
+    两种方式在同一连接上执行；索引路径包括索引检索与按 flight_id 取回航班两步。
+    """
+    base = datetime(2024, 1, 1)
+    for rows in sizes:
+        rng = random.Random(seed)
+        with _synthetic_flights(rows, airports, rng) as engine:
+            with engine.connect() as conn:
+                seq = flight_index.read_change_seq(conn)
+                started = time.perf_counter()
+                index = flight_index.FlightIndex.build(conn, seq)
+                build_elapsed = time.perf_counter() - started
+
+                codes = [code for code in index.codes if code is not None]
+
+                def window(days: int) -> dict:
+                    start = base + timedelta(days=rng.randrange(365 - days), hours=rng.randrange(24))
+                    return {"start_time": start, "end_time": start + timedelta(days=days)}
+
+                cases = {
+                    "航线 + 7天": lambda: {"departure_airport": rng.choice(codes), "arrival_airport": rng.choice(codes), **window(7)},
+                    "航线": lambda: {"departure_airport": rng.choice(codes), "arrival_airport": rng.choice(codes)},
+                    "出发机场 + 1天": lambda: {"departure_airport": rng.choice(codes), **window(1)},
+                    "到达机场 + 1天": lambda: {"arrival_airport": rng.choice(codes), **window(1)},
+                    "只有时间 1小时": lambda: {"start_time": (start := base + timedelta(hours=rng.randrange(365 * 24))),
+                                          "end_time": start + timedelta(hours=1)},
+                    "无结果航线": lambda: {"departure_airport": codes[0], "arrival_airport": "ZZZ"},
+                }
+                result_rows = []
+                for case, make_params in cases.items():
+                    params = [make_params() for _ in range(queries)]
+                    elapsed = {}
+                    start = time.perf_counter()
+                    for p in params:
+                        conn.execute(*_search_flights_stmt(limit=20, **p)).all()
+                    elapsed["sql"] = (time.perf_counter() - start) / queries * 1000
+                    start = time.perf_counter()
+                    for p in params:
+                        index.search(limit=20, **{k.replace("_time", ""): v for k, v in p.items()})
+                    elapsed["search"] = (time.perf_counter() - start) / queries * 1000
+                    start = time.perf_counter()
+                    for p in params:
+                        ids, prepared, _ = _indexed_search(index, limit=20, **p)
+                        if ids:
+                            conn.execute(*prepared).all()
+                    elapsed["index"] = (time.perf_counter() - start) / queries * 1000
+                    result_rows.append([
+                        case,
+                        f"{elapsed['sql']:.3f}",
+                        f"{elapsed['search']:.3f}",
+                        f"{elapsed['index']:.3f}",
+                        f"{elapsed['sql'] / elapsed['index']:.1f}x",
+                    ])
+            _print_table(
+                f"航班搜索单次耗时 (ms)，{rows:,} 行，{airports} 个机场",
+                ["查询", "SQL", "索引检索", "索引+取回", "加速"],
+                result_rows,
+            )
+
+            changed = rng.sample(range(1, rows + 1), changes)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(
+                    "UPDATE flights SET scheduled_departure = datetime(scheduled_departure, '+1 day') || '.000+03:00' "
+                    f"WHERE flight_id IN ({', '.join(map(str, changed))})"
+                )
+            with engine.connect() as conn:
+                new_seq = flight_index.read_change_seq(conn)
+                started = time.perf_counter()
+                index.apply_changes(conn, changed, new_seq)
+                refresh_elapsed = time.perf_counter() - started
+            footprint = index.footprint()
+            _print_table(
+                f"航班索引，{rows:,} 行",
+                ["全量构建 (s)", f"增量刷新 {changes} 行 (s)", "内存 (MB)"],
+                [[f"{build_elapsed:.2f}", f"{refresh_elapsed:.3f}", f"{footprint['bytes'] / 2 ** 20:.1f}"]],
+            )
+
+
+def bench_connections(
+    per_day: tuple[int, ...] = (1_000, 10_000, 50_000),
+    airports: int = 300,
+    queries: int = 100,
+    seed: int = 42,
+) -> None:
+    """联程搜索随航班规模（每天的航班数）的延迟：建图耗时，以及不同航段数上限下 search 的 ms/次
+
+    航班分布在3天内，查询第2天出发、随机起降机场的前5条行程（衔接 45-360 分钟），每次查询的目的地不同，
+    下界表不命中缓存。两段行程另以 SQL 自连接作对照（按总耗时排序取前5条）。
+    """
+    min_connection, max_connection, limit = 45, 360, 5
+    two_leg_sql = (
+        "SELECT f1.flight_id, f2.flight_id, "
+        "julianday(f2.scheduled_arrival) - julianday(f1.scheduled_departure) AS elapsed "
+        "FROM flights f1 JOIN flights f2 ON f2.departure_airport = f1.arrival_airport "
+        "AND f2.scheduled_departure BETWEEN datetime(f1.scheduled_arrival, ?) AND datetime(f1.scheduled_arrival, ?) "
+        "WHERE f1.departure_airport = ? AND f2.arrival_airport = ? "
+        "AND f1.scheduled_departure >= ? AND f1.scheduled_departure < ? "
+        "ORDER BY elapsed LIMIT ?"
+    )
+    day_start = datetime(2024, 1, 2)
+    result_rows = []
+    for flights_per_day in per_day:
+        rng = random.Random(seed)
+        with _synthetic_flights(flights_per_day * 3, airports, rng, days=3) as engine:
+            with engine.connect() as conn:
+                started = time.perf_counter()
+                graph = route_graph.RouteGraph.build(conn, day_start, timedelta(hours=24), None)
+                build_elapsed = time.perf_counter() - started
+
+                codes = list(graph.by_airport)
+                pairs = [rng.sample(codes, 2) for _ in range(queries)]
+                latencies = {}
+                for max_legs in (2, 3):
+                    graph = route_graph.RouteGraph.build(conn, day_start, timedelta(hours=24), None)
+                    samples = []
+                    for origin, destination in pairs:
+                        started = time.perf_counter()
+                        graph.search(
+                            origin, destination, max_legs, min_connection * 60, max_connection * 60, limit, 20_000
+                        )
+                        samples.append((time.perf_counter() - started) * 1000)
+                    samples.sort()
+                    latencies[max_legs] = (sum(samples) / len(samples), samples[int(len(samples) * 0.95)])
+
+                started = time.perf_counter()
+                for origin, destination in pairs[:20]:
+                    conn.exec_driver_sql(two_leg_sql, (
+                        f"+{min_connection} minutes", f"+{max_connection} minutes", origin, destination,
+                        f"{day_start:%Y-%m-%d %H:%M:%S}", f"{day_start + timedelta(days=1):%Y-%m-%d %H:%M:%S}", limit,
+                    )).all()
+                sql_elapsed = (time.perf_counter() - started) / 20 * 1000
+            result_rows.append([
+                f"{flights_per_day:,}",
+                len(graph),
+                f"{build_elapsed * 1000:.0f}",
+                f"{latencies[2][0]:.3f} / {latencies[2][1]:.3f}",
+                f"{latencies[3][0]:.3f} / {latencies[3][1]:.3f}",
+                f"{sql_elapsed:.2f}",
+            ])
+    _print_table(
+        f"联程搜索延迟（ms），{airports} 个机场，前{limit}条行程",
+        ["航班/天", "图中航班", "建图", "2段 平均/p95", "3段 平均/p95", "2段 SQL自连接"],
+        result_rows,
+    )
+
+
+def bench_seat_availability(rounds: int = 200, page: int = 20) -> None:
+    """对比每次查询余座的 SQL 聚合与已占座位位图（ms/次，一次 page 个航班，相当于一页 search_flights 结果）
+
+    位图分首次加载（每次清空缓存）与已加载两种情况；取消机票后的位图更新计入写入路径，不在此测量。
+    """
+    aggregate = (
+        select(Flight.flight_id, Seat.fare_conditions, func.count() - func.count(BoardingPass.seat_no))
+        .join(Seat, Seat.aircraft_code == Flight.aircraft_code)
+        .outerjoin(
+            BoardingPass,
+            (BoardingPass.flight_id == Flight.flight_id) & (BoardingPass.seat_no == Seat.seat_no),
+        )
+        .group_by(Flight.flight_id, Seat.fare_conditions)
+    )
+    with get_session() as session:
+        flight_ids = session.scalars(select(Flight.flight_id).order_by(Flight.flight_id)).all()
+    rng = random.Random(42)
+    pages = [rng.sample(flight_ids, min(page, len(flight_ids))) for _ in range(rounds)]
+
+    def sql(ids: list[int]) -> dict:
+        counts: dict[int, dict[str, int]] = {}
+        with get_session() as session:
+            for flight_id, fare_conditions, left in session.execute(aggregate.where(Flight.flight_id.in_(ids))):
+                counts.setdefault(flight_id, {})[fare_conditions] = left
+        return counts
+
+    def cold(ids: list[int]) -> dict:
+        seat_availability.reset_seat_availability()
+        return seat_availability.seats_left(ids)
+
+    assert all(sql(ids) == seat_availability.seats_left(ids) for ids in pages[:20]), "位图与 SQL 聚合结果不一致"
+    timings = []
+    for name, run in (("SQL 聚合", sql), ("位图 首次加载", cold), ("位图 已加载", seat_availability.seats_left)):
+        if run is seat_availability.seats_left:
+            seat_availability.seats_left({flight_id for ids in pages for flight_id in ids})
+        started = time.perf_counter()
+        for ids in pages:
+            run(ids)
+        timings.append([name, f"{(time.perf_counter() - started) / rounds * 1000:.3f}"])
+    report = seat_availability.seat_availability_report()
+    seat_availability.reset_seat_availability()
+    _print_table(f"航班余座查询（ms/次，每次 {page} 个航班）", ["方式", "耗时"], timings)
+    print(f"位图: {report['flights']} 个航班，{report['bitmap_bytes']} 字节")
+
+
+def bench_rebooking(tickets: int = 2_000, horizon_hours: int = 24 * 7) -> None:
+    """对比逐张调用 update_ticket_to_new_flight 与批量改签任务的吞吐量（张/s）
+
+    在计划中航班最多的航线上，取最早可改签的航班写入 tickets 张合成机票（经济舱）作为受影响航班：
+    先按批量改签的计划逐张调用 update_ticket_to_new_flight，恢复后再执行批量改签，结束后删除合成机票。
+    需要数据库中有未来的航班（启动时 update_dates 或开启 virtual_clock）。
+    """
+    with get_session() as session:
+        flights = session.execute(
+            select(Flight.flight_id, Flight.departure_airport, Flight.arrival_airport, Flight.scheduled_departure)
+            .where(Flight.status == "Scheduled")
+            .order_by(Flight.scheduled_departure)
+        ).all()
+    routes: dict[tuple[str, str], list[int]] = {}
+    for flight in flights:
+        if (seconds_until_departure(flight.scheduled_departure) or 0) >= 3 * 3600:
+            routes.setdefault((flight.departure_airport, flight.arrival_airport), []).append(flight.flight_id)
+    if not routes:
+        print("没有可改签的未来航班（需要 update_dates 或 virtual_clock）")
+        return
+    route, flight_ids = max(routes.items(), key=lambda item: len(item[1]))
+    disrupted = flight_ids[0]
+    ticket_nos = [f"BENCH{i:08d}" for i in range(tickets)]
+
+    def write(*statements) -> None:
+        with get_session() as session:
+            for stmt in statements:
+                session.execute(stmt)
+            invalidate(session, TicketFlight.__tablename__, Ticket.__tablename__)
+            session.commit()
+
+    with get_session() as session:
+        session.execute(insert(Ticket), [
+            {"ticket_no": ticket_no, "book_ref": "BENCH", "passenger_id": f"BENCH {ticket_no}"} for ticket_no in ticket_nos
+        ])
+        session.execute(insert(TicketFlight), [
+            {"ticket_no": ticket_no, "flight_id": disrupted, "fare_conditions": "Economy", "amount": 0}
+            for ticket_no in ticket_nos
+        ])
+        invalidate(session, TicketFlight.__tablename__, Ticket.__tablename__)
+        session.commit()
+    try:
+        repo = TicketRepository()
+        plan = rebooking.plan_rebooking([disrupted], horizon_hours=horizon_hours)
+        started = time.perf_counter()
+        looped = sum(repo.update_ticket_to_new_flight(item.ticket_no, item.to_flight_id)[0] for item in plan)
+        looped_elapsed = time.perf_counter() - started
+        write(update(TicketFlight).where(TicketFlight.ticket_no.like("BENCH%")).values(flight_id=disrupted))
+        report = rebooking.rebook_disrupted([disrupted], horizon_hours=horizon_hours)
+    finally:
+        write(
+            delete(TicketFlight).where(TicketFlight.ticket_no.like("BENCH%")),
+            delete(Ticket).where(Ticket.ticket_no.like("BENCH%")),
+        )
+    batch_elapsed = report.plan_seconds + report.write_seconds
+    _print_table(
+        f"批量改签（航线 {route[0]}-{route[1]}，航班 {disrupted} 上 {tickets} 张机票，{len(report.moves)} 个替代航班）",
+        ["方式", "改签张数", "耗时 (s)", "张/s"],
+        [
+            ["逐张 update_ticket_to_new_flight", looped, f"{looped_elapsed:.3f}", f"{looped / looped_elapsed:.0f}"],
+            ["批量改签（计划 + 改签）", report.rebooked, f"{batch_elapsed:.3f}", f"{report.rebooked / batch_elapsed:.0f}"],
+        ],
+    )
+    print(f"未分配 {sum(report.unplaced.values())} 张，冲突 {sum(report.conflicts.values())} 张，{report.batches} 个写事务")
+
+
+BENCHMARKS = {
+    "async": bench_async_vs_sync,
+    "fts": bench_fts,
+    "projection": bench_projection,
+    "statements": bench_statements,
+    "writes": bench_writes,
+    "dates": bench_update_dates,
+    "bulk": bench_bulk,
+    "profiles": bench_profiles,
+    "reference": bench_reference_data,
+    "flight_index": bench_flight_index,
+    "connections": bench_connections,
+    "seats": bench_seat_availability,
+    "rebooking": bench_rebooking,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,51 @@
+"""批量增删改查的分块工具
+
+批量操作在一个事务中执行：插入与按主键更新使用 executemany（ORM bulk INSERT/UPDATE），
+按主键删除与查询使用 IN 条件。IN 条件的每个值占一个绑定参数，超过数据库的参数上限
+（SQLite 3.32 之前为 999，之后为 32766）会报 "too many SQL variables"，因此按上限分块执行。
+"""
+import sqlite3
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import islice
+from typing import Any
+
+from sqlalchemy import ColumnElement, tuple_
+
+from .pagination import key_attributes, key_columns
+
+# 各方言单条语句的绑定参数上限
+_MAX_BIND_PARAMS = {
+    "sqlite": 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999,
+    "mysql": 65535,
+}
+_DEFAULT_MAX_BIND_PARAMS = 999
+
+# executemany 每个事务分块的行数（限制单次传给驱动的参数列表大小）
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """按 size 分块"""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def in_chunk_size(model: type, dialect_name: str) -> int:
+    """IN 条件每块的主键个数（复合主键每个值占多个参数）"""
+    limit = _MAX_BIND_PARAMS.get(dialect_name, _DEFAULT_MAX_BIND_PARAMS)
+    return max(1, limit // len(key_columns(model)))
+
+
+def key_in(model: type, ids: Sequence[Any]) -> ColumnElement[bool]:
+    """主键 IN 条件；复合主键的 ids 为与主键列顺序一致的元组"""
+    columns = key_columns(model)
+    if len(columns) == 1:
+        return columns[0].in_(ids)
+    return tuple_(*columns).in_([tuple(value) for value in ids])
+
+
+def missing_keys(model: type, rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """缺少主键属性的行（按主键批量更新时每行都必须带主键）"""
+    keys = key_attributes(model)
+    return [row for row in rows if any(key not in row for key in keys)]
@@ -0,0 +1,524 @@
+"""列式内存航班索引
+
+航班搜索（起降机场 + 起飞时间范围）在大规模航班表上可改由进程内的列式索引回答。flights 表的
+检索列加载为 NumPy 数组：
+
+- 机场代码编码为整数类别（0 表示 NULL），航线 route = 出发类别 * ROUTE_BASE + 到达类别（int64）；
+- 计划起飞时间为 int64 秒数（库中时间文本的前19个字符即日期时间部分，由 NumPy 批量解析，
+  与 SQL 路径按文本比较的语义一致，时间边界精确到秒），NULL 为 _NO_TIME（即 NaT）；
+- 三个数组按 (出发, 到达, 起飞时间, flight_id) 排序，另有一份按 (起飞时间, flight_id) 排序的行号。
+
+查询：指定起降机场时用 searchsorted 在 route 上定位航线区间、在区间内的时间上定位时间范围，
+结果是连续的一段；只指定出发机场时航线区间也是连续的，时间条件用布尔掩码；没有出发机场时在
+按时间排序的行号上定位时间范围，到达机场条件用布尔掩码（分块计算，凑够 limit 条即停止）。
+索引只给出 flight_id，仓储再按主键取回最新的行。结果按索引顺序返回；SQL 路径没有 ORDER BY，
+超过 limit 时两者返回的航班可能不同。
+
+增量刷新：flight_index_changes 表按 flight_id 记录最近一次变更的序号，由 flights 上的 SQLite 触发器
+在插入、删除或修改检索列时写入。索引记录加载时的最大序号，距上次检查超过 check_interval_seconds
+时读取之后的变更：只重新读取变更的行，从数组中删除旧行、按两种排序的位置插入新行（生成新的
+索引对象，查询中的旧对象不受影响）；变更行数超过 rebuild_ratio 时全量重建。
+
+索引为可选功能，由配置 flight_index.enabled 开启，需要 NumPy；未开启、未安装 NumPy 或变更表
+不存在（非 SQLite、未迁移）时 get_flight_index() 返回 None，仓储使用 SQL 查询。
+
+用法：
+    python -m app.dao.flight_index        # 加载索引并打印内存占用
+"""
+import calendar
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+from app.dao.bulk import chunked
+from app.dao.models.flight_models import Flight
+from app.dao.session import get_read_engine
+from config import CONFIG, get_logger
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy 为可选依赖
+    np = None
+
+logger = get_logger(__name__)
+
+CHANGES_TABLE = "flight_index_changes"
+
+# route = 出发类别 * ROUTE_BASE + 到达类别
+ROUTE_BASE = 1 << 20
+# 计划起飞时间为 NULL 的行（NaT 的 int64 值，排在每条航线的最前面）
+_NO_TIME = -(1 << 63)
+# 读取 flights 与按到达机场扫描时每块的行数
+_SCAN_CHUNK = 1 << 16
+# 一次按 IN 读取的变更行数
+_FETCH_CHUNK = 500
+# 增量刷新逐行定位插入位置的行数上限，超过时拼接后整体排序
+_MAX_INSERTS = 10_000
+
+_INDEX_COLUMNS = "flight_id, departure_airport, arrival_airport, COALESCE(scheduled_departure, '')"
+
+
+def _trigger_statements() -> dict[str, str]:
+    """触发器名 -> 建触发器语句（记录插入、删除与检索列被修改的 flight_id）"""
+    record = (
+        f"INSERT INTO {CHANGES_TABLE} (flight_id, seq) "
+        f"VALUES ({{ref}}.flight_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM {CHANGES_TABLE})) "
+        f"ON CONFLICT (flight_id) DO UPDATE SET seq = excluded.seq;"
+    )
+    columns = "flight_id, departure_airport, arrival_airport, scheduled_departure"
+    return {
+        f"{CHANGES_TABLE}_ai": f"AFTER INSERT ON flights BEGIN {record.format(ref='NEW')} END",
+        f"{CHANGES_TABLE}_au": (
+            f"AFTER UPDATE OF {columns} ON flights "
+            f"BEGIN {record.format(ref='OLD')} {record.format(ref='NEW')} END"
+        ),
+        f"{CHANGES_TABLE}_ad": f"AFTER DELETE ON flights BEGIN {record.format(ref='OLD')} END",
+    }
+
+
+def ensure_flight_changes(conn: Connection) -> list[str]:
+    """创建或修复变更表与触发器
+
+    flights 被整表重写后触发器随之丢失，期间的变更没有记录，因此重建触发器时把所有航班记为变更
+    （已加载的索引随之全量重建）。
+
+    Returns:
+        被创建或修复的对象名列表
+    """
+    if conn.dialect.name != "sqlite":
+        return []
+    existing = {row[0] for row in conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+    )}
+    if Flight.__tablename__ not in existing:
+        return []
+    triggers = _trigger_statements()
+    if {CHANGES_TABLE, *triggers} <= existing:
+        return []
+
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (flight_id INTEGER PRIMARY KEY, seq INTEGER NOT NULL)"
+    )
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS idx_{CHANGES_TABLE}_seq ON {CHANGES_TABLE} (seq)")
+    conn.exec_driver_sql(
+        f"INSERT INTO {CHANGES_TABLE} (flight_id, seq) "
+        f"SELECT DISTINCT flight_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM {CHANGES_TABLE}) "
+        f"FROM flights WHERE flight_id IS NOT NULL "
+        f"ON CONFLICT (flight_id) DO UPDATE SET seq = excluded.seq"
+    )
+    for name, body in triggers.items():
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    logger.info("航班索引变更表与触发器已创建")
+    return [CHANGES_TABLE]
+
+
+def read_change_seq(conn: Connection) -> int | None:
+    """变更表的最大序号（航班索引与联程航线图据此发现航班变更）；变更表不存在时返回 None"""
+    if conn.dialect.name != "sqlite":
+        return None
+    try:
+        return conn.exec_driver_sql(f"SELECT COALESCE(MAX(seq), 0) FROM {CHANGES_TABLE}").scalar()
+    except OperationalError:
+        return None
+
+
+def _seconds(value: datetime | None, ceil: bool = False) -> int | None:
+    """查询条件中的时间 -> 索引中的秒数（取日期时间部分，不换算时区）"""
+    if value is None:
+        return None
+    seconds = calendar.timegm(value.replace(tzinfo=None).timetuple())
+    return seconds + 1 if ceil and value.microsecond else seconds
+
+
+def _fetch_columns(conn: Connection, where: str, params: tuple = ()) -> Iterator[tuple]:
+    """分块读取检索列（直接使用 DBAPI 游标，不构造结果行对象）
+
+    Yields:
+        (flight_id 数组, 出发机场代码元组, 到达机场代码元组, 起飞时间数组)
+    """
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"SELECT {_INDEX_COLUMNS} FROM flights WHERE {where}", params)
+        while rows := cursor.fetchmany(_SCAN_CHUNK):
+            flight_ids, departure_airports, arrival_airports, departure = zip(*rows)
+            yield (
+                np.fromiter(flight_ids, dtype=np.int64, count=len(rows)),
+                departure_airports,
+                arrival_airports,
+                # 时间文本截取日期时间部分后批量解析，空字符串（NULL）解析为 NaT
+                np.array(departure, dtype="U19").astype("datetime64[s]").astype(np.int64),
+            )
+    finally:
+        cursor.close()
+
+
+class FlightIndex:
+    """航班检索列的列式索引（创建后不再修改，刷新时生成新对象）
+
+    Attributes:
+        codes: 类别 -> 机场代码（类别 0 为 None）
+        route: 航线（int64），与 departure、flight_ids 一起按 (航线, 起飞时间, flight_id) 排序
+        departure: 计划起飞时间秒数（int64）
+        flight_ids: 航班ID（int64）
+        by_time: 按 (起飞时间, flight_id) 排序的行号（int32），只按时间或到达机场 + 时间检索时使用
+        sorted_departure: 按 by_time 排列的起飞时间（int64），用于 searchsorted
+        sorted_arrival: 按 by_time 排列的到达机场类别（int32），到达机场 + 时间检索时连续比较
+        seq: 索引已包含的变更序号
+    """
+
+    __slots__ = (
+        "codes", "categories", "route", "departure", "flight_ids", "by_time", "sorted_departure", "sorted_arrival", "seq",
+    )
+
+    def __init__(self, codes: list[str | None], route, departure, flight_ids, by_time, seq: int) -> None:
+        self.codes = codes
+        self.categories = {code: category for category, code in enumerate(codes)}
+        self.route = route
+        self.departure = departure
+        self.flight_ids = flight_ids
+        self.by_time = by_time
+        self.sorted_departure = departure[by_time]
+        self.sorted_arrival = (route[by_time] % ROUTE_BASE).astype(np.int32)
+        self.seq = seq
+
+    def __len__(self) -> int:
+        return len(self.flight_ids)
+
+    @classmethod
+    def from_arrays(cls, codes: list[str | None], route, departure, flight_ids, seq: int) -> "FlightIndex":
+        """由未排序的列数组构建索引"""
+        order = np.lexsort((flight_ids, departure, route))
+        route, departure, flight_ids = route[order], departure[order], flight_ids[order]
+        by_time = np.lexsort((flight_ids, departure)).astype(np.int32)
+        return cls(codes, route, departure, flight_ids, by_time, seq)
+
+    @classmethod
+    def build(cls, conn: Connection, seq: int = 0) -> "FlightIndex":
+        """从 flights 表全量构建索引
+
+        Args:
+            conn: 数据库连接（SQLite）
+            seq: 读取前的变更序号，之后的变更由增量刷新补上
+        """
+        codes: list[str | None] = [None]
+        categories: dict[str | None, int] = {None: 0}
+        routes, departures, ids = [], [], []
+        for flight_ids, departure_airports, arrival_airports, departure in _fetch_columns(conn, "flight_id IS NOT NULL"):
+            ids.append(flight_ids)
+            routes.append(_route_array(departure_airports, arrival_airports, codes, categories))
+            departures.append(departure)
+        if not ids:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(codes, empty, empty.copy(), empty.copy(), np.empty(0, dtype=np.int32), seq)
+        return cls.from_arrays(codes, np.concatenate(routes), np.concatenate(departures), np.concatenate(ids), seq)
+
+    def apply_changes(self, conn: Connection, changed_ids: Sequence[int], seq: int) -> "FlightIndex":
+        """应用变更：删除变更航班的旧行，按排序位置插入其当前行（两种排序都增量维护）
+
+        变更行数超过 _MAX_INSERTS 时改为拼接后整体排序（仍不重新读取未变更的行）。
+
+        Args:
+            conn: 数据库连接
+            changed_ids: 变更的 flight_id
+            seq: 变更后的序号
+
+        Returns:
+            新的索引对象
+        """
+        codes = list(self.codes)
+        categories = dict(self.categories)
+        empty = np.empty(0, dtype=np.int64)
+        new_ids, new_route, new_departure = [empty], [empty], [empty]
+        for chunk in chunked(changed_ids, _FETCH_CHUNK):
+            where = f"flight_id IN ({', '.join('?' * len(chunk))})"
+            for flight_ids, departure_airports, arrival_airports, departure in _fetch_columns(conn, where, tuple(chunk)):
+                new_ids.append(flight_ids)
+                new_route.append(_route_array(departure_airports, arrival_airports, codes, categories))
+                new_departure.append(departure)
+        new_ids, new_route, new_departure = np.concatenate(new_ids), np.concatenate(new_route), np.concatenate(new_departure)
+        keep = ~np.isin(self.flight_ids, np.asarray(changed_ids, dtype=np.int64))
+        route, departure, flight_ids = self.route[keep], self.departure[keep], self.flight_ids[keep]
+        if len(new_ids) > _MAX_INSERTS:
+            return FlightIndex.from_arrays(
+                codes,
+                np.concatenate((route, new_route)),
+                np.concatenate((departure, new_departure)),
+                np.concatenate((flight_ids, new_ids)),
+                seq,
+            )
+
+        # 按 (航线, 起飞时间, flight_id) 的插入位置（相对删除后的数组）
+        order = np.lexsort((new_ids, new_departure, new_route))
+        new_route, new_departure, new_ids = new_route[order], new_departure[order], new_ids[order]
+        positions = np.asarray([
+            _insert_position((route, departure, flight_ids), (r, d, i))
+            for r, d, i in zip(new_route.tolist(), new_departure.tolist(), new_ids.tolist())
+        ], dtype=np.int64)
+        # np.insert 之后保留行与新行的行号
+        compacted = np.cumsum(keep) - 1
+        kept_rows = compacted + np.searchsorted(positions, compacted, "right")
+        new_rows = positions + np.arange(len(positions))
+
+        # 按时间排序：保留行换算为新行号，新行按 (起飞时间, flight_id) 插入
+        kept = keep[self.by_time]
+        by_time = kept_rows[self.by_time[kept]]
+        time_order = np.lexsort((new_ids, new_departure))
+        sorted_departure = self.sorted_departure[kept]
+        sorted_ids = self.flight_ids[self.by_time[kept]]
+        time_positions = [
+            _insert_position((sorted_departure, sorted_ids), (d, i))
+            for d, i in zip(new_departure[time_order].tolist(), new_ids[time_order].tolist())
+        ]
+        by_time = np.insert(by_time, time_positions, new_rows[time_order]).astype(np.int32)
+
+        return FlightIndex(
+            codes,
+            np.insert(route, positions, new_route),
+            np.insert(departure, positions, new_departure),
+            np.insert(flight_ids, positions, new_ids),
+            by_time,
+            seq,
+        )
+
+    def search(
+        self,
+        departure_airport: str | None = None,
+        arrival_airport: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        limit: int = 20,
+    ) -> list[int]:
+        """按起降机场与起飞时间范围检索航班（条件语义同 FlightRepository.search_flights）
+
+        Args:
+            departure_airport: 出发机场代码
+            arrival_airport: 到达机场代码
+            start: 起飞时间下限（含），数据库中的时间
+            end: 起飞时间上限（含），数据库中的时间
+            limit: 返回数
+
+        Returns:
+            flight_id 列表：指定出发机场时按 (出发, 到达, 起飞时间) 排序，否则按起飞时间排序
+        """
+        start_seconds, end_seconds = _seconds(start, ceil=True), _seconds(end)
+        departure_category = arrival_category = None
+        if departure_airport:
+            departure_category = self.categories.get(departure_airport)
+            if departure_category is None:
+                return []
+        if arrival_airport:
+            arrival_category = self.categories.get(arrival_airport)
+            if arrival_category is None:
+                return []
+        has_time = start_seconds is not None or end_seconds is not None
+
+        if departure_category is not None:
+            if arrival_category is not None:
+                key = departure_category * ROUTE_BASE + arrival_category
+                lo, hi = np.searchsorted(self.route, [key, key + 1])
+            else:
+                base = departure_category * ROUTE_BASE
+                lo, hi = np.searchsorted(self.route, [base, base + ROUTE_BASE])
+            if arrival_category is not None or not has_time:
+                # 单条航线内按时间连续
+                first, last = _time_range(self.departure[lo:hi], start_seconds, end_seconds)
+                return self.flight_ids[lo + first:lo + min(last, first + limit)].tolist() if last > first else []
+            mask = _time_mask(self.departure[lo:hi], start_seconds, end_seconds)
+            return self.flight_ids[lo:hi][mask][:limit].tolist()
+
+        if has_time:
+            first, last = _time_range(self.sorted_departure, start_seconds, end_seconds)
+            if arrival_category is None:
+                return self.flight_ids[self.by_time[first:min(last, first + limit)]].tolist()
+            found: list[int] = []
+            for offset in range(first, last, _SCAN_CHUNK):
+                chunk = slice(offset, min(last, offset + _SCAN_CHUNK))
+                rows = self.by_time[chunk][self.sorted_arrival[chunk] == arrival_category]
+                found.extend(self.flight_ids[rows[:limit - len(found)]].tolist())
+                if len(found) >= limit:
+                    break
+            return found
+
+        if arrival_category is None:
+            return self.flight_ids[:limit].tolist()
+        found = []
+        for offset in range(0, len(self), _SCAN_CHUNK):
+            chunk = slice(offset, offset + _SCAN_CHUNK)
+            mask = self.route[chunk] % ROUTE_BASE == arrival_category
+            found.extend(self.flight_ids[chunk][mask][:limit - len(found)].tolist())
+            if len(found) >= limit:
+                break
+        return found
+
+    def footprint(self) -> dict[str, int]:
+        """行数与数组占用的字节数"""
+        arrays = (self.route, self.departure, self.flight_ids, self.by_time, self.sorted_departure, self.sorted_arrival)
+        return {"rows": len(self), "airports": len(self.codes) - 1, "bytes": sum(array.nbytes for array in arrays)}
+
+
+def _route_array(
+    departures: Sequence[str | None],
+    arrivals: Sequence[str | None],
+    codes: list[str | None],
+    categories: dict[str | None, int],
+):
+    """把起降机场代码编码为航线数组，新出现的代码追加类别"""
+    for code in {*departures, *arrivals} - categories.keys():
+        categories[code] = len(codes)
+        codes.append(code)
+    lookup = categories.__getitem__
+    departure = np.fromiter(map(lookup, departures), dtype=np.int64, count=len(departures))
+    arrival = np.fromiter(map(lookup, arrivals), dtype=np.int64, count=len(arrivals))
+    return departure * ROUTE_BASE + arrival
+
+
+def _insert_position(columns: tuple, key: tuple) -> int:
+    """新行在按多列排序的数组中的插入位置（逐列在相等区间内 searchsorted）"""
+    lo, hi = 0, len(columns[0])
+    for column, value in zip(columns[:-1], key[:-1]):
+        segment = column[lo:hi]
+        lo, hi = lo + int(np.searchsorted(segment, value, "left")), lo + int(np.searchsorted(segment, value, "right"))
+    return lo + int(np.searchsorted(columns[-1][lo:hi], key[-1], "left"))
+
+
+def _time_range(times, start: int | None, end: int | None) -> tuple[int, int]:
+    """已排序的起飞时间中满足时间范围的区间（有时间条件时排除 NULL）"""
+    if start is not None:
+        first = int(np.searchsorted(times, start, "left"))
+    elif end is not None:
+        first = int(np.searchsorted(times, _NO_TIME, "right"))
+    else:
+        first = 0
+    last = len(times) if end is None else int(np.searchsorted(times, end, "right"))
+    return first, last
+
+
+def _time_mask(times, start: int | None, end: int | None):
+    """起飞时间范围的布尔掩码（有时间条件时排除 NULL）"""
+    mask = times != _NO_TIME
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times <= end
+    return mask
+
+
+_index: FlightIndex | None = None
+_checked_at = float("-inf")
+_lock = threading.Lock()
+_stats = {"checks": 0, "builds": 0, "refreshes": 0}
+_warned = False
+
+
+def _settings() -> dict:
+    return CONFIG.get("flight_index") or {}
+
+
+def is_enabled() -> bool:
+    """是否开启航班索引（需要 NumPy）"""
+    global _warned
+    if not _settings().get("enabled", False):
+        return False
+    if np is None:
+        if not _warned:
+            logger.warning("已开启 flight_index 但未安装 NumPy，航班搜索使用 SQL 查询")
+            _warned = True
+        return False
+    return True
+
+
+def _check_interval() -> float:
+    """变更检查间隔（秒）"""
+    return float(_settings().get("check_interval_seconds", 1))
+
+
+def _refresh(force: bool = False) -> FlightIndex | None:
+    """读取变更序号，有变更时增量刷新（变更过多或 force 时全量重建）；调用方持有 _lock"""
+    global _index, _checked_at
+    with get_read_engine().connect() as conn:
+        seq = read_change_seq(conn)
+        _stats["checks"] += 1
+        if seq is None:
+            _index = None
+        elif force or _index is None or seq < _index.seq:
+            _index = _build(conn, seq)
+        elif seq > _index.seq:
+            changed = [row[0] for row in conn.exec_driver_sql(
+                f"SELECT flight_id FROM {CHANGES_TABLE} WHERE seq > ?", (_index.seq,)
+            )]
+            if len(changed) > float(_settings().get("rebuild_ratio", 0.1)) * max(len(_index), 1):
+                _index = _build(conn, seq)
+            else:
+                _index = _index.apply_changes(conn, changed, seq)
+                _stats["refreshes"] += 1
+    _checked_at = time.monotonic()
+    return _index
+
+
+def _build(conn: Connection, seq: int) -> FlightIndex:
+    """全量构建并记录日志"""
+    started = time.perf_counter()
+    index = FlightIndex.build(conn, seq)
+    _stats["builds"] += 1
+    logger.info("航班索引已构建: %s，耗时 %.2fs", index.footprint(), time.perf_counter() - started)
+    return index
+
+
+def get_flight_index() -> FlightIndex | None:
+    """获取航班索引，距上次检查超过 check_interval_seconds 时先应用变更
+
+    Returns:
+        索引；未开启、未安装 NumPy 或变更表不存在时返回 None
+    """
+    if not is_enabled():
+        return None
+    if time.monotonic() - _checked_at < _check_interval():
+        return _index
+    with _lock:
+        if time.monotonic() - _checked_at < _check_interval():
+            return _index
+        return _refresh()
+
+
+def load_flight_index() -> FlightIndex | None:
+    """立即（重新）构建航班索引，启动时由 init_db 调用；未开启时返回 None"""
+    if not is_enabled():
+        return None
+    with _lock:
+        return _refresh(force=True)
+
+
+def reset_flight_index() -> None:
+    """丢弃索引，下次使用时重新构建"""
+    global _index, _checked_at
+    with _lock:
+        _index = None
+        _checked_at = float("-inf")
+
+
+def flight_index_report() -> dict[str, Any]:
+    """航班索引的加载状态、变更序号与内存占用"""
+    index = _index
+    return {
+        "enabled": is_enabled(),
+        "loaded": index is not None,
+        "seq": index.seq if index is not None else None,
+        **(index.footprint() if index is not None else {}),
+        **_stats,
+    }
+
+
+if __name__ == '__main__':
+    CONFIG.setdefault("flight_index", {})["enabled"] = True
+    load_flight_index()
+    report = flight_index_report()
+    if not report["loaded"]:
+        print("航班索引不可用（需要 NumPy，且已执行迁移创建变更表）")
+    else:
+        print(f"flights: {report['rows']} rows, {report['airports']} airports, {report['bytes']} bytes")
+        print("seq:", report["seq"])
@@ -0,0 +1,174 @@
+"""SQLite FTS5 全文检索
+
+为酒店、租车、旅行推荐建立 external content 模式的 FTS5 影子表，
+由触发器与业务表保持同步。仓储的 search_mode="fts" 使用 bm25() 排序与前缀匹配，
+FTS5 不可用（非 SQLite、未编译 FTS5 或影子表未建立）时回退到 LIKE 模糊匹配。
+"""
+import re
+
+from sqlalchemy import ColumnElement, FromClause, and_, func, literal_column, or_, table
+from sqlalchemy.engine import Connection
+
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# 业务表 -> 参与全文检索的列
+FTS_TABLES: dict[str, tuple[str, ...]] = {
+    "hotels": ("name", "location"),
+    "car_rentals": ("name", "location"),
+    "trip_recommendations": ("name", "location", "keywords"),
+}
+
+# 已确认存在影子表的业务表（进程级缓存）；None 表示尚未检测
+_ready_tables: set[str] | None = None
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_table_name(table_name: str) -> str:
+    """影子表名"""
+    return f"{table_name}_fts"
+
+
+def fts5_available(conn: Connection) -> bool:
+    """当前连接的 SQLite 是否编译了 FTS5"""
+    if conn.dialect.name != "sqlite":
+        return False
+    return bool(conn.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def _create_statements(table_name: str, columns: tuple[str, ...]) -> list[str]:
+    """影子表与同步触发器的建表语句"""
+    fts = fts_table_name(table_name)
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{c}" for c in columns)
+    old_cols = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table_name}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF id, {cols} ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+def _existing_objects(conn: Connection) -> set[str]:
+    """sqlite_master 中已存在的表与触发器"""
+    rows = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+    return {row[0] for row in rows}
+
+
+def ensure_fts(conn: Connection) -> list[str]:
+    """创建或修复影子表与触发器，必要时重建全文索引
+
+    业务表被整表重写（DROP + CREATE）后触发器会随之丢失、影子表内容失效，
+    因此触发器缺失时同样执行 rebuild。
+
+    Returns:
+        被创建或重建的影子表名列表
+    """
+    global _ready_tables
+    _ready_tables = None
+    if not fts5_available(conn):
+        logger.warning("当前 SQLite 不支持 FTS5，全文检索将回退到 LIKE 匹配")
+        return []
+
+    repaired = []
+    existing = _existing_objects(conn)
+    for table_name, columns in FTS_TABLES.items():
+        if table_name not in existing:
+            continue
+        fts = fts_table_name(table_name)
+        expected = {fts, f"{fts}_ai", f"{fts}_ad", f"{fts}_au"}
+        if expected <= existing:
+            continue
+        for statement in _create_statements(table_name, columns):
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        repaired.append(fts)
+    if repaired:
+        logger.info("全文索引已建立: %s", repaired)
+    return repaired
+
+
+def is_ready(conn: Connection, table_name: str) -> bool:
+    """业务表的影子表是否可用于查询"""
+    global _ready_tables
+    if _ready_tables is None:
+        if conn.dialect.name != "sqlite":
+            _ready_tables = set()
+        else:
+            existing = _existing_objects(conn)
+            _ready_tables = {t for t in FTS_TABLES if fts_table_name(t) in existing}
+    return table_name in _ready_tables
+
+
+def _prefix_terms(text: str) -> list[str]:
+    """把用户输入拆成 FTS5 前缀匹配词项（加引号避免语法字符）"""
+    return [f'"{token}"*' for token in _TOKEN_PATTERN.findall(text)]
+
+
+def match_expression(all_of: dict[str, str | None], any_of: dict[str, list[str]] | None = None) -> str | None:
+    """构建 FTS5 MATCH 表达式
+
+    Args:
+        all_of: 列名 -> 输入文本，文本中的每个词都需前缀匹配该列
+        any_of: 列名 -> 候选词列表，任一候选词前缀匹配该列即可
+
+    Returns:
+        MATCH 表达式；没有任何词项时返回None
+    """
+    clauses = []
+    for column, text in all_of.items():
+        if text:
+            terms = _prefix_terms(text)
+            if terms:
+                clauses.append(f"{column} : ({' AND '.join(terms)})")
+    for column, candidates in (any_of or {}).items():
+        alternatives = [" AND ".join(terms) for terms in map(_prefix_terms, candidates) if terms]
+        if alternatives:
+            clauses.append(f"{column} : ({' OR '.join(f'({a})' for a in alternatives)})")
+    return " AND ".join(clauses) if clauses else None
+
+
+def words(text: str | None) -> list[str]:
+    """输入文本拆分出的词（部分匹配时任一词命中即可）"""
+    return _TOKEN_PATTERN.findall(text) if text else []
+
+
+def partial_expression(texts: dict[str, str | None], any_of: dict[str, list[str]] | None = None) -> str | None:
+    """部分匹配的 MATCH 表达式：每列文本（或候选词）中任一词前缀匹配即可，各列之间仍需同时满足"""
+    candidates = {column: words(text) for column, text in texts.items()}
+    for column, values in (any_of or {}).items():
+        candidates[column] = [word for value in values for word in words(value)]
+    return match_expression({}, candidates)
+
+
+def like_condition(column: ColumnElement, text: str, match_any: bool = False) -> ColumnElement[bool]:
+    """LIKE 模糊匹配条件（FTS5 不可用时）：默认整段文本匹配，match_any 为True时任一词匹配即可"""
+    if not match_any or not words(text):
+        return column.like(f"%{text}%")
+    return or_(*(column.like(f"%{word}%") for word in words(text)))
+
+
+def match_clause(table_name: str, id_column: ColumnElement, expression: str) -> tuple[FromClause, ColumnElement, ColumnElement]:
+    """构建 JOIN 影子表所需的语句片段
+
+    Args:
+        table_name: 业务表名
+        id_column: 业务表的ID列（对应影子表的 rowid）
+        expression: MATCH 表达式
+
+    Returns:
+        (影子表, JOIN+MATCH 条件, bm25 排序表达式)
+    """
+    fts_name = fts_table_name(table_name)
+    rowid = literal_column(f"{fts_name}.rowid")
+    condition = and_(rowid == id_column, literal_column(fts_name).op("MATCH")(expression))
+    return table(fts_name), condition, func.bm25(literal_column(fts_name))
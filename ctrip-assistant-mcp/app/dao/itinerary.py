@@ -0,0 +1,212 @@
+"""乘客行程读模型
+
+fetch_user_flight_information 每轮对话都会执行 tickets、ticket_flights、flights、boarding_passes
+四表联查。本模块把联查结果物化为 passenger_itineraries 表（按 passenger_id 建索引），
+由 SQLite 触发器在业务表写入时按机票号/航班ID局部刷新，仓储只需一次索引查找。
+
+非 SQLite 或读模型未建立时，仓储回退到联表查询。
+check_itineraries() 对比读模型与实时联查的结果，用于校验触发器是否遗漏。
+
+用法：
+    python -m app.dao.itinerary        # 校验读模型与实时联查是否一致
+"""
+from dataclasses import dataclass, field
+
+from sqlalchemy.engine import Connection
+
+from app.dao.models.booking_models import PassengerItinerary
+from config import get_logger
+
+logger = get_logger(__name__)
+
+ITINERARY_TABLE = PassengerItinerary.__tablename__
+
+# 读模型的列（与 fetch_user_flight_information 返回字典的键一致，另加 passenger_id）
+ITINERARY_COLUMNS = (
+    "passenger_id",
+    "ticket_no",
+    "book_ref",
+    "flight_id",
+    "flight_no",
+    "departure_airport",
+    "arrival_airport",
+    "scheduled_departure",
+    "scheduled_arrival",
+    "seat_no",
+    "fare_conditions",
+)
+
+# 实时联查（与 _user_flight_information_template 的联表条件一致），刷新时追加 WHERE 条件限定范围
+_LIVE_JOIN = (
+    "SELECT t.passenger_id, t.ticket_no, t.book_ref, f.flight_id, f.flight_no, "
+    "f.departure_airport, f.arrival_airport, f.scheduled_departure, f.scheduled_arrival, "
+    "bp.seat_no, tf.fare_conditions "
+    "FROM tickets t "
+    "JOIN ticket_flights tf ON t.ticket_no = tf.ticket_no "
+    "JOIN flights f ON tf.flight_id = f.flight_id "
+    "JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no AND bp.flight_id = f.flight_id"
+)
+
+# 触发器依赖的业务表
+SOURCE_TABLES = ("tickets", "ticket_flights", "flights", "boarding_passes")
+
+# flights 中影响读模型的列，只有这些列更新时才刷新
+_FLIGHT_COLUMNS = ("flight_id", "flight_no", "departure_airport", "arrival_airport", "scheduled_departure", "scheduled_arrival")
+
+# 读模型是否可用（进程级缓存）：数据库地址 -> 是否可用，未检测的数据库不在其中（开启分片时每个分片各自检测）
+_ready: dict[str, bool] = {}
+
+
+def _insert(where: str) -> str:
+    """按条件从实时联查写入读模型"""
+    return f"INSERT OR REPLACE INTO {ITINERARY_TABLE} ({', '.join(ITINERARY_COLUMNS)}) {_LIVE_JOIN} WHERE {where};"
+
+
+def _refresh_ticket(ref: str) -> str:
+    """刷新一张机票的行程（ref 为触发器中的 old.ticket_no / new.ticket_no）"""
+    return f"DELETE FROM {ITINERARY_TABLE} WHERE ticket_no = {ref}; " + _insert(f"t.ticket_no = {ref}")
+
+
+def _trigger_statements() -> dict[str, str]:
+    """触发器名 -> 建触发器语句"""
+    triggers = {}
+    # 机票、机票航班关联、登机牌：按机票号刷新（更新时新旧机票号各刷新一次）
+    for table_name in ("tickets", "ticket_flights", "boarding_passes"):
+        prefix = f"{ITINERARY_TABLE}_{table_name}"
+        triggers[f"{prefix}_ai"] = (
+            f"CREATE TRIGGER IF NOT EXISTS {prefix}_ai AFTER INSERT ON {table_name} BEGIN "
+            f"{_refresh_ticket('new.ticket_no')} END"
+        )
+        triggers[f"{prefix}_ad"] = (
+            f"CREATE TRIGGER IF NOT EXISTS {prefix}_ad AFTER DELETE ON {table_name} BEGIN "
+            f"{_refresh_ticket('old.ticket_no')} END"
+        )
+        triggers[f"{prefix}_au"] = (
+            f"CREATE TRIGGER IF NOT EXISTS {prefix}_au AFTER UPDATE ON {table_name} BEGIN "
+            f"{_refresh_ticket('old.ticket_no')} {_refresh_ticket('new.ticket_no')} END"
+        )
+    # 航班：按航班ID刷新
+    prefix = f"{ITINERARY_TABLE}_flights"
+    triggers[f"{prefix}_ai"] = (
+        f"CREATE TRIGGER IF NOT EXISTS {prefix}_ai AFTER INSERT ON flights BEGIN "
+        f"{_insert('f.flight_id = new.flight_id')} END"
+    )
+    triggers[f"{prefix}_ad"] = (
+        f"CREATE TRIGGER IF NOT EXISTS {prefix}_ad AFTER DELETE ON flights BEGIN "
+        f"DELETE FROM {ITINERARY_TABLE} WHERE flight_id = old.flight_id; END"
+    )
+    triggers[f"{prefix}_au"] = (
+        f"CREATE TRIGGER IF NOT EXISTS {prefix}_au AFTER UPDATE OF {', '.join(_FLIGHT_COLUMNS)} ON flights BEGIN "
+        f"DELETE FROM {ITINERARY_TABLE} WHERE flight_id IN (old.flight_id, new.flight_id); "
+        f"{_insert('f.flight_id = new.flight_id')} END"
+    )
+    return triggers
+
+
+def _existing_objects(conn: Connection) -> set[str]:
+    """sqlite_master 中已存在的表与触发器"""
+    rows = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+    return {row[0] for row in rows}
+
+
+def rebuild_itineraries(conn: Connection) -> int:
+    """清空读模型并从实时联查全量重建
+
+    Returns:
+        写入的行数
+    """
+    conn.exec_driver_sql(f"DELETE FROM {ITINERARY_TABLE}")
+    return conn.exec_driver_sql(_insert("1 = 1").rstrip(";")).rowcount
+
+
+def ensure_itineraries(conn: Connection) -> list[str]:
+    """创建或修复读模型表与触发器，必要时全量重建
+
+    业务表被整表重写（DROP + CREATE）后触发器会随之丢失、读模型内容失效，
+    因此触发器缺失时同样全量重建。
+
+    Returns:
+        被创建或重建的读模型表名列表
+    """
+    _ready.pop(str(conn.engine.url), None)
+    if conn.dialect.name != "sqlite":
+        return []
+
+    existing = _existing_objects(conn)
+    if not set(SOURCE_TABLES) <= existing:
+        return []
+    triggers = _trigger_statements()
+    if {ITINERARY_TABLE, *triggers} <= existing:
+        return []
+
+    PassengerItinerary.__table__.create(conn, checkfirst=True)
+    for statement in triggers.values():
+        conn.exec_driver_sql(statement)
+    rows = rebuild_itineraries(conn)
+    logger.info("乘客行程读模型已重建: %s 行", rows)
+    return [ITINERARY_TABLE]
+
+
+def is_ready(conn: Connection) -> bool:
+    """读模型是否可用于查询"""
+    key = str(conn.engine.url)
+    ready = _ready.get(key)
+    if ready is None:
+        if conn.dialect.name != "sqlite":
+            ready = False
+        else:
+            ready = {ITINERARY_TABLE, *_trigger_statements()} <= _existing_objects(conn)
+        _ready[key] = ready
+    return ready
+
+
+@dataclass
+class ItineraryDiff:
+    """读模型与实时联查的差异
+
+    Attributes:
+        missing: 实时联查有、读模型没有的行
+        stale: 读模型有、实时联查没有（或内容已变化）的行
+    """
+    missing: list[tuple] = field(default_factory=list)
+    stale: list[tuple] = field(default_factory=list)
+
+    @property
+    def consistent(self) -> bool:
+        return not self.missing and not self.stale
+
+
+def check_itineraries(conn: Connection, passenger_id: str | None = None, limit: int = 100) -> ItineraryDiff:
+    """对比读模型与实时联查的结果（按全部列比较）
+
+    Args:
+        conn: 数据库连接
+        passenger_id: 只检查该乘客，None 表示检查全部
+        limit: 每类差异最多返回的行数
+
+    Returns:
+        差异，行按 ITINERARY_COLUMNS 的顺序
+    """
+    live_where = "WHERE t.passenger_id = ?" if passenger_id is not None else ""
+    model_where = "WHERE passenger_id = ?" if passenger_id is not None else ""
+    live = f"{_LIVE_JOIN} {live_where}"
+    model = f"SELECT {', '.join(ITINERARY_COLUMNS)} FROM {ITINERARY_TABLE} {model_where}"
+    params = (passenger_id, passenger_id) if passenger_id is not None else ()
+
+    def difference(left: str, right: str) -> list[tuple]:
+        rows = conn.exec_driver_sql(f"{left} EXCEPT {right} LIMIT {int(limit)}", params)
+        return [tuple(row) for row in rows]
+
+    return ItineraryDiff(missing=difference(live, model), stale=difference(model, live))
+
+
+if __name__ == '__main__':
+    from app.dao.session import get_sync_engine
+
+    with get_sync_engine().connect() as conn:
+        diff = check_itineraries(conn)
+    print("consistent:", diff.consistent)
+    for row in diff.missing:
+        print("missing:", row)
+    for row in diff.stale:
+        print("stale:", row)
@@ -0,0 +1,343 @@
+"""数据库版本化迁移
+
+travel.sqlite 由外部数据导入，表上没有任何二级索引（重置日期时还会整表重写）。
+本模块按版本号顺序执行迁移、在 schema_migrations 表中记录已执行的版本，
+并在每次启动时校验索引是否存在（缺失则重建），最后执行 ANALYZE 更新统计信息。
+
+用法：
+    python -m app.dao.migrations        # 执行迁移并打印热点查询的执行计划
+"""
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Engine,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    insert,
+    select,
+)
+from sqlalchemy.engine import Connection
+
+from app.dao import flight_index, fts, itinerary, reference_data
+from app.dao.models.booking_models import BoardingPass, Booking, Ticket, TicketFlight
+from app.dao.models.car_rental_models import CarRental
+from app.dao.models.flight_models import AirportData, Flight, Seat
+from app.dao.models.hotel_models import Hotel
+from app.dao.models.trip_models import TripRecommendation
+from app.dao.statement_cache import PreparedStatement
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# 迁移记录表（独立的 MetaData，不参与业务模型的 create_all）
+_migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """一个版本的迁移
+
+    Attributes:
+        version: 版本号，按升序执行
+        description: 迁移说明
+        indexes: 本版本创建并在每次启动时校验的索引
+        requires: 索引之外额外依赖的表
+        upgrade: 额外的升级操作（可选），接收当前连接
+        verify: 每次启动时的校验/修复操作（可选），返回被修复的对象名列表
+    """
+    version: int
+    description: str
+    indexes: tuple[Index, ...] = ()
+    requires: tuple[str, ...] = ()
+    upgrade: Callable[[Connection], object] | None = field(default=None, compare=False)
+    verify: Callable[[Connection], list[str]] | None = field(default=None, compare=False)
+
+    def tables(self) -> set[str]:
+        """本迁移依赖的表"""
+        return {index.table.name for index in self.indexes} | set(self.requires)
+
+    def apply(self, conn: Connection) -> None:
+        """执行迁移"""
+        for index in self.indexes:
+            index.create(conn, checkfirst=True)
+        if self.upgrade is not None:
+            self.upgrade(conn)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        description="热点查询的覆盖索引",
+        indexes=(
+            # FlightRepository.search_flights：起降机场 + 起飞时间范围
+            Index(
+                "idx_flights_route_departure",
+                Flight.departure_airport,
+                Flight.arrival_airport,
+                Flight.scheduled_departure,
+            ),
+            # 只按起飞时间范围搜索
+            Index("idx_flights_scheduled_departure", Flight.scheduled_departure),
+            # 导入的数据没有主键约束，按 flight_id 的联表/查找需要索引
+            Index("idx_flights_flight_id", Flight.flight_id),
+            # TicketRepository.fetch_user_flight_information：从乘客ID出发的联表
+            Index("idx_tickets_passenger", Ticket.passenger_id, Ticket.ticket_no, Ticket.book_ref),
+            Index("idx_tickets_ticket_no", Ticket.ticket_no),
+            Index(
+                "idx_ticket_flights_ticket",
+                TicketFlight.ticket_no,
+                TicketFlight.flight_id,
+                TicketFlight.fare_conditions,
+            ),
+            Index(
+                "idx_boarding_passes_ticket_flight",
+                BoardingPass.ticket_no,
+                BoardingPass.flight_id,
+                BoardingPass.seat_no,
+            ),
+            Index("idx_bookings_book_ref", Booking.book_ref),
+            # 酒店/租车/旅行推荐的按ID预订、取消、更新
+            Index("idx_hotels_id", Hotel.id),
+            Index("idx_car_rentals_id", CarRental.id),
+            Index("idx_trip_recommendations_id", TripRecommendation.id),
+            # 机场与座位参考数据
+            Index("idx_airports_data_code", AirportData.airport_code),
+            Index("idx_airports_data_city", AirportData.city),
+            Index("idx_seats_aircraft", Seat.aircraft_code, Seat.seat_no, Seat.fare_conditions),
+        ),
+    ),
+    Migration(
+        version=2,
+        description="酒店/租车/旅行推荐的 FTS5 全文索引",
+        requires=tuple(fts.FTS_TABLES),
+        # 影子表与触发器在整表重写后会失效，每次启动时校验并重建
+        upgrade=fts.ensure_fts,
+        verify=fts.ensure_fts,
+    ),
+    Migration(
+        version=3,
+        description="乘客行程读模型 passenger_itineraries",
+        # 航班更新触发器按 flight_id 查找机票航班关联
+        indexes=(Index("idx_ticket_flights_flight", TicketFlight.flight_id),),
+        requires=itinerary.SOURCE_TABLES,
+        # 业务表整表重写后触发器失效，每次启动时校验并全量重建
+        upgrade=itinerary.ensure_itineraries,
+        verify=itinerary.ensure_itineraries,
+    ),
+    Migration(
+        version=4,
+        description="参考数据版本表 reference_data_versions",
+        requires=reference_data.REFERENCE_TABLES,
+        # 参考表整表重写后触发器失效，每次启动时校验并重建（同时递增版本号）
+        upgrade=reference_data.ensure_reference_versions,
+        verify=reference_data.ensure_reference_versions,
+    ),
+    Migration(
+        version=5,
+        description="航班索引变更表 flight_index_changes",
+        requires=(Flight.__tablename__,),
+        # flights 整表重写后触发器失效，每次启动时校验并重建（同时把所有航班记为变更）
+        upgrade=flight_index.ensure_flight_changes,
+        verify=flight_index.ensure_flight_changes,
+    ),
+]
+
+
+def _applied_versions(conn: Connection) -> set[int]:
+    """查询已执行的迁移版本"""
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def _missing_tables(conn: Connection, migration: Migration) -> list[str]:
+    """迁移依赖但数据库中不存在的表"""
+    inspector = inspect(conn)
+    return [table for table in sorted(migration.tables()) if not inspector.has_table(table)]
+
+
+def verify_indexes(conn: Connection) -> list[str]:
+    """校验已执行迁移的索引是否存在，缺失的索引会被重建
+
+    数据重置（整表重写）会丢失索引和触发器，因此每次启动都需要校验；
+    迁移定义了 verify 时一并执行。
+
+    Returns:
+        被重建的索引（及 verify 修复的对象）名列表
+    """
+    applied = _applied_versions(conn)
+    inspector = inspect(conn)
+    recreated = []
+    for migration in MIGRATIONS:
+        if migration.version not in applied:
+            continue
+        for index in migration.indexes:
+            table = index.table.name
+            if not inspector.has_table(table):
+                continue
+            existing = {ix["name"] for ix in inspector.get_indexes(table)}
+            if index.name not in existing:
+                index.create(conn, checkfirst=True)
+                recreated.append(index.name)
+        if migration.verify is not None:
+            recreated.extend(migration.verify(conn))
+    if recreated:
+        logger.warning("索引缺失，已重建: %s", recreated)
+    return recreated
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """执行所有未执行的迁移，校验索引并更新统计信息
+
+    依赖的表不存在时跳过该迁移（不记录版本），下次启动时重试。
+
+    Args:
+        engine: 数据库引擎
+
+    Returns:
+        本次执行的迁移版本列表
+    """
+    executed = []
+    with engine.begin() as conn:
+        applied = _applied_versions(conn)
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if migration.version in applied:
+                continue
+            missing = _missing_tables(conn, migration)
+            if missing:
+                logger.warning("迁移 %s 跳过，缺少数据表: %s", migration.version, missing)
+                break
+            migration.apply(conn)
+            conn.execute(insert(schema_migrations).values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.now(),
+            ))
+            executed.append(migration.version)
+            logger.info("已执行迁移 %s: %s", migration.version, migration.description)
+
+        recreated = verify_indexes(conn)
+        if executed or recreated:
+            conn.exec_driver_sql("ANALYZE")
+    return executed
+
+
+# 预期的全表扫描：LIKE '%关键词%' 无法使用 B-tree 索引（search_mode="fts" 的形式走全文索引）
+EXPECTED_SCANS = frozenset({
+    "search_hotels(like)",
+    "search_car_rentals(like)",
+    "search_trip_recommendations(like)",
+})
+
+
+def _hot_queries(conn: Connection) -> dict[str, object]:
+    """仓储热点查询（使用与仓储相同的语句构建函数）
+
+    酒店、租车、旅行推荐搜索包含 LIKE（默认 search_mode）与 FTS 两种形式，FTS 形式只在影子表可用时加入。
+    """
+    from sqlalchemy import update
+
+    from app.dao.repositories.flight_repository import (
+        _flight_by_id_stmt,
+        _itinerary_stmt,
+        _search_flights_stmt,
+        _ticket_flights_stmt,
+        _user_flight_information_stmt,
+    )
+    from app.dao.repositories.car_rental_repository import _search_car_rentals_stmt
+    from app.dao.repositories.hotel_repository import _search_hotels_stmt
+    from app.dao.repositories.trip_recommendation_repository import _search_trip_recommendations_stmt
+
+    now = datetime.now()
+    queries = {
+        "search_flights(route, time)": _search_flights_stmt("SVO", "LED", now, now),
+        "search_flights(time)": _search_flights_stmt(start_time=now, end_time=now),
+        "search_flights(city route, time)": _search_flights_stmt(("SVO", "DME", "VKO"), "LED", now, now),
+        "fetch_user_flight_information": _user_flight_information_stmt("3442 587242"),
+        "fetch_user_flight_information(read model)": _itinerary_stmt("3442 587242"),
+        "get_ticket_flights": _ticket_flights_stmt("0000000000"),
+        "book_hotel": update(Hotel).where(Hotel.id == 1).values(booked=1),
+        "book_car_rental": update(CarRental).where(CarRental.id == 1).values(booked=1),
+        "book_excursion": update(TripRecommendation).where(TripRecommendation.id == 1).values(booked=1),
+        "update_ticket_to_new_flight": _flight_by_id_stmt(1),
+        "search_hotels(like)": _search_hotels_stmt("Basel", "Hilton", "Midscale"),
+        "search_car_rentals(like)": _search_car_rentals_stmt("Basel", "Europcar", "Economy"),
+        "search_trip_recommendations(like)": _search_trip_recommendations_stmt("Basel", keywords="art, history"),
+        "airport.search_by_city": select(AirportData).where(AirportData.city == "Moscow"),
+    }
+    if fts.is_ready(conn, Hotel.__tablename__):
+        queries["search_hotels(fts)"] = _search_hotels_stmt("Basel", "Hilton", "Midscale", use_fts=True)
+    if fts.is_ready(conn, CarRental.__tablename__):
+        queries["search_car_rentals(fts)"] = _search_car_rentals_stmt("Basel", "Europcar", "Economy", use_fts=True)
+    if fts.is_ready(conn, TripRecommendation.__tablename__):
+        queries["search_trip_recommendations(fts)"] = _search_trip_recommendations_stmt(
+            "Basel", keywords="art, history", use_fts=True,
+        )
+    return queries
+
+
+def explain_query_plans(conn: Connection) -> dict[str, list[str]]:
+    """对热点查询执行 EXPLAIN QUERY PLAN（仅SQLite）
+
+    Returns:
+        查询名称 -> 执行计划明细
+    """
+    plans = {}
+    for name, query in _hot_queries(conn).items():
+        stmt, values = query if isinstance(query, PreparedStatement) else (query, {})
+        # 按参数值展开 IN 列表等 postcompile 参数
+        expanded = stmt.compile(dialect=conn.dialect).construct_expanded_state(values)
+        params = tuple(expanded.parameters[key] for key in expanded.positiontup or ())
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {expanded.statement}", params).all()
+        plans[name] = [row[-1] for row in rows]
+    return plans
+
+
+def find_full_scans(conn: Connection, include_expected: bool = False) -> dict[str, list[str]]:
+    """找出未命中索引（全表扫描）的热点查询
+
+    酒店、租车、旅行推荐的 LIKE 形式为 '%关键词%' 模糊匹配，B-tree 索引无法使用，属于预期的全表扫描
+    （EXPECTED_SCANS），默认不报告；对应的 FTS 形式（search_mode="fts"）走全文索引。
+
+    Args:
+        include_expected: 是否同时报告预期的全表扫描
+
+    Returns:
+        查询名称 -> 全表扫描的执行计划明细；全部命中索引时为空字典
+    """
+    scans = {}
+    for name, details in explain_query_plans(conn).items():
+        if name in EXPECTED_SCANS and not include_expected:
+            continue
+        full = [d for d in details if d.startswith("SCAN") and "INDEX" not in d]
+        if full:
+            scans[name] = full
+    return scans
+
+
+if __name__ == '__main__':
+    from app.dao.session import get_sync_engine
+
+    engine = get_sync_engine()
+    print("executed:", run_migrations(engine))
+    with engine.connect() as conn:
+        for name, details in explain_query_plans(conn).items():
+            print(name)
+            for detail in details:
+                print("   ", detail)
+        print("full scans:", find_full_scans(conn) or "none")
+        print("expected scans:", sorted(EXPECTED_SCANS))
@@ -1,7 +1,9 @@
 from sqlalchemy import inspect, DateTime
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from app.dao.projection import column_keys
+
 class Base(DeclarativeBase):
     """声明式基类"""
     def to_dict(self) -> dict:
-        return {column.key: getattr(self, column.key) for column in inspect(self).mapper.column_attrs}
\ No newline at end of file
+        return {key: getattr(self, key) for key in column_keys(type(self))}
\ No newline at end of file
@@ -66,3 +66,24 @@ class BoardingPass(Base):
 
     def __repr__(self):
         return f"<BoardingPass(ticket_no={self.ticket_no}, flight_id={self.flight_id}, seat_no={self.seat_no})>"
+
+
+class PassengerItinerary(Base):
+    """乘客行程读模型：tickets、ticket_flights、flights、boarding_passes 联表结果的物化，
+    由 SQLite 触发器与业务表保持同步（见 app.dao.itinerary）"""
+    __tablename__ = "passenger_itineraries"
+
+    ticket_no = Column(String(20), primary_key=True)
+    flight_id = Column(Integer, primary_key=True)
+    passenger_id = Column(String(20), index=True, comment="乘客ID")
+    book_ref = Column(String(10), comment="预订编号")
+    flight_no = Column(String(20), comment="航班号")
+    departure_airport = Column(String(10), comment="出发机场代码")
+    arrival_airport = Column(String(10), comment="到达机场代码")
+    scheduled_departure = Column(DateTime, comment="计划出发时间")
+    scheduled_arrival = Column(DateTime, comment="计划到达时间")
+    seat_no = Column(String(10), comment="座位号")
+    fare_conditions = Column(String(20), comment="票价条件")
+
+    def __repr__(self):
+        return f"<PassengerItinerary(passenger_id={self.passenger_id}, ticket_no={self.ticket_no}, flight_id={self.flight_id})>"
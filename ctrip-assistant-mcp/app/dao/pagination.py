@@ -0,0 +1,85 @@
+"""键集分页（keyset pagination）
+
+offset 分页每次都要扫描并丢弃前面的行，翻页越深越慢。键集分页按主键排序，
+以上一页最后一行的主键作为下一页的起点：WHERE (主键) > (上一页末行主键)，每页都是一次索引范围扫描。
+续页令牌是"模型表名 + 末行主键"的 base64 编码，对调用方不透明。
+"""
+import base64
+import binascii
+import functools
+import json
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+
+from sqlalchemy import Column, inspect, tuple_
+from sqlalchemy.sql import Select
+
+T = TypeVar("T")
+
+
+@dataclass
+class Page(Generic[T]):
+    """一页结果
+
+    Attributes:
+        items: 本页记录
+        next_token: 下一页的续页令牌，None 表示没有更多记录
+    """
+    items: list[T] = field(default_factory=list)
+    next_token: str | None = None
+
+
+@functools.cache
+def key_columns(model: type) -> tuple[Column, ...]:
+    """模型的主键列（分页排序与续页条件使用）"""
+    return tuple(inspect(model).mapper.primary_key)
+
+
+@functools.cache
+def key_attributes(model: type) -> tuple[str, ...]:
+    """主键列对应的属性名"""
+    mapper = inspect(model).mapper
+    return tuple(mapper.get_property_by_column(column).key for column in key_columns(model))
+
+
+def encode_token(model: type, values: tuple) -> str:
+    """把末行主键编码为续页令牌"""
+    payload = json.dumps({"t": model.__tablename__, "k": list(values)}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(model: type, token: str) -> tuple:
+    """解析续页令牌
+
+    Raises:
+        ValueError: 令牌格式错误或不是该模型的令牌
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        table_name, values = payload["t"], payload["k"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"无效的分页令牌: {token}") from e
+    if table_name != model.__tablename__ or len(values) != len(key_columns(model)):
+        raise ValueError(f"分页令牌不属于 {model.__tablename__}: {token}")
+    return tuple(values)
+
+
+def keyset_stmt(model: type, stmt: Select, token: str | None, limit: int) -> Select:
+    """给语句加上按主键排序、从令牌位置开始的键集条件，多取一行用于判断是否还有下一页"""
+    columns = key_columns(model)
+    if token is not None:
+        values = decode_token(model, token)
+        if len(columns) == 1:
+            stmt = stmt.where(columns[0] > values[0])
+        else:
+            stmt = stmt.where(tuple_(*columns) > tuple_(*values))
+    return stmt.order_by(*columns).limit(limit + 1)
+
+
+def make_page(model: type, rows: list[Any], limit: int) -> Page:
+    """由多取一行的查询结果构造分页结果"""
+    if len(rows) <= limit:
+        return Page(rows, None)
+    items = rows[:limit]
+    last = items[-1]
+    return Page(items, encode_token(model, tuple(getattr(last, key) for key in key_attributes(model))))
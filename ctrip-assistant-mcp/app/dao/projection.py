@@ -0,0 +1,50 @@
+"""只读查询的轻量行投影
+
+搜索类查询只读、结果直接转成字典返回给工具，不需要 ORM 实例的身份映射与状态跟踪。
+本模块按模型缓存列清单，并生成带 __slots__ 的不可变 dataclass 作为行类型，
+仓储通过 Core 只选择列，把结果行直接构造成行类型（或保持为元组）。
+
+行类型提供与 Base.to_dict 相同的 to_dict()，调用方无需区分。
+"""
+import functools
+from dataclasses import make_dataclass
+from typing import Any
+
+from sqlalchemy import ColumnElement, inspect
+from sqlalchemy.sql import Select
+
+
+@functools.cache
+def column_keys(model: type) -> tuple[str, ...]:
+    """模型映射的列属性名（按声明顺序）"""
+    return tuple(attr.key for attr in inspect(model).mapper.column_attrs)
+
+
+@functools.cache
+def model_columns(model: type) -> tuple[ColumnElement, ...]:
+    """模型映射的列，标签为属性名"""
+    return tuple(getattr(model, key).label(key) for key in column_keys(model))
+
+
+def _row_to_dict(self) -> dict[str, Any]:
+    return {key: getattr(self, key) for key in self.__slots__}
+
+
+@functools.cache
+def row_type(model: type) -> type:
+    """模型对应的行类型：带 __slots__ 的不可变 dataclass，字段与列属性一致
+
+    例如 Hotel 对应 HotelRow(id, name, location, ...)。
+    """
+    return make_dataclass(
+        f"{model.__name__}Row",
+        [(key, Any) for key in column_keys(model)],
+        namespace={"to_dict": _row_to_dict},
+        frozen=True,
+        slots=True,
+    )
+
+
+def projection_stmt(model: type, stmt: Select) -> Select:
+    """把 select(model) 语句改为只选择模型的列（保留条件、联表、排序与分页）"""
+    return stmt.with_only_columns(*model_columns(model), maintain_column_froms=True)
@@ -0,0 +1,184 @@
+"""语句预算：检测 N+1 查询
+
+N+1 查询表现为语句数随结果行数增长（例如逐条访问关系属性触发的延迟加载）。语句预算为一段代码
+（一次仓储调用）限定最多执行的语句数，超出时报告执行过的语句，并指出重复次数最多的语句：
+
+- statement_budget(limit) 上下文管理器：测试中包住被测代码，超出预算即抛出 QueryBudgetExceeded；
+- query_budget(limit) 仓储方法装饰器：声明方法的语句预算，仅在 database.query_budget.enabled
+  开启时检查（开发、测试环境），database.query_budget.limits 可按 "类名.方法名" 覆盖预算，
+  raise_on_exceed 为 false 时只记录 WARNING。
+
+语句由引擎的 before_cursor_execute 事件计入当前上下文中所有生效的预算（嵌套时外层也计入）。
+预算保存在 ContextVar 中，异步会话在 greenlet 中执行的语句同样计入，分片的 scatter-gather 线程
+继承调用方的预算；写调度模式下写线程执行的语句不计入调用方的预算。
+"""
+import asyncio
+import functools
+from collections import Counter
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+# 报告中列出的语句数上限
+_MAX_REPORTED = 20
+
+
+@dataclass
+class StatementBudget:
+    """一段代码的语句预算与已执行的语句"""
+    limit: int
+    label: str = "-"
+    statements: list[str] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def exceeded(self) -> bool:
+        return self.count > self.limit
+
+    def most_repeated(self) -> tuple[str, int] | None:
+        """重复次数最多的语句及次数（N+1 通常表现为同一语句执行多次）"""
+        if not self.statements:
+            return None
+        return Counter(self.statements).most_common(1)[0]
+
+    def report(self) -> str:
+        """超出预算的说明：语句数、重复最多的语句与执行过的语句"""
+        lines = [f"{self.label} 执行了 {self.count} 条语句，超出预算 {self.limit}"]
+        statement, times = self.most_repeated()
+        if times > 1:
+            lines.append(f"重复 {times} 次的语句（可能是 N+1 查询）:\n    {statement}")
+        lines.append("执行的语句:")
+        lines.extend(f"  {i}. {statement}" for i, statement in enumerate(self.statements[:_MAX_REPORTED], 1))
+        if self.count > _MAX_REPORTED:
+            lines.append(f"  ...（另有 {self.count - _MAX_REPORTED} 条）")
+        return "\n".join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """代码执行的语句数超出预算"""
+
+    def __init__(self, budget: StatementBudget) -> None:
+        super().__init__(budget.report())
+        self.budget = budget
+
+
+_active_budgets: ContextVar[tuple[StatementBudget, ...]] = ContextVar("active_query_budgets", default=())
+
+
+def active_budgets() -> tuple[StatementBudget, ...]:
+    """当前上下文中生效的预算（交给其他线程继续计数）"""
+    return _active_budgets.get()
+
+
+@contextmanager
+def use_budgets(budgets: tuple[StatementBudget, ...]) -> Generator[None]:
+    """在当前线程中继续计入调用方线程的预算"""
+    token = _active_budgets.set(budgets)
+    try:
+        yield
+    finally:
+        _active_budgets.reset(token)
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    """before_cursor_execute 事件：把语句计入当前上下文中生效的预算"""
+    for budget in _active_budgets.get():
+        budget.statements.append(statement)
+
+
+@contextmanager
+def statement_budget(limit: int, label: str = "-", raise_on_exceed: bool = True) -> Generator[StatementBudget]:
+    """限定代码块最多执行的语句数
+
+    用法（测试中）：
+        with statement_budget(5, "get_with_details"):
+            repo.get_with_details(book_ref)
+
+    Args:
+        limit: 最多执行的语句数
+        label: 报告中的代码路径名称
+        raise_on_exceed: 超出时抛出异常，否则记录 WARNING
+
+    Yields:
+        本次的预算对象（退出后可读取 count、statements）
+
+    Raises:
+        QueryBudgetExceeded: 代码块正常结束但语句数超出预算
+    """
+    budget = StatementBudget(limit, label)
+    token = _active_budgets.set((*_active_budgets.get(), budget))
+    try:
+        yield budget
+    finally:
+        _active_budgets.reset(token)
+    if budget.exceeded:
+        if raise_on_exceed:
+            raise QueryBudgetExceeded(budget)
+        logger.warning("语句数超出预算: %s", budget.report())
+
+
+def _budget_settings() -> dict | None:
+    """database.query_budget 配置，未开启时为 None"""
+    settings = CONFIG["database"].get("query_budget") or {}
+    return settings if settings.get("enabled") else None
+
+
+def _shard_count() -> int:
+    """参与 scatter-gather 的数据库数（未开启分片时为1）"""
+    from .session import get_shard_router  # session 导入本模块注册事件，此处延迟导入
+
+    router = get_shard_router()
+    return 1 if router is None else len(router.names)
+
+
+def query_budget(limit: int, per_shard: int = 0) -> Callable:
+    """仓储方法装饰器：声明方法的语句预算（同步与异步方法均适用）
+
+    仅在 database.query_budget.enabled 开启时检查，未开启时不影响调用。
+
+    Args:
+        limit: 默认预算，可由 database.query_budget.limits 中的 "类名.方法名" 覆盖
+        per_shard: 在每个分片上执行（scatter-gather）的语句数，计入预算 limit + per_shard * 分片数
+    """
+
+    def decorator(func: Callable) -> Callable:
+
+        def budget_args(self) -> tuple[int, str, bool] | None:
+            settings = _budget_settings()
+            if settings is None:
+                return None
+            label = f"{type(self).__name__}.{func.__name__}"
+            limits = settings.get("limits") or {}
+            budget = limits.get(label, limit + per_shard * _shard_count())
+            return budget, label, settings.get("raise_on_exceed", True)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                budget = budget_args(self)
+                if budget is None:
+                    return await func(self, *args, **kwargs)
+                with statement_budget(*budget):
+                    return await func(self, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            budget = budget_args(self)
+            if budget is None:
+                return func(self, *args, **kwargs)
+            with statement_budget(*budget):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
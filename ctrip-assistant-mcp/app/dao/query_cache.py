@@ -0,0 +1,269 @@
+"""仓储查询结果缓存
+
+LLM 的工具调用与 MCP 请求会反复执行相同的搜索（同一城市的酒店、同一航线的航班），
+本模块为仓储的读方法提供进程内的 read-through 缓存：
+
+- 缓存键：仓储类 + 方法名 + 规范化后的查询参数（位置参数与关键字参数、默认值统一绑定）+ 当前分片
+- 淘汰：LRU（max_entries）+ TTL（ttl_seconds）
+- 失效：每张表维护一个版本号，条目记录写入时依赖表的版本号，版本不一致即视为失效。
+  仓储的写方法调用 invalidate() 立即递增版本号，并在所属事务提交/回滚后再递增一次，
+  避免事务提交前被其他会话读到的旧数据以新版本号写入缓存。
+- 未提交的写入：工作单元写入后、提交前，其中的读方法绕过缓存（既不命中也不写入），
+  未提交的数据不会进入缓存被其他请求读到，工作单元自身也总能读到自己的写入。
+
+缓存为可选功能，由配置 query_cache.enabled 开启；未开启时读方法直接查询数据库。
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from config import CONFIG
+
+from .session import current_shard, has_uncommitted_writes
+
+# 会话 info 中记录待提交后再次失效的表
+_PENDING_KEY = "query_cache_pending_tables"
+
+_MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    """缓存统计"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0  # LRU 淘汰
+    expirations: int = 0  # TTL 过期
+    stale: int = 0  # 表版本变化导致的失效
+    invalidations: int = 0  # 表版本递增次数
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "hit_rate": round(self.hit_rate, 4)}
+
+
+@dataclass
+class _Entry:
+    versions: tuple[int, ...]
+    expires_at: float
+    value: Any
+
+
+class QueryCache:
+    """LRU + TTL 的查询结果缓存，线程安全"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60.0) -> None:
+        """
+        Args:
+            max_entries: 最多缓存的条目数
+            ttl_seconds: 条目存活秒数
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def versions(self, tables: Iterable[str]) -> tuple[int, ...]:
+        """依赖表的当前版本号"""
+        with self._lock:
+            return tuple(self._versions.get(t, 0) for t in tables)
+
+    def get(self, key: Hashable, tables: tuple[str, ...]) -> Any:
+        """查询缓存，未命中返回 _MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return _MISSING
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return _MISSING
+            if entry.versions != tuple(self._versions.get(t, 0) for t in tables):
+                del self._entries[key]
+                self._stats.stale += 1
+                self._stats.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, versions: tuple[int, ...], value: Any) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            versions: 执行查询前读取的依赖表版本号（查询期间发生写入时条目会立即失效）
+            value: 查询结果
+        """
+        with self._lock:
+            self._entries[key] = _Entry(versions, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def bump(self, *tables: str) -> None:
+        """递增表版本号，依赖这些表的条目随之失效"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                self._stats.invalidations += 1
+
+    def clear(self) -> None:
+        """清空缓存条目（保留表版本号）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        """当前统计信息的快照"""
+        with self._lock:
+            return CacheStats(**{**asdict(self._stats), "size": len(self._entries)})
+
+
+_query_cache: QueryCache | None = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache | None:
+    """获取进程级查询缓存，未在配置中开启时返回None"""
+    global _query_cache
+    settings = CONFIG.get("query_cache") or {}
+    if not settings.get("enabled", False):
+        return None
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache(
+                    max_entries=settings.get("max_entries", 1024),
+                    ttl_seconds=settings.get("ttl_seconds", 60),
+                )
+    return _query_cache
+
+
+def invalidate(session: Session, *tables: str) -> None:
+    """仓储写方法调用：使依赖这些表的缓存条目失效
+
+    立即递增版本号，并登记到会话上，在事务提交或回滚后再递增一次
+    （工作单元中的写入要到作用域退出时才提交）。
+
+    Args:
+        session: 执行写入的会话（同步或异步会话）
+        *tables: 被写入的表名
+    """
+    cache = get_query_cache()
+    if cache is None:
+        return
+    cache.bump(*tables)
+    session.info.setdefault(_PENDING_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _bump_pending_tables(session: Session) -> None:
+    """事务结束后再次递增写入过的表的版本号"""
+    tables = session.info.pop(_PENDING_KEY, None)
+    cache = get_query_cache()
+    if tables and cache is not None:
+        cache.bump(*tables)
+
+
+def _normalize(value: Any) -> Hashable:
+    """把查询参数规范化为可哈希的值"""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = tuple(_normalize(v) for v in value)
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else items
+    return value
+
+
+def _detached(value: Any) -> Any:
+    """复制查询结果中的列表、字典与 ORM 实例（写入缓存与命中时各复制一次）
+
+    共享会话回滚时会使其中的实例过期，缓存的实例因此需要与会话脱离；命中时再复制一次，
+    调用方修改返回的结果不影响缓存。行投影与标量结果本身不可变，直接共享。
+    """
+    if isinstance(value, list):
+        return [_detached(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _detached(v) for k, v in value.items()}
+    state = sa_inspect(value, raiseerr=False)
+    if state is not None and hasattr(state, "mapper"):
+        return type(value)(**{attr.key: getattr(value, attr.key) for attr in state.mapper.column_attrs})
+    return value
+
+
+def cached_query(*tables: str) -> Callable:
+    """仓储读方法的缓存装饰器（同步与异步方法均适用）
+
+    Args:
+        *tables: 查询依赖的表；省略时为仓储模型对应的表
+    """
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        def prepare(self, args, kwargs) -> tuple[QueryCache | None, Hashable, tuple[str, ...]]:
+            cache = get_query_cache()
+            # 工作单元已写入未提交时读到的是未提交的数据：不命中也不写入缓存
+            if cache is None or has_uncommitted_writes(_PENDING_KEY):
+                return None, None, ()
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = tuple((name, _normalize(value)) for name, value in bound.arguments.items() if name != "self")
+            depends = tables or (self.model.__tablename__,)
+            return cache, (type(self).__qualname__, func.__name__, depends, params, current_shard()), depends
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                cache, key, depends = prepare(self, args, kwargs)
+                if cache is None:
+                    return await func(self, *args, **kwargs)
+                value = cache.get(key, depends)
+                if value is not _MISSING:
+                    return _detached(value)
+                versions = cache.versions(depends)
+                value = await func(self, *args, **kwargs)
+                cache.put(key, versions, _detached(value) if value is not None else None)
+                return value
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache, key, depends = prepare(self, args, kwargs)
+            if cache is None:
+                return func(self, *args, **kwargs)
+            value = cache.get(key, depends)
+            if value is not _MISSING:
+                return _detached(value)
+            versions = cache.versions(depends)
+            value = func(self, *args, **kwargs)
+            cache.put(key, versions, _detached(value) if value is not None else None)
+            return value
+
+        return wrapper
+
+    return decorator
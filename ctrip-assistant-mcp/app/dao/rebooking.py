@@ -0,0 +1,359 @@
+"""受影响航班的批量改签
+
+航班取消或延误时，持有该航班机票的乘客需要改签。TicketRepository.update_ticket_to_new_flight
+一次改签一张机票（查询新航班、查询机票航班、更新，各一次往返并单独提交），逐张处理上千名乘客很慢。
+本工具按批处理一组受影响的航班：
+
+1. 计划：在各分片上查询受影响航班的机票航班（ticket_flights）及这些机票已持有的航班；
+   用一条语句查询同航线的候选航班，按每个舱位的余座分配替代航班；
+2. 改签：按分片把计划分块，每块一个写事务（写调度模式下交给分片的写线程），在事务中重新核对
+   机票航班后用 executemany 更新 flight_id。
+
+替代航班的规则：
+- 与原航班同一航线，计划起飞时间不早于原航班、不晚于原航班之后 horizon_hours 小时，
+  且距当前时间不少于 min_hours_before_departure 小时（与 update_ticket_to_new_flight 的校验一致）；
+- 不是本次受影响的航班，状态不是已取消，机票尚未持有该航班；
+- 原舱位仍有余座：余座 = min(已占座位位图的余座（seat_availability），舱位座位数 - 已售机票数)；
+- 机票按原航班起飞时间、机票号依次分配到最早起飞的可用航班。
+
+冲突：计划之后机票航班已被改动（不在原航班上，或已持有目标航班）的机票跳过并计入冲突，
+重新执行本工具会处理仍在原航班上的机票。余座只在计划时核对，计划与改签之间其他写入售出的座位
+不会被重新检查。与 update_ticket_to_new_flight 一样，改签不移动登机牌。
+
+用法：
+    python -m app.dao.rebooking 101 102            # 改签航班 101、102 上的机票
+    python -m app.dao.rebooking --dry-run 101      # 只计划，不改签
+"""
+import sys
+import time
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from sqlalchemy import bindparam, func, select, tuple_, update
+
+from app.dao import seat_availability
+from app.dao.bulk import chunked, in_chunk_size
+from app.dao.models.booking_models import TicketFlight
+from app.dao.models.flight_models import Flight
+from app.dao.query_cache import invalidate
+from app.dao.repositories.flight_repository import seconds_until_departure
+from app.dao.route_graph import UNAVAILABLE_STATUSES
+from app.dao.session import commit_session, current_shard, get_session, scatter_gather, submit_write, use_shard
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# 按复合主键改签一行机票航班（executemany）；绑定参数名不能与 SET 的列名相同
+_REBOOK_STMT = (
+    update(TicketFlight.__table__)
+    .where(
+        TicketFlight.__table__.c.ticket_no == bindparam("b_ticket_no"),
+        TicketFlight.__table__.c.flight_id == bindparam("b_from_flight_id"),
+    )
+    .values(flight_id=bindparam("b_to_flight_id"))
+)
+
+
+@dataclass(frozen=True)
+class Rebooking:
+    """一条改签计划
+
+    Attributes:
+        ticket_no: 机票号
+        from_flight_id: 受影响的原航班
+        to_flight_id: 替代航班
+        shard: 机票所在的分片，None 表示主库
+    """
+    ticket_no: str
+    from_flight_id: int
+    to_flight_id: int
+    shard: str | None
+
+
+@dataclass
+class RebookingReport:
+    """批量改签结果
+
+    Attributes:
+        affected: 受影响航班上的机票数
+        rebooked: 已改签的机票数（dry_run 时为 0）
+        moves: (原航班, 替代航班) -> 计划改签的机票数
+        unplaced: 原航班 -> 没有可用替代航班的机票数
+        conflicts: 原因 -> 改签时发现已被改动而跳过的机票数
+        batches: 改签的写事务数
+        plan_seconds: 计划耗时
+        write_seconds: 改签耗时
+    """
+    affected: int = 0
+    rebooked: int = 0
+    moves: Counter = field(default_factory=Counter)
+    unplaced: Counter = field(default_factory=Counter)
+    conflicts: Counter = field(default_factory=Counter)
+    batches: int = 0
+    plan_seconds: float = 0.0
+    write_seconds: float = 0.0
+
+    @property
+    def tickets_per_second(self) -> float:
+        """吞吐量：受影响的机票数 / 总耗时"""
+        elapsed = self.plan_seconds + self.write_seconds
+        return self.affected / elapsed if elapsed else 0.0
+
+
+def _disrupted_flights(flight_ids: Sequence[int]) -> list:
+    """受影响航班的航线与计划起飞时间（主库）"""
+    with get_session() as session:
+        return session.execute(
+            select(Flight.flight_id, Flight.departure_airport, Flight.arrival_airport, Flight.scheduled_departure)
+            .where(Flight.flight_id.in_(flight_ids))
+        ).all()
+
+
+def _affected_tickets(flight_ids: Sequence[int]) -> tuple[str | None, list[tuple[str, int, str]], dict[str, set[int]]]:
+    """当前分片上受影响航班的机票航班，以及这些机票持有的所有航班
+
+    Returns:
+        (分片, [(机票号, 原航班, 舱位)], 机票号 -> 持有的航班ID)
+    """
+    with get_session() as session:
+        size = in_chunk_size(TicketFlight, session.get_bind().dialect.name)
+        rows = [
+            (ticket_no, flight_id, fare_conditions)
+            for chunk in chunked(flight_ids, size)
+            for ticket_no, flight_id, fare_conditions in session.execute(
+                select(TicketFlight.ticket_no, TicketFlight.flight_id, TicketFlight.fare_conditions)
+                .where(TicketFlight.flight_id.in_(chunk))
+            )
+        ]
+        held: dict[str, set[int]] = defaultdict(set)
+        for chunk in chunked(list(dict.fromkeys(ticket_no for ticket_no, _, _ in rows)), size):
+            for ticket_no, flight_id in session.execute(
+                select(TicketFlight.ticket_no, TicketFlight.flight_id).where(TicketFlight.ticket_no.in_(chunk))
+            ):
+                held[ticket_no].add(flight_id)
+    return current_shard(), rows, held
+
+
+def _candidate_flights(disrupted: list, horizon: timedelta, min_hours_before_departure: int) -> dict[int, list[int]]:
+    """受影响航班 -> 候选替代航班ID（按计划起飞时间排序），一条语句查询所有航线
+
+    数据库中的时间按文本比较，SQL 中的时间边界各放宽一天，精确比较在 Python 中进行。
+    """
+    timed = [flight for flight in disrupted if flight.scheduled_departure is not None]
+    if not timed:
+        return {}
+    routes = list({(flight.departure_airport, flight.arrival_airport) for flight in timed})
+    start = min(flight.scheduled_departure for flight in timed) - timedelta(days=1)
+    end = max(flight.scheduled_departure for flight in timed) + horizon + timedelta(days=1)
+    excluded = {flight.flight_id for flight in disrupted}
+    min_seconds = min_hours_before_departure * 3600
+    by_route: dict[tuple[str, str], list] = defaultdict(list)
+    with get_session() as session:
+        for row in session.execute(
+            select(
+                Flight.flight_id, Flight.departure_airport, Flight.arrival_airport,
+                Flight.scheduled_departure, Flight.status,
+            )
+            .where(
+                tuple_(Flight.departure_airport, Flight.arrival_airport).in_(routes),
+                Flight.scheduled_departure.between(start, end),
+            )
+            .order_by(Flight.scheduled_departure, Flight.flight_id)
+        ):
+            if row.flight_id in excluded or row.status in UNAVAILABLE_STATUSES:
+                continue
+            seconds = seconds_until_departure(row.scheduled_departure)
+            if seconds is not None and seconds >= min_seconds:
+                by_route[(row.departure_airport, row.arrival_airport)].append(row)
+    return {
+        flight.flight_id: [
+            row.flight_id
+            for row in by_route[(flight.departure_airport, flight.arrival_airport)]
+            if flight.scheduled_departure <= row.scheduled_departure <= flight.scheduled_departure + horizon
+        ]
+        for flight in timed
+    }
+
+
+def _sold_seats(flight_ids: Sequence[int]) -> Counter:
+    """当前分片上航班各舱位的已售机票数：(flight_id, 舱位) -> 张数"""
+    sold = Counter()
+    with get_session() as session:
+        size = in_chunk_size(TicketFlight, session.get_bind().dialect.name)
+        for chunk in chunked(flight_ids, size):
+            for flight_id, fare_conditions, count in session.execute(
+                select(TicketFlight.flight_id, TicketFlight.fare_conditions, func.count())
+                .where(TicketFlight.flight_id.in_(chunk))
+                .group_by(TicketFlight.flight_id, TicketFlight.fare_conditions)
+            ):
+                sold[(flight_id, fare_conditions)] = count
+    return sold
+
+
+def _remaining_seats(flight_ids: Sequence[int]) -> dict[int, dict[str, int]]:
+    """航班各舱位可改签的座位数：min(位图余座, 舱位座位数 - 已售机票数)；机型没有座位信息的航班不在结果中"""
+    entries = seat_availability.get_flight_seats(flight_ids)
+    sold = Counter()
+    for counts in scatter_gather(_sold_seats, list(entries)):
+        sold.update(counts)
+    remaining = {}
+    for flight_id, entry in entries.items():
+        left = entry.seats_left()
+        remaining[flight_id] = {
+            fare_conditions: min(left[fare_conditions], capacity - sold[(flight_id, fare_conditions)])
+            for fare_conditions, capacity in zip(entry.layout.fare_names, entry.layout.capacity)
+        }
+    return remaining
+
+
+def plan_rebooking(
+    flight_ids: Sequence[int],
+    min_hours_before_departure: int = 3,
+    horizon_hours: int = 48,
+    report: RebookingReport | None = None,
+) -> list[Rebooking]:
+    """为受影响航班上的机票分配替代航班（只读，不改签）
+
+    Args:
+        flight_ids: 取消或延误的航班ID
+        min_hours_before_departure: 替代航班起飞前最少小时数，默认3小时
+        horizon_hours: 替代航班最晚在原航班之后多少小时起飞
+        report: 记录受影响机票数、分配结果与未分配机票数的报告
+
+    Returns:
+        改签计划（按原航班起飞时间、机票号排序）
+    """
+    report = report if report is not None else RebookingReport()
+    flight_ids = list(dict.fromkeys(flight_ids))
+    disrupted = _disrupted_flights(flight_ids)
+    departures = {flight.flight_id: flight.scheduled_departure for flight in disrupted}
+    candidates = _candidate_flights(disrupted, timedelta(hours=horizon_hours), min_hours_before_departure)
+    remaining = _remaining_seats(list(dict.fromkeys(i for ids in candidates.values() for i in ids)))
+
+    tickets = []
+    held: dict[str, set[int]] = {}
+    for shard, rows, shard_held in scatter_gather(_affected_tickets, flight_ids):
+        tickets.extend((shard, *row) for row in rows)
+        held.update(shard_held)
+    tickets.sort(key=lambda ticket: (departures.get(ticket[2]) is None, departures.get(ticket[2]), ticket[2], ticket[1]))
+    report.affected += len(tickets)
+
+    plan = []
+    for shard, ticket_no, from_flight_id, fare_conditions in tickets:
+        for to_flight_id in candidates.get(from_flight_id, ()):
+            seats = remaining.get(to_flight_id, {})
+            if seats.get(fare_conditions, 0) > 0 and to_flight_id not in held[ticket_no]:
+                seats[fare_conditions] -= 1
+                held[ticket_no].add(to_flight_id)
+                plan.append(Rebooking(ticket_no, from_flight_id, to_flight_id, shard))
+                report.moves[(from_flight_id, to_flight_id)] += 1
+                break
+        else:
+            report.unplaced[from_flight_id] += 1
+    return plan
+
+
+def _apply_batch(batch: list[Rebooking]) -> Counter:
+    """在一个写事务中改签一批机票（同一分片），先核对机票航班仍与计划一致
+
+    Returns:
+        结果 -> 机票数（"rebooked"，或冲突原因 "moved"、"duplicate"）
+    """
+    outcome = Counter()
+    with get_session() as session:
+        held = {
+            (ticket_no, flight_id)
+            for ticket_no, flight_id in session.execute(
+                select(TicketFlight.ticket_no, TicketFlight.flight_id)
+                .where(TicketFlight.ticket_no.in_([item.ticket_no for item in batch]))
+            )
+        }
+        params = []
+        for item in batch:
+            if (item.ticket_no, item.from_flight_id) not in held:
+                outcome["moved"] += 1
+            elif (item.ticket_no, item.to_flight_id) in held:
+                outcome["duplicate"] += 1
+            else:
+                held.add((item.ticket_no, item.to_flight_id))
+                params.append({
+                    "b_ticket_no": item.ticket_no,
+                    "b_from_flight_id": item.from_flight_id,
+                    "b_to_flight_id": item.to_flight_id,
+                })
+        if params:
+            session.execute(_REBOOK_STMT, params)
+            commit_session(session)
+            invalidate(session, TicketFlight.__tablename__)
+        outcome["rebooked"] = len(params)
+    return outcome
+
+
+def rebook_disrupted(
+    flight_ids: Sequence[int],
+    min_hours_before_departure: int = 3,
+    horizon_hours: int = 48,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> RebookingReport:
+    """把取消或延误航班上的机票改签到替代航班
+
+    Args:
+        flight_ids: 取消或延误的航班ID
+        min_hours_before_departure: 替代航班起飞前最少小时数，默认3小时
+        horizon_hours: 替代航班最晚在原航班之后多少小时起飞
+        batch_size: 每个写事务改签的机票数
+        dry_run: 为True时只计划，不改签
+
+    Returns:
+        改签结果（吞吐量、冲突与未分配的机票）
+    """
+    report = RebookingReport()
+    started = time.perf_counter()
+    plan = plan_rebooking(flight_ids, min_hours_before_departure, horizon_hours, report)
+    report.plan_seconds = time.perf_counter() - started
+    if dry_run:
+        return report
+
+    started = time.perf_counter()
+    by_shard: dict[str | None, list[Rebooking]] = defaultdict(list)
+    for item in plan:
+        by_shard[item.shard].append(item)
+    for shard, items in by_shard.items():
+        with use_shard(shard):
+            for batch in chunked(items, batch_size):
+                outcome = submit_write(_apply_batch, batch).result()
+                report.rebooked += outcome.pop("rebooked")
+                report.conflicts.update(outcome)
+                report.batches += 1
+    report.write_seconds = time.perf_counter() - started
+    logger.info(
+        "批量改签：受影响 %s 张，改签 %s 张，未分配 %s 张，冲突 %s 张，%.0f 张/s",
+        report.affected, report.rebooked, sum(report.unplaced.values()), sum(report.conflicts.values()),
+        report.tickets_per_second,
+    )
+    return report
+
+
+def _print_report(report: RebookingReport) -> None:
+    for (from_flight_id, to_flight_id), count in sorted(report.moves.items()):
+        print(f"{from_flight_id} -> {to_flight_id}: {count}")
+    for flight_id, count in sorted(report.unplaced.items()):
+        print(f"{flight_id} unplaced: {count}")
+    for reason, count in sorted(report.conflicts.items()):
+        print(f"conflict {reason}: {count}")
+    print(
+        f"affected {report.affected}, rebooked {report.rebooked}, batches {report.batches}, "
+        f"plan {report.plan_seconds * 1000:.1f} ms, write {report.write_seconds * 1000:.1f} ms, "
+        f"{report.tickets_per_second:.0f} tickets/s"
+    )
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    ids = [int(argument) for argument in arguments if argument != "--dry-run"]
+    if not ids:
+        sys.exit("用法: python -m app.dao.rebooking [--dry-run] FLIGHT_ID ...")
+    _print_report(rebook_disrupted(ids, dry_run="--dry-run" in arguments))
@@ -0,0 +1,344 @@
+"""进程内参考数据：机场、机型与座位
+
+airports_data、aircrafts_data、seats 数据量小且几乎只读，但机场与座位查询每次都要访问数据库。
+本模块把三张表加载为进程内的只读快照，按字典与数组建立索引：
+
+- 机场：按机场代码的字典、按城市的下标数组，名称搜索在预先 casefold 的名称元组上匹配；
+- 机型：按机型代码的字典；
+- 座位：每个机型一份列式座位表（座位号元组 + 舱位编码数组），单个座位按座位号字典定位。
+
+失效：reference_data_versions 表为每张参考表记录一个版本号，由 SQLite 触发器在写入时递增；
+快照记录加载时的版本号，距上次检查超过 check_interval_seconds 时读取一次版本表（一条小查询），
+版本变化即重新加载。其他进程写入参考表同样会被发现。版本号初始值取创建时的毫秒时间戳，
+版本表随整库重置重建后不会与旧快照的版本号相同。
+
+快照为可选功能，由配置 reference_data.enabled 开启；未开启或版本表不存在（非 SQLite、未迁移）时
+get_reference_data() 返回 None，仓储回退到数据库查询。
+
+用法：
+    python -m app.dao.reference_data        # 加载参考数据并打印内存占用
+"""
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+from app.dao.models.flight_models import AircraftData, AirportData, Seat
+from app.dao.projection import model_columns, row_type
+from app.dao.session import get_read_engine
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+VERSION_TABLE = "reference_data_versions"
+
+# 参考表（版本号按此顺序记录）
+REFERENCE_TABLES = (AirportData.__tablename__, AircraftData.__tablename__, Seat.__tablename__)
+
+AirportRow = row_type(AirportData)
+AircraftRow = row_type(AircraftData)
+SeatRow = row_type(Seat)
+
+
+def _trigger_statements() -> dict[str, str]:
+    """触发器名 -> 建触发器语句（参考表每次写入都递增该表的版本号）"""
+    triggers = {}
+    for table_name in REFERENCE_TABLES:
+        bump = f"UPDATE {VERSION_TABLE} SET version = version + 1 WHERE table_name = '{table_name}';"
+        for suffix, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+            name = f"{VERSION_TABLE}_{table_name}_{suffix}"
+            triggers[name] = f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table_name} BEGIN {bump} END"
+    return triggers
+
+
+def ensure_reference_versions(conn: Connection) -> list[str]:
+    """创建或修复版本表与触发器
+
+    参考表被整表重写后触发器随之丢失，期间的写入没有记录，因此重建触发器时同时递增所有版本号。
+
+    Returns:
+        被创建或修复的对象名列表
+    """
+    if conn.dialect.name != "sqlite":
+        return []
+    existing = {row[0] for row in conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+    )}
+    if not set(REFERENCE_TABLES) <= existing:
+        return []
+    triggers = _trigger_statements()
+    if {VERSION_TABLE, *triggers} <= existing:
+        return []
+
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (table_name TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    initial = int(time.time() * 1000)
+    for table_name in REFERENCE_TABLES:
+        conn.exec_driver_sql(
+            f"INSERT INTO {VERSION_TABLE} (table_name, version) VALUES (?, ?) "
+            f"ON CONFLICT (table_name) DO UPDATE SET version = MAX(version + 1, excluded.version)",
+            (table_name, initial),
+        )
+    for statement in triggers.values():
+        conn.exec_driver_sql(statement)
+    logger.info("参考数据版本表与触发器已创建")
+    return [VERSION_TABLE]
+
+
+def _read_versions(conn: Connection) -> tuple[int, ...] | None:
+    """参考表的当前版本号；版本表不存在时返回 None"""
+    if conn.dialect.name != "sqlite":
+        return None
+    try:
+        rows = dict(conn.exec_driver_sql(f"SELECT table_name, version FROM {VERSION_TABLE}").all())
+    except OperationalError:
+        return None
+    if not set(REFERENCE_TABLES) <= rows.keys():
+        return None
+    return tuple(rows[table_name] for table_name in REFERENCE_TABLES)
+
+
+@dataclass(frozen=True, slots=True)
+class SeatMap:
+    """一个机型的座位（列式存储）
+
+    Attributes:
+        aircraft_code: 机型代码
+        seat_nos: 座位号，按座位号排序
+        fare_codes: 与 seat_nos 对齐的舱位编码（fare_names 中的下标）
+        fare_names: 舱位名称（所有机型共享同一个元组）
+        positions: 座位号 -> 下标
+    """
+    aircraft_code: str
+    seat_nos: tuple[str, ...]
+    fare_codes: array
+    fare_names: tuple[str, ...]
+    positions: dict[str, int]
+
+    def seat(self, seat_no: str) -> SeatRow | None:
+        """查询单个座位"""
+        position = self.positions.get(seat_no)
+        if position is None:
+            return None
+        return SeatRow(self.aircraft_code, seat_no, self.fare_names[self.fare_codes[position]])
+
+    def seats(self, fare_conditions: str | None = None) -> list[SeatRow]:
+        """座位列表，可按舱位过滤"""
+        if fare_conditions is None:
+            return [SeatRow(self.aircraft_code, s, self.fare_names[c]) for s, c in zip(self.seat_nos, self.fare_codes)]
+        if fare_conditions not in self.fare_names:
+            return []
+        code = self.fare_names.index(fare_conditions)
+        return [SeatRow(self.aircraft_code, s, fare_conditions) for s, c in zip(self.seat_nos, self.fare_codes) if c == code]
+
+    def counts(self) -> dict[str, int]:
+        """各舱位的座位数"""
+        counts = {}
+        for code in self.fare_codes:
+            counts[self.fare_names[code]] = counts.get(self.fare_names[code], 0) + 1
+        return counts
+
+
+def _deep_size(obj: Any, seen: set[int]) -> int:
+    """对象及其引用的容器、字符串、__slots__ 属性的内存大小（已计入的对象不重复计算）"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (tuple, list, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    elif hasattr(type(obj), "__slots__") and not isinstance(obj, (str, bytes, int, float, array)):
+        size += sum(_deep_size(getattr(obj, name), seen) for name in type(obj).__slots__ if hasattr(obj, name))
+    return size
+
+
+@dataclass
+class ReferenceData:
+    """参考数据快照（加载后只读）
+
+    Attributes:
+        versions: 加载时各参考表的版本号（按 REFERENCE_TABLES 顺序）
+        airports: 机场，按机场代码排序
+        aircraft: 机型代码 -> 机型
+        seat_maps: 机型代码 -> 座位表
+        loaded_at: 加载时间
+    """
+    versions: tuple[int, ...]
+    airports: tuple[AirportRow, ...]
+    aircraft: dict[str, AircraftRow]
+    seat_maps: dict[str, SeatMap]
+    loaded_at: datetime = field(default_factory=datetime.now)
+    _airport_index: dict[str, int] = field(init=False, repr=False)
+    _city_index: dict[str, array] = field(init=False, repr=False)
+    _airport_names: tuple[str, ...] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._airport_index = {}
+        self._city_index = {}
+        for position, airport in enumerate(self.airports):
+            self._airport_index.setdefault(airport.airport_code, position)
+            self._city_index.setdefault(airport.city, array("I")).append(position)
+        self._airport_names = tuple((airport.airport_name or "").casefold() for airport in self.airports)
+
+    def airport(self, airport_code: str) -> AirportRow | None:
+        """按机场代码查询机场"""
+        position = self._airport_index.get(airport_code)
+        return self.airports[position] if position is not None else None
+
+    def airports_in_city(self, city: str, limit: int = 100) -> list[AirportRow]:
+        """按城市查询机场"""
+        return [self.airports[position] for position in self._city_index.get(city, ())[:limit]]
+
+    def search_airports(self, keyword: str) -> list[AirportRow]:
+        """按名称搜索机场（不区分大小写的子串匹配，与 LIKE '%keyword%' 一致）"""
+        keyword = keyword.casefold()
+        return [airport for airport, name in zip(self.airports, self._airport_names) if keyword in name]
+
+    def seat_map(self, aircraft_code: str) -> SeatMap | None:
+        """机型的座位表"""
+        return self.seat_maps.get(aircraft_code)
+
+    def footprint(self) -> dict[str, dict[str, int]]:
+        """各参考表在快照中的行数与内存占用（字节，含索引；共享对象只计入首次出现的表）"""
+        seen: set[int] = set()
+        airports = _deep_size(self.airports, seen)
+        airports += sum(_deep_size(item, seen) for item in (self._airport_index, self._city_index, self._airport_names))
+        aircraft = _deep_size(self.aircraft, seen)
+        seats = _deep_size(self.seat_maps, seen)
+        return {
+            AirportData.__tablename__: {"rows": len(self.airports), "bytes": airports},
+            AircraftData.__tablename__: {"rows": len(self.aircraft), "bytes": aircraft},
+            Seat.__tablename__: {"rows": sum(len(m.seat_nos) for m in self.seat_maps.values()), "bytes": seats},
+        }
+
+
+def _load(conn: Connection, versions: tuple[int, ...]) -> ReferenceData:
+    """从数据库加载快照（版本号须在读取数据之前取得，期间的写入会在下次检查时触发重新加载）"""
+    airports = tuple(AirportRow(*row) for row in conn.execute(
+        select(*model_columns(AirportData)).order_by(AirportData.airport_code)
+    ))
+    aircraft = {}
+    for row in conn.execute(select(*model_columns(AircraftData)).order_by(AircraftData.aircraft_code)):
+        aircraft.setdefault(row.aircraft_code, AircraftRow(*row))
+
+    seat_rows = conn.execute(
+        select(Seat.aircraft_code, Seat.seat_no, Seat.fare_conditions).order_by(Seat.aircraft_code, Seat.seat_no)
+    ).all()
+    fare_names = tuple(sorted({row.fare_conditions for row in seat_rows}))
+    fare_lookup = {name: code for code, name in enumerate(fare_names)}
+    typecode = "B" if len(fare_names) <= 256 else "H"
+    columns: dict[str, tuple[list[str], array]] = {}
+    for aircraft_code, seat_no, fare_conditions in seat_rows:
+        seat_nos, fare_codes = columns.setdefault(aircraft_code, ([], array(typecode)))
+        seat_nos.append(seat_no)
+        fare_codes.append(fare_lookup[fare_conditions])
+    seat_maps = {
+        aircraft_code: SeatMap(
+            aircraft_code,
+            tuple(seat_nos),
+            fare_codes,
+            fare_names,
+            {seat_no: position for position, seat_no in enumerate(seat_nos)},
+        )
+        for aircraft_code, (seat_nos, fare_codes) in columns.items()
+    }
+    return ReferenceData(versions, airports, aircraft, seat_maps)
+
+
+_data: ReferenceData | None = None
+_checked_at = float("-inf")
+_lock = threading.Lock()
+_stats = {"loads": 0, "checks": 0}
+
+
+def is_enabled() -> bool:
+    """是否开启进程内参考数据"""
+    return bool((CONFIG.get("reference_data") or {}).get("enabled", False))
+
+
+def _check_interval() -> float:
+    return float((CONFIG.get("reference_data") or {}).get("check_interval_seconds", 5))
+
+
+def _refresh(force: bool = False) -> ReferenceData | None:
+    """检查版本号，变化（或 force）时重新加载；调用方持有 _lock"""
+    global _data, _checked_at
+    with get_read_engine().connect() as conn:
+        versions = _read_versions(conn)
+        _stats["checks"] += 1
+        if versions is None:
+            _data = None
+        elif force or _data is None or versions != _data.versions:
+            _data = _load(conn, versions)
+            _stats["loads"] += 1
+            logger.info("参考数据已加载: %s", {t: item["rows"] for t, item in _data.footprint().items()})
+    _checked_at = time.monotonic()
+    return _data
+
+
+def get_reference_data() -> ReferenceData | None:
+    """获取参考数据快照，距上次检查超过 check_interval_seconds 时先检查版本号
+
+    Returns:
+        快照；未开启或版本表不存在时返回 None
+    """
+    if not is_enabled():
+        return None
+    if time.monotonic() - _checked_at < _check_interval():
+        return _data
+    with _lock:
+        if time.monotonic() - _checked_at < _check_interval():
+            return _data
+        return _refresh()
+
+
+def load_reference_data() -> ReferenceData | None:
+    """立即（重新）加载参考数据，启动时由 init_db 调用；未开启时返回 None"""
+    if not is_enabled():
+        return None
+    with _lock:
+        return _refresh(force=True)
+
+
+def reset_reference_data() -> None:
+    """丢弃快照，下次使用时重新加载"""
+    global _data, _checked_at
+    with _lock:
+        _data = None
+        _checked_at = float("-inf")
+
+
+def reference_data_report() -> dict[str, Any]:
+    """参考数据的加载状态、版本号与内存占用"""
+    data = _data
+    tables = data.footprint() if data is not None else {}
+    return {
+        "enabled": is_enabled(),
+        "loaded": data is not None,
+        "loaded_at": data.loaded_at if data is not None else None,
+        "versions": dict(zip(REFERENCE_TABLES, data.versions)) if data is not None else {},
+        "loads": _stats["loads"],
+        "checks": _stats["checks"],
+        "tables": tables,
+        "total_bytes": sum(item["bytes"] for item in tables.values()),
+    }
+
+
+if __name__ == '__main__':
+    with _lock:
+        _refresh(force=True)
+    report = reference_data_report()
+    for table_name, item in report["tables"].items():
+        print(f"{table_name}: {item['rows']} rows, {item['bytes']} bytes")
+    print("total:", report["total_bytes"], "bytes")
+    print("versions:", report["versions"])
@@ -0,0 +1,238 @@
+"""搜索放宽阶梯
+
+搜索没有结果时，助手提示词要求模型扩大查询范围后重试，每次重试都是一轮完整的 LLM 调用。
+搜索工具改为在一次调用内按阶梯逐级放宽条件，返回第一个有结果的步骤及其结果：
+
+- 航班：原条件（城市名解析为其全部机场） -> 同城其他机场（出发、到达机场各自扩展） -> 出发时间范围前后逐级扩大；
+- 酒店、租车、旅行推荐：原条件 -> 部分匹配（每个条件中任一词命中即可） -> 去掉名称条件。
+
+每一级都在上一级的基础上放宽，与上一级查询参数相同的步骤跳过。工具在结果中返回产生结果的步骤
+（relaxation 为步骤名，relaxation_note 说明放宽了什么），模型据此告知用户，不再自行重试。
+航班的城市/机场名称按前缀或模糊匹配解析（猜测）时，relaxation_note 同时提示模型向用户确认解析结果。
+
+配置见 search_relaxation（均有默认值），关闭时只执行原条件查询。
+"""
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from app.dao import fts
+from app.dao.airport_resolver import AirportResolution, get_airport_resolver, resolve_airport
+from config import CONFIG
+
+_DEFAULTS = {
+    "enabled": True,
+    "time_window_hours": [24, 72],
+}
+
+
+def _settings() -> dict:
+    return {**_DEFAULTS, **(CONFIG.get("search_relaxation") or {})}
+
+
+@dataclass(frozen=True)
+class RelaxationStep:
+    """放宽阶梯的一级
+
+    Attributes:
+        name: 步骤名（exact、same_city_airports、wider_time_window_<小时>h、partial_match、without_name）
+        note: 对模型说明本级放宽了什么
+        params: 本级的查询参数
+        notice: 对整个阶梯的提示（如名称解析需要向用户确认），无论哪一级产生结果都附在说明前
+    """
+    name: str
+    note: str
+    params: dict[str, Any]
+    notice: str = ""
+
+
+@dataclass
+class RelaxedResult:
+    """阶梯搜索的结果
+
+    Attributes:
+        rows: 第一个有结果的步骤返回的行，所有步骤都没有结果时为空
+        step: 产生结果的步骤，所有步骤都没有结果时为None
+        tried: 依次执行过的步骤名
+        notice: 阶梯的提示（见 RelaxationStep.notice）
+    """
+    rows: list
+    step: RelaxationStep | None
+    tried: list[str]
+    notice: str = ""
+
+    def to_dict(self, results: list[dict]) -> dict[str, Any]:
+        """工具返回给模型的结构：results 为转换后的结果行"""
+        note = self.step.note if self.step else "已放宽全部条件，仍没有结果"
+        return {
+            "relaxation": self.step.name if self.step else None,
+            "relaxation_note": f"{self.notice}；{note}" if self.notice else note,
+            "tried": self.tried,
+            "results": results,
+        }
+
+
+def _distinct(steps: list[RelaxationStep]) -> list[RelaxationStep]:
+    """跳过查询参数与之前某一级相同的步骤"""
+    result = []
+    for step in steps:
+        if all(step.params != earlier.params for earlier in result):
+            result.append(step)
+    return result
+
+
+def _same_city_airports(airport_codes: tuple[str | None, ...]) -> tuple[str | None, ...]:
+    """机场及其同城的其他机场（原机场在前）；未知机场只保留其本身"""
+    if airport_codes == (None,):
+        return airport_codes
+    resolver = get_airport_resolver()
+    return tuple(dict.fromkeys(other for code in airport_codes for other in resolver.city_airports(code)))
+
+
+def _as_datetime(value: date | datetime | None) -> datetime | None:
+    """日期按当天零点处理，使时间范围可以按小时扩大"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.combine(value, time.min)
+
+
+def _resolve(text: str | None) -> tuple[tuple[str | None, ...], AirportResolution | None]:
+    """名称 -> 机场代码与解析结果；无法解析时代码为原文本"""
+    resolution = resolve_airport(text)
+    if resolution is not None:
+        return resolution.airport_codes, resolution
+    return (text.strip() if text is not None else None,), None
+
+
+def _guess_notice(resolutions: list[AirportResolution | None]) -> str:
+    """前缀、模糊匹配的解析结果需要向用户确认"""
+    guesses = [
+        f"“{r.query}”按{'前缀' if r.kind == 'prefix' else '相近拼写'}解析为 {r.city}（{'/'.join(r.airport_codes)}）"
+        for r in resolutions
+        if r is not None and r.is_guess
+    ]
+    return f"{'，'.join(guesses)}，请向客户确认地点" if guesses else ""
+
+
+def flight_steps(
+    departure_airport: str | None = None,
+    arrival_airport: str | None = None,
+    start_time: date | datetime | None = None,
+    end_time: date | datetime | None = None,
+) -> list[RelaxationStep]:
+    """航班搜索的放宽阶梯，每级参数为 departure_airports、arrival_airports、start_time、end_time
+
+    出发、到达可以是城市名或机场名，由 app.dao.airport_resolver 解析为机场代码（城市为其全部机场），
+    原条件一级即按解析出的全部机场查询；前缀或模糊匹配的解析记入每一级的 notice。
+
+    Args:
+        departure_airport: 出发机场代码、机场名或城市名
+        arrival_airport: 到达机场代码、机场名或城市名
+        start_time: 出发时间范围的开始时间
+        end_time: 出发时间范围的结束时间
+
+    Returns:
+        放宽步骤（第一级为原条件）
+    """
+    (departures, departure), (arrivals, arrival) = _resolve(departure_airport), _resolve(arrival_airport)
+    notice = _guess_notice([departure, arrival])
+    params = {
+        "departure_airports": departures,
+        "arrival_airports": arrivals,
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+    resolved = [
+        f"{text} -> {'/'.join(codes)}"
+        for text, codes in ((departure_airport, departures), (arrival_airport, arrivals))
+        if text and codes != (text,)
+    ]
+    steps = [RelaxationStep(
+        "exact", "按原条件查询" + (f"（{'，'.join(resolved)}）" if resolved else ""), params, notice,
+    )]
+    settings = _settings()
+    if not settings["enabled"]:
+        return steps
+
+    departures, arrivals = _same_city_airports(departures), _same_city_airports(arrivals)
+    params = {**params, "departure_airports": departures, "arrival_airports": arrivals}
+    steps.append(RelaxationStep(
+        "same_city_airports",
+        f"改用同城机场：出发 {'/'.join(filter(None, departures)) or '不限'}，到达 {'/'.join(filter(None, arrivals)) or '不限'}",
+        params,
+        notice,
+    ))
+
+    start, end = _as_datetime(start_time), _as_datetime(end_time)
+    if start is not None or end is not None:
+        for hours in settings["time_window_hours"]:
+            widen = timedelta(hours=hours)
+            steps.append(RelaxationStep(
+                f"wider_time_window_{hours}h",
+                f"出发时间范围前后各扩大 {hours} 小时",
+                {
+                    **params,
+                    "start_time": start - widen if start is not None else None,
+                    "end_time": end + widen if end is not None else None,
+                },
+                notice,
+            ))
+    return _distinct(steps)
+
+
+def text_steps(**filters: str | None) -> list[RelaxationStep]:
+    """酒店、租车、旅行推荐搜索的放宽阶梯，每级参数为 filters 加上 match_any
+
+    Args:
+        **filters: 文本条件（location、name、keywords 等），name 为名称条件
+
+    Returns:
+        放宽步骤（第一级为原条件）
+    """
+    steps = [RelaxationStep("exact", "按原条件查询", {**filters, "match_any": False})]
+    if not _settings()["enabled"]:
+        return steps
+
+    if any(len(fts.words(value)) > 1 for value in filters.values()):
+        steps.append(RelaxationStep(
+            "partial_match", "改为部分匹配：每个条件中任一词命中即可", {**filters, "match_any": True},
+        ))
+    if filters.get("name") and any(value for key, value in filters.items() if key != "name"):
+        steps.append(RelaxationStep(
+            "without_name",
+            f"去掉名称条件（{filters['name']}），其余条件部分匹配",
+            {**filters, "name": None, "match_any": True},
+        ))
+    return _distinct(steps)
+
+
+def run_ladder(search: Callable[..., list], steps: list[RelaxationStep]) -> RelaxedResult:
+    """按阶梯依次执行搜索，返回第一个有结果的步骤
+
+    Args:
+        search: 搜索函数，以步骤的 params 为关键字参数调用
+        steps: 放宽步骤
+
+    Returns:
+        阶梯搜索的结果
+    """
+    tried = []
+    for step in steps:
+        tried.append(step.name)
+        rows = search(**step.params)
+        if rows:
+            return RelaxedResult(list(rows), step, tried, step.notice)
+    return RelaxedResult([], None, tried, steps[0].notice if steps else "")
+
+
+async def async_run_ladder(search: Callable[..., Awaitable[list]], steps: list[RelaxationStep]) -> RelaxedResult:
+    """异步版本的 run_ladder"""
+    tried = []
+    for step in steps:
+        tried.append(step.name)
+        rows = await search(**step.params)
+        if rows:
+            return RelaxedResult(list(rows), step, tried, step.notice)
+    return RelaxedResult([], None, tried, steps[0].notice if steps else "")
+
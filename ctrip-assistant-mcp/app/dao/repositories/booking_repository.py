@@ -0,0 +1,160 @@
+"""预订数据仓储
+
+预订聚合（预订 -> 机票 -> 机票航班 -> 航班，以及机票的登机牌）以固定条数的语句加载：
+预订一条语句，机票及其关联对象由 selectinload 各用一条 IN 语句批量加载，语句数与机票数无关。
+加载选项末尾的 raiseload("*") 使未预先加载的关系在访问时报错，不会逐条发出延迟加载查询
+（会话关闭后延迟加载本来也会失败）。
+
+开启分片时预订按 book_ref、机票按乘客分布在不同分片上，两部分分别在各分片上查询后组装。
+聚合包含关系对象，查询缓存只复制列属性，因此这些方法不使用 cached_query。
+"""
+from collections.abc import Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import raiseload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.dao.async_base_repository import AsyncBaseRepository
+from app.dao.base_repository import BaseRepository
+from app.dao.bulk import chunked, in_chunk_size
+from app.dao.models.booking_models import Booking, Ticket
+from app.dao.query_budget import query_budget
+from app.dao.repositories.flight_repository import ticket_detail_options
+from app.dao.session import (
+    async_scatter_gather,
+    get_async_session,
+    get_session,
+    read_routed,
+    scatter_gather,
+)
+
+
+def _assemble(bookings: list[Booking], tickets: list[Ticket]) -> list[Booking]:
+    """把机票挂到所属预订上（作为已加载的关系，不再触发查询）"""
+    by_booking: dict[str, list[Ticket]] = {booking.book_ref: [] for booking in bookings}
+    for ticket in sorted(tickets, key=lambda t: t.ticket_no):
+        if ticket.book_ref in by_booking:
+            by_booking[ticket.book_ref].append(ticket)
+    bookings_by_ref = {booking.book_ref: booking for booking in bookings}
+    for book_ref, booking_tickets in by_booking.items():
+        booking = bookings_by_ref[book_ref]
+        set_committed_value(booking, "tickets", booking_tickets)
+        for ticket in booking_tickets:
+            set_committed_value(ticket, "booking", booking)
+    return sorted(bookings, key=lambda b: b.book_ref)
+
+
+class BookingRepository(BaseRepository[Booking]):
+    """预订数据仓储"""
+
+    def __init__(self) -> None:
+        super().__init__(Booking)
+
+    def _bookings(self, book_refs: Sequence[str]) -> list[Booking]:
+        """在当前分片上查询预订（机票关系由调用方组装）"""
+        with get_session() as session:
+            size = in_chunk_size(Booking, session.get_bind().dialect.name)
+            return [
+                booking
+                for chunk in chunked(book_refs, size)
+                for booking in session.scalars(
+                    select(Booking).where(Booking.book_ref.in_(chunk)).options(raiseload("*"))
+                )
+            ]
+
+    def _tickets(self, book_refs: Sequence[str]) -> list[Ticket]:
+        """在当前分片上查询预订的机票，并批量加载机票航班、航班与登机牌"""
+        with get_session() as session:
+            size = in_chunk_size(Ticket, session.get_bind().dialect.name)
+            return [
+                ticket
+                for chunk in chunked(book_refs, size)
+                for ticket in session.scalars(
+                    select(Ticket).where(Ticket.book_ref.in_(chunk)).options(*ticket_detail_options())
+                )
+            ]
+
+    @read_routed
+    @query_budget(0, per_shard=4)
+    def get_many_with_details(self, book_refs: Sequence[str]) -> "list[Booking]":
+        """批量加载预订聚合：预订、机票、机票航班（含航班）与登机牌
+
+        每个分片执行4条语句（预订、机票、机票航班联航班、登机牌），与预订和机票数量无关。
+        返回的对象在会话关闭后仍可访问上述关系，访问其他关系（如航班的机场）会报错。
+
+        Args:
+            book_refs: 预订编号列表
+
+        Returns:
+            预订列表（按预订编号排序），不存在的预订编号被忽略
+        """
+        book_refs = list(dict.fromkeys(book_refs))
+        if not book_refs:
+            return []
+        bookings = [booking for shard_bookings in scatter_gather(self._bookings, book_refs) for booking in shard_bookings]
+        if not bookings:
+            return []
+        found = [booking.book_ref for booking in bookings]
+        tickets = [ticket for shard_tickets in scatter_gather(self._tickets, found) for ticket in shard_tickets]
+        return _assemble(bookings, tickets)
+
+    def get_with_details(self, book_ref: str) -> Booking | None:
+        """加载一个预订的聚合，见 get_many_with_details
+
+        Args:
+            book_ref: 预订编号
+
+        Returns:
+            预订或None
+        """
+        bookings = self.get_many_with_details([book_ref])
+        return bookings[0] if bookings else None
+
+
+class AsyncBookingRepository(AsyncBaseRepository[Booking]):
+    """预订数据仓储（异步），语义同 BookingRepository"""
+
+    sync_repository_class = BookingRepository
+
+    def __init__(self) -> None:
+        super().__init__(Booking)
+
+    async def _bookings(self, book_refs: Sequence[str]) -> list[Booking]:
+        """在当前分片上查询预订（机票关系由调用方组装）"""
+        async with get_async_session() as session:
+            size = in_chunk_size(Booking, session.get_bind().dialect.name)
+            bookings = []
+            for chunk in chunked(book_refs, size):
+                stmt = select(Booking).where(Booking.book_ref.in_(chunk)).options(raiseload("*"))
+                bookings.extend(await session.scalars(stmt))
+            return bookings
+
+    async def _tickets(self, book_refs: Sequence[str]) -> list[Ticket]:
+        """在当前分片上查询预订的机票，并批量加载机票航班、航班与登机牌"""
+        async with get_async_session() as session:
+            size = in_chunk_size(Ticket, session.get_bind().dialect.name)
+            tickets = []
+            for chunk in chunked(book_refs, size):
+                stmt = select(Ticket).where(Ticket.book_ref.in_(chunk)).options(*ticket_detail_options())
+                tickets.extend(await session.scalars(stmt))
+            return tickets
+
+    @read_routed
+    @query_budget(0, per_shard=4)
+    async def get_many_with_details(self, book_refs: Sequence[str]) -> "list[Booking]":
+        """批量加载预订聚合，见 BookingRepository.get_many_with_details"""
+        book_refs = list(dict.fromkeys(book_refs))
+        if not book_refs:
+            return []
+        results = await async_scatter_gather(self._bookings, book_refs)
+        bookings = [booking for shard_bookings in results for booking in shard_bookings]
+        if not bookings:
+            return []
+        found = [booking.book_ref for booking in bookings]
+        results = await async_scatter_gather(self._tickets, found)
+        return _assemble(bookings, [ticket for shard_tickets in results for ticket in shard_tickets])
+
+    async def get_with_details(self, book_ref: str) -> Booking | None:
+        """加载一个预订的聚合，见 BookingRepository.get_many_with_details"""
+        bookings = await self.get_many_with_details([book_ref])
+        return bookings[0] if bookings else None
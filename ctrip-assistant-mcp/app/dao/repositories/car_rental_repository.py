@@ -1,7 +1,71 @@
 """车租赁数据仓储"""
 
+from sqlalchemy import Select, Update, select, update
+
+from app.dao import fts
+from app.dao.async_base_repository import AsyncBaseRepository
 from app.dao.base_repository import BaseRepository
 from app.dao.models.car_rental_models import CarRental
+from app.dao.projection import row_type
+from app.dao.query_cache import cached_query, invalidate
+from app.dao.session import write_transaction
+
+# 搜索方法返回的轻量行类型
+CarRentalRow = row_type(CarRental)
+
+
+def _search_car_rentals_stmt(
+    location: str | None = None,
+    name: str | None = None,
+    price_tier: str | None = None,
+    booked: int | None = None,
+    limit: int = 50,
+    use_fts: bool = False,
+    match_any: bool = False,
+) -> Select:
+    """构建车租赁搜索语句（同步/异步仓储共用）
+
+    use_fts 为True时位置、名称通过 FTS5 影子表前缀匹配并按 bm25 相关度排序，否则使用 LIKE 模糊匹配。
+    match_any 为True时位置、名称中任一词匹配即可（部分匹配）。
+    """
+    stmt = select(CarRental)
+
+    texts = {"location": location, "name": name}
+    expression = None
+    if use_fts:
+        expression = fts.partial_expression(texts) if match_any else fts.match_expression(texts)
+    if expression:
+        fts_table, condition, rank = fts.match_clause(CarRental.__tablename__, CarRental.id, expression)
+        stmt = stmt.join(fts_table, condition).order_by(rank)
+    else:
+        if location:
+            stmt = stmt.where(fts.like_condition(CarRental.location, location, match_any))
+
+        if name:
+            stmt = stmt.where(fts.like_condition(CarRental.name, name, match_any))
+
+    if price_tier:
+        stmt = stmt.where(CarRental.price_tier == price_tier)
+
+    if booked is not None:
+        stmt = stmt.where(CarRental.booked == booked)
+
+    return stmt.limit(limit)
+
+
+def _update_car_rental_stmt(rental_id: int, **values) -> Update:
+    """构建按ID更新车租赁的语句（同步/异步仓储共用）"""
+    return update(CarRental).where(CarRental.id == rental_id).values(**values)
+
+
+def _dates_values(start_date: str | None, end_date: str | None) -> dict:
+    """只更新传入的日期字段"""
+    values = {}
+    if start_date:
+        values["start_date"] = start_date
+    if end_date:
+        values["end_date"] = end_date
+    return values
 
 
 class CarRentalRepository(BaseRepository[CarRental]):
@@ -10,6 +74,7 @@ class CarRentalRepository(BaseRepository[CarRental]):
     def __init__(self):
         super().__init__(CarRental)
 
+    @cached_query()
     def search_car_rentals(
         self,
         location: str | None = None,
@@ -17,7 +82,9 @@ class CarRentalRepository(BaseRepository[CarRental]):
         price_tier: str | None = None,
         booked: int | None = None,
         limit: int = 50,
-    ) -> list[CarRental]:
+        search_mode: str = "like",
+        match_any: bool = False,
+    ) -> list[CarRentalRow]:
         """
         根据位置、名称、价格层级搜索车租赁
 
@@ -26,27 +93,18 @@ class CarRentalRepository(BaseRepository[CarRental]):
         :param price_tier: 价格层级
         :param booked: 是否已预订
         :param limit: 返回结果的最大数量（默认50）
+        :param search_mode: 匹配方式，"like" 模糊匹配或 "fts" 全文检索（按相关度排序，不可用时回退到 like）
+        :param match_any: 为True时位置、名称中任一词匹配即可（部分匹配）
         :return: 符合条件的车租赁列表
         """
         from app.dao.session import get_session
 
         with get_session() as session:
-            query = session.query(CarRental)
-
-            if location:
-                query = query.filter(CarRental.location.like(f"%{location}%"))
-
-            if name:
-                query = query.filter(CarRental.name.like(f"%{name}%"))
-
-            if price_tier:
-                query = query.filter(CarRental.price_tier == price_tier)
-
-            if booked is not None:
-                query = query.filter(CarRental.booked == booked)
-
-            return query.limit(limit).all()
+            use_fts = search_mode == "fts" and fts.is_ready(session.connection(), CarRental.__tablename__)
+            stmt = _search_car_rentals_stmt(location, name, price_tier, booked, limit, use_fts, match_any)
+            return self._project(session, stmt)
 
+    @write_transaction
     def book_car_rental(self, rental_id: int) -> bool:
         """
         预订租车
@@ -54,16 +112,15 @@ class CarRentalRepository(BaseRepository[CarRental]):
         :param rental_id: 要预订的汽车租赁服务的ID。
         :return: 如果预订成功则返回True，否则返回False
         """
-        from app.dao.session import get_session
+        from app.dao.session import commit_session, get_session
 
         with get_session() as session:
-            rental = session.query(CarRental).filter(CarRental.id == rental_id).first()
-            if rental:
-                rental.booked = 1
-                session.commit()
-                return True
-            return False
+            result = session.execute(_update_car_rental_stmt(rental_id, booked=1))
+            commit_session(session)
+            invalidate(session, CarRental.__tablename__)
+            return result.rowcount > 0
 
+    @write_transaction
     def cancel_car_rental(self, rental_id: int) -> bool:
         """
         根据ID取消汽车租赁服务。
@@ -71,16 +128,15 @@ class CarRentalRepository(BaseRepository[CarRental]):
         :param rental_id: 要取消的汽车租赁服务的ID。
         :return: 如果取消成功则返回True，否则返回False
         """
-        from app.dao.session import get_session
+        from app.dao.session import commit_session, get_session
 
         with get_session() as session:
-            rental = session.query(CarRental).filter(CarRental.id == rental_id).first()
-            if rental:
-                rental.booked = 0
-                session.commit()
-                return True
-            return False
+            result = session.execute(_update_car_rental_stmt(rental_id, booked=0))
+            commit_session(session)
+            invalidate(session, CarRental.__tablename__)
+            return result.rowcount > 0
 
+    @write_transaction
     def update_car_rental_dates(
         self,
         rental_id: int,
@@ -95,28 +151,135 @@ class CarRentalRepository(BaseRepository[CarRental]):
         :param end_date: 汽车租赁的新结束日期。
         :return: 如果更新成功则返回True，否则返回False
         """
-        from app.dao.session import get_session
+        from app.dao.session import commit_session, get_session
+
+        values = _dates_values(start_date, end_date)
+        if not values:
+            return self.exists(id=rental_id)
 
         with get_session() as session:
-            rental = session.query(CarRental).filter(CarRental.id == rental_id).first()
-            if rental:
-                if start_date:
-                    rental.start_date = start_date
-                if end_date:
-                    rental.end_date = end_date
-                session.commit()
-                return True
-            return False
-
-    def get_by_location(self, location: str, limit: int = 50) -> list[CarRental]:
+            result = session.execute(_update_car_rental_stmt(rental_id, **values))
+            commit_session(session)
+            invalidate(session, CarRental.__tablename__)
+            return result.rowcount > 0
+
+    def get_by_location(self, location: str, limit: int = 50) -> list[CarRentalRow]:
         """根据位置查询租车"""
         return self.search_car_rentals(location=location, limit=limit)
 
-    def get_available(self, limit: int = 50) -> list[CarRental]:
+    def get_available(self, limit: int = 50) -> list[CarRentalRow]:
         """获取可预订的租车"""
         return self.search_car_rentals(booked=0, limit=limit)
 
 
+class AsyncCarRentalRepository(AsyncBaseRepository[CarRental]):
+    """车租赁数据仓储（异步）"""
+
+    sync_repository_class = CarRentalRepository
+
+    def __init__(self):
+        super().__init__(CarRental)
+
+    @cached_query()
+    async def search_car_rentals(
+        self,
+        location: str | None = None,
+        name: str | None = None,
+        price_tier: str | None = None,
+        booked: int | None = None,
+        limit: int = 50,
+        search_mode: str = "like",
+        match_any: bool = False,
+    ) -> list[CarRentalRow]:
+        """
+        根据位置、名称、价格层级搜索车租赁
+
+        :param location: 汽车租赁的位置（模糊匹配）
+        :param name: 汽车租赁公司的名称（模糊匹配）
+        :param price_tier: 价格层级
+        :param booked: 是否已预订
+        :param limit: 返回结果的最大数量（默认50）
+        :param search_mode: 匹配方式，"like" 模糊匹配或 "fts" 全文检索（按相关度排序，不可用时回退到 like）
+        :param match_any: 为True时位置、名称中任一词匹配即可（部分匹配）
+        :return: 符合条件的车租赁列表
+        """
+        from app.dao.session import get_async_session
+
+        async with get_async_session() as session:
+            use_fts = search_mode == "fts" and await session.run_sync(
+                lambda s: fts.is_ready(s.connection(), CarRental.__tablename__)
+            )
+            stmt = _search_car_rentals_stmt(location, name, price_tier, booked, limit, use_fts, match_any)
+            return await self._project(session, stmt)
+
+    @write_transaction
+    async def book_car_rental(self, rental_id: int) -> bool:
+        """
+        预订租车
+
+        :param rental_id: 要预订的汽车租赁服务的ID。
+        :return: 如果预订成功则返回True，否则返回False
+        """
+        from app.dao.session import commit_async_session, get_async_session
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_car_rental_stmt(rental_id, booked=1))
+            await commit_async_session(session)
+            invalidate(session, CarRental.__tablename__)
+            return result.rowcount > 0
+
+    @write_transaction
+    async def cancel_car_rental(self, rental_id: int) -> bool:
+        """
+        根据ID取消汽车租赁服务。
+
+        :param rental_id: 要取消的汽车租赁服务的ID。
+        :return: 如果取消成功则返回True，否则返回False
+        """
+        from app.dao.session import commit_async_session, get_async_session
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_car_rental_stmt(rental_id, booked=0))
+            await commit_async_session(session)
+            invalidate(session, CarRental.__tablename__)
+            return result.rowcount > 0
+
+    @write_transaction
+    async def update_car_rental_dates(
+        self,
+        rental_id: int,
+        start_date: str | None = None,
+        end_date: str | None = None,
+    ) -> bool:
+        """
+        根据ID更新汽车租赁的开始和结束日期。
+
+        :param rental_id: 要更新日期的汽车租赁服务的ID。
+        :param start_date: 汽车租赁的新开始日期。
+        :param end_date: 汽车租赁的新结束日期。
+        :return: 如果更新成功则返回True，否则返回False
+        """
+        from app.dao.session import commit_async_session, get_async_session
+
+        values = _dates_values(start_date, end_date)
+        if not values:
+            return await self.exists(id=rental_id)
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_car_rental_stmt(rental_id, **values))
+            await commit_async_session(session)
+            invalidate(session, CarRental.__tablename__)
+            return result.rowcount > 0
+
+    async def get_by_location(self, location: str, limit: int = 50) -> list[CarRentalRow]:
+        """根据位置查询租车"""
+        return await self.search_car_rentals(location=location, limit=limit)
+
+    async def get_available(self, limit: int = 50) -> list[CarRentalRow]:
+        """获取可预订的租车"""
+        return await self.search_car_rentals(booked=0, limit=limit)
+
+
 if __name__ == '__main__':
     car_rental_repo = CarRentalRepository()
     available_rentals = car_rental_repo.get_available()
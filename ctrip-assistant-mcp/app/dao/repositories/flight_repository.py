@@ -1,12 +1,367 @@
 """航班数据仓储"""
-from datetime import datetime
+import asyncio
+from collections.abc import Sequence
+from datetime import date, datetime
+from itertools import product
 from typing import Any
 from zoneinfo import ZoneInfo
 
+from sqlalchemy import Integer, Select, bindparam, delete, select
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from app.dao.async_base_repository import AsyncBaseRepository
 from app.dao.base_repository import BaseRepository
-from app.dao.models.booking_models import BoardingPass, Ticket, TicketFlight
-from app.dao.models.flight_models import AirportData, Flight
-from app.dao.session import get_session
+from app.dao import itinerary, route_graph, seat_availability
+from app.dao.flight_index import FlightIndex, get_flight_index
+from app.dao.models.booking_models import BoardingPass, PassengerItinerary, Ticket, TicketFlight
+from app.dao.models.flight_models import AircraftData, AirportData, Flight, Seat
+from app.dao.projection import model_columns, row_type
+from app.dao.query_budget import query_budget
+from app.dao.query_cache import cached_query, invalidate
+from app.dao.reference_data import AircraftRow, AirportRow, SeatRow, get_reference_data
+from app.dao.route_graph import ConnectionPath, Itinerary
+from app.dao.seat_availability import record_seat_changes
+from app.dao.session import (
+    async_scatter_gather,
+    commit_async_session,
+    commit_session,
+    get_async_session,
+    get_session,
+    locate_shard,
+    read_routed,
+    scatter_gather,
+    shard_routed,
+    write_transaction,
+)
+from app.dao.statement_cache import PreparedStatement, statement_template
+from app.dao.virtual_clock import to_stored, to_virtual, virtual_row
+
+# 搜索方法返回的轻量行类型
+FlightRow = row_type(Flight)
+
+# 机票行程查询依赖的表
+_ITINERARY_TABLES = (
+    Ticket.__tablename__,
+    TicketFlight.__tablename__,
+    Flight.__tablename__,
+    BoardingPass.__tablename__,
+)
+
+
+@statement_template("search_flights")
+def _search_flights_template(
+    by_departure: bool,
+    by_arrival: bool,
+    by_start: bool,
+    by_end: bool,
+    many_departures: bool,
+    many_arrivals: bool,
+) -> Select:
+    """航班搜索语句模板：可选条件的每种组合缓存一条语句，直接选择 FlightRow 的列
+
+    出发或到达为多个机场（城市的全部机场）时用 IN 条件并按计划起飞时间排序，
+    使 limit 内不只是第一个机场的航班。
+    """
+    stmt = select(*model_columns(Flight))
+
+    if many_departures:
+        stmt = stmt.where(Flight.departure_airport.in_(bindparam("departure_airports", expanding=True)))
+    elif by_departure:
+        stmt = stmt.where(Flight.departure_airport == bindparam("departure_airport"))
+
+    if many_arrivals:
+        stmt = stmt.where(Flight.arrival_airport.in_(bindparam("arrival_airports", expanding=True)))
+    elif by_arrival:
+        stmt = stmt.where(Flight.arrival_airport == bindparam("arrival_airport"))
+
+    if by_start:
+        stmt = stmt.where(Flight.scheduled_departure >= bindparam("start_time"))
+
+    if by_end:
+        stmt = stmt.where(Flight.scheduled_departure <= bindparam("end_time"))
+
+    if many_departures or many_arrivals:
+        stmt = stmt.order_by(Flight.scheduled_departure, Flight.flight_id)
+
+    return stmt.limit(bindparam("limit", type_=Integer))
+
+
+def _airport_codes(airports: str | Sequence[str] | None) -> tuple[str, ...]:
+    """机场条件 -> 去重后的机场代码元组（空值忽略）"""
+    if airports is None or isinstance(airports, str):
+        airports = (airports,)
+    return tuple(dict.fromkeys(code for code in airports if code))
+
+
+def _search_flights_stmt(
+    departure_airport: str | Sequence[str] | None = None,
+    arrival_airport: str | Sequence[str] | None = None,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+    limit: int = 20,
+) -> PreparedStatement:
+    """构建航班搜索语句（同步/异步仓储共用），时间边界换算为数据库中的时间"""
+    params = {
+        "start_time": to_stored(start_time),
+        "end_time": to_stored(end_time),
+    }
+    params = {key: value for key, value in params.items() if value}
+    departures, arrivals = _airport_codes(departure_airport), _airport_codes(arrival_airport)
+    for name, codes in (("departure_airport", departures), ("arrival_airport", arrivals)):
+        if len(codes) == 1:
+            params[name] = codes[0]
+        elif codes:
+            params[f"{name}s"] = list(codes)
+    stmt = _search_flights_template(
+        bool(departures),
+        bool(arrivals),
+        "start_time" in params,
+        "end_time" in params,
+        len(departures) > 1,
+        len(arrivals) > 1,
+    )
+    return PreparedStatement(stmt, {**params, "limit": limit})
+
+
+@statement_template("flights_by_ids")
+def _flights_by_ids_template() -> Select:
+    """按航班ID列表取回航班的模板（航班索引检索之后），直接选择 FlightRow 的列"""
+    return select(*model_columns(Flight)).where(Flight.flight_id.in_(bindparam("flight_ids", expanding=True)))
+
+
+def _indexed_search(
+    index: FlightIndex,
+    departure_airport: str | Sequence[str] | None = None,
+    arrival_airport: str | Sequence[str] | None = None,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+    limit: int = 20,
+) -> tuple[list[int], PreparedStatement, bool]:
+    """在航班索引中检索 flight_id，并构建按ID取回航班的语句（同步/异步仓储共用）
+
+    多个机场时逐个机场组合检索，返回的第三项为 True，取回后由 _indexed_rows 按计划起飞时间合并。
+    """
+    pairs = list(product(_airport_codes(departure_airport) or (None,), _airport_codes(arrival_airport) or (None,)))
+    start, end = to_stored(start_time), to_stored(end_time)
+    ids = list(dict.fromkeys(
+        flight_id for departure, arrival in pairs for flight_id in index.search(departure, arrival, start, end, limit)
+    ))
+    return ids, PreparedStatement(_flights_by_ids_template(), {"flight_ids": ids}), len(pairs) > 1
+
+
+def _indexed_rows(rows: list[FlightRow], ids: list[int], merged: bool, limit: int) -> list[FlightRow]:
+    """按索引返回的顺序排列取回的航班；多个机场组合的结果按计划起飞时间排序后取前 limit 个（与 SQL 一致）"""
+    if merged:
+        rows = sorted(rows, key=lambda row: (row.scheduled_departure is None, row.scheduled_departure, row.flight_id))
+        return rows[:limit]
+    position = {flight_id: i for i, flight_id in enumerate(ids)}
+    return sorted(rows, key=lambda row: position[row.flight_id])
+
+
+def _connection_ids(paths: list[ConnectionPath]) -> list[int]:
+    """联程行程中的航班ID（去重）"""
+    return list(dict.fromkeys(flight_id for path in paths for flight_id in path.flight_ids))
+
+
+def _itineraries(paths: list[ConnectionPath], rows: list[FlightRow]) -> list[Itinerary]:
+    """按航线图给出的顺序组装行程，丢弃其中有航班已取消或已删除的行程"""
+    by_id = {row.flight_id: virtual_row(row) for row in rows if row.status not in route_graph.UNAVAILABLE_STATUSES}
+    return [
+        Itinerary(tuple(by_id[flight_id] for flight_id in path.flight_ids))
+        for path in paths
+        if all(flight_id in by_id for flight_id in path.flight_ids)
+    ]
+
+
+@statement_template("fetch_user_flight_information")
+def _user_flight_information_template() -> Select:
+    """乘客机票、航班及座位信息的联表查询模板"""
+    return select(
+        Ticket.ticket_no,
+        Ticket.book_ref,
+        Flight.flight_id,
+        Flight.flight_no,
+        Flight.departure_airport,
+        Flight.arrival_airport,
+        Flight.scheduled_departure,
+        Flight.scheduled_arrival,
+        BoardingPass.seat_no,
+        TicketFlight.fare_conditions,
+    ).join(
+        TicketFlight, Ticket.ticket_no == TicketFlight.ticket_no
+    ).join(
+        Flight, TicketFlight.flight_id == Flight.flight_id
+    ).join(
+        BoardingPass,
+        (BoardingPass.ticket_no == Ticket.ticket_no) &
+        (BoardingPass.flight_id == Flight.flight_id)
+    ).where(
+        Ticket.passenger_id == bindparam("passenger_id")
+    )
+
+
+def _user_flight_information_stmt(passenger_id: str) -> PreparedStatement:
+    """构建乘客机票、航班及座位信息的联表查询语句"""
+    return PreparedStatement(_user_flight_information_template(), {"passenger_id": passenger_id})
+
+
+@statement_template("fetch_user_flight_information_read_model")
+def _itinerary_template() -> Select:
+    """从乘客行程读模型按乘客ID查询的模板（列与联表查询模板一致）"""
+    return select(
+        PassengerItinerary.ticket_no,
+        PassengerItinerary.book_ref,
+        PassengerItinerary.flight_id,
+        PassengerItinerary.flight_no,
+        PassengerItinerary.departure_airport,
+        PassengerItinerary.arrival_airport,
+        PassengerItinerary.scheduled_departure,
+        PassengerItinerary.scheduled_arrival,
+        PassengerItinerary.seat_no,
+        PassengerItinerary.fare_conditions,
+    ).where(
+        PassengerItinerary.passenger_id == bindparam("passenger_id")
+    )
+
+
+def _itinerary_stmt(passenger_id: str) -> PreparedStatement:
+    """构建从乘客行程读模型查询的语句"""
+    return PreparedStatement(_itinerary_template(), {"passenger_id": passenger_id})
+
+
+def _passenger_itinerary_stmt(conn, passenger_id: str) -> PreparedStatement:
+    """乘客行程查询：读模型可用时单表索引查找，否则四表联查"""
+    if itinerary.is_ready(conn):
+        return _itinerary_stmt(passenger_id)
+    return _user_flight_information_stmt(passenger_id)
+
+
+@statement_template("get_ticket_flights")
+def _ticket_flights_template() -> Select:
+    """机票关联航班信息的查询模板"""
+    return select(
+        Ticket, Flight, TicketFlight, BoardingPass
+    ).join(
+        TicketFlight, Ticket.ticket_no == TicketFlight.ticket_no
+    ).join(
+        Flight, TicketFlight.flight_id == Flight.flight_id
+    ).outerjoin(
+        BoardingPass,
+        (BoardingPass.ticket_no == Ticket.ticket_no) &
+        (BoardingPass.flight_id == Flight.flight_id)
+    ).where(
+        Ticket.ticket_no == bindparam("ticket_no")
+    )
+
+
+def _ticket_flights_stmt(ticket_no: str) -> PreparedStatement:
+    """构建机票关联航班信息的查询语句"""
+    return PreparedStatement(_ticket_flights_template(), {"ticket_no": ticket_no})
+
+
+@statement_template("flight_by_id")
+def _flight_by_id_template() -> Select:
+    """按航班ID查询航班的模板"""
+    return select(Flight).where(Flight.flight_id == bindparam("flight_id")).limit(1)
+
+
+def _flight_by_id_stmt(flight_id: int) -> PreparedStatement:
+    """构建按航班ID查询航班的语句"""
+    return PreparedStatement(_flight_by_id_template(), {"flight_id": flight_id})
+
+
+@statement_template("ticket_flight_by_ticket")
+def _ticket_flight_by_ticket_template() -> Select:
+    """按机票号查询机票航班关联的模板"""
+    return select(TicketFlight).where(TicketFlight.ticket_no == bindparam("ticket_no")).limit(1)
+
+
+def _ticket_flight_by_ticket_stmt(ticket_no: str) -> PreparedStatement:
+    """构建按机票号查询机票航班关联的语句"""
+    return PreparedStatement(_ticket_flight_by_ticket_template(), {"ticket_no": ticket_no})
+
+
+@statement_template("boarding_seats_by_ticket")
+def _boarding_seats_template() -> Select:
+    """机票登机牌的 (flight_id, 座位号) 模板（取消机票前登记释放的座位）"""
+    return select(BoardingPass.flight_id, BoardingPass.seat_no).where(BoardingPass.ticket_no == bindparam("ticket_no"))
+
+
+def _boarding_seats_stmt(ticket_no: str) -> PreparedStatement:
+    """构建按机票号查询登机牌座位的语句"""
+    return PreparedStatement(_boarding_seats_template(), {"ticket_no": ticket_no})
+
+
+def _ticket_flight_to_dict(ticket: Ticket, flight: Flight, tf: TicketFlight, bp: BoardingPass | None) -> dict:
+    """将机票关联查询的一行结果转换为字典"""
+    return {
+        "ticket_no": ticket.ticket_no,
+        "passenger_id": ticket.passenger_id,
+        "flight_id": flight.flight_id,
+        "flight_no": flight.flight_no,
+        "departure_airport": flight.departure_airport,
+        "arrival_airport": flight.arrival_airport,
+        "scheduled_departure": to_virtual(flight.scheduled_departure),
+        "scheduled_arrival": to_virtual(flight.scheduled_arrival),
+        "fare_conditions": tf.fare_conditions,
+        "amount": tf.amount,
+        "seat_no": bp.seat_no if bp else None,
+    }
+
+
+def seconds_until_departure(scheduled_departure: datetime | None) -> float | None:
+    """计划起飞时间（数据库中的时间）距当前时间的秒数，按对外展示的时间计算；没有起飞时间时返回None"""
+    departure_time = to_virtual(scheduled_departure)
+    if not departure_time:
+        return None
+    timezone = ZoneInfo("Etc/GMT-3")
+    # 如果 departure_time 是 naive datetime，假设它使用同样的时区
+    if departure_time.tzinfo is None:
+        departure_time = departure_time.replace(tzinfo=timezone)
+    return (departure_time - datetime.now(tz=timezone)).total_seconds()
+
+
+def _check_new_flight(
+    new_flight: Flight | None,
+    new_flight_id: int,
+    min_hours_before_departure: int,
+) -> str | None:
+    """校验改签的目标航班，返回错误消息；校验通过时返回None"""
+    # 1. 查询新航班的信息
+    if not new_flight:
+        return f"提供的新的航班ID {new_flight_id} 无效。"
+
+    # 2. 时间验证：确保新航班起飞时间与当前时间相差不少于3小时
+    time_until = seconds_until_departure(new_flight.scheduled_departure)
+    if time_until is not None and time_until < min_hours_before_departure * 3600:
+        return (
+            f"不允许重新安排到距离当前时间少于 {min_hours_before_departure} 小时的航班。"
+            f"所选航班时间为 {to_virtual(new_flight.scheduled_departure)}。"
+        )
+    return None
+
+
+def ticket_detail_options() -> tuple[LoaderOption, ...]:
+    """机票聚合的加载选项：机票航班（联表加载航班）与登机牌各用一条 IN 语句批量加载，
+    其余关系禁止延迟加载（访问时报错，避免逐条查询）"""
+    return (
+        selectinload(Ticket.ticket_flights).joinedload(TicketFlight.flight),
+        selectinload(Ticket.boarding_passes),
+        raiseload("*"),
+    )
+
+
+def _has_ticket(ticket_no: str) -> bool:
+    """当前分片上是否存在该机票"""
+    with get_session() as session:
+        return session.scalar(select(Ticket.ticket_no).where(Ticket.ticket_no == ticket_no).limit(1)) is not None
+
+
+def _ticket_shard(arguments: dict[str, Any]) -> str | None:
+    """按机票号定位机票所在的分片（写方法没有乘客ID时使用）"""
+    return locate_shard(_has_ticket, arguments["ticket_no"])
+
 
 class FlightRepository(BaseRepository[Flight]):
     """航班数据仓储"""
@@ -14,46 +369,87 @@ class FlightRepository(BaseRepository[Flight]):
     def __init__(self) -> None:
         super().__init__(Flight)
 
+    @cached_query()
     def search_flights(
         self,
-        departure_airport: str | None = None,
-        arrival_airport: str | None = None,
+        departure_airport: str | Sequence[str] | None = None,
+        arrival_airport: str | Sequence[str] | None = None,
         start_time: datetime | None = None,
         end_time: datetime | None = None,
         limit: int = 20,
-    ) -> list[Flight]:
-        """搜索航班"""
+    ) -> list[FlightRow]:
+        """搜索航班（开启 flight_index 时由列式内存索引检索，见 app.dao.flight_index）
 
+        出发、到达机场可以是多个机场代码（如城市的全部机场，见 app.dao.airport_resolver），
+        此时在一条查询中检索并按计划起飞时间排序。
+        """
+
+        index = get_flight_index()
         with get_session() as session:
-            query = session.query(Flight)
+            if index is not None:
+                ids, prepared, merged = _indexed_search(
+                    index, departure_airport, arrival_airport, start_time, end_time, limit,
+                )
+                rows = _indexed_rows(self._fetch_rows(session, prepared), ids, merged, limit) if ids else []
+            else:
+                prepared = _search_flights_stmt(departure_airport, arrival_airport, start_time, end_time, limit)
+                rows = self._fetch_rows(session, prepared)
+            return [virtual_row(row) for row in rows]
+
+    @cached_query()
+    def search_connections(
+        self,
+        departure_airport: str | Sequence[str],
+        arrival_airport: str | Sequence[str],
+        departure_date: date | datetime,
+        max_legs: int | None = None,
+        min_connection_minutes: int | None = None,
+        max_connection_minutes: int | None = None,
+        limit: int = 5,
+    ) -> list[Itinerary]:
+        """搜索当天出发的联程行程（含直飞），按总耗时排序，见 app.dao.route_graph
 
-            if departure_airport:
-                query = query.filter(Flight.departure_airport == departure_airport)
+        Args:
+            departure_airport: 出发机场代码（或城市的全部机场代码）
+            arrival_airport: 到达机场代码（或城市的全部机场代码）
+            departure_date: 出发日期
+            max_legs: 最多航段数，None 时取 route_graph.max_legs
+            min_connection_minutes: 最短衔接时间（分钟），None 时取配置
+            max_connection_minutes: 最长衔接时间（分钟），None 时取配置
+            limit: 返回的行程数
 
-            if arrival_airport:
-                query = query.filter(Flight.arrival_airport == arrival_airport)
+        Returns:
+            行程列表
+        """
+        paths = route_graph.search_connections(
+            departure_airport, arrival_airport, to_stored(route_graph.day_window(departure_date)),
+            max_legs, min_connection_minutes, max_connection_minutes, limit,
+        )
+        ids = _connection_ids(paths)
+        if not ids:
+            return []
+        with get_session() as session:
+            rows = self._fetch_rows(session, PreparedStatement(_flights_by_ids_template(), {"flight_ids": ids}))
+        return _itineraries(paths, rows)
 
-            if start_time:
-                query = query.filter(Flight.scheduled_departure >= start_time)
+    def seats_left(self, flight_ids: Sequence[int]) -> dict[int, dict[str, int]]:
+        """多个航班各舱位的余座数（已占座位位图，见 app.dao.seat_availability）
 
-            if end_time:
-                query = query.filter(Flight.scheduled_departure <= end_time)
+        Args:
+            flight_ids: 航班ID列表
 
-            return query.limit(limit).all()
+        Returns:
+            航班ID -> {舱位: 余座数}；不存在或机型没有座位信息的航班不在结果中
+        """
+        return seat_availability.seats_left(flight_ids)
 
     def get_by_flight_no(self, flight_no: str) -> Flight | None:
         """根据航班号查询航班"""
         return self.get_by(flight_no=flight_no)
 
-    def get_by_airports(self, departure: str, arrival: str, limit: int = 50) -> list[Flight]:
+    def get_by_airports(self, departure: str, arrival: str, limit: int = 50) -> list[FlightRow]:
         """查询指定起降机场的航班"""
-        
-
-        with get_session() as session:
-            return session.query(Flight).filter(
-                Flight.departure_airport == departure,
-                Flight.arrival_airport == arrival,
-            ).limit(limit).all()
+        return self.search_flights(departure_airport=departure, arrival_airport=arrival, limit=limit)
 
     def get_by_status(self, status: str, limit: int = 50) -> list[Flight]:
         """根据状态查询航班"""
@@ -61,35 +457,101 @@ class FlightRepository(BaseRepository[Flight]):
 
 
 class AirportRepository(BaseRepository[AirportData]):
-    """机场数据仓储"""
+    """机场数据仓储（开启 reference_data 时从进程内参考数据查询）"""
 
     def __init__(self) -> None:
         super().__init__(AirportData)
 
-    def get_by_code(self, airport_code: str) -> AirportData | None:
+    def get_by_code(self, airport_code: str) -> AirportRow | None:
         """根据机场代码查询"""
-        return self.get_by(airport_code=airport_code)
+        data = get_reference_data()
+        if data is not None:
+            return data.airport(airport_code)
+        rows = self.project(select(AirportData).where(AirportData.airport_code == airport_code).limit(1))
+        return rows[0] if rows else None
 
-    def search_by_city(self, city: str) -> list[AirportData]:
+    def search_by_city(self, city: str) -> list[AirportRow]:
         """根据城市查询机场"""
-        return self.list(limit=100, city=city)
+        data = get_reference_data()
+        if data is not None:
+            return data.airports_in_city(city, limit=100)
+        return self.project(select(AirportData).where(AirportData.city == city).limit(100))
 
-    def search_by_name(self, keyword: str) -> list[AirportData]:
+    def search_by_name(self, keyword: str) -> list[AirportRow]:
         """根据机场名称搜索"""
-        
+        data = get_reference_data()
+        if data is not None:
+            return data.search_airports(keyword)
+        return self.project(select(AirportData).where(AirportData.airport_name.like(f"%{keyword}%")))
 
-        with get_session() as session:
-            return session.query(AirportData).filter(
-                AirportData.airport_name.like(f"%{keyword}%")
-            ).all()
+
+class AircraftRepository(BaseRepository[AircraftData]):
+    """机型数据仓储（开启 reference_data 时从进程内参考数据查询）"""
+
+    def __init__(self) -> None:
+        super().__init__(AircraftData)
+
+    def get_by_code(self, aircraft_code: str) -> AircraftRow | None:
+        """根据机型代码查询"""
+        data = get_reference_data()
+        if data is not None:
+            return data.aircraft.get(aircraft_code)
+        rows = self.project(select(AircraftData).where(AircraftData.aircraft_code == aircraft_code).limit(1))
+        return rows[0] if rows else None
+
+
+class SeatRepository(BaseRepository[Seat]):
+    """座位数据仓储（开启 reference_data 时从进程内参考数据查询）"""
+
+    def __init__(self) -> None:
+        super().__init__(Seat)
+
+    def get_seat(self, aircraft_code: str, seat_no: str) -> SeatRow | None:
+        """查询机型的单个座位"""
+        data = get_reference_data()
+        if data is not None:
+            seat_map = data.seat_map(aircraft_code)
+            return seat_map.seat(seat_no) if seat_map is not None else None
+        rows = self.project(
+            select(Seat).where(Seat.aircraft_code == aircraft_code, Seat.seat_no == seat_no).limit(1)
+        )
+        return rows[0] if rows else None
+
+    def search_by_aircraft(self, aircraft_code: str, fare_conditions: str | None = None) -> list[SeatRow]:
+        """查询机型的座位，可按舱位过滤，按座位号排序"""
+        data = get_reference_data()
+        if data is not None:
+            seat_map = data.seat_map(aircraft_code)
+            return seat_map.seats(fare_conditions) if seat_map is not None else []
+        stmt = select(Seat).where(Seat.aircraft_code == aircraft_code)
+        if fare_conditions is not None:
+            stmt = stmt.where(Seat.fare_conditions == fare_conditions)
+        return self.project(stmt.order_by(Seat.seat_no))
+
+    def count_by_fare_conditions(self, aircraft_code: str) -> dict[str, int]:
+        """机型各舱位的座位数"""
+        data = get_reference_data()
+        if data is not None:
+            seat_map = data.seat_map(aircraft_code)
+            return seat_map.counts() if seat_map is not None else {}
+        counts = {}
+        for seat in self.search_by_aircraft(aircraft_code):
+            counts[seat.fare_conditions] = counts.get(seat.fare_conditions, 0) + 1
+        return counts
 
 
 class TicketRepository(BaseRepository[Ticket]):
-    """机票数据仓储"""
+    """机票数据仓储
+
+    开启分片（database.shards）时按乘客ID路由到乘客所在的分片；按预订编号、机票号的查询
+    在各分片上执行并合并结果，没有乘客ID的写方法先按机票号定位分片。
+    """
 
     def __init__(self) -> None:
         super().__init__(Ticket)
 
+    @shard_routed("passenger_id")
+    @cached_query(*_ITINERARY_TABLES)
     def fetch_user_flight_information(self, passenger_id: str) -> list[dict[str, Any]]:
         """根据乘客ID获取所有机票信息及其相关联的航班信息和座位分配情况
 
@@ -99,107 +561,74 @@ class TicketRepository(BaseRepository[Ticket]):
         Returns:
             包含每张机票的详情、关联航班的信息及座位分配的字典列表
         """
-        
 
         with get_session() as session:
-            query = session.query(
-                Ticket.ticket_no,
-                Ticket.book_ref,
-                Flight.flight_id,
-                Flight.flight_no,
-                Flight.departure_airport,
-                Flight.arrival_airport,
-                Flight.scheduled_departure,
-                Flight.scheduled_arrival,
-                BoardingPass.seat_no,
-                TicketFlight.fare_conditions,
-            ).join(
-                TicketFlight, Ticket.ticket_no == TicketFlight.ticket_no
-            ).join(
-                Flight, TicketFlight.flight_id == Flight.flight_id
-            ).join(
-                BoardingPass,
-                (BoardingPass.ticket_no == Ticket.ticket_no) &
-                (BoardingPass.flight_id == Flight.flight_id)
-            ).filter(
-                Ticket.passenger_id == passenger_id
-            )
-
-            results = []
-            for row in query.all():
-                results.append({
-                    "ticket_no": row.ticket_no,
-                    "book_ref": row.book_ref,
-                    "flight_id": row.flight_id,
-                    "flight_no": row.flight_no,
-                    "departure_airport": row.departure_airport,
-                    "arrival_airport": row.arrival_airport,
-                    "scheduled_departure": row.scheduled_departure,
-                    "scheduled_arrival": row.scheduled_arrival,
-                    "seat_no": row.seat_no,
-                    "fare_conditions": row.fare_conditions,
-                })
-            return results
+            conn = session.connection()
+            rows = conn.execute(*_passenger_itinerary_stmt(conn, passenger_id))
+            return [virtual_row(row._asdict()) for row in rows]
 
+    @shard_routed("passenger_id")
     def get_by_passenger(self, passenger_id: str) -> list[Ticket]:
         """根据乘客ID查询所有机票"""
         return self.list(limit=1000, passenger_id=passenger_id)
 
+    @shard_routed("passenger_id")
+    @read_routed
+    @query_budget(3)
+    def get_by_passenger_with_details(self, passenger_id: str) -> "list[Ticket]":
+        """根据乘客ID查询所有机票，并批量加载机票航班（含航班）与登机牌
+
+        固定执行3条语句（机票、机票航班联航班、登机牌），与机票数量无关；
+        返回的对象在会话关闭后仍可访问这些关系。
+
+        Args:
+            passenger_id: 乘客ID
+
+        Returns:
+            机票列表（按机票号排序）
+        """
+        stmt = (
+            select(Ticket)
+            .where(Ticket.passenger_id == passenger_id)
+            .options(*ticket_detail_options())
+            .order_by(Ticket.ticket_no)
+        )
+        with get_session() as session:
+            return list(session.scalars(stmt))
+
     def get_by_booking(self, book_ref: str) -> list[Ticket]:
-        """根据预订编号查询机票"""
-        return self.list(limit=100, book_ref=book_ref)
+        """根据预订编号查询机票（一个预订的乘客可能分布在多个分片）"""
+        tickets = scatter_gather(self.list, limit=100, book_ref=book_ref)
+        return [ticket for shard_tickets in tickets for ticket in shard_tickets][:100]
+
+    def _ticket_flights(self, ticket_no: str) -> list[dict]:
+        """在当前分片上查询机票关联的航班信息"""
+        with get_session() as session:
+            rows = session.execute(*_ticket_flights_stmt(ticket_no))
+            return [_ticket_flight_to_dict(*row) for row in rows]
 
+    @cached_query(*_ITINERARY_TABLES)
     def get_ticket_flights(self, ticket_no: str) -> list[dict]:
         """获取机票关联的航班信息"""
-        
-
-        with get_session() as session:
-            query = session.query(
-                Ticket, Flight, TicketFlight, BoardingPass
-            ).join(
-                TicketFlight, Ticket.ticket_no == TicketFlight.ticket_no
-            ).join(
-                Flight, TicketFlight.flight_id == Flight.flight_id
-            ).outerjoin(
-                BoardingPass,
-                (BoardingPass.ticket_no == Ticket.ticket_no) &
-                (BoardingPass.flight_id == Flight.flight_id)
-            ).filter(
-                Ticket.ticket_no == ticket_no
-            )
-
-            results = []
-            for ticket, flight, tf, bp in query.all():
-                results.append({
-                    "ticket_no": ticket.ticket_no,
-                    "passenger_id": ticket.passenger_id,
-                    "flight_id": flight.flight_id,
-                    "flight_no": flight.flight_no,
-                    "departure_airport": flight.departure_airport,
-                    "arrival_airport": flight.arrival_airport,
-                    "scheduled_departure": flight.scheduled_departure,
-                    "scheduled_arrival": flight.scheduled_arrival,
-                    "fare_conditions": tf.fare_conditions,
-                    "amount": tf.amount,
-                    "seat_no": bp.seat_no if bp else None,
-                })
-            return results
+        return [row for rows in scatter_gather(self._ticket_flights, ticket_no) for row in rows]
 
+    @shard_routed(locate=_ticket_shard)
+    @write_transaction
     def update_ticket_flight(self, ticket_no: str, new_flight_id: int) -> bool:
         """更新机票的航班（简单版本，无验证）"""
-        
 
         with get_session() as session:
-            result = session.query(TicketFlight).filter(
-                TicketFlight.ticket_no == ticket_no
-            ).first()
+            result = session.scalars(*_ticket_flight_by_ticket_stmt(ticket_no)).first()
 
             if result:
                 result.flight_id = new_flight_id
-                session.commit()
+                commit_session(session)
+                invalidate(session, TicketFlight.__tablename__)
                 return True
             return False
 
+    @shard_routed("passenger_id", locate=_ticket_shard)
+    @write_transaction
     def update_ticket_to_new_flight(
         self,
         ticket_no: str,
@@ -225,40 +654,16 @@ class TicketRepository(BaseRepository[Ticket]):
         Returns:
             (是否成功, 消息)
         """
-        
 
         with get_session() as session:
-            # 1. 查询新航班的信息
-            new_flight = session.query(Flight).filter(
-                Flight.flight_id == new_flight_id
-            ).first()
-
-            if not new_flight:
-                return False, f"提供的新的航班ID {new_flight_id} 无效。"
-
-            # 2. 时间验证：确保新航班起飞时间与当前时间相差不少于3小时
-            timezone = ZoneInfo("Etc/GMT-3")
-            current_time = datetime.now(tz=timezone)
-            departure_time = new_flight.scheduled_departure
-
-            if departure_time:
-                # 如果 departure_time 是 naive datetime，假设它使用同样的时区
-                if departure_time.tzinfo is None:
-                    departure_time = departure_time.replace(tzinfo=timezone)
-
-                time_until = (departure_time - current_time).total_seconds()
-                min_seconds = min_hours_before_departure * 3600
-
-                if time_until < min_seconds:
-                    return False, (
-                        f"不允许重新安排到距离当前时间少于 {min_hours_before_departure} 小时的航班。"
-                        f"所选航班时间为 {departure_time}。"
-                    )
+            # 1~2. 查询并校验新航班
+            new_flight = session.scalars(*_flight_by_id_stmt(new_flight_id)).first()
+            error = _check_new_flight(new_flight, new_flight_id, min_hours_before_departure)
+            if error:
+                return False, error
 
             # 3. 确认原机票的存在性
-            current_ticket_flight = session.query(TicketFlight).filter(
-                TicketFlight.ticket_no == ticket_no
-            ).first()
+            current_ticket_flight = session.scalars(*_ticket_flight_by_ticket_stmt(ticket_no)).first()
 
             if not current_ticket_flight:
                 return False, f"未找到给定机票号码 {ticket_no} 的现有机票。"
@@ -275,15 +680,19 @@ class TicketRepository(BaseRepository[Ticket]):
 
             # 5. 更新机票对应的航班ID
             current_ticket_flight.flight_id = new_flight_id
-            session.commit()
+            commit_session(session)
+            invalidate(session, TicketFlight.__tablename__)
 
             return True, f"机票 {ticket_no} 已成功更新为新的航班 {new_flight.flight_no}。"
 
+    @shard_routed(locate=_ticket_shard)
+    @write_transaction
     def cancel_ticket(self, ticket_no: str) -> bool:
         """取消机票"""
-        
 
         with get_session() as session:
+            # 登记释放的座位，提交后更新余座位图
+            record_seat_changes(session, released=session.execute(*_boarding_seats_stmt(ticket_no)).all())
             # 删除机票航班关联
             session.query(TicketFlight).filter(
                 TicketFlight.ticket_no == ticket_no
@@ -296,9 +705,224 @@ class TicketRepository(BaseRepository[Ticket]):
             session.query(Ticket).filter(
                 Ticket.ticket_no == ticket_no
             ).delete()
-            session.commit()
+            commit_session(session)
+            invalidate(session, TicketFlight.__tablename__, BoardingPass.__tablename__, Ticket.__tablename__)
             return True
 
+
+class AsyncFlightRepository(AsyncBaseRepository[Flight]):
+    """航班数据仓储（异步）"""
+
+    sync_repository_class = FlightRepository
+
+    def __init__(self) -> None:
+        super().__init__(Flight)
+
+    @cached_query()
+    async def search_flights(
+        self,
+        departure_airport: str | Sequence[str] | None = None,
+        arrival_airport: str | Sequence[str] | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        limit: int = 20,
+    ) -> list[FlightRow]:
+        """搜索航班（开启 flight_index 时由列式内存索引检索，见 app.dao.flight_index）
+
+        出发、到达机场可以是多个机场代码（如城市的全部机场，见 app.dao.airport_resolver），
+        此时在一条查询中检索并按计划起飞时间排序。
+        """
+
+        # 到期检查变更时会读取数据库，在线程池中执行
+        index = await asyncio.to_thread(get_flight_index)
+        async with get_async_session() as session:
+            if index is not None:
+                ids, prepared, merged = _indexed_search(
+                    index, departure_airport, arrival_airport, start_time, end_time, limit,
+                )
+                rows = _indexed_rows(await self._fetch_rows(session, prepared), ids, merged, limit) if ids else []
+            else:
+                prepared = _search_flights_stmt(departure_airport, arrival_airport, start_time, end_time, limit)
+                rows = await self._fetch_rows(session, prepared)
+            return [virtual_row(row) for row in rows]
+
+    @cached_query()
+    async def search_connections(
+        self,
+        departure_airport: str | Sequence[str],
+        arrival_airport: str | Sequence[str],
+        departure_date: date | datetime,
+        max_legs: int | None = None,
+        min_connection_minutes: int | None = None,
+        max_connection_minutes: int | None = None,
+        limit: int = 5,
+    ) -> list[Itinerary]:
+        """搜索当天出发的联程行程，见 FlightRepository.search_connections"""
+
+        # 建图与搜索在线程池中执行
+        paths = await asyncio.to_thread(
+            route_graph.search_connections,
+            departure_airport, arrival_airport, to_stored(route_graph.day_window(departure_date)),
+            max_legs, min_connection_minutes, max_connection_minutes, limit,
+        )
+        ids = _connection_ids(paths)
+        if not ids:
+            return []
+        async with get_async_session() as session:
+            rows = await self._fetch_rows(session, PreparedStatement(_flights_by_ids_template(), {"flight_ids": ids}))
+        return _itineraries(paths, rows)
+
+    async def seats_left(self, flight_ids: Sequence[int]) -> dict[int, dict[str, int]]:
+        """多个航班各舱位的余座数，见 FlightRepository.seats_left"""
+
+        # 未缓存的航班在线程池中加载
+        return await asyncio.to_thread(seat_availability.seats_left, flight_ids)
+
+    async def get_by_flight_no(self, flight_no: str) -> Flight | None:
+        """根据航班号查询航班"""
+        return await self.get_by(flight_no=flight_no)
+
+    async def get_by_airports(self, departure: str, arrival: str, limit: int = 50) -> list[FlightRow]:
+        """查询指定起降机场的航班"""
+        return await self.search_flights(departure_airport=departure, arrival_airport=arrival, limit=limit)
+
+    async def get_by_status(self, status: str, limit: int = 50) -> list[Flight]:
+        """根据状态查询航班"""
+        return await self.list(limit=limit, status=status)
+
+
+class AsyncTicketRepository(AsyncBaseRepository[Ticket]):
+    """机票数据仓储（异步），分片路由同 TicketRepository"""
+
+    sync_repository_class = TicketRepository
+
+    def __init__(self) -> None:
+        super().__init__(Ticket)
+
+    @shard_routed("passenger_id")
+    @cached_query(*_ITINERARY_TABLES)
+    async def fetch_user_flight_information(self, passenger_id: str) -> list[dict[str, Any]]:
+        """根据乘客ID获取所有机票信息及其相关联的航班信息和座位分配情况
+
+        Args:
+            passenger_id: 乘客ID
+
+        Returns:
+            包含每张机票的详情、关联航班的信息及座位分配的字典列表
+        """
+
+        async with get_async_session() as session:
+            conn = await session.connection()
+            ready = await conn.run_sync(itinerary.is_ready)
+            prepared = _itinerary_stmt(passenger_id) if ready else _user_flight_information_stmt(passenger_id)
+            rows = await conn.execute(*prepared)
+            return [virtual_row(row._asdict()) for row in rows]
+
+    @shard_routed("passenger_id")
+    async def get_by_passenger(self, passenger_id: str) -> list[Ticket]:
+        """根据乘客ID查询所有机票"""
+        return await self.list(limit=1000, passenger_id=passenger_id)
+
+    @shard_routed("passenger_id")
+    @read_routed
+    @query_budget(3)
+    async def get_by_passenger_with_details(self, passenger_id: str) -> "list[Ticket]":
+        """根据乘客ID查询所有机票并批量加载机票航班与登机牌，见 TicketRepository.get_by_passenger_with_details"""
+        stmt = (
+            select(Ticket)
+            .where(Ticket.passenger_id == passenger_id)
+            .options(*ticket_detail_options())
+            .order_by(Ticket.ticket_no)
+        )
+        async with get_async_session() as session:
+            return list(await session.scalars(stmt))
+
+    async def get_by_booking(self, book_ref: str) -> list[Ticket]:
+        """根据预订编号查询机票（一个预订的乘客可能分布在多个分片）"""
+        tickets = await async_scatter_gather(self.list, limit=100, book_ref=book_ref)
+        return [ticket for shard_tickets in tickets for ticket in shard_tickets][:100]
+
+    async def _ticket_flights(self, ticket_no: str) -> list[dict]:
+        """在当前分片上查询机票关联的航班信息"""
+        async with get_async_session() as session:
+            rows = await session.execute(*_ticket_flights_stmt(ticket_no))
+            return [_ticket_flight_to_dict(*row) for row in rows]
+
+    @cached_query(*_ITINERARY_TABLES)
+    async def get_ticket_flights(self, ticket_no: str) -> list[dict]:
+        """获取机票关联的航班信息"""
+        return [row for rows in await async_scatter_gather(self._ticket_flights, ticket_no) for row in rows]
+
+    @shard_routed("passenger_id", locate=_ticket_shard)
+    @write_transaction
+    async def update_ticket_to_new_flight(
+        self,
+        ticket_no: str,
+        new_flight_id: int,
+        passenger_id: str | None = None,
+        min_hours_before_departure: int = 3,
+    ) -> tuple[bool, str]:
+        """将用户的机票更新为新的有效航班，步骤同 TicketRepository.update_ticket_to_new_flight
+
+        Args:
+            ticket_no: 要更新的机票编号
+            new_flight_id: 新的航班ID
+            passenger_id: 乘客ID（用于验证，可选）
+            min_hours_before_departure: 起飞前最少小时数，默认3小时
+
+        Returns:
+            (是否成功, 消息)
+        """
+
+        async with get_async_session() as session:
+            # 1~2. 查询并校验新航班
+            new_flight = (await session.scalars(*_flight_by_id_stmt(new_flight_id))).first()
+            error = _check_new_flight(new_flight, new_flight_id, min_hours_before_departure)
+            if error:
+                return False, error
+
+            # 3. 确认原机票的存在性
+            current_ticket_flight = (await session.scalars(*_ticket_flight_by_ticket_stmt(ticket_no))).first()
+
+            if not current_ticket_flight:
+                return False, f"未找到给定机票号码 {ticket_no} 的现有机票。"
+
+            # 4. 确认已登录用户确实拥有此机票
+            if passenger_id:
+                ticket = (await session.scalars(
+                    select(Ticket).where(
+                        Ticket.ticket_no == ticket_no,
+                        Ticket.passenger_id == passenger_id,
+                    ).limit(1)
+                )).first()
+
+                if not ticket:
+                    return False, f"当前登录的乘客ID为 {passenger_id}，不是机票 {ticket_no} 的拥有者。"
+
+            # 5. 更新机票对应的航班ID
+            current_ticket_flight.flight_id = new_flight_id
+            await commit_async_session(session)
+            invalidate(session, TicketFlight.__tablename__)
+
+            return True, f"机票 {ticket_no} 已成功更新为新的航班 {new_flight.flight_no}。"
+
+    @shard_routed(locate=_ticket_shard)
+    @write_transaction
+    async def cancel_ticket(self, ticket_no: str) -> bool:
+        """取消机票"""
+
+        async with get_async_session() as session:
+            # 登记释放的座位，提交后更新余座位图
+            record_seat_changes(session, released=(await session.execute(*_boarding_seats_stmt(ticket_no))).all())
+            # 删除机票航班关联、登机牌和机票
+            await session.execute(delete(TicketFlight).where(TicketFlight.ticket_no == ticket_no))
+            await session.execute(delete(BoardingPass).where(BoardingPass.ticket_no == ticket_no))
+            await session.execute(delete(Ticket).where(Ticket.ticket_no == ticket_no))
+            await commit_async_session(session)
+            invalidate(session, TicketFlight.__tablename__, BoardingPass.__tablename__, Ticket.__tablename__)
+            return True
+
+
 if __name__ == '__main__':
     flight_repo = FlightRepository()
     available_flights = flight_repo.search_flights(departure_airport="SEZ", arrival_airport="SHA")
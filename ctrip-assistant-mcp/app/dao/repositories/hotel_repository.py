@@ -1,8 +1,71 @@
 """酒店数据仓储"""
 
+from sqlalchemy import Select, Update, select, update
 
+from app.dao import fts
+from app.dao.async_base_repository import AsyncBaseRepository
 from app.dao.base_repository import BaseRepository
 from app.dao.models.hotel_models import Hotel
+from app.dao.projection import row_type
+from app.dao.query_cache import cached_query, invalidate
+from app.dao.session import write_transaction
+
+# 搜索方法返回的轻量行类型
+HotelRow = row_type(Hotel)
+
+
+def _search_hotels_stmt(
+    location: str | None = None,
+    name: str | None = None,
+    price_tier: str | None = None,
+    booked: int | None = None,
+    limit: int = 50,
+    use_fts: bool = False,
+    match_any: bool = False,
+) -> Select:
+    """构建酒店搜索语句（同步/异步仓储共用）
+
+    use_fts 为True时位置、名称通过 FTS5 影子表前缀匹配并按 bm25 相关度排序，否则使用 LIKE 模糊匹配。
+    match_any 为True时位置、名称中任一词匹配即可（部分匹配）。
+    """
+    stmt = select(Hotel)
+
+    texts = {"location": location, "name": name}
+    expression = None
+    if use_fts:
+        expression = fts.partial_expression(texts) if match_any else fts.match_expression(texts)
+    if expression:
+        fts_table, condition, rank = fts.match_clause(Hotel.__tablename__, Hotel.id, expression)
+        stmt = stmt.join(fts_table, condition).order_by(rank)
+    else:
+        if location:
+            stmt = stmt.where(fts.like_condition(Hotel.location, location, match_any))
+
+        if name:
+            stmt = stmt.where(fts.like_condition(Hotel.name, name, match_any))
+
+    if price_tier:
+        stmt = stmt.where(Hotel.price_tier == price_tier)
+
+    if booked is not None:
+        stmt = stmt.where(Hotel.booked == booked)
+
+    return stmt.limit(limit)
+
+
+def _update_hotel_stmt(hotel_id: int, **values) -> Update:
+    """构建按ID更新酒店的语句（同步/异步仓储共用）"""
+    return update(Hotel).where(Hotel.id == hotel_id).values(**values)
+
+
+def _dates_values(checkin_date: str | None, checkout_date: str | None) -> dict:
+    """只更新传入的日期字段"""
+    values = {}
+    if checkin_date:
+        values["checkin_date"] = checkin_date
+    if checkout_date:
+        values["checkout_date"] = checkout_date
+    return values
 
 
 class HotelRepository(BaseRepository[Hotel]):
@@ -11,6 +74,7 @@ class HotelRepository(BaseRepository[Hotel]):
     def __init__(self):
         super().__init__(Hotel)
 
+    @cached_query()
     def search_hotels(
         self,
         location: str | None = None,
@@ -18,51 +82,44 @@ class HotelRepository(BaseRepository[Hotel]):
         price_tier: str | None = None,
         booked: int | None = None,
         limit: int = 50,
-    ) -> list[Hotel]:
-        """搜索酒店"""
-        from app.dao.session import get_session 
+        search_mode: str = "like",
+        match_any: bool = False,
+    ) -> list[HotelRow]:
+        """搜索酒店
+
+        search_mode 为 "fts" 时使用全文检索并按相关度排序，FTS5 不可用时回退到 LIKE。
+        match_any 为True时位置、名称中任一词匹配即可（部分匹配）。
+        """
+        from app.dao.session import get_session
 
         with get_session() as session:
-            query = session.query(Hotel)
-
-            if location:
-                query = query.filter(Hotel.location.like(f"%{location}%"))
-
-            if name:
-                query = query.filter(Hotel.name.like(f"%{name}%"))
-
-            if price_tier:
-                query = query.filter(Hotel.price_tier == price_tier)
-
-            if booked is not None:
-                query = query.filter(Hotel.booked == booked)
-
-            return query.limit(limit).all()
+            use_fts = search_mode == "fts" and fts.is_ready(session.connection(), Hotel.__tablename__)
+            stmt = _search_hotels_stmt(location, name, price_tier, booked, limit, use_fts, match_any)
+            return self._project(session, stmt)
 
+    @write_transaction
     def book_hotel(self, hotel_id: int) -> bool:
         """预订酒店"""
-        from app.dao.session import get_session 
+        from app.dao.session import commit_session, get_session
 
         with get_session() as session:
-            hotel = session.query(Hotel).filter(Hotel.id == hotel_id).first()
-            if hotel:
-                hotel.booked = 1
-                session.commit()
-                return True
-            return False
+            result = session.execute(_update_hotel_stmt(hotel_id, booked=1))
+            commit_session(session)
+            invalidate(session, Hotel.__tablename__)
+            return result.rowcount > 0
 
+    @write_transaction
     def cancel_hotel(self, hotel_id: int) -> bool:
         """取消酒店预订"""
-        from app.dao.session import get_session 
+        from app.dao.session import commit_session, get_session
 
         with get_session() as session:
-            hotel = session.query(Hotel).filter(Hotel.id == hotel_id).first()
-            if hotel:
-                hotel.booked = 0
-                session.commit()
-                return True
-            return False
+            result = session.execute(_update_hotel_stmt(hotel_id, booked=0))
+            commit_session(session)
+            invalidate(session, Hotel.__tablename__)
+            return result.rowcount > 0
 
+    @write_transaction
     def update_hotel_dates(
         self,
         hotel_id: int,
@@ -70,27 +127,111 @@ class HotelRepository(BaseRepository[Hotel]):
         checkout_date: str | None = None,
     ) -> bool:
         """更新酒店入住日期"""
-        from app.dao.session import get_session
+        from app.dao.session import commit_session, get_session
+
+        values = _dates_values(checkin_date, checkout_date)
+        if not values:
+            return self.exists(id=hotel_id)
 
         with get_session() as session:
-            hotel = session.query(Hotel).filter(Hotel.id == hotel_id).first()
-            if hotel:
-                if checkin_date:
-                    hotel.checkin_date = checkin_date
-                if checkout_date:
-                    hotel.checkout_date = checkout_date
-                session.commit()
-                return True
-            return False
-
-    def get_by_location(self, location: str, limit: int = 50) -> list[Hotel]:
+            result = session.execute(_update_hotel_stmt(hotel_id, **values))
+            commit_session(session)
+            invalidate(session, Hotel.__tablename__)
+            return result.rowcount > 0
+
+    def get_by_location(self, location: str, limit: int = 50) -> list[HotelRow]:
         """根据位置查询酒店"""
         return self.search_hotels(location=location, limit=limit)
 
-    def get_available(self, limit: int = 50) -> list[Hotel]:
+    def get_available(self, limit: int = 50) -> list[HotelRow]:
         """获取可预订的酒店"""
         return self.search_hotels(booked=0, limit=limit)
 
+
+class AsyncHotelRepository(AsyncBaseRepository[Hotel]):
+    """酒店数据仓储（异步）"""
+
+    sync_repository_class = HotelRepository
+
+    def __init__(self):
+        super().__init__(Hotel)
+
+    @cached_query()
+    async def search_hotels(
+        self,
+        location: str | None = None,
+        name: str | None = None,
+        price_tier: str | None = None,
+        booked: int | None = None,
+        limit: int = 50,
+        search_mode: str = "like",
+        match_any: bool = False,
+    ) -> list[HotelRow]:
+        """搜索酒店
+
+        search_mode 为 "fts" 时使用全文检索并按相关度排序，FTS5 不可用时回退到 LIKE。
+        match_any 为True时位置、名称中任一词匹配即可（部分匹配）。
+        """
+        from app.dao.session import get_async_session
+
+        async with get_async_session() as session:
+            use_fts = search_mode == "fts" and await session.run_sync(
+                lambda s: fts.is_ready(s.connection(), Hotel.__tablename__)
+            )
+            stmt = _search_hotels_stmt(location, name, price_tier, booked, limit, use_fts, match_any)
+            return await self._project(session, stmt)
+
+    @write_transaction
+    async def book_hotel(self, hotel_id: int) -> bool:
+        """预订酒店"""
+        from app.dao.session import commit_async_session, get_async_session
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_hotel_stmt(hotel_id, booked=1))
+            await commit_async_session(session)
+            invalidate(session, Hotel.__tablename__)
+            return result.rowcount > 0
+
+    @write_transaction
+    async def cancel_hotel(self, hotel_id: int) -> bool:
+        """取消酒店预订"""
+        from app.dao.session import commit_async_session, get_async_session
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_hotel_stmt(hotel_id, booked=0))
+            await commit_async_session(session)
+            invalidate(session, Hotel.__tablename__)
+            return result.rowcount > 0
+
+    @write_transaction
+    async def update_hotel_dates(
+        self,
+        hotel_id: int,
+        checkin_date: str | None = None,
+        checkout_date: str | None = None,
+    ) -> bool:
+        """更新酒店入住日期"""
+        from app.dao.session import commit_async_session, get_async_session
+
+        values = _dates_values(checkin_date, checkout_date)
+        if not values:
+            return await self.exists(id=hotel_id)
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_hotel_stmt(hotel_id, **values))
+            await commit_async_session(session)
+            invalidate(session, Hotel.__tablename__)
+            return result.rowcount > 0
+
+    async def get_by_location(self, location: str, limit: int = 50) -> list[HotelRow]:
+        """根据位置查询酒店"""
+        return await self.search_hotels(location=location, limit=limit)
+
+    async def get_available(self, limit: int = 50) -> list[HotelRow]:
+        """获取可预订的酒店"""
+        return await self.search_hotels(booked=0, limit=limit)
+
+
 if __name__ == '__main__':
     hotel_repo = HotelRepository()
     available_hotels = hotel_repo.search_hotels(booked=0, price_tier="Midscale")
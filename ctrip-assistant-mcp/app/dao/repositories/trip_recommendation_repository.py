@@ -1,7 +1,67 @@
 """旅行推荐数据仓储"""
 
+from sqlalchemy import Select, Update, or_, select, update
+
+from app.dao import fts
+from app.dao.async_base_repository import AsyncBaseRepository
 from app.dao.base_repository import BaseRepository
 from app.dao.models.trip_models import TripRecommendation
+from app.dao.projection import row_type
+from app.dao.query_cache import cached_query, invalidate
+from app.dao.session import write_transaction
+
+# 搜索方法返回的轻量行类型
+TripRecommendationRow = row_type(TripRecommendation)
+
+
+def _search_trip_recommendations_stmt(
+    location: str | None = None,
+    name: str | None = None,
+    keywords: str | None = None,
+    booked: int | None = None,
+    limit: int = 50,
+    use_fts: bool = False,
+    match_any: bool = False,
+) -> Select:
+    """构建旅行推荐搜索语句（同步/异步仓储共用）
+
+    use_fts 为True时通过 FTS5 影子表前缀匹配并按 bm25 相关度排序，否则使用 LIKE 模糊匹配。
+    match_any 为True时位置、名称与关键词中任一词匹配即可（部分匹配）。
+    """
+    stmt = select(TripRecommendation)
+    # 支持逗号分隔的多个关键词
+    keyword_list = [k.strip() for k in keywords.split(",")] if keywords else []
+
+    texts = {"location": location, "name": name}
+    expression = None
+    if use_fts:
+        match = fts.partial_expression if match_any else fts.match_expression
+        expression = match(texts, {"keywords": keyword_list})
+    if expression:
+        fts_table, condition, rank = fts.match_clause(
+            TripRecommendation.__tablename__, TripRecommendation.id, expression
+        )
+        stmt = stmt.join(fts_table, condition).order_by(rank)
+    else:
+        if location:
+            stmt = stmt.where(fts.like_condition(TripRecommendation.location, location, match_any))
+
+        if name:
+            stmt = stmt.where(fts.like_condition(TripRecommendation.name, name, match_any))
+
+        if keyword_list:
+            conditions = [fts.like_condition(TripRecommendation.keywords, k, match_any) for k in keyword_list]
+            stmt = stmt.where(or_(*conditions))
+
+    if booked is not None:
+        stmt = stmt.where(TripRecommendation.booked == booked)
+
+    return stmt.limit(limit)
+
+
+def _update_trip_stmt(recommendation_id: int, **values) -> Update:
+    """构建按ID更新旅行推荐的语句（同步/异步仓储共用）"""
+    return update(TripRecommendation).where(TripRecommendation.id == recommendation_id).values(**values)
 
 
 class TripRecommendationRepository(BaseRepository[TripRecommendation]):
@@ -10,6 +70,7 @@ class TripRecommendationRepository(BaseRepository[TripRecommendation]):
     def __init__(self):
         super().__init__(TripRecommendation)
 
+    @cached_query()
     def search_trip_recommendations(
         self,
         location: str | None = None,
@@ -17,79 +78,128 @@ class TripRecommendationRepository(BaseRepository[TripRecommendation]):
         keywords: str | None = None,
         booked: int | None = None,
         limit: int = 50,
-    ) -> list[TripRecommendation]:
-        """搜索旅行推荐"""
+        search_mode: str = "like",
+        match_any: bool = False,
+    ) -> list[TripRecommendationRow]:
+        """搜索旅行推荐
+
+        search_mode 为 "fts" 时使用全文检索并按相关度排序，FTS5 不可用时回退到 LIKE。
+        match_any 为True时位置、名称与关键词中任一词匹配即可（部分匹配）。
+        """
         from app.dao.session import get_session
 
         with get_session() as session:
-            query = session.query(TripRecommendation)
-
-            if location:
-                query = query.filter(TripRecommendation.location.like(f"%{location}%"))
-
-            if name:
-                query = query.filter(TripRecommendation.name.like(f"%{name}%"))
-
-            if keywords:
-                # 支持逗号分隔的多个关键词
-                keyword_list = [k.strip() for k in keywords.split(",")]
-                conditions = [TripRecommendation.keywords.like(f"%{k}%") for k in keyword_list]
-                from sqlalchemy import or_
-                query = query.filter(or_(*conditions))
-
-            if booked is not None:
-                query = query.filter(TripRecommendation.booked == booked)
-
-            return query.limit(limit).all()
+            use_fts = search_mode == "fts" and fts.is_ready(session.connection(), TripRecommendation.__tablename__)
+            stmt = _search_trip_recommendations_stmt(location, name, keywords, booked, limit, use_fts, match_any)
+            return self._project(session, stmt)
 
+    @write_transaction
     def book_excursion(self, recommendation_id: int) -> bool:
         """预订旅行项目"""
-        from app.dao.session import get_session
+        from app.dao.session import commit_session, get_session
 
         with get_session() as session:
-            trip = session.query(TripRecommendation).filter(
-                TripRecommendation.id == recommendation_id
-            ).first()
-            if trip:
-                trip.booked = 1
-                session.commit()
-                return True
-            return False
+            result = session.execute(_update_trip_stmt(recommendation_id, booked=1))
+            commit_session(session)
+            invalidate(session, TripRecommendation.__tablename__)
+            return result.rowcount > 0
 
+    @write_transaction
     def cancel_excursion(self, recommendation_id: int) -> bool:
         """取消旅行项目"""
-        from app.dao.session import get_session
+        from app.dao.session import commit_session, get_session
 
         with get_session() as session:
-            trip = session.query(TripRecommendation).filter(
-                TripRecommendation.id == recommendation_id
-            ).first()
-            if trip:
-                trip.booked = 0
-                session.commit()
-                return True
-            return False
+            result = session.execute(_update_trip_stmt(recommendation_id, booked=0))
+            commit_session(session)
+            invalidate(session, TripRecommendation.__tablename__)
+            return result.rowcount > 0
 
+    @write_transaction
     def update_excursion_details(self, recommendation_id: int, details: str) -> bool:
         """更新旅行项目详情"""
-        from app.dao.session import get_session
+        from app.dao.session import commit_session, get_session
 
         with get_session() as session:
-            trip = session.query(TripRecommendation).filter(
-                TripRecommendation.id == recommendation_id
-            ).first()
-            if trip:
-                trip.details = details
-                session.commit()
-                return True
-            return False
-
-    def get_by_location(self, location: str, limit: int = 50) -> list[TripRecommendation]:
+            result = session.execute(_update_trip_stmt(recommendation_id, details=details))
+            commit_session(session)
+            invalidate(session, TripRecommendation.__tablename__)
+            return result.rowcount > 0
+
+    def get_by_location(self, location: str, limit: int = 50) -> list[TripRecommendationRow]:
         """根据位置查询旅行推荐"""
-        from app.dao.session import get_session
+        return self.search_trip_recommendations(location=location, limit=limit)
 
-        with get_session() as session:
-            return self.search_trip_recommendations(location=location, limit=limit)
+
+class AsyncTripRecommendationRepository(AsyncBaseRepository[TripRecommendation]):
+    """旅行推荐数据仓储（异步）"""
+
+    sync_repository_class = TripRecommendationRepository
+
+    def __init__(self):
+        super().__init__(TripRecommendation)
+
+    @cached_query()
+    async def search_trip_recommendations(
+        self,
+        location: str | None = None,
+        name: str | None = None,
+        keywords: str | None = None,
+        booked: int | None = None,
+        limit: int = 50,
+        search_mode: str = "like",
+        match_any: bool = False,
+    ) -> list[TripRecommendationRow]:
+        """搜索旅行推荐
+
+        search_mode 为 "fts" 时使用全文检索并按相关度排序，FTS5 不可用时回退到 LIKE。
+        match_any 为True时位置、名称与关键词中任一词匹配即可（部分匹配）。
+        """
+        from app.dao.session import get_async_session
+
+        async with get_async_session() as session:
+            use_fts = search_mode == "fts" and await session.run_sync(
+                lambda s: fts.is_ready(s.connection(), TripRecommendation.__tablename__)
+            )
+            stmt = _search_trip_recommendations_stmt(location, name, keywords, booked, limit, use_fts, match_any)
+            return await self._project(session, stmt)
+
+    @write_transaction
+    async def book_excursion(self, recommendation_id: int) -> bool:
+        """预订旅行项目"""
+        from app.dao.session import commit_async_session, get_async_session
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_trip_stmt(recommendation_id, booked=1))
+            await commit_async_session(session)
+            invalidate(session, TripRecommendation.__tablename__)
+            return result.rowcount > 0
+
+    @write_transaction
+    async def cancel_excursion(self, recommendation_id: int) -> bool:
+        """取消旅行项目"""
+        from app.dao.session import commit_async_session, get_async_session
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_trip_stmt(recommendation_id, booked=0))
+            await commit_async_session(session)
+            invalidate(session, TripRecommendation.__tablename__)
+            return result.rowcount > 0
+
+    @write_transaction
+    async def update_excursion_details(self, recommendation_id: int, details: str) -> bool:
+        """更新旅行项目详情"""
+        from app.dao.session import commit_async_session, get_async_session
+
+        async with get_async_session() as session:
+            result = await session.execute(_update_trip_stmt(recommendation_id, details=details))
+            await commit_async_session(session)
+            invalidate(session, TripRecommendation.__tablename__)
+            return result.rowcount > 0
+
+    async def get_by_location(self, location: str, limit: int = 50) -> list[TripRecommendationRow]:
+        """根据位置查询旅行推荐"""
+        return await self.search_trip_recommendations(location=location, limit=limit)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,460 @@
+"""时间展开航线图：多段联程搜索
+
+search_flights 只返回直飞航班。联程搜索在一个出发日期窗口内的航班上建立时间展开图：
+每个航班是一条从 (出发机场, 起飞时间) 到 (到达机场, 到达时间) 的边；在同一机场，到达后
+[min_connection, max_connection] 内起飞的航班可以衔接。每个机场的出发航班按起飞时间排序，
+衔接边不显式存储，由二分查找得到。
+
+搜索为有界的 k 最短路径：部分行程按总耗时的下界出队（A*），下界 = 已用时间 + 剩余航段的最短耗时。
+最短耗时在航线图（每条航线取最短飞行时间）上从目的地反向计算，每段之间至少加上最短衔接时间，
+并限定剩余航段数。下界是一致的，到达目的地的行程按总耗时从小到大依次出队，取前 limit 条即为
+最优的 limit 条行程。行程不重复经过同一机场，展开的部分行程超过 max_expansions 时停止搜索。
+排序：总耗时（首段起飞到末段到达）升序，相同时航段少者、起飞早者优先。
+
+缓存：图按出发日期（数据库中的时间）建立，包含当天起飞的航班与之后 horizon_hours 内的后续航段，
+LRU 保留 max_graphs 个日期。航班的起降机场或时间变更由 flight_index_changes 的序号发现
+（距上次检查超过 check_interval_seconds 时读取一次），变更后重建；航班状态的变化（如取消）
+不记录序号，因此图最多保留 ttl_seconds。图中只有 flight_id 与时间，仓储按 flight_id 取回最新的
+航班行，并丢弃其中有航班已取消或已删除的行程。
+
+配置见 route_graph（均有默认值）。
+
+用法：
+    python -m app.dao.route_graph PEK SHA 2024-05-09        # 打印联程搜索结果与图的规模
+"""
+import calendar
+import heapq
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from itertools import product
+from typing import Any
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.engine import Connection
+
+from app.dao.flight_index import read_change_seq
+from app.dao.models.flight_models import Flight
+from app.dao.session import get_read_engine
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+# 不参与联程的航班状态
+UNAVAILABLE_STATUSES = ("Cancelled",)
+
+_DEFAULTS = {
+    "max_legs": 3,
+    "min_connection_minutes": 45,
+    "max_connection_minutes": 360,
+    "horizon_hours": 24,
+    "max_expansions": 20_000,
+    "max_graphs": 8,
+    "ttl_seconds": 300,
+    "check_interval_seconds": 1,
+}
+
+# 每个图缓存的下界表数量上限（目的地、航段数与最短衔接时间的组合）
+_MAX_BOUNDS = 256
+# 计算下界时一轮逐条松弛的航线数上限
+_MAX_RELAXATIONS = 10_000
+
+_INFINITY = float("inf")
+
+
+def _settings() -> dict:
+    return {**_DEFAULTS, **(CONFIG.get("route_graph") or {})}
+
+
+def _epoch(value: datetime) -> int:
+    """航班时间 -> 秒数（带时区时按时区换算，不带时区时按 UTC 处理）"""
+    if value.tzinfo is not None:
+        return int(value.timestamp())
+    return calendar.timegm(value.timetuple())
+
+
+@dataclass(frozen=True, slots=True)
+class ConnectionPath:
+    """图中搜索到的一条行程"""
+    flight_ids: tuple[int, ...]
+    elapsed_seconds: int
+
+
+@dataclass(frozen=True, slots=True)
+class Itinerary:
+    """联程行程：按顺序的航段（FlightRow）"""
+    legs: tuple[Any, ...]
+
+    @property
+    def departure(self) -> datetime:
+        return self.legs[0].scheduled_departure
+
+    @property
+    def arrival(self) -> datetime:
+        return self.legs[-1].scheduled_arrival
+
+    def to_dict(self) -> dict[str, Any]:
+        connections = [
+            {
+                "airport": previous.arrival_airport,
+                "minutes": round((leg.scheduled_departure - previous.scheduled_arrival).total_seconds() / 60),
+            }
+            for previous, leg in zip(self.legs, self.legs[1:])
+        ]
+        return {
+            "departure_airport": self.legs[0].departure_airport,
+            "arrival_airport": self.legs[-1].arrival_airport,
+            "departure": self.departure,
+            "arrival": self.arrival,
+            "duration_minutes": round((self.arrival - self.departure).total_seconds() / 60),
+            "stops": len(self.legs) - 1,
+            "connections": connections,
+            "legs": [leg.to_dict() for leg in self.legs],
+        }
+
+
+class RouteGraph:
+    """一个出发日期窗口内的时间展开航线图（构建后只读，由多个线程共享）"""
+
+    __slots__ = (
+        "day_start", "seq", "built_at",
+        "flight_ids", "departures", "arrivals", "origins", "destinations", "first_day",
+        "by_airport", "by_route", "route_minimum", "inbound", "outbound_minimum", "_bounds", "_bounds_lock",
+    )
+
+    def __init__(self, day_start: datetime, seq: int | None, rows: list[tuple]) -> None:
+        """
+        Args:
+            day_start: 出发日期的开始时间（数据库中的时间）
+            seq: 构建时的变更序号（变更表不存在时为 None）
+            rows: (flight_id, 出发机场, 到达机场, 起飞秒数, 到达秒数, 是否当天起飞)
+        """
+        self.day_start = day_start
+        self.seq = seq
+        self.built_at = time.monotonic()
+        rows = sorted(rows, key=lambda row: (row[3], row[0]))
+        self.flight_ids = array("q", (row[0] for row in rows))
+        self.origins = [row[1] for row in rows]
+        self.destinations = [row[2] for row in rows]
+        self.departures = array("q", (row[3] for row in rows))
+        self.arrivals = array("q", (row[4] for row in rows))
+        self.first_day = bytes(bool(row[5]) for row in rows)
+
+        # 机场 -> (起飞秒数数组, 航班下标数组)，按起飞时间排序
+        grouped: dict[str, list[int]] = {}
+        for i, origin in enumerate(self.origins):
+            grouped.setdefault(origin, []).append(i)
+        self.by_airport = {
+            airport: (array("q", (self.departures[i] for i in indices)), array("l", indices))
+            for airport, indices in grouped.items()
+        }
+        # (出发机场, 到达机场) -> (起飞秒数数组, 航班下标数组)，最后一个航段只需查找飞往目的地的航班
+        routes: dict[tuple[str, str], list[int]] = {}
+        for i, route in enumerate(zip(self.origins, self.destinations)):
+            routes.setdefault(route, []).append(i)
+        self.by_route = {
+            route: (array("q", (self.departures[i] for i in indices)), array("l", indices))
+            for route, indices in routes.items()
+        }
+        # (出发机场, 到达机场) -> 最短飞行秒数
+        self.route_minimum: dict[tuple[str, str], int] = {
+            route: min(self.arrivals[i] - self.departures[i] for i in indices)
+            for route, indices in routes.items()
+        }
+        # 到达机场 -> [(出发机场, 最短飞行秒数)]，用于从目的地反向计算下界；出发机场 -> 最短飞行秒数
+        self.inbound: dict[str, list[tuple[str, int]]] = {}
+        self.outbound_minimum: dict[str, int] = {}
+        for (origin, arrival), duration in self.route_minimum.items():
+            self.inbound.setdefault(arrival, []).append((origin, duration))
+            if duration < self.outbound_minimum.get(origin, _INFINITY):
+                self.outbound_minimum[origin] = duration
+        self._bounds: OrderedDict[tuple, list[dict[str, int]]] = OrderedDict()
+        self._bounds_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, conn: Connection, day_start: datetime, horizon: timedelta, seq: int | None) -> "RouteGraph":
+        """读取 [day_start, day_start + 1天 + horizon) 内起飞的可用航班并建图"""
+        stmt = select(
+            Flight.flight_id,
+            Flight.departure_airport,
+            Flight.arrival_airport,
+            Flight.scheduled_departure,
+            Flight.scheduled_arrival,
+            (Flight.scheduled_departure < bindparam("day_end")).label("first_day"),
+        ).where(
+            Flight.scheduled_departure >= bindparam("start"),
+            Flight.scheduled_departure < bindparam("end"),
+            Flight.scheduled_arrival.is_not(None),
+            Flight.status.not_in(UNAVAILABLE_STATUSES),
+        )
+        day_end = day_start + timedelta(days=1)
+        rows = []
+        for flight_id, origin, destination, departure, arrival, first_day in conn.execute(
+            stmt, {"start": day_start, "day_end": day_end, "end": day_end + horizon}
+        ):
+            departure, arrival = _epoch(departure), _epoch(arrival)
+            if origin and destination and origin != destination and arrival > departure:
+                rows.append((flight_id, origin, destination, departure, arrival, first_day))
+        return cls(day_start, seq, rows)
+
+    def __len__(self) -> int:
+        return len(self.flight_ids)
+
+    def lower_bounds(self, destination: str, max_legs: int, min_connection: int) -> list[dict[str, int]]:
+        """到目的地的最短耗时下界：bounds[r][机场] 为最多 r 个航段时的下界（不含出发前的衔接时间）
+
+        从目的地沿到达航线反向松弛，每轮只从上一轮下界变小的机场出发。航线稠密、一轮需要松弛的
+        航线超过 _MAX_RELAXATIONS 条时，第二轮起改用较弱的下界：机场的最短出发航段 + 最短衔接时间 +
+        上一轮的最小下界。两种下界都满足一致性，搜索结果不变。结果按参数缓存在图上，
+        搜索只用到 bounds[0..max_legs-1]。
+        """
+        key = (destination, max_legs, min_connection)
+        with self._bounds_lock:
+            bounds = self._bounds.get(key)
+            if bounds is not None:
+                self._bounds.move_to_end(key)
+                return bounds
+
+        bounds = [{destination: 0}]
+        changed = {destination: 0}
+        for _ in range(max_legs - 1):
+            previous = bounds[-1]
+            current = dict(previous)
+            improved = {}
+            # 第一轮只松弛飞往目的地的航线，总是精确计算（较弱的下界依赖直飞航段的下界）
+            if len(bounds) == 1 or sum(len(self.inbound.get(arrival, ())) for arrival in changed) <= _MAX_RELAXATIONS:
+                relaxations = (
+                    (origin, duration + (0 if arrival == destination else min_connection + rest))
+                    for arrival, rest in changed.items()
+                    for origin, duration in self.inbound.get(arrival, ())
+                )
+            else:
+                nearest = min((rest for airport, rest in previous.items() if airport != destination), default=None)
+                relaxations = () if nearest is None else (
+                    (origin, duration + min_connection + nearest) for origin, duration in self.outbound_minimum.items()
+                )
+            for origin, cost in relaxations:
+                if origin != destination and cost < current.get(origin, _INFINITY):
+                    current[origin] = improved[origin] = cost
+            bounds.append(current)
+            changed = improved
+
+        with self._bounds_lock:
+            self._bounds[key] = bounds
+            while len(self._bounds) > _MAX_BOUNDS:
+                self._bounds.popitem(last=False)
+        return bounds
+
+    def search(
+        self,
+        origin: str,
+        destination: str,
+        max_legs: int,
+        min_connection: int,
+        max_connection: int,
+        limit: int,
+        max_expansions: int,
+    ) -> list[ConnectionPath]:
+        """按总耗时搜索前 limit 条行程（首段在当天起飞）
+
+        Args:
+            origin: 出发机场
+            destination: 到达机场
+            max_legs: 最多航段数
+            min_connection: 最短衔接秒数
+            max_connection: 最长衔接秒数
+            limit: 返回的行程数
+            max_expansions: 最多展开的部分行程数
+
+        Returns:
+            行程列表，按总耗时、航段数与起飞时间排序
+        """
+        if origin == destination or limit <= 0 or max_legs <= 0 or origin not in self.by_airport:
+            return []
+        bounds = self.lower_bounds(destination, max_legs, min_connection)
+        departures, arrivals, destinations = self.departures, self.arrivals, self.destinations
+
+        # 堆元素：(下界, 航段数, 首段起飞秒数, 路径上的航班下标)；bounds[0] 只有目的地，
+        # 航段用完仍未到达的部分行程在下界表中查不到，不入堆
+        heap: list[tuple[int, int, int, tuple[int, ...]]] = []
+        rest_bounds = bounds[max_legs - 1]
+        for i in self.by_airport[origin][1]:
+            if not self.first_day[i]:
+                continue
+            elapsed, airport = arrivals[i] - departures[i], destinations[i]
+            if airport == destination:
+                heap.append((elapsed, 1, departures[i], (i,)))
+            elif (rest := rest_bounds.get(airport)) is not None:
+                heap.append((elapsed + min_connection + rest, 1, departures[i], (i,)))
+        heapq.heapify(heap)
+
+        results = []
+        expansions = 0
+        while heap and len(results) < limit:
+            cost, legs, first_departure, path = heapq.heappop(heap)
+            last = path[-1]
+            airport = destinations[last]
+            if airport == destination:
+                results.append(ConnectionPath(tuple(self.flight_ids[i] for i in path), cost))
+                continue
+            expansions += 1
+            if expansions > max_expansions:
+                logger.info("联程搜索 %s -> %s 展开超过 %d 次，提前结束", origin, destination, max_expansions)
+                break
+            # 最后一个航段只能飞往目的地
+            final = legs + 1 == max_legs
+            connecting = self.by_route.get((airport, destination)) if final else self.by_airport.get(airport)
+            if connecting is None:
+                continue
+            visited = {self.origins[path[0]], *(destinations[i] for i in path)}
+            rest_bounds = bounds[max_legs - legs - 1]
+            times, indices = connecting
+            ready = arrivals[last]
+            for position in range(bisect_left(times, ready + min_connection), bisect_right(times, ready + max_connection)):
+                j = indices[position]
+                next_airport = destinations[j]
+                if next_airport in visited:
+                    continue
+                elapsed = arrivals[j] - first_departure
+                if next_airport == destination:
+                    heapq.heappush(heap, (elapsed, legs + 1, first_departure, (*path, j)))
+                elif (rest := rest_bounds.get(next_airport)) is not None:
+                    heapq.heappush(heap, (elapsed + min_connection + rest, legs + 1, first_departure, (*path, j)))
+        return results
+
+    def footprint(self) -> dict[str, int]:
+        """图的规模"""
+        return {"flights": len(self), "airports": len(self.by_airport), "routes": len(self.route_minimum)}
+
+
+_graphs: OrderedDict[datetime, tuple[RouteGraph, float]] = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "builds": 0, "checks": 0}
+
+
+def _build(conn: Connection, day_start: datetime, seq: int | None) -> RouteGraph:
+    """建图并记录日志"""
+    started = time.perf_counter()
+    graph = RouteGraph.build(conn, day_start, timedelta(hours=float(_settings()["horizon_hours"])), seq)
+    _stats["builds"] += 1
+    logger.info("联程航线图已构建: %s %s，耗时 %.3fs", day_start, graph.footprint(), time.perf_counter() - started)
+    return graph
+
+
+def get_route_graph(day_start: datetime) -> RouteGraph:
+    """获取出发日期的航线图，不存在、过期或航班有变更时（重新）构建
+
+    Args:
+        day_start: 出发日期的开始时间（数据库中的时间）
+    """
+    settings = _settings()
+    now = time.monotonic()
+    with _lock:
+        cached = _graphs.get(day_start)
+        if cached is not None:
+            graph, checked_at = cached
+            _graphs.move_to_end(day_start)
+            if now - graph.built_at < float(settings["ttl_seconds"]) and (
+                now - checked_at < float(settings["check_interval_seconds"])
+            ):
+                _stats["hits"] += 1
+                return graph
+        with get_read_engine().connect() as conn:
+            seq = read_change_seq(conn)
+            _stats["checks"] += 1
+            if cached is None or now - graph.built_at >= float(settings["ttl_seconds"]) or seq != graph.seq:
+                graph = _build(conn, day_start, seq)
+            else:
+                _stats["hits"] += 1
+        _graphs[day_start] = (graph, time.monotonic())
+        _graphs.move_to_end(day_start)
+        while len(_graphs) > int(settings["max_graphs"]):
+            _graphs.popitem(last=False)
+        return graph
+
+
+def search_connections(
+    departure_airport: str | Sequence[str],
+    arrival_airport: str | Sequence[str],
+    day_start: datetime,
+    max_legs: int | None = None,
+    min_connection_minutes: int | None = None,
+    max_connection_minutes: int | None = None,
+    limit: int = 5,
+) -> list[ConnectionPath]:
+    """在出发日期的航线图中搜索联程行程，参数为 None 时取 route_graph 配置
+
+    出发或到达为多个机场（城市的全部机场）时逐个机场组合搜索，合并后按总耗时取前 limit 条。
+
+    Args:
+        departure_airport: 出发机场代码（或多个机场代码）
+        arrival_airport: 到达机场代码（或多个机场代码）
+        day_start: 出发日期的开始时间（数据库中的时间）
+        max_legs: 最多航段数（1 即只有直飞）
+        min_connection_minutes: 最短衔接时间（分钟）
+        max_connection_minutes: 最长衔接时间（分钟）
+        limit: 返回的行程数
+
+    Returns:
+        行程列表（flight_id 与总耗时），按总耗时排序
+    """
+    settings = _settings()
+    max_legs = int(max_legs or settings["max_legs"])
+    min_connection = int(settings["min_connection_minutes"] if min_connection_minutes is None else min_connection_minutes)
+    max_connection = int(settings["max_connection_minutes"] if max_connection_minutes is None else max_connection_minutes)
+    if min_connection > max_connection:
+        raise ValueError(f"最短衔接时间 {min_connection} 分钟大于最长衔接时间 {max_connection} 分钟")
+    graph = get_route_graph(day_start)
+    departures = (departure_airport,) if isinstance(departure_airport, str) else tuple(departure_airport)
+    arrivals = (arrival_airport,) if isinstance(arrival_airport, str) else tuple(arrival_airport)
+    pairs = [(departure, arrival) for departure, arrival in product(departures, arrivals) if departure != arrival]
+    paths = [
+        path
+        for departure, arrival in pairs
+        for path in graph.search(
+            departure, arrival, max_legs,
+            min_connection * 60, max_connection * 60, limit, int(settings["max_expansions"]),
+        )
+    ]
+    if len(pairs) > 1:
+        paths.sort(key=lambda path: (path.elapsed_seconds, len(path.flight_ids)))
+    return paths[:limit]
+
+
+def day_window(departure_date: date | datetime) -> datetime:
+    """出发日期 -> 图的键：当天的开始时间"""
+    if isinstance(departure_date, datetime):
+        departure_date = departure_date.date()
+    return datetime.combine(departure_date, datetime.min.time())
+
+
+def reset_route_graphs() -> None:
+    """丢弃所有缓存的航线图"""
+    with _lock:
+        _graphs.clear()
+
+
+def route_graph_report() -> dict[str, Any]:
+    """缓存的航线图与命中统计"""
+    with _lock:
+        graphs = {day.isoformat(): graph.footprint() for day, (graph, _) in _graphs.items()}
+    return {"graphs": graphs, **_stats}
+
+
+if __name__ == '__main__':
+    # 仓储使用的是 app.dao.route_graph 模块（而非 __main__）中缓存的图
+    from app.dao import route_graph
+    from app.dao.repositories.flight_repository import FlightRepository
+
+    origin, destination, day = sys.argv[1], sys.argv[2], date.fromisoformat(sys.argv[3])
+    for itinerary in FlightRepository().search_connections(origin, destination, day):
+        summary = itinerary.to_dict()
+        route = " -> ".join([summary["departure_airport"], *(c["airport"] for c in summary["connections"]), summary["arrival_airport"]])
+        print(f"{summary['departure']} - {summary['arrival']}  {summary['duration_minutes']} 分钟  {route}")
+    print(route_graph.route_graph_report())
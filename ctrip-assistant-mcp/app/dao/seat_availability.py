@@ -0,0 +1,350 @@
+"""航班余座：按舱位的已占座位位图
+
+座位（seats，按机型）与登机牌（boarding_passes，按航班）中已有余座所需的数据。本模块为每个航班
+维护一份已占座位位图：机型的座位按舱位分组，每个舱位内的座位对应一个比特位（SeatLayout），
+航班的每个舱位一个 int 位图，余座 = 舱位座位数 - 位图中置位的个数（int.bit_count）。
+
+- 懒加载：查询时只加载未缓存的航班，一次调用的所有航班合并为按 IN 分块的查询
+  （航班机型一条，登机牌在每个分片上一条，开启分片时各分片的位图按位或合并）；
+- 写入更新：删除或新增登机牌的仓储写方法在提交前用 record_seat_changes 登记座位变化，
+  事务提交后置位或清除已加载航班的位图，回滚则丢弃；
+- 其他进程或绕过仓储的写入不会通知本进程，位图最多保留 ttl_seconds，LRU 保留 max_flights 个航班。
+
+座位布局优先取进程内参考数据（reference_data）的座位表，未开启时查询 seats 表并缓存 ttl_seconds。
+配置见 seat_availability（均有默认值）。
+
+用法：
+    python -m app.dao.seat_availability 1 2 3        # 打印航班各舱位的余座
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.dao.bulk import chunked, in_chunk_size
+from app.dao.models.booking_models import BoardingPass
+from app.dao.models.flight_models import Flight, Seat
+from app.dao.reference_data import SeatMap, get_reference_data
+from app.dao.session import get_session, scatter_gather
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+# 会话 info 中登记的待提交座位变化：[(flight_id, seat_no, 是否占用)]
+_PENDING_KEY = "seat_availability_pending_changes"
+
+_DEFAULTS = {
+    "annotate_search_results": True,
+    "max_flights": 100_000,
+    "ttl_seconds": 300,
+}
+
+
+def _settings() -> dict:
+    return {**_DEFAULTS, **(CONFIG.get("seat_availability") or {})}
+
+
+@dataclass(frozen=True, slots=True)
+class SeatLayout:
+    """一个机型的座位在位图中的位置
+
+    Attributes:
+        aircraft_code: 机型代码
+        fare_names: 该机型的舱位（按首次出现的顺序）
+        capacity: 与 fare_names 对齐的各舱位座位数
+        positions: 座位号 -> (舱位下标, 比特位)
+    """
+    aircraft_code: str
+    fare_names: tuple[str, ...]
+    capacity: tuple[int, ...]
+    positions: dict[str, tuple[int, int]]
+
+    @classmethod
+    def from_seats(cls, aircraft_code: str, seats: Iterable[tuple[str, str]]) -> "SeatLayout":
+        """由 (座位号, 舱位) 建立布局，座位按座位号排序后在舱位内依次编号"""
+        fare_names: list[str] = []
+        counts: list[int] = []
+        positions = {}
+        for seat_no, fare_conditions in sorted(seats):
+            if fare_conditions not in fare_names:
+                fare_names.append(fare_conditions)
+                counts.append(0)
+            code = fare_names.index(fare_conditions)
+            positions[seat_no] = (code, counts[code])
+            counts[code] += 1
+        return cls(aircraft_code, tuple(fare_names), tuple(counts), positions)
+
+    @classmethod
+    def from_seat_map(cls, seat_map: SeatMap) -> "SeatLayout":
+        """由参考数据的座位表建立布局"""
+        return cls.from_seats(
+            seat_map.aircraft_code,
+            ((seat_no, seat_map.fare_names[code]) for seat_no, code in zip(seat_map.seat_nos, seat_map.fare_codes)),
+        )
+
+
+class FlightSeats:
+    """一个航班的已占座位位图（每个舱位一个 int）"""
+
+    __slots__ = ("flight_id", "layout", "occupied", "loaded_at")
+
+    def __init__(self, flight_id: int, layout: SeatLayout, seat_nos: Iterable[str]) -> None:
+        self.flight_id = flight_id
+        self.layout = layout
+        self.occupied = [0] * len(layout.fare_names)
+        self.loaded_at = time.monotonic()
+        for seat_no in seat_nos:
+            self.mark(seat_no, True)
+
+    def mark(self, seat_no: str, occupied: bool) -> None:
+        """置位或清除座位（布局中没有的座位号忽略）"""
+        position = self.layout.positions.get(seat_no)
+        if position is None:
+            return
+        code, bit = position
+        if occupied:
+            self.occupied[code] |= 1 << bit
+        else:
+            self.occupied[code] &= ~(1 << bit)
+
+    def is_free(self, seat_no: str) -> bool:
+        """座位是否空闲（布局中没有的座位号视为不可用）"""
+        position = self.layout.positions.get(seat_no)
+        if position is None:
+            return False
+        code, bit = position
+        return not self.occupied[code] >> bit & 1
+
+    def seats_left(self) -> dict[str, int]:
+        """各舱位的余座数"""
+        return {
+            name: capacity - bitmap.bit_count()
+            for name, capacity, bitmap in zip(self.layout.fare_names, self.layout.capacity, self.occupied)
+        }
+
+    def free_seats(self, fare_conditions: str | None = None) -> list[str]:
+        """空闲座位号（按座位号排序），可按舱位过滤"""
+        return sorted(seat_no for seat_no in self.layout.positions if self.is_free(seat_no) and (
+            fare_conditions is None or self.layout.fare_names[self.layout.positions[seat_no][0]] == fare_conditions
+        ))
+
+
+_flights: OrderedDict[int, FlightSeats] = OrderedDict()
+# 机型代码 -> (布局, 建立时间, 来源的参考数据座位表；查询 seats 表建立时为 None)
+_layouts: dict[str, tuple[SeatLayout | None, float, SeatMap | None]] = {}
+_lock = threading.Lock()
+# 正在进行的加载数，以及加载期间提交过座位变化的航班（这些航班的加载结果不缓存）
+_loading = 0
+_changed_while_loading: set[int] = set()
+_stats = {"hits": 0, "loads": 0, "loaded_flights": 0, "changes": 0}
+
+
+def _fresh(entry: FlightSeats | None, now: float, ttl: float) -> bool:
+    return entry is not None and now - entry.loaded_at < ttl
+
+
+def _aircraft_codes(flight_ids: Sequence[int]) -> dict[int, str]:
+    """航班ID -> 机型代码（主库）"""
+    with get_session() as session:
+        size = in_chunk_size(Flight, session.get_bind().dialect.name)
+        return {
+            flight_id: aircraft_code
+            for chunk in chunked(flight_ids, size)
+            for flight_id, aircraft_code in session.execute(
+                select(Flight.flight_id, Flight.aircraft_code).where(Flight.flight_id.in_(chunk))
+            )
+        }
+
+
+def _boarded_seats(flight_ids: Sequence[int]) -> list[tuple[int, str]]:
+    """当前分片上航班的 (flight_id, 座位号)"""
+    with get_session() as session:
+        size = in_chunk_size(BoardingPass, session.get_bind().dialect.name)
+        return [
+            (flight_id, seat_no)
+            for chunk in chunked(flight_ids, size)
+            for flight_id, seat_no in session.execute(
+                select(BoardingPass.flight_id, BoardingPass.seat_no).where(
+                    BoardingPass.flight_id.in_(chunk), BoardingPass.seat_no.is_not(None)
+                )
+            )
+        ]
+
+
+def _seat_layouts(aircraft_codes: set[str], now: float, ttl: float) -> dict[str, SeatLayout | None]:
+    """机型的座位布局：优先由参考数据的座位表建立（座位表重新加载后重建），否则查询 seats 表（缓存 ttl_seconds）"""
+    reference = get_reference_data()
+    layouts = {}
+    if reference is not None:
+        for code in aircraft_codes:
+            seat_map = reference.seat_map(code)
+            cached = _layouts.get(code)
+            if cached is None or cached[2] is not seat_map:
+                cached = _layouts[code] = (SeatLayout.from_seat_map(seat_map) if seat_map else None, now, seat_map)
+            layouts[code] = cached[0]
+        return layouts
+
+    for code in aircraft_codes:
+        cached = _layouts.get(code)
+        if cached is not None and cached[2] is None and now - cached[1] < ttl:
+            layouts[code] = cached[0]
+    missing = sorted(aircraft_codes - layouts.keys())
+    if missing:
+        seats: dict[str, list[tuple[str, str]]] = {code: [] for code in missing}
+        with get_session() as session:
+            for aircraft_code, seat_no, fare_conditions in session.execute(
+                select(Seat.aircraft_code, Seat.seat_no, Seat.fare_conditions).where(Seat.aircraft_code.in_(missing))
+            ):
+                seats[aircraft_code].append((seat_no, fare_conditions))
+        for code, rows in seats.items():
+            layouts[code] = SeatLayout.from_seats(code, rows) if rows else None
+            _layouts[code] = (layouts[code], now, None)
+    return layouts
+
+
+def _load(flight_ids: list[int], now: float, ttl: float) -> dict[int, FlightSeats]:
+    """加载航班的位图（不存在的航班、机型没有座位的航班不在结果中）"""
+    aircraft = _aircraft_codes(flight_ids)
+    if not aircraft:
+        return {}
+    layouts = _seat_layouts(set(aircraft.values()), now, ttl)
+    seats: dict[int, list[str]] = {flight_id: [] for flight_id in aircraft}
+    for shard_seats in scatter_gather(_boarded_seats, list(aircraft)):
+        for flight_id, seat_no in shard_seats:
+            seats[flight_id].append(seat_no)
+    return {
+        flight_id: FlightSeats(flight_id, layouts[code], seats[flight_id])
+        for flight_id, code in aircraft.items()
+        if layouts.get(code) is not None
+    }
+
+
+def get_flight_seats(flight_ids: Iterable[int]) -> dict[int, FlightSeats]:
+    """获取航班的已占座位位图，未缓存或过期的航班在一次调用中批量加载
+
+    Args:
+        flight_ids: 航班ID
+
+    Returns:
+        航班ID -> 位图；不存在或机型没有座位信息的航班不在结果中
+    """
+    global _loading
+    settings = _settings()
+    ttl = float(settings["ttl_seconds"])
+    now = time.monotonic()
+    flight_ids = list(dict.fromkeys(flight_ids))
+    result = {}
+    with _lock:
+        for flight_id in flight_ids:
+            entry = _flights.get(flight_id)
+            if _fresh(entry, now, ttl):
+                _flights.move_to_end(flight_id)
+                result[flight_id] = entry
+        _stats["hits"] += len(result)
+        missing = [flight_id for flight_id in flight_ids if flight_id not in result]
+        if not missing:
+            return result
+        _loading += 1
+
+    try:
+        loaded = _load(missing, now, ttl)
+        with _lock:
+            _stats["loads"] += 1
+            _stats["loaded_flights"] += len(loaded)
+            for flight_id, entry in loaded.items():
+                if flight_id not in _changed_while_loading:
+                    _flights[flight_id] = entry
+                    _flights.move_to_end(flight_id)
+            while len(_flights) > int(settings["max_flights"]):
+                _flights.popitem(last=False)
+    finally:
+        with _lock:
+            _loading -= 1
+            if _loading == 0:
+                _changed_while_loading.clear()
+    result.update(loaded)
+    return result
+
+
+def seats_left(flight_ids: Iterable[int]) -> dict[int, dict[str, int]]:
+    """多个航班各舱位的余座数
+
+    Args:
+        flight_ids: 航班ID
+
+    Returns:
+        航班ID -> {舱位: 余座数}；不存在或机型没有座位信息的航班不在结果中
+    """
+    return {flight_id: entry.seats_left() for flight_id, entry in get_flight_seats(flight_ids).items()}
+
+
+def annotate_seats_left(flights: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """为航班字典（search_flights 的结果）加上 seats_left 字段，关闭 annotate_search_results 时原样返回"""
+    if not flights or not _settings()["annotate_search_results"]:
+        return flights
+    available = seats_left(flight["flight_id"] for flight in flights)
+    return [{**flight, "seats_left": available.get(flight["flight_id"], {})} for flight in flights]
+
+
+def record_seat_changes(
+    session: Session,
+    occupied: Iterable[tuple[int, str]] = (),
+    released: Iterable[tuple[int, str]] = (),
+) -> None:
+    """仓储写方法在提交前调用：登记新增与删除的登机牌座位，事务提交后更新已加载的位图
+
+    Args:
+        session: 执行写入的会话（同步或异步会话）
+        occupied: 新占用的 (flight_id, 座位号)
+        released: 释放的 (flight_id, 座位号)
+    """
+    changes = [(flight_id, seat_no, False) for flight_id, seat_no in released if seat_no]
+    changes += [(flight_id, seat_no, True) for flight_id, seat_no in occupied if seat_no]
+    if changes:
+        session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_changes(session: Session) -> None:
+    """事务提交后把登记的座位变化应用到已加载的位图"""
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    with _lock:
+        _stats["changes"] += len(changes)
+        for flight_id, seat_no, occupied in changes:
+            entry = _flights.get(flight_id)
+            if entry is not None:
+                entry.mark(seat_no, occupied)
+            if _loading:
+                _changed_while_loading.add(flight_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def reset_seat_availability() -> None:
+    """丢弃所有位图与座位布局，下次查询时重新加载"""
+    with _lock:
+        _flights.clear()
+        _layouts.clear()
+
+
+def seat_availability_report() -> dict[str, Any]:
+    """已加载的航班数、位图内存占用与统计"""
+    with _lock:
+        bitmap_bytes = sum(sys.getsizeof(bitmap) for entry in _flights.values() for bitmap in entry.occupied)
+        return {"flights": len(_flights), "bitmap_bytes": bitmap_bytes, **_stats}
+
+
+if __name__ == '__main__':
+    for flight_id, left in seats_left(int(arg) for arg in sys.argv[1:]).items():
+        print(flight_id, left)
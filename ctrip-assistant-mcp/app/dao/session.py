@@ -1,44 +1,390 @@
 """数据库连接管理"""
-from collections.abc import Generator
-from contextlib import contextmanager
+import asyncio
+import atexit
+import bisect
+import functools
+import hashlib
+import inspect
+import queue
+import threading
+import time
+from collections.abc import AsyncGenerator, Callable, Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
 
-from sqlalchemy import create_engine, event
+from sqlalchemy import URL, AsyncAdaptedQueuePool, Pool, QueuePool, create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
-from config import CONFIG
+from config import CONFIG, get_logger
+
+from .query_budget import active_budgets, count_statement, use_budgets
+from .sql_metrics import meter_result, record_statement_metrics, start_statement_timer
+from .sqlite_profiles import apply_profile, log_sqlite_settings
+from .statement_cache import record_statement
+
+logger = get_logger(__name__)
 
 # 同步引擎和会话工厂
 _sync_engine = None
 _sync_session_factory = None
 
+# 异步引擎和会话工厂
+_async_engine = None
+_async_session_factory = None
+
+# 读连接池的引擎和会话工厂（配置 database.read_pool.enabled 开启后创建）
+_read_engine = None
+_read_session_factory = None
+_async_read_engine = None
+_async_read_session_factory = None
+
+# 连接池统计：从连接池签出连接的累计次数
+_pool_stats = {"checkouts": 0}
+
+# 各连接池的签出等待统计：连接池名称 -> 统计
+_pool_wait_stats: dict[str, dict[str, float]] = {}
+_pool_wait_lock = threading.Lock()
+
+# 读路由：仓储读方法执行期间为 True，get_session()/get_async_session() 使用读连接池
+_read_routing: ContextVar[bool] = ContextVar("read_routing", default=False)
+
+# 路由到读连接池的仓储方法名前缀
+READ_METHOD_PREFIXES = ("search_", "fetch_")
+
+# 会话 info 中标记该会话已有写操作（工作单元中的读方法随后改用共享会话，读到自身的写入）
+_HAS_WRITES = "has_writes"
+
+# 单写线程调度器（写调度模式开启后创建）：分片名 -> 调度器，None 为主库
+_write_dispatchers: dict[str | None, "WriteDispatcher"] = {}
+_write_dispatcher_lock = threading.Lock()
+
+# 分片路由器与各分片的引擎、会话工厂（配置 database.shards.enabled 开启后创建）
+_shard_router = None
+_shard_engines: dict[tuple[str, bool], Any] = {}
+_shard_session_factories: dict[tuple[str, bool], Any] = {}
+_shard_lock = threading.Lock()
+
+# 分片路由：分片路由的仓储方法执行期间为所选分片名，None 表示主库
+_current_shard: ContextVar[str | None] = ContextVar("current_shard", default=None)
+
+
+@dataclass
+class _UnitOfWork:
+    """工作单元：一次请求/MCP调用/工具节点执行内共享的会话"""
+    session: Session
+    # LangGraph 会在线程池中并行执行工具调用，Session 非线程安全，需串行访问
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    # 读连接池上的会话，首次读路由时创建
+    read_session: Session | None = None
+    # session 所在的分片，None 为主库（分片的写线程以分片会话开启工作单元）
+    shard: str | None = None
+    # 其他分片上的会话，首次路由到该分片时创建，随工作单元一起提交或回滚
+    shard_sessions: dict[str | None, Session] = field(default_factory=dict)
+
+    def reader(self) -> Session:
+        """读路由使用的会话：工作单元尚未写入时为读连接池上的会话，否则为共享会话"""
+        if self.shard is not None or self.session.info.get(_HAS_WRITES) or _read_pool_settings() is None:
+            return self.session
+        if self.read_session is None:
+            self.read_session = get_read_session_factory()()
+        return self.read_session
+
+    def session_for(self, shard: str | None, reading: bool) -> Session:
+        """分片上的会话：工作单元所在分片为共享会话（读路由见 reader），其他分片各一个会话"""
+        if shard == self.shard:
+            return self.reader() if reading else self.session
+        if shard not in self.shard_sessions:
+            self.shard_sessions[shard] = get_shard_session_factory(shard)()
+        return self.shard_sessions[shard]
+
+    def commit_shards(self) -> None:
+        """提交其他分片上的会话（各分片独立提交，不保证跨分片的原子性）"""
+        for session in self.shard_sessions.values():
+            session.commit()
+
+    def rollback_shards(self) -> None:
+        """回滚其他分片上的会话"""
+        for session in self.shard_sessions.values():
+            session.rollback()
+
+    def close(self) -> None:
+        """关闭工作单元的所有会话"""
+        self.session.close()
+        if self.read_session is not None:
+            self.read_session.close()
+        for session in self.shard_sessions.values():
+            session.close()
+
+
+@dataclass
+class _AsyncUnitOfWork:
+    """异步工作单元"""
+    session: AsyncSession
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    read_session: AsyncSession | None = None
+    shard_sessions: dict[str, AsyncSession] = field(default_factory=dict)
+
+    def reader(self) -> AsyncSession:
+        """读路由使用的会话，语义同 _UnitOfWork.reader"""
+        if self.session.info.get(_HAS_WRITES) or _read_pool_settings() is None:
+            return self.session
+        if self.read_session is None:
+            self.read_session = get_async_read_session_factory()()
+        return self.read_session
+
+    def session_for(self, shard: str | None, reading: bool) -> AsyncSession:
+        """分片上的会话，语义同 _UnitOfWork.session_for（异步工作单元总在主库上开启）"""
+        if shard is None:
+            return self.reader() if reading else self.session
+        if shard not in self.shard_sessions:
+            self.shard_sessions[shard] = get_async_shard_session_factory(shard)()
+        return self.shard_sessions[shard]
+
+    async def commit_shards(self) -> None:
+        for session in self.shard_sessions.values():
+            await session.commit()
+
+    async def rollback_shards(self) -> None:
+        for session in self.shard_sessions.values():
+            await session.rollback()
+
+    async def close(self) -> None:
+        await self.session.close()
+        if self.read_session is not None:
+            await self.read_session.close()
+        for session in self.shard_sessions.values():
+            await session.close()
+
+
+_current_uow: ContextVar[_UnitOfWork | None] = ContextVar("current_unit_of_work", default=None)
+_current_async_uow: ContextVar[_AsyncUnitOfWork | None] = ContextVar("current_async_unit_of_work", default=None)
+
+
+def _read_pool_settings() -> dict | None:
+    """读连接池配置，未开启时返回None"""
+    settings = CONFIG["database"].get("read_pool") or {}
+    return settings if settings.get("enabled", False) else None
+
+
+def _build_url(is_async: bool = False, read_only: bool = False, overrides: dict | None = None) -> str | URL:
+    """根据配置构建数据库连接地址
+
+    Args:
+        is_async: 是否构建异步驱动的连接地址（SQLite 使用 aiosqlite，MySQL 使用 aiomysql）
+        read_only: 是否构建读连接池的地址（SQLite 以 URI mode=ro 只读打开同一文件，
+            MySQL 使用 read_pool 中配置的只读副本地址，未配置的项沿用主库配置）
+        overrides: 覆盖 database 下同名配置的连接配置（分片的 url 或 host/port/database 等）
+
+    Returns:
+        数据库连接地址
+    """
+    db_config = {**CONFIG["database"], **(overrides or {})}
+    dialect = db_config["dialect"]
+    if "sqlite" == dialect:
+        driver = db_config.get("async_driver", "aiosqlite") if is_async else db_config.get("driver")
+        drivername = f"sqlite+{driver}" if driver else "sqlite"
+        if read_only:
+            return f"{drivername}:///file:{db_config['url']}?mode=ro&uri=true"
+        return f"{drivername}:///{db_config['url']}"  # SQLite 连接格式
+
+    if read_only:
+        db_config = {**db_config, **(_read_pool_settings() or {})}
+
+    driver = db_config.get("async_driver", "aiomysql") if is_async else db_config.get("driver", "pymysql")
+    return URL.create(
+        f"{dialect}+{driver}",
+        username=db_config["username"],
+        password=db_config["password"],
+        host=db_config["host"],
+        port=db_config["port"],
+        database=db_config["database"],
+        query={"charset": db_config.get("charset", "utf8mb4")},
+    )
+
+
+def _engine_options(pool_settings: dict | None = None) -> dict:
+    """同步/异步引擎共用的连接池参数
+
+    Args:
+        pool_settings: 连接池自己的配置（读连接池的 pool_size、max_overflow 等），覆盖 database 下的同名配置
+    """
+    db_config = {**CONFIG["database"], **(pool_settings or {})}
+    return {
+        "echo": db_config["echo"],
+        "pool_size": db_config["pool_size"],
+        "max_overflow": db_config["max_overflow"],
+        "pool_recycle": db_config["pool_recycle"],
+        "pool_pre_ping": "sqlite" != db_config["dialect"],  # SQLite 不支持pool_pre_ping，设为false
+    }
+
+
+def _count_checkout(dbapi_conn, connection_record, connection_proxy):
+    """连接池签出事件：统计签出次数"""
+    _pool_stats["checkouts"] += 1
+
+
+def get_pool_checkout_count() -> int:
+    """获取连接池累计签出次数（同步与异步引擎合计）"""
+    return _pool_stats["checkouts"]
+
+
+def _record_checkout_wait(pool_name: str, waited: float) -> None:
+    """记录一次签出的等待时间（秒）"""
+    waited_ms = waited * 1000
+    with _pool_wait_lock:
+        stats = _pool_wait_stats.get(pool_name)
+        if stats is None:
+            stats = _pool_wait_stats[pool_name] = {"checkouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0}
+        stats["checkouts"] += 1
+        stats["total_wait_ms"] += waited_ms
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], waited_ms)
+
+
+class _TimedPoolMixin:
+    """连接池签出计时：记录从请求连接到拿到连接的等待时间（连接池已满时的排队与新建连接）"""
+    pool_name = "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _record_checkout_wait(self.pool_name, time.perf_counter() - started)
+
+
+@functools.cache
+def _timed_pool_class(base: type[Pool], pool_name: str) -> type[Pool]:
+    """带签出计时的连接池类（连接池重建时沿用同一个类，名称不丢失）
+
+    模块名沿用 SQLAlchemy 的连接池模块，连接池日志仍由 sqlalchemy.pool 的日志配置控制。
+    """
+    namespace = {"pool_name": pool_name, "__module__": base.__module__}
+    return type(f"Timed{base.__name__}", (_TimedPoolMixin, base), namespace)
+
+
+def get_pool_stats() -> dict[str, dict[str, float]]:
+    """各连接池的签出等待统计
+
+    Returns:
+        连接池名称（writer、reader，异步引擎带 _async 后缀）->
+        {"checkouts": 签出次数, "total_wait_ms": 累计等待, "avg_wait_ms": 平均等待, "max_wait_ms": 最长等待}
+    """
+    with _pool_wait_lock:
+        snapshot = {name: dict(stats) for name, stats in sorted(_pool_wait_stats.items())}
+    for stats in snapshot.values():
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        for key in ("total_wait_ms", "avg_wait_ms", "max_wait_ms"):
+            stats[key] = round(stats[key], 3)
+    return snapshot
+
+
+def reset_pool_stats() -> None:
+    """清空连接池签出等待统计"""
+    with _pool_wait_lock:
+        _pool_wait_stats.clear()
+
+
+def _listen_statement_events(engine) -> None:
+    """注册语句级事件：执行耗时/行数/调用方统计与慢查询日志，编译缓存命中统计，语句预算"""
+    event.listen(engine, "before_cursor_execute", start_statement_timer)
+    event.listen(engine, "before_cursor_execute", count_statement)
+    event.listen(engine, "after_cursor_execute", record_statement_metrics)
+    event.listen(engine, "after_cursor_execute", record_statement)
+    event.listen(engine, "after_execute", meter_result)
+
+
+def _set_sqlite_pragma(dbapi_conn, connection_record):
+    """SQLite优化：每个新连接建立时按配置档设置PRAGMA（见 sqlite_profiles）"""
+    apply_profile(dbapi_conn)
+
+
+def _set_sqlite_read_pragma(dbapi_conn, connection_record):
+    """SQLite 读连接：只读打开，禁止任何写操作，按配置档设置缓存等PRAGMA"""
+    apply_profile(dbapi_conn, read_only=True)
+
+
+def _create_engine(is_async: bool = False, read_only: bool = False, shard: str | None = None):
+    """创建引擎：连接池带签出计时，注册语句级事件与 SQLite 连接设置
+
+    Args:
+        is_async: 是否创建异步引擎
+        read_only: 是否为读连接池（使用 read_pool 的连接池配置与只读连接）
+        shard: 分片名，创建该分片的引擎（连接与连接池配置取自 database.shards 中的分片配置）
+    """
+    sqlite = "sqlite" == CONFIG["database"]["dialect"]
+    if shard is not None:
+        overrides = get_shard_router().shards[shard]
+        pool_name = f"shard_{shard}"
+        options = _engine_options(overrides)
+    else:
+        overrides = None
+        pool_name = "reader" if read_only else "writer"
+        options = _engine_options(_read_pool_settings() if read_only else None)
+    if is_async:
+        engine = create_async_engine(
+            _build_url(is_async=True, read_only=read_only, overrides=overrides),
+            poolclass=_timed_pool_class(AsyncAdaptedQueuePool, f"{pool_name}_async"),
+            **options,
+        )
+        # 异步引擎的事件注册在其内部的同步引擎上
+        sync_engine = engine.sync_engine
+    else:
+        connect_args = {}
+        if sqlite:
+            connect_args["check_same_thread"] = False  # SQLite 多线程访问必须加此参数
+        engine = sync_engine = create_engine(
+            _build_url(read_only=read_only, overrides=overrides),
+            connect_args=connect_args,
+            poolclass=_timed_pool_class(QueuePool, pool_name),
+            **options,
+        )
+    event.listen(sync_engine, "checkout", _count_checkout)
+    _listen_statement_events(sync_engine)
+
+    # SQLite优化
+    if sqlite:
+        event.listen(sync_engine, "connect", _set_sqlite_read_pragma if read_only else _set_sqlite_pragma)
+    return engine
+
 
 def get_sync_engine():
-    """获取同步数据库引擎"""
+    """获取同步数据库引擎（写连接池，未开启读连接池时也承担读）"""
     global _sync_engine
     if _sync_engine is None:
-        conn_str = f"{CONFIG['database']['dialect']}:///{CONFIG['database']['url']}"  # SQLite 连接格式
-        _sync_engine = create_engine(
-            conn_str,
-            echo=CONFIG["database"]["echo"],
-            pool_size=CONFIG["database"]["pool_size"],
-            max_overflow=CONFIG["database"]["max_overflow"],
-            pool_recycle=CONFIG["database"]["pool_recycle"],
-            pool_pre_ping=False,  # SQLite 不支持pool_pre_ping，设为false
-            connect_args={"check_same_thread": False}  # SQLite 多线程访问必须加此参数
-        )
+        _sync_engine = _create_engine()
+    return _sync_engine
 
-        # SQLite优化
-        if "sqlite" == CONFIG["database"]["dialect"]:
-            @event.listens_for(_sync_engine, "connect")
-            def set_sqlite_pragma(dbapi_conn, connection_record):
-                cursor = dbapi_conn.cursor()
-                cursor.execute("PRAGMA journal_mode=WAL")  # 写前日志模式
-                cursor.execute("PRAGMA synchronous=NORMAL")  # 同步模式
-                cursor.execute("PRAGMA cache_size=-64000")  # 64MB缓存
-                cursor.execute("PRAGMA foreign_keys=ON")  # 开启外键
-                cursor.close()
 
-    return _sync_engine
+def get_async_engine():
+    """获取异步数据库引擎（SQLite 基于 aiosqlite，MySQL 基于 aiomysql）"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = _create_engine(is_async=True)
+    return _async_engine
+
+
+def get_read_engine():
+    """获取读连接池的同步引擎，未开启读连接池时返回 get_sync_engine()"""
+    global _read_engine
+    if _read_pool_settings() is None:
+        return get_sync_engine()
+    if _read_engine is None:
+        _read_engine = _create_engine(read_only=True)
+    return _read_engine
+
+
+def get_async_read_engine():
+    """获取读连接池的异步引擎，未开启读连接池时返回 get_async_engine()"""
+    global _async_read_engine
+    if _read_pool_settings() is None:
+        return get_async_engine()
+    if _async_read_engine is None:
+        _async_read_engine = _create_engine(is_async=True, read_only=True)
+    return _async_read_engine
 
 
 def get_sync_session_factory():
@@ -50,25 +396,392 @@ def get_sync_session_factory():
             autocommit=False,
             autoflush=False,
             bind=engine,
+            expire_on_commit=False,  # 工作单元提交后返回的对象仍可直接读取属性
         )
     return _sync_session_factory
 
 
+def get_async_session_factory():
+    """获取异步会话工厂"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        engine = get_async_engine()
+        _async_session_factory = async_sessionmaker(
+            bind=engine,
+            autoflush=False,
+            expire_on_commit=False,  # 提交后不过期，避免在异步环境中触发隐式IO
+        )
+    return _async_session_factory
+
+
+def get_read_session_factory():
+    """获取读连接池的同步会话工厂，未开启读连接池时返回 get_sync_session_factory()"""
+    global _read_session_factory
+    if _read_pool_settings() is None:
+        return get_sync_session_factory()
+    if _read_session_factory is None:
+        _read_session_factory = sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=get_read_engine(),
+            expire_on_commit=False,
+        )
+    return _read_session_factory
+
+
+def get_async_read_session_factory():
+    """获取读连接池的异步会话工厂，未开启读连接池时返回 get_async_session_factory()"""
+    global _async_read_session_factory
+    if _read_pool_settings() is None:
+        return get_async_session_factory()
+    if _async_read_session_factory is None:
+        _async_read_session_factory = async_sessionmaker(
+            bind=get_async_read_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _async_read_session_factory
+
+
+class ShardRouter:
+    """分片路由器：按一致性哈希把分片键（passenger_id、book_ref）映射到 database.shards 中的一个数据库
+
+    每个分片在哈希环上有 virtual_nodes 个虚拟节点，增删分片时只有约 1/N 的分片键改变归属
+    （由 app.dao.shard_rebalance 迁移）。分片配置与 database 下的连接配置同名（SQLite 为 url，
+    MySQL 为 host/port/database 等），未配置的项沿用主库；指向主库的分片直接使用主库的引擎。
+    """
+
+    def __init__(self, shards: dict[str, dict], virtual_nodes: int = 64) -> None:
+        """
+        Args:
+            shards: 分片名 -> 连接配置
+            virtual_nodes: 每个分片的虚拟节点数
+        """
+        if not shards:
+            raise ValueError("database.shards.databases 未配置任何分片")
+        self.shards = shards
+        ring = sorted((_ring_hash(f"{name}#{i}"), name) for name in shards for i in range(virtual_nodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [name for _, name in ring]
+        primary = str(_build_url())
+        self._primary = {name for name, settings in shards.items() if str(_build_url(overrides=settings)) == primary}
+        self._executor = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard-scatter")
+
+    @property
+    def names(self) -> list[str]:
+        """分片名（按配置顺序）"""
+        return list(self.shards)
+
+    def shard_for(self, key: Any) -> str:
+        """分片键所属的分片"""
+        index = bisect.bisect(self._points, _ring_hash(str(key).strip())) % len(self._points)
+        return self._owners[index]
+
+    def is_primary(self, name: str) -> bool:
+        """分片是否指向主库"""
+        return name in self._primary
+
+    def scatter_gather(self, func: Callable, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        """在每个分片上并行执行 func（各自的线程与会话，不加入调用方的工作单元；语句计入调用方的语句预算）
+
+        Returns:
+            分片名 -> 返回值
+        """
+        budgets = active_budgets()
+
+        def run(name: str) -> Any:
+            with use_budgets(budgets), use_shard(name):
+                return func(*args, **kwargs)
+
+        futures = {name: self._executor.submit(run, name) for name in self.shards}
+        return {name: future.result() for name, future in futures.items()}
+
+    async def async_scatter_gather(self, func: Callable, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        """在每个分片上并发执行协程函数 func
+
+        Returns:
+            分片名 -> 返回值
+        """
+        async def run(name: str) -> Any:
+            with use_shard(name):
+                return await func(*args, **kwargs)
+
+        results = await asyncio.gather(*(run(name) for name in self.shards))
+        return dict(zip(self.shards, results))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def _ring_hash(value: str) -> int:
+    """哈希环上的位置（与进程无关的稳定哈希）"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def _shard_settings() -> dict | None:
+    """分片配置，未开启时返回None"""
+    settings = CONFIG["database"].get("shards") or {}
+    return settings if settings.get("enabled", False) else None
+
+
+def get_shard_router() -> ShardRouter | None:
+    """获取分片路由器，未在配置中开启分片时返回None"""
+    global _shard_router
+    settings = _shard_settings()
+    if settings is None:
+        return None
+    if _shard_router is None:
+        with _shard_lock:
+            if _shard_router is None:
+                shards = {item["name"]: {k: v for k, v in item.items() if k != "name"} for item in settings["databases"]}
+                _shard_router = ShardRouter(shards, settings.get("virtual_nodes", 64))
+    return _shard_router
+
+
+def reset_shard_router() -> None:
+    """丢弃分片路由器并关闭各分片的引擎（分片配置变化后调用）"""
+    global _shard_router
+    with _shard_lock:
+        if _shard_router is not None:
+            _shard_router.close()
+        _shard_router = None
+        for engine in _shard_engines.values():
+            (engine.sync_engine if hasattr(engine, "sync_engine") else engine).dispose()
+        _shard_engines.clear()
+        _shard_session_factories.clear()
+
+
+def current_shard() -> str | None:
+    """当前上下文路由到的分片，None 表示主库"""
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(name: str | None) -> Generator[None]:
+    """作用域内的 get_session()/get_async_session() 与写调度使用分片 name（指向主库的分片与 None 使用主库）"""
+    router = get_shard_router()
+    if name is not None and (router is None or router.is_primary(name)):
+        name = None
+    token = _current_shard.set(name)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def get_shard_engine(name: str | None):
+    """获取分片的同步引擎，指向主库的分片与 None 返回 get_sync_engine()"""
+    router = get_shard_router()
+    if name is None or router is None or router.is_primary(name):
+        return get_sync_engine()
+    engine = _shard_engines.get((name, False))
+    if engine is None:
+        with _shard_lock:
+            engine = _shard_engines.get((name, False))
+            if engine is None:
+                engine = _shard_engines[(name, False)] = _create_engine(shard=name)
+    return engine
+
+
+def get_async_shard_engine(name: str | None):
+    """获取分片的异步引擎，指向主库的分片与 None 返回 get_async_engine()"""
+    router = get_shard_router()
+    if name is None or router is None or router.is_primary(name):
+        return get_async_engine()
+    engine = _shard_engines.get((name, True))
+    if engine is None:
+        with _shard_lock:
+            engine = _shard_engines.get((name, True))
+            if engine is None:
+                engine = _shard_engines[(name, True)] = _create_engine(is_async=True, shard=name)
+    return engine
+
+
+def get_shard_session_factory(name: str | None):
+    """获取分片的同步会话工厂，主库返回 get_sync_session_factory()"""
+    engine = get_shard_engine(name)
+    if engine is get_sync_engine():
+        return get_sync_session_factory()
+    factory = _shard_session_factories.get((name, False))
+    if factory is None:
+        factory = _shard_session_factories[(name, False)] = sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=engine,
+            expire_on_commit=False,
+        )
+    return factory
+
+
+def get_async_shard_session_factory(name: str | None):
+    """获取分片的异步会话工厂，主库返回 get_async_session_factory()"""
+    engine = get_async_shard_engine(name)
+    if engine is get_async_engine():
+        return get_async_session_factory()
+    factory = _shard_session_factories.get((name, True))
+    if factory is None:
+        factory = _shard_session_factories[(name, True)] = async_sessionmaker(
+            bind=engine,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return factory
+
+
 def init_db():
-    """初始化数据库"""
+    """初始化数据库：在主库与各分片上执行版本化迁移（创建并校验索引、更新统计信息），
+    SQLite 记录实际生效的 PRAGMA，开启 reference_data、flight_index 时加载进程内参考数据与航班索引"""
+    from .flight_index import load_flight_index
+    from .migrations import EXPECTED_SCANS, find_full_scans, run_migrations
+    from .reference_data import load_reference_data
+
     engine = get_sync_engine()
     # 这里可以添加创建表的操作
     # Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    router = get_shard_router()
+    for name in router.names if router is not None else ():
+        if not router.is_primary(name):
+            run_migrations(get_shard_engine(name))
+    if "sqlite" == CONFIG["database"]["dialect"]:
+        log_sqlite_settings(engine)
+        if _read_pool_settings() is not None:
+            log_sqlite_settings(get_read_engine(), read_only=True)
+        with engine.connect() as conn:
+            scans = find_full_scans(conn, include_expected=True)
+        expected = {name: scans.pop(name) for name in EXPECTED_SCANS & scans.keys()}
+        if expected:
+            logger.info("以下热点查询为预期的全表扫描（LIKE 模糊匹配，FTS 形式走全文索引）: %s", sorted(expected))
+        if scans:
+            logger.warning("以下热点查询未命中索引: %s", scans)
+    load_reference_data()
+    load_flight_index()
+
+
+@contextmanager
+def unit_of_work() -> Generator[Session]:
+    """开启工作单元（一次 FastAPI 请求、MCP 调用或图中工具节点的一次执行只开启一次）
+
+    作用域内所有仓储通过 get_session() 自动加入同一个会话，
+    只签出一次连接；作用域正常退出时提交，发生异常时回滚。
+    嵌套调用时直接加入外层工作单元。
+    开启读连接池时，仓储读方法使用工作单元另开的读会话（见 _UnitOfWork.reader）。
+
+    Yields:
+        Session: 工作单元共享的SQLAlchemy会话
+    """
+    current = _current_uow.get()
+    if current is not None:
+        yield current.session
+        return
+
+    session = get_sync_session_factory()()
+    uow = _UnitOfWork(session)
+    token = _current_uow.set(uow)
+    try:
+        yield session
+        session.commit()
+        uow.commit_shards()
+    except BaseException:
+        session.rollback()
+        uow.rollback_shards()
+        raise
+    finally:
+        _current_uow.reset(token)
+        uow.close()
+
+
+@asynccontextmanager
+async def async_unit_of_work() -> AsyncGenerator[AsyncSession]:
+    """开启异步工作单元，语义同 unit_of_work
+
+    Yields:
+        AsyncSession: 工作单元共享的SQLAlchemy异步会话
+    """
+    current = _current_async_uow.get()
+    if current is not None:
+        yield current.session
+        return
+
+    session = get_async_session_factory()()
+    uow = _AsyncUnitOfWork(session)
+    token = _current_async_uow.set(uow)
+    try:
+        yield session
+        await session.commit()
+        await uow.commit_shards()
+    except BaseException:
+        await session.rollback()
+        await uow.rollback_shards()
+        raise
+    finally:
+        _current_async_uow.reset(token)
+        await uow.close()
+
+
+def in_unit_of_work() -> bool:
+    """当前上下文是否处于工作单元中"""
+    return _current_uow.get() is not None
+
+
+def has_uncommitted_writes(*info_keys: str) -> bool:
+    """当前工作单元（同步或异步）中是否有会话已写入但尚未提交，此时会话读到的是未提交的数据
+
+    Args:
+        *info_keys: 额外检查的会话 info 键（如查询缓存登记的待失效表），commit_session 的写入标记总会检查
+    """
+    for uow in (_current_uow.get(), _current_async_uow.get()):
+        if uow is None:
+            continue
+        for session in (uow.session, *uow.shard_sessions.values()):
+            if session.info.get(_HAS_WRITES) or any(session.info.get(key) for key in info_keys):
+                return True
+    return False
+
+
+def commit_session(session: Session) -> None:
+    """提交仓储的写操作
+
+    处于工作单元中时只 flush，由工作单元退出时统一提交或回滚。
+    """
+    session.info[_HAS_WRITES] = True
+    if _current_uow.get() is not None:
+        session.flush()
+    else:
+        session.commit()
+
+
+async def commit_async_session(session: AsyncSession) -> None:
+    """提交异步仓储的写操作，语义同 commit_session"""
+    session.info[_HAS_WRITES] = True
+    if _current_async_uow.get() is not None:
+        await session.flush()
+    else:
+        await session.commit()
 
 
 @contextmanager
 def get_session() -> Generator[Session]:
     """获取同步数据库会话上下文管理器
 
+    处于工作单元中时返回工作单元的共享会话（不关闭），否则新建会话。
+    仓储读方法（见 read_routed）中使用读连接池；分片路由（见 shard_routed）时使用所选分片。
+
     Yields:
         Session: SQLAlchemy会话
     """
-    session_factory = get_sync_session_factory()
+    reading = _read_routing.get()
+    shard = _current_shard.get()
+    uow = _current_uow.get()
+    if uow is not None:
+        with uow.lock:
+            yield uow.session_for(shard, reading)
+        return
+
+    if shard is not None:
+        session_factory = get_shard_session_factory(shard)
+    else:
+        session_factory = get_read_session_factory() if reading else get_sync_session_factory()
     session = session_factory()
     try:
         yield session
@@ -76,6 +789,32 @@ def get_session() -> Generator[Session]:
         session.close()
 
 
+@asynccontextmanager
+async def get_async_session() -> AsyncGenerator[AsyncSession]:
+    """获取异步数据库会话上下文管理器
+
+    处于异步工作单元中时返回工作单元的共享会话（不关闭），否则新建会话。
+    仓储读方法（见 read_routed）中使用读连接池；分片路由（见 shard_routed）时使用所选分片。
+
+    Yields:
+        AsyncSession: SQLAlchemy异步会话
+    """
+    reading = _read_routing.get()
+    shard = _current_shard.get()
+    uow = _current_async_uow.get()
+    if uow is not None:
+        async with uow.lock:
+            yield uow.session_for(shard, reading)
+        return
+
+    if shard is not None:
+        session_factory = get_async_shard_session_factory(shard)
+    else:
+        session_factory = get_async_read_session_factory() if reading else get_async_session_factory()
+    async with session_factory() as session:
+        yield session
+
+
 def get_db() -> Session:
     """获取数据库会话（用于依赖注入）
 
@@ -85,3 +824,365 @@ def get_db() -> Session:
     session_factory = get_sync_session_factory()
     return session_factory()
 
+
+@dataclass
+class _WriteJob:
+    """提交给写线程的写事务"""
+    func: Callable
+    args: tuple
+    kwargs: dict
+    future: Future = field(default_factory=Future)
+
+
+class WriteDispatcher:
+    """单写线程调度器：所有写事务交给一个专用线程串行执行，并按批合并提交（group commit）
+
+    SQLite 同一时刻只允许一个写事务，多个线程各自在连接池连接上提交时会互相等待，
+    超过 busy timeout 即报 "database is locked"。写线程从队列中取出一批写事务，
+    在同一个事务中逐个执行（每个写事务一个 SAVEPOINT，失败只回滚自身），最后一次提交，
+    提交完成后通过 Future 把结果或异常返回给调用方。
+    """
+
+    def __init__(self, max_batch_size: int = 64, max_batch_latency_ms: float = 2.0, shard: str | None = None) -> None:
+        """
+        Args:
+            max_batch_size: 一次合并提交的最大写事务数
+            max_batch_latency_ms: 批中第一个写事务等待后续写事务加入的最长时间（毫秒），0 表示只合并已排队的写事务
+            shard: 写入的分片，None 为主库（每个分片一个写线程）
+        """
+        self.shard = shard
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency = max_batch_latency_ms / 1000
+        self._queue: queue.SimpleQueue[_WriteJob | None] = queue.SimpleQueue()
+        self._stats = {"batches": 0, "jobs": 0, "failed_batches": 0}
+        self._closed = False
+        self._stopping = False
+        thread_name = "db-writer" if shard is None else f"db-writer-{shard}"
+        self._thread = threading.Thread(target=self._run, name=thread_name, daemon=True)
+        self._thread.start()
+
+    def in_writer_thread(self) -> bool:
+        """当前线程是否为写线程"""
+        return threading.current_thread() is self._thread
+
+    def submit(self, func: Callable, *args: Any, **kwargs: Any) -> Future:
+        """提交写事务
+
+        Args:
+            func: 写事务函数，在写线程中执行，通过 get_session() 获得写线程的会话
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            写事务所在批次提交后完成的 Future
+        """
+        if self._closed:
+            raise RuntimeError("写调度器已关闭")
+        job = _WriteJob(func, args, kwargs)
+        self._queue.put(job)
+        return job.future
+
+    def stats(self) -> dict[str, Any]:
+        """批次统计：批次数、写事务数、提交失败的批次数与平均批大小"""
+        stats = dict(self._stats)
+        stats["avg_batch_size"] = round(stats["jobs"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def close(self, timeout: float | None = None) -> None:
+        """停止接收写事务，执行完已排队的写事务后结束写线程"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _next_batch(self) -> list[_WriteJob]:
+        """阻塞等待第一个写事务，再在批次延迟内收集后续写事务"""
+        job = self._queue.get()
+        if job is None:
+            self._stopping = True
+            return []
+        batch = [job]
+        deadline = time.monotonic() + self.max_batch_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._stopping = True
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopping:
+            batch = self._next_batch()
+            if batch:
+                self._execute_batch(batch)
+
+    def _execute_batch(self, batch: list[_WriteJob]) -> None:
+        """在一个事务中执行一批写事务并提交
+
+        先不加保存点整批执行（写事务很少失败，每个写事务一个 SAVEPOINT 的开销与写事务本身相当）；
+        有写事务抛出异常时回滚整批，再逐个在 SAVEPOINT 中重新执行，失败的写事务只回滚自身。
+        """
+        jobs = [job for job in batch if job.future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        outcomes = self._run_jobs(jobs, savepoints=False)
+        if outcomes is not None and any(error is not None for _, _, error in outcomes):
+            outcomes = self._run_jobs(jobs, savepoints=True)
+        if outcomes is None:
+            return
+
+        self._stats["batches"] += 1
+        self._stats["jobs"] += len(outcomes)
+        for job, result, error in outcomes:
+            if error is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(error)
+
+    def _run_jobs(self, jobs: list[_WriteJob], savepoints: bool) -> list[tuple[_WriteJob, Any, Exception | None]] | None:
+        """在一个事务中执行写事务并提交
+
+        Args:
+            jobs: 写事务列表
+            savepoints: 是否为每个写事务建立 SAVEPOINT；为False时任一写事务失败即回滚整批
+
+        Returns:
+            (写事务, 结果, 异常) 列表；提交失败时返回None（异常已设置到所有 Future）
+        """
+        session = get_shard_session_factory(self.shard)()
+        uow = _UnitOfWork(session, shard=self.shard)
+        token = _current_uow.set(uow)
+        shard_token = _current_shard.set(self.shard)
+        outcomes = []
+        try:
+            # pysqlite 只在 DML 前隐式 BEGIN，释放不在显式事务中的 SAVEPOINT 会直接提交；
+            # 显式开启事务并立即获取写锁，整批只提交一次
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            for job in jobs:
+                try:
+                    if savepoints:
+                        with session.begin_nested():
+                            result = job.func(*job.args, **job.kwargs)
+                    else:
+                        result = job.func(*job.args, **job.kwargs)
+                    outcomes.append((job, result, None))
+                except Exception as e:
+                    outcomes.append((job, None, e))
+                    if not savepoints:
+                        session.rollback()
+                        uow.rollback_shards()
+                        return outcomes
+            session.commit()
+            uow.commit_shards()
+            return outcomes
+        except Exception as e:
+            session.rollback()
+            uow.rollback_shards()
+            self._stats["failed_batches"] += 1
+            logger.error("写事务批次提交失败（%s 个写事务）: %s", len(jobs), e)
+            for job in jobs:
+                job.future.set_exception(e)
+            return None
+        finally:
+            _current_shard.reset(shard_token)
+            _current_uow.reset(token)
+            uow.close()
+
+
+def get_write_dispatcher(shard: str | None = None) -> WriteDispatcher | None:
+    """获取单写线程调度器，未在配置中开启写调度模式（或非 SQLite）时返回None
+
+    Args:
+        shard: 分片名，None 为主库；每个 SQLite 文件各有一个写线程
+    """
+    db_config = CONFIG["database"]
+    settings = db_config.get("write_dispatcher") or {}
+    if not settings.get("enabled", False) or "sqlite" != db_config["dialect"]:
+        return None
+    dispatcher = _write_dispatchers.get(shard)
+    if dispatcher is None:
+        with _write_dispatcher_lock:
+            dispatcher = _write_dispatchers.get(shard)
+            if dispatcher is None:
+                dispatcher = _write_dispatchers[shard] = WriteDispatcher(
+                    max_batch_size=settings.get("max_batch_size", 64),
+                    max_batch_latency_ms=settings.get("max_batch_latency_ms", 2.0),
+                    shard=shard,
+                )
+                atexit.register(dispatcher.close)
+    return dispatcher
+
+
+def submit_write(func: Callable, *args: Any, **kwargs: Any) -> Future:
+    """提交写事务并返回 Future
+
+    写调度模式下交给写线程执行；否则（或处于工作单元中时）在当前线程执行，返回已完成的 Future。
+
+    Args:
+        func: 写事务函数，通过 get_session()/commit_session() 访问数据库
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        写事务的 Future
+    """
+    dispatcher = get_write_dispatcher(_current_shard.get())
+    if dispatcher is not None and _current_uow.get() is None:
+        return dispatcher.submit(func, *args, **kwargs)
+    future = Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def write_transaction(func: Callable) -> Callable:
+    """仓储写方法装饰器：写调度模式下把写方法交给写线程执行，调用方等待其所在批次提交
+
+    处于工作单元中时写方法仍在当前线程的工作单元会话中执行，随工作单元一起提交或回滚；
+    写线程只承担工作单元之外独立提交的写方法。
+    异步仓储的写方法转交同名的同步仓储方法执行（见 AsyncBaseRepository.sync_repository）。
+    分片路由（见 shard_routed）时交给所选分片的写线程。
+    """
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            dispatcher = get_write_dispatcher(_current_shard.get())
+            if dispatcher is None or _current_async_uow.get() is not None:
+                return await func(self, *args, **kwargs)
+            sync_method = getattr(self.sync_repository(), func.__name__)
+            return await asyncio.wrap_future(dispatcher.submit(sync_method, *args, **kwargs))
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        dispatcher = get_write_dispatcher(_current_shard.get())
+        if dispatcher is None or _current_uow.get() is not None:
+            return func(*args, **kwargs)
+        return dispatcher.submit(func, *args, **kwargs).result()
+
+    return wrapper
+
+
+def read_routed(func: Callable) -> Callable:
+    """仓储读方法装饰器：方法内的 get_session()/get_async_session() 使用读连接池
+
+    未开启读连接池时不改变行为。
+    """
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = _read_routing.set(True)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _read_routing.reset(token)
+
+        async_wrapper.read_routed = True
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _read_routing.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _read_routing.reset(token)
+
+    wrapper.read_routed = True
+    return wrapper
+
+
+def route_read_methods(cls: type) -> None:
+    """把仓储类中以 READ_METHOD_PREFIXES 开头的方法包装为 read_routed（由仓储基类的 __init_subclass__ 调用）"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith(READ_METHOD_PREFIXES) and callable(attr) and not getattr(attr, "read_routed", False):
+            setattr(cls, name, read_routed(attr))
+
+
+def shard_routed(key: str | None = None, locate: Callable[[dict[str, Any]], str | None] | None = None) -> Callable:
+    """仓储方法装饰器：按分片键参数选择分片，方法内的 get_session()/get_async_session() 与写调度使用该分片
+
+    写方法需放在 write_transaction 之外，使写事务交给所选分片的写线程。未开启分片时不改变行为。
+
+    Args:
+        key: 分片键参数名（passenger_id、book_ref），参数值经 ShardRouter.shard_for 映射到分片
+        locate: 没有分片键（或参数值为 None）时定位分片的函数，接收绑定后的参数字典，返回分片名
+            （None 表示主库）；异步方法中在线程池执行
+    """
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        def route(router: ShardRouter, args: tuple, kwargs: dict) -> tuple[str | None, dict[str, Any] | None]:
+            """按分片键选择分片；需要 locate 定位时返回 (None, 参数字典)"""
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            value = bound.arguments.get(key) if key is not None else None
+            if value is not None:
+                return router.shard_for(value), None
+            return None, (bound.arguments if locate is not None else None)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                router = get_shard_router()
+                if router is None:
+                    return await func(*args, **kwargs)
+                shard, arguments = route(router, args, kwargs)
+                if arguments is not None:
+                    shard = await asyncio.to_thread(locate, arguments)
+                with use_shard(shard):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            router = get_shard_router()
+            if router is None:
+                return func(*args, **kwargs)
+            shard, arguments = route(router, args, kwargs)
+            if arguments is not None:
+                shard = locate(arguments)
+            with use_shard(shard):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def scatter_gather(func: Callable, *args: Any, **kwargs: Any) -> list[Any]:
+    """在每个分片上执行 func 并收集返回值（用于没有分片键的查询）；未开启分片时只在主库执行一次"""
+    router = get_shard_router()
+    if router is None:
+        return [func(*args, **kwargs)]
+    return list(router.scatter_gather(func, *args, **kwargs).values())
+
+
+async def async_scatter_gather(func: Callable, *args: Any, **kwargs: Any) -> list[Any]:
+    """异步版本的 scatter_gather"""
+    router = get_shard_router()
+    if router is None:
+        return [await func(*args, **kwargs)]
+    return list((await router.async_scatter_gather(func, *args, **kwargs)).values())
+
+
+def locate_shard(func: Callable, *args: Any, **kwargs: Any) -> str | None:
+    """在各分片上执行判断函数 func，返回第一个结果为真的分片；都不满足或未开启分片时返回None（主库）"""
+    router = get_shard_router()
+    if router is None:
+        return None
+    for name, found in router.scatter_gather(func, *args, **kwargs).items():
+        if found:
+            return name
+    return None
@@ -0,0 +1,328 @@
+"""分片的准备、再平衡与数据迁移
+
+开启 database.shards 后，乘客相关的数据按分片键分布在各分片上：
+
+- tickets 及其 ticket_flights、boarding_passes 按 passenger_id 分片（passenger_itineraries 由各分片的触发器维护）；
+- bookings 按 book_ref 分片；
+- flights、airports_data、aircrafts_data、seats 为共享表，每个分片保存一份主库的副本，
+  机票联查与行程读模型在分片内完成。航班搜索、酒店等其他表仍在主库上查询
+  （分片上只建空表，使各分片的表结构与迁移和主库一致）。
+
+增删分片或首次从单库拆分时，用本工具：
+
+1. provision：在分片上创建表结构、复制共享表并执行迁移（索引、触发器、读模型）；
+2. plan：列出归属（ShardRouter.shard_for）与所在分片不一致的乘客与预订；
+3. rebalance：按批把这些数据复制到目标分片并提交，再从原分片删除。
+   每批先删除目标分片上的同名机票再写入，中断后重新执行即可继续，不会产生重复数据。
+
+共享表在主库上更新（例如 update_dates 平移航班时间）后需执行 sync-shared 同步到各分片。
+主库不在分片列表中时，rebalance 把主库上的乘客数据全部迁出。
+
+用法：
+    python -m app.dao.shard_rebalance provision
+    python -m app.dao.shard_rebalance plan
+    python -m app.dao.shard_rebalance rebalance
+    python -m app.dao.shard_rebalance sync-shared
+"""
+import sys
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from sqlalchemy import Column, Engine, MetaData, Table, delete, inspect, select
+from sqlalchemy.types import NullType
+from sqlalchemy.engine import Connection
+
+from app.dao.bulk import DEFAULT_CHUNK_SIZE, chunked, in_chunk_size
+from app.dao.migrations import run_migrations
+from app.dao.models.booking_models import BoardingPass, Booking, Ticket, TicketFlight
+from app.dao.models.car_rental_models import CarRental
+from app.dao.models.flight_models import AircraftData, AirportData, Flight, Seat
+from app.dao.models.hotel_models import Hotel
+from app.dao.models.trip_models import TripRecommendation
+from app.dao.query_cache import get_query_cache
+from app.dao.session import get_shard_engine, get_shard_router, get_sync_engine
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# 每个分片保存一份副本的共享表
+SHARED_TABLES = (
+    Flight.__tablename__,
+    AirportData.__tablename__,
+    AircraftData.__tablename__,
+    Seat.__tablename__,
+)
+
+# 按乘客分片的表（按写入顺序；tickets 之外的表通过 ticket_no 跟随机票）
+PASSENGER_TABLES = (Ticket.__tablename__, TicketFlight.__tablename__, BoardingPass.__tablename__)
+
+# 按预订编号分片的表
+BOOKING_TABLES = (Booking.__tablename__,)
+
+# 只在主库上查询的表（分片上为空表）
+PRIMARY_ONLY_TABLES = (Hotel.__tablename__, CarRental.__tablename__, TripRecommendation.__tablename__)
+
+# 主库不在分片列表中时，计划中以 None 表示主库
+PRIMARY_LABEL = "<primary>"
+
+
+@dataclass(frozen=True)
+class Move:
+    """一条迁移计划
+
+    Attributes:
+        kind: "passenger"（乘客的机票）或 "booking"（预订）
+        key: 分片键（passenger_id 或 book_ref）
+        source: 数据当前所在的分片，None 表示不在分片列表中的主库
+        target: 分片键归属的分片
+    """
+    kind: str
+    key: str
+    source: str | None
+    target: str
+
+
+@dataclass
+class RebalanceReport:
+    """再平衡结果
+
+    Attributes:
+        moves: (类型, 原分片, 目标分片) -> 迁移的分片键数
+        rows: 表名 -> 迁移的行数
+    """
+    moves: Counter = field(default_factory=Counter)
+    rows: Counter = field(default_factory=Counter)
+
+
+def _label(name: str | None) -> str:
+    return PRIMARY_LABEL if name is None else name
+
+
+def _sources() -> dict[str | None, Engine]:
+    """可能存有分片数据的数据库：各分片，以及不在分片列表中的主库（键为 None）"""
+    router = get_shard_router()
+    if router is None:
+        raise RuntimeError("未开启分片（database.shards.enabled）")
+    sources: dict[str | None, Engine] = {name: get_shard_engine(name) for name in router.names}
+    if not any(router.is_primary(name) for name in router.names):
+        sources[None] = get_sync_engine()
+    return sources
+
+
+def _reflect(conn: Connection, tables: tuple[str, ...], raw: bool = True) -> dict[str, Table]:
+    """反射数据库中的表（导入的表结构与模型不完全一致，按实际结构复制）
+
+    Args:
+        conn: 数据库连接
+        tables: 表名
+        raw: 为True时各列不做类型转换，按数据库中的原值复制（例如带时区偏移的时间文本）；
+            为False时保留反射出的列类型，用于建表
+    """
+    metadata = MetaData()
+    metadata.reflect(bind=conn, only=list(tables))
+    if not raw:
+        return {name: metadata.tables[name] for name in tables}
+    raw_metadata = MetaData()
+    return {
+        name: Table(name, raw_metadata, *(Column(column.name, NullType()) for column in metadata.tables[name].c))
+        for name in tables
+    }
+
+
+def provision_shard(name: str) -> list[str]:
+    """准备分片：按主库的表结构创建缺少的表、复制共享表并执行迁移
+
+    Args:
+        name: 分片名（指向主库的分片无需准备）
+
+    Returns:
+        新建的表名列表
+    """
+    router = get_shard_router()
+    if router is None or router.is_primary(name):
+        return []
+    with get_sync_engine().connect() as source:
+        tables = _reflect(source, SHARED_TABLES + PASSENGER_TABLES + BOOKING_TABLES + PRIMARY_ONLY_TABLES, raw=False)
+    engine = get_shard_engine(name)
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        created = [table_name for table_name in tables if table_name not in existing]
+        for table_name in created:
+            tables[table_name].create(conn)
+    sync_shared_tables(name)
+    run_migrations(engine)
+    logger.info("分片 %s 已准备，新建表: %s", name, created)
+    return created
+
+
+def sync_shared_tables(name: str, batch_size: int = DEFAULT_CHUNK_SIZE) -> dict[str, int]:
+    """用主库的共享表覆盖分片上的副本（在一个事务中按表清空后分批写入）
+
+    Returns:
+        表名 -> 写入的行数
+    """
+    router = get_shard_router()
+    if router is None or router.is_primary(name):
+        return {}
+    copied = {}
+    with get_sync_engine().connect() as source, get_shard_engine(name).begin() as target:
+        tables = _reflect(source, SHARED_TABLES)
+        for table_name, table in tables.items():
+            target.execute(delete(table))
+            copied[table_name] = 0
+            for rows in chunked(source.execute(select(table)).mappings(), batch_size):
+                target.execute(table.insert(), rows)
+                copied[table_name] += len(rows)
+    logger.info("分片 %s 的共享表已同步: %s", name, copied)
+    return copied
+
+
+def plan_rebalance() -> list[Move]:
+    """列出所在分片与归属分片不一致的乘客与预订"""
+    router = get_shard_router()
+    moves = []
+    for source, engine in _sources().items():
+        with engine.connect() as conn:
+            passengers = conn.scalars(select(Ticket.passenger_id).distinct()).all()
+            bookings = conn.scalars(select(Booking.book_ref).distinct()).all()
+        for kind, keys in (("passenger", passengers), ("booking", bookings)):
+            for key in keys:
+                target = router.shard_for(key)
+                if target != source:
+                    moves.append(Move(kind, key, source, target))
+    return moves
+
+
+def _copy_rows(
+    source: Connection,
+    target: Connection,
+    tables: dict[str, Table],
+    table_names: tuple[str, ...],
+    column: str,
+    keys: list[str],
+) -> dict[str, int]:
+    """按 column IN keys 从原分片复制行到目标分片（目标分片上的同名行先删除），返回各表复制的行数"""
+    size = in_chunk_size(Ticket, target.dialect.name)
+    counts = {}
+    for table_name in reversed(table_names):
+        table = tables[table_name]
+        for chunk in chunked(keys, size):
+            target.execute(delete(table).where(table.c[column].in_(chunk)))
+    for table_name in table_names:
+        table = tables[table_name]
+        counts[table_name] = 0
+        for chunk in chunked(keys, size):
+            rows = [dict(row) for row in source.execute(select(table).where(table.c[column].in_(chunk))).mappings()]
+            if rows:
+                target.execute(table.insert(), rows)
+                counts[table_name] += len(rows)
+    return counts
+
+
+def _delete_rows(conn: Connection, tables: dict[str, Table], table_names: tuple[str, ...], column: str, keys: list[str]) -> None:
+    """按 column IN keys 删除行（子表先删）"""
+    size = in_chunk_size(Ticket, conn.dialect.name)
+    for table_name in reversed(table_names):
+        table = tables[table_name]
+        for chunk in chunked(keys, size):
+            conn.execute(delete(table).where(table.c[column].in_(chunk)))
+
+
+def move_passengers(passenger_ids: list[str], source: str | None, target: str) -> dict[str, int]:
+    """把乘客的机票（含机票航班关联与登机牌）从原分片迁移到目标分片
+
+    先在目标分片写入并提交，再从原分片删除；两步之间中断时数据在两个分片上各有一份，
+    重新执行会覆盖目标分片上的副本后再删除原分片的数据。
+
+    Args:
+        passenger_ids: 乘客ID列表
+        source: 原分片，None 表示不在分片列表中的主库
+        target: 目标分片
+
+    Returns:
+        表名 -> 迁移的行数
+    """
+    source_engine = get_sync_engine() if source is None else get_shard_engine(source)
+    with source_engine.connect() as source_conn:
+        tables = _reflect(source_conn, PASSENGER_TABLES)
+        ticket_table = tables[Ticket.__tablename__]
+        ticket_nos = []
+        for chunk in chunked(passenger_ids, in_chunk_size(Ticket, source_conn.dialect.name)):
+            ticket_nos.extend(source_conn.scalars(
+                select(ticket_table.c.ticket_no).where(ticket_table.c.passenger_id.in_(chunk))
+            ))
+        with get_shard_engine(target).begin() as target_conn:
+            counts = _copy_rows(source_conn, target_conn, tables, PASSENGER_TABLES, "ticket_no", ticket_nos)
+    with source_engine.begin() as source_conn:
+        _delete_rows(source_conn, tables, PASSENGER_TABLES, "ticket_no", ticket_nos)
+    return counts
+
+
+def move_bookings(book_refs: list[str], source: str | None, target: str) -> dict[str, int]:
+    """把预订从原分片迁移到目标分片，步骤同 move_passengers"""
+    source_engine = get_sync_engine() if source is None else get_shard_engine(source)
+    with source_engine.connect() as source_conn:
+        tables = _reflect(source_conn, BOOKING_TABLES)
+        with get_shard_engine(target).begin() as target_conn:
+            counts = _copy_rows(source_conn, target_conn, tables, BOOKING_TABLES, "book_ref", book_refs)
+    with source_engine.begin() as source_conn:
+        _delete_rows(source_conn, tables, BOOKING_TABLES, "book_ref", book_refs)
+    return counts
+
+
+def rebalance(batch_size: int = 500, dry_run: bool = False) -> RebalanceReport:
+    """按迁移计划把乘客与预订迁移到归属的分片
+
+    Args:
+        batch_size: 每批迁移的分片键数（每批在目标分片与原分片上各一个事务）
+        dry_run: 为True时只统计计划，不迁移
+
+    Returns:
+        迁移结果
+    """
+    report = RebalanceReport()
+    groups: dict[tuple[str, str | None, str], list[str]] = defaultdict(list)
+    for move in plan_rebalance():
+        groups[(move.kind, move.source, move.target)].append(move.key)
+
+    for (kind, source, target), keys in groups.items():
+        report.moves[(kind, _label(source), target)] += len(keys)
+        if dry_run:
+            continue
+        mover = move_passengers if kind == "passenger" else move_bookings
+        for batch in chunked(keys, batch_size):
+            report.rows.update(mover(batch, source, target))
+        logger.info("已迁移 %s 个%s: %s -> %s", len(keys), "乘客" if kind == "passenger" else "预订", _label(source), target)
+
+    cache = get_query_cache()
+    if cache is not None and not dry_run:
+        cache.bump(*PASSENGER_TABLES, *BOOKING_TABLES)
+    return report
+
+
+def _print_report(report: RebalanceReport) -> None:
+    for (kind, source, target), count in sorted(report.moves.items()):
+        print(f"{kind:<9} {source} -> {target}: {count}")
+    for table_name, count in sorted(report.rows.items()):
+        print(f"rows {table_name}: {count}")
+    if not report.moves:
+        print("all shards balanced")
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else "plan"
+    router = get_shard_router()
+    if router is None:
+        sys.exit("database.shards.enabled 未开启")
+    if command == "provision":
+        for shard in router.names:
+            print(shard, "created:", provision_shard(shard))
+    elif command == "sync-shared":
+        for shard in router.names:
+            print(shard, sync_shared_tables(shard))
+    elif command == "plan":
+        _print_report(rebalance(dry_run=True))
+    elif command == "rebalance":
+        _print_report(rebalance())
+    else:
+        sys.exit(f"未知命令: {command}（provision、plan、rebalance、sync-shared）")
@@ -0,0 +1,300 @@
+"""SQL 执行监控与慢查询日志
+
+引擎事件为每条语句记录耗时、行数与发起调用的仓储方法，并按 (语句, 调用方) 聚合：
+
+- before_cursor_execute / after_cursor_execute 记录执行耗时，不返回结果行的语句
+  （UPDATE/DELETE/INSERT）取 cursor.rowcount 作为行数；
+- 返回结果行的语句在 after_execute 中包装结果的取数策略，取数耗时与行数计入同一次执行
+  （SQLite 的 cursor.execute 只取到第一行，其余工作发生在取数阶段，且 SELECT 的 rowcount 恒为 -1）。
+  exec_driver_sql 不触发 after_execute，这类语句（迁移、全文索引检测）只记录执行阶段；
+- 调用方：沿调用栈（异步会话继续遍历父 greenlet）找到仓储模块中的方法，记为 "类名.方法名"。
+
+单次执行（执行 + 取数）耗时超过 database.slow_query_ms 时以 WARNING 记录语句、参数与执行计划
+（SQLite 为 EXPLAIN QUERY PLAN，MySQL 为 EXPLAIN），执行计划在同一连接上查询。
+get_sql_report() 返回按总耗时排序的语句统计，供管理接口读取。
+"""
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import greenlet
+
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+# 执行选项：为 True 时不记录该语句（查询执行计划本身）
+SKIP_METRICS = "skip_sql_metrics"
+
+# 聚合的 (语句, 调用方) 上限，超出后新语句合并到 _OVERFLOW_STATEMENT
+_MAX_STATEMENTS = 1000
+_OVERFLOW_STATEMENT = "<其他语句>"
+
+# 仓储模块：调用方只从这些模块的方法中识别
+_REPOSITORY_MODULES = ("app.dao.repositories.", "app.dao.base_repository", "app.dao.async_base_repository")
+_DAO_PACKAGE = "app.dao."
+
+# 执行上下文中保存本次执行记录的属性名
+_EXECUTION_ATTR = "_sql_metrics_execution"
+
+
+@dataclass
+class StatementStats:
+    """一条语句（按调用方区分）的累计统计"""
+    statement: str
+    caller: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    slow: int = 0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        for key in ("total_ms", "max_ms"):
+            data[key] = round(data[key], 3)
+        return {**data, "avg_ms": round(self.avg_ms, 3)}
+
+
+class _Execution:
+    """一次语句执行的计时状态"""
+    __slots__ = ("stats", "conn", "statement", "parameters", "executemany", "started",
+                 "elapsed", "fetch_elapsed", "fetched", "fetching", "closed", "finished")
+
+    def __init__(self, conn, statement: str, parameters: Any, executemany: bool) -> None:
+        self.stats: StatementStats | None = None
+        self.conn = conn
+        self.statement = statement
+        self.parameters = parameters
+        self.executemany = executemany
+        self.started = time.perf_counter()
+        self.elapsed = 0.0  # 执行阶段耗时（秒）
+        self.fetch_elapsed = 0.0  # 取数阶段耗时（秒）
+        self.fetched = 0  # 取回的行数（不返回结果行的语句为影响的行数）
+        self.fetching = False
+        self.closed = False
+        self.finished = False
+
+
+_stats: dict[tuple[str, str], StatementStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _method_name(frame) -> str:
+    """仓储方法的 "类名.方法名"（继承自基类的方法取实际的仓储类名）"""
+    owner = frame.f_locals.get("self")
+    if owner is None:
+        return frame.f_code.co_name
+    return f"{type(owner).__name__}.{frame.f_code.co_name}"
+
+
+def _repository_caller() -> str | None:
+    """沿调用栈向外查找，返回最外层的仓储方法（仓储方法之间互相调用时归到入口方法）
+
+    异步会话的语句在 greenlet 中执行，greenlet 内的调用栈到 greenlet_spawn 为止，
+    发起调用的协程帧在父 greenlet 挂起时的调用栈上，因此继续遍历父 greenlet。
+    """
+    found = None
+    frame = sys._getframe(1)
+    current = greenlet.getcurrent()
+    while True:
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "")
+            if module.startswith(_REPOSITORY_MODULES):
+                found = frame
+            elif found is not None and not module.startswith(_DAO_PACKAGE):
+                return _method_name(found)
+            frame = frame.f_back
+        if current.parent is None:
+            break
+        current = current.parent
+        frame = current.gr_frame
+    return _method_name(found) if found is not None else None
+
+
+def _stats_for(statement: str, caller: str) -> StatementStats:
+    """获取 (语句, 调用方) 的统计对象，调用方需持有 _stats_lock"""
+    key = (statement, caller)
+    stats = _stats.get(key)
+    if stats is None:
+        if len(_stats) >= _MAX_STATEMENTS:
+            key = (_OVERFLOW_STATEMENT, caller)
+            stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = StatementStats(*key)
+    return stats
+
+
+def _slow_query_ms() -> float | None:
+    """慢查询阈值（毫秒），未配置时不记录慢查询"""
+    return CONFIG["database"].get("slow_query_ms")
+
+
+def _explain(execution: _Execution) -> list[str]:
+    """在执行语句的连接上查询执行计划"""
+    conn = execution.conn
+    if execution.executemany or conn.closed or conn.invalidated:
+        return []
+    sqlite = "sqlite" == conn.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+    try:
+        rows = conn.exec_driver_sql(
+            prefix + execution.statement,
+            execution.parameters,
+            execution_options={SKIP_METRICS: True},
+        ).all()
+    except Exception as e:
+        return [f"执行计划查询失败: {e}"]
+    return [row[-1] if sqlite else " | ".join(map(str, row)) for row in rows]
+
+
+def _finish(execution: _Execution) -> None:
+    """本次执行结束（结果取完或关闭）：计入取数阶段的耗时与行数，检查慢查询"""
+    if execution.finished:
+        return
+    execution.finished = True
+    stats = execution.stats
+    elapsed_ms = (execution.elapsed + execution.fetch_elapsed) * 1000
+    threshold = _slow_query_ms()
+    slow = threshold is not None and elapsed_ms >= threshold
+    with _stats_lock:
+        stats.total_ms += execution.fetch_elapsed * 1000
+        stats.rows += execution.fetched
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        if slow:
+            stats.slow += 1
+    if slow:
+        logger.warning(
+            "慢查询 %.1fms，%s 行，调用方 %s\n%s\n参数: %.500r\n执行计划:\n    %s",
+            elapsed_ms, execution.fetched, stats.caller, execution.statement, execution.parameters,
+            "\n    ".join(_explain(execution)) or "-",
+        )
+
+
+class _MeteredFetchStrategy:
+    """包装 CursorResult 的取数策略，累计取数耗时与行数，结果关闭时结束本次执行"""
+    __slots__ = ("_strategy", "_execution")
+
+    def __init__(self, strategy, execution: _Execution) -> None:
+        self._strategy = strategy
+        self._execution = execution
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._strategy, name)
+
+    def _fetch(self, fetch, single: bool, *args) -> Any:
+        execution = self._execution
+        execution.fetching = True
+        started = time.perf_counter()
+        rows = None
+        try:
+            rows = fetch(*args)
+            return rows
+        finally:
+            execution.fetch_elapsed += time.perf_counter() - started
+            if rows is not None:
+                execution.fetched += 1 if single else len(rows)
+            execution.fetching = False
+            if execution.closed:
+                _finish(execution)
+
+    def fetchone(self, result, dbapi_cursor, hard_close: bool = False) -> Any:
+        return self._fetch(self._strategy.fetchone, True, result, dbapi_cursor, hard_close)
+
+    def fetchmany(self, result, dbapi_cursor, size: int | None = None) -> Any:
+        return self._fetch(self._strategy.fetchmany, False, result, dbapi_cursor, size)
+
+    def fetchall(self, result, dbapi_cursor) -> Any:
+        return self._fetch(self._strategy.fetchall, False, result, dbapi_cursor)
+
+    def _close(self) -> None:
+        execution = self._execution
+        execution.closed = True
+        if not execution.fetching:
+            _finish(execution)
+
+    def soft_close(self, result, dbapi_cursor) -> None:
+        self._strategy.soft_close(result, dbapi_cursor)
+        self._close()
+
+    def hard_close(self, result, dbapi_cursor) -> None:
+        self._strategy.hard_close(result, dbapi_cursor)
+        self._close()
+
+    def yield_per(self, result, dbapi_cursor, num: int) -> None:
+        self._strategy.yield_per(result, dbapi_cursor, num)
+        # 默认策略会把结果切换为缓冲策略，需要重新包装
+        if result.cursor_strategy is not self:
+            result.cursor_strategy = _MeteredFetchStrategy(result.cursor_strategy, self._execution)
+
+
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany) -> None:
+    """before_cursor_execute 事件：开始计时"""
+    if context is None or context.execution_options.get(SKIP_METRICS):
+        return
+    setattr(context, _EXECUTION_ATTR, _Execution(conn, statement, parameters, executemany))
+
+
+def record_statement_metrics(conn, cursor, statement, parameters, context, executemany) -> None:
+    """after_cursor_execute 事件：记录执行耗时与调用方
+
+    不返回结果行的语句在此结束；返回结果行的语句在结果取完或关闭时结束。
+    """
+    execution = getattr(context, _EXECUTION_ATTR, None)
+    if execution is None or execution.stats is not None:
+        return
+    execution.elapsed = time.perf_counter() - execution.started
+    caller = _repository_caller() or "-"
+    returns_rows = cursor.description is not None
+    with _stats_lock:
+        stats = execution.stats = _stats_for(statement, caller)
+        stats.count += 1
+        stats.total_ms += execution.elapsed * 1000
+        stats.max_ms = max(stats.max_ms, execution.elapsed * 1000)
+    if not returns_rows:
+        execution.fetched = max(cursor.rowcount, 0)
+        _finish(execution)
+
+
+def meter_result(conn, clauseelement, multiparams, params, execution_options, result) -> None:
+    """after_execute 事件：包装返回结果行的结果，记录取数阶段
+
+    依赖 CursorResult.cursor_strategy 的取数接口（fetchone/fetchmany/fetchall/soft_close/hard_close）。
+    """
+    context = getattr(result, "context", None)
+    execution = getattr(context, _EXECUTION_ATTR, None)
+    if execution is None or execution.stats is None or execution.finished:
+        return
+    strategy = getattr(result, "cursor_strategy", None)
+    if strategy is None or not result.returns_rows:
+        _finish(execution)
+        return
+    result.cursor_strategy = _MeteredFetchStrategy(strategy, execution)
+
+
+def get_sql_report(limit: int = 20, order_by: str = "total_ms") -> list[dict[str, Any]]:
+    """语句统计报表
+
+    Args:
+        limit: 返回的语句数
+        order_by: 排序字段（total_ms、avg_ms、max_ms、count、rows、slow），降序
+
+    Returns:
+        语句统计列表，每项包含 statement、caller、count、total_ms、avg_ms、max_ms、rows、slow
+    """
+    with _stats_lock:
+        report = [stats.to_dict() for stats in _stats.values()]
+    report.sort(key=lambda item: item[order_by], reverse=True)
+    return report[:limit]
+
+
+def reset_sql_report() -> None:
+    """清空语句统计"""
+    with _stats_lock:
+        _stats.clear()
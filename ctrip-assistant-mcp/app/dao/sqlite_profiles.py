@@ -0,0 +1,148 @@
+"""SQLite PRAGMA 配置档
+
+每个新连接建立时按 database.sqlite_profile 选择的配置档（定义在 database.sqlite_profiles 中）执行 PRAGMA：
+
+- journal_mode、synchronous、cache_size、mmap_size、temp_store、busy_timeout、wal_autocheckpoint
+  为连接级设置，每个连接都执行；
+- page_size 只在创建数据库（文件为空）时生效，已有数据库保持原页大小（WAL 模式下 VACUUM 也无法修改）；
+- 只读连接（读连接池）不执行 journal_mode、wal_autocheckpoint，并开启 query_only。
+
+配置档未定义或配置中没有 sqlite_profiles 时使用 DEFAULT_PROFILE（即改造前写死的设置）。
+check_sqlite_settings() 读取连接上实际生效的值并与配置档对比，启动时由 init_db 记录日志。
+"""
+import re
+from typing import Any
+
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_PROFILE_NAME = "default"
+DEFAULT_PROFILE: dict[str, Any] = {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -64000}
+
+# 连接级 PRAGMA，按执行顺序
+CONNECTION_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+    "wal_autocheckpoint",
+)
+# 只读连接不能（也不需要）修改的 PRAGMA
+_WRITER_ONLY_PRAGMAS = {"journal_mode", "wal_autocheckpoint", "page_size"}
+
+# 查询时以数字返回的枚举型 PRAGMA
+_ENUM_VALUES = {
+    "synchronous": {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3},
+    "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2},
+}
+
+_VALUE_PATTERN = re.compile(r"^-?\w+$")
+
+
+def get_profile(name: str | None = None) -> tuple[str, dict[str, Any]]:
+    """获取配置档
+
+    Args:
+        name: 配置档名称，None 表示 database.sqlite_profile 选择的配置档
+
+    Returns:
+        (配置档名称, PRAGMA 设置)
+
+    Raises:
+        ValueError: 配置档未定义，或设置值不是单个数字/标识符
+    """
+    db_config = CONFIG["database"]
+    name = name or db_config.get("sqlite_profile", DEFAULT_PROFILE_NAME)
+    profiles = db_config.get("sqlite_profiles") or {}
+    if name in profiles:
+        profile = profiles[name]
+    elif name == DEFAULT_PROFILE_NAME:
+        profile = DEFAULT_PROFILE
+    else:
+        raise ValueError(f"未定义的 SQLite 配置档: {name}")
+    for pragma, value in profile.items():
+        if not _VALUE_PATTERN.match(str(value)):
+            raise ValueError(f"SQLite 配置档 {name} 的 {pragma} 取值无效: {value}")
+    return name, profile
+
+
+def apply_profile(dbapi_conn, read_only: bool = False) -> None:
+    """在新连接上执行当前配置档的 PRAGMA
+
+    Args:
+        dbapi_conn: DBAPI 连接
+        read_only: 是否为只读连接
+    """
+    _, profile = get_profile()
+    cursor = dbapi_conn.cursor()
+    try:
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        elif "page_size" in profile and cursor.execute("PRAGMA page_count").fetchone()[0] == 0:
+            cursor.execute(f"PRAGMA page_size={profile['page_size']}")
+        for pragma in CONNECTION_PRAGMAS:
+            if pragma in profile and not (read_only and pragma in _WRITER_ONLY_PRAGMAS):
+                cursor.execute(f"PRAGMA {pragma}={profile[pragma]}")
+        if not read_only:
+            cursor.execute("PRAGMA foreign_keys=ON")  # 开启外键
+    finally:
+        cursor.close()
+
+
+def _normalized(pragma: str, value: Any) -> Any:
+    """把配置值换算为 PRAGMA 查询返回的形式"""
+    if pragma in _ENUM_VALUES and str(value).upper() in _ENUM_VALUES[pragma]:
+        return _ENUM_VALUES[pragma][str(value).upper()]
+    if pragma == "journal_mode":
+        return str(value).lower()
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def check_sqlite_settings(conn, read_only: bool = False) -> dict[str, dict[str, Any]]:
+    """读取连接上实际生效的设置并与配置档对比
+
+    例如 mmap_size 受编译期上限约束、已有数据库的 page_size 不会改变，实际值可能与配置不同。
+
+    Args:
+        conn: SQLAlchemy 连接
+        read_only: 是否为只读连接（跳过只读连接不执行的 PRAGMA）
+
+    Returns:
+        PRAGMA -> {"expected": 配置值（未配置为None）, "actual": 实际值, "matched": 是否一致}
+    """
+    _, profile = get_profile()
+    settings = {}
+    for pragma in (*CONNECTION_PRAGMAS, "page_size"):
+        if read_only and pragma in _WRITER_ONLY_PRAGMAS:
+            continue
+        actual = conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+        expected = profile.get(pragma)
+        matched = expected is None or _normalized(pragma, expected) == _normalized(pragma, actual)
+        settings[pragma] = {"expected": expected, "actual": actual, "matched": matched}
+    return settings
+
+
+def log_sqlite_settings(engine, read_only: bool = False) -> dict[str, dict[str, Any]]:
+    """启动自检：记录引擎连接上实际生效的设置，与配置档不一致的项记为 WARNING"""
+    name, _ = get_profile()
+    with engine.connect() as conn:
+        settings = check_sqlite_settings(conn, read_only)
+    pool = "读连接" if read_only else "写连接"
+    logger.info(
+        "SQLite 配置档 %s（%s）实际生效: %s",
+        name, pool, ", ".join(f"{pragma}={item['actual']}" for pragma, item in settings.items()),
+    )
+    mismatched = {pragma: item for pragma, item in settings.items() if not item["matched"]}
+    if mismatched:
+        logger.warning(
+            "SQLite 配置档 %s（%s）未生效的设置: %s",
+            name, pool,
+            ", ".join(f"{pragma} 配置 {item['expected']} 实际 {item['actual']}" for pragma, item in mismatched.items()),
+        )
+    return settings
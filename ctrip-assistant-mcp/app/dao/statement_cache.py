@@ -0,0 +1,88 @@
+"""热点查询的预编译语句缓存
+
+仓储的热点查询每次调用都会重新构建 select/Query 对象，SQLAlchemy 还要为其计算缓存键
+才能命中编译缓存。本模块把热点查询改为"语句模板 + 绑定参数"：
+
+- 模板函数用 statement_template 装饰，按结构开关（例如哪些可选条件生效）缓存语句对象，
+  条件值全部使用 bindparam()，同一结构只构建一次，缓存键也随语句对象一起复用；
+- 构建函数返回 PreparedStatement（模板 + 本次参数），由仓储执行。
+
+模板会标记语句名称，每次执行按名称记录编译缓存的命中情况：
+    hit       命中引擎的编译缓存
+    miss      首次编译（或缓存已被淘汰）
+    uncached  未使用编译缓存（缓存被禁用或语句不可缓存）
+"""
+import functools
+import threading
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.sql import Executable
+
+# 执行选项中记录语句名称的键
+STATEMENT_NAME = "statement_name"
+
+_stats: defaultdict[str, Counter] = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+class PreparedStatement(NamedTuple):
+    """缓存的语句模板与本次调用的绑定参数"""
+    statement: Executable
+    params: dict[str, Any]
+
+
+def statement_template(name: str) -> Callable:
+    """语句模板装饰器：按参数缓存模板函数返回的语句，并标记语句名称
+
+    模板函数的参数只能是决定语句结构的开关（可哈希），条件值应使用 bindparam()。
+
+    Args:
+        name: 语句名称，用于编译缓存统计
+    """
+
+    def decorator(func: Callable[..., Executable]) -> Callable[..., Executable]:
+        @functools.cache
+        @functools.wraps(func)
+        def wrapper(*args):
+            return func(*args).execution_options(**{STATEMENT_NAME: name})
+
+        return wrapper
+
+    return decorator
+
+
+def record_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    """after_cursor_execute 事件：按语句名称记录编译缓存命中情况"""
+    name = context.execution_options.get(STATEMENT_NAME)
+    if name is None:
+        return
+    if context.cache_hit is CacheStats.CACHE_HIT:
+        outcome = "hit"
+    elif context.cache_hit is CacheStats.CACHE_MISS:
+        outcome = "miss"
+    else:
+        outcome = "uncached"
+    with _stats_lock:
+        _stats[name][outcome] += 1
+
+
+def get_statement_cache_stats() -> dict[str, dict[str, int]]:
+    """各命名语句的编译缓存统计
+
+    Returns:
+        语句名称 -> {"hit": 命中次数, "miss": 未命中次数, "uncached": 未缓存次数}
+    """
+    with _stats_lock:
+        return {
+            name: {"hit": c["hit"], "miss": c["miss"], "uncached": c["uncached"]}
+            for name, c in sorted(_stats.items())
+        }
+
+
+def reset_statement_cache_stats() -> None:
+    """清空统计"""
+    with _stats_lock:
+        _stats.clear()
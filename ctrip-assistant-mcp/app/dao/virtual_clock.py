@@ -0,0 +1,89 @@
+"""虚拟时钟：查询时平移航班时间，不改写数据库
+
+示例数据的航班时间停留在导入时，update_dates 在启动时把整库的日期平移到当前时间附近，
+因此数据库不能只读挂载，也不能在多个进程之间共享。开启 database.virtual_clock 后：
+
+- 平移量只计算一次：当前时间的一天后 - MAX(flights.actual_departure)（与 update_dates 的平移规则一致）；
+- 仓储返回的航班时间加上平移量（to_virtual），查询条件中的时间边界减去平移量（to_stored）；
+- update_dates 不再复制与改写数据库，启动时没有写操作。
+
+数据库需要事先用 prepare_staging_db（app.multi_agent.workflow.init_db）准备一次：
+统一日期格式并创建索引，之后即可只读挂载、由所有进程共享。
+未开启时平移量为 0，各函数原样返回。
+"""
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import func, select
+
+from app.dao.models.flight_models import Flight
+from app.dao.session import get_session
+from config import CONFIG, get_logger
+
+logger = get_logger(__name__)
+
+# 仓储返回结果中需要平移的航班时间字段
+FLIGHT_TIME_FIELDS = ("scheduled_departure", "scheduled_arrival", "actual_departure", "actual_arrival")
+
+_offset: timedelta | None = None
+_offset_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """是否开启虚拟时钟"""
+    return bool(CONFIG["database"].get("virtual_clock", False))
+
+
+def _compute_offset() -> timedelta:
+    """当前时间的一天后与最晚实际起飞时间之差（精确到秒）"""
+    with get_session() as session:
+        latest = session.scalar(select(func.max(Flight.actual_departure)))
+    if latest is None:
+        return timedelta(0)
+    now = datetime.now(latest.tzinfo) if latest.tzinfo else datetime.now()
+    return timedelta(seconds=round((now + timedelta(days=1) - latest).total_seconds()))
+
+
+def get_clock_offset() -> timedelta:
+    """虚拟时钟的平移量，首次调用时查询数据库计算，之后复用；未开启时为 0"""
+    global _offset
+    if not is_enabled():
+        return timedelta(0)
+    if _offset is None:
+        with _offset_lock:
+            if _offset is None:
+                _offset = _compute_offset()
+                logger.info("虚拟时钟已开启，航班时间平移 %s", _offset)
+    return _offset
+
+
+def reset_clock_offset() -> None:
+    """清除已计算的平移量，下次使用时重新计算"""
+    global _offset
+    with _offset_lock:
+        _offset = None
+
+
+def to_virtual(value: datetime | None) -> datetime | None:
+    """数据库中的时间 -> 对外展示的时间"""
+    if value is None:
+        return None
+    return value + get_clock_offset()
+
+
+def to_stored(value: datetime | None) -> datetime | None:
+    """查询条件中的时间 -> 数据库中的时间"""
+    if value is None:
+        return None
+    return value - get_clock_offset()
+
+
+def virtual_row(row: Any, fields: tuple[str, ...] = FLIGHT_TIME_FIELDS) -> Any:
+    """平移结果行（投影行类型或字典）中存在的时间字段，返回新对象"""
+    if not get_clock_offset():
+        return row
+    if isinstance(row, dict):
+        return {**row, **{key: to_virtual(row[key]) for key in fields if key in row}}
+    return replace(row, **{key: to_virtual(getattr(row, key)) for key in fields if hasattr(row, key)})
@@ -1,6 +1,7 @@
 from app.multi_agent.tools.flight_tools import (
     fetch_user_flight_information,
     search_flights,
+    search_connecting_flights,
     update_ticket_to_new_flight,
     cancel_ticket,
 )
@@ -16,6 +17,7 @@ from app.multi_agent.assistants.llm import llm
 # Flight Assistant
 flight_tools = [
     search_flights,
+    search_connecting_flights,
     fetch_user_flight_information,
     update_ticket_to_new_flight,
     cancel_ticket,
@@ -3,6 +3,8 @@ from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableLambda
 from langgraph.prebuilt import ToolNode
 
+from app.dao.session import async_unit_of_work, unit_of_work
+
 
 def handle_tool_error(state) -> dict:
     """
@@ -26,9 +28,33 @@ def handle_tool_error(state) -> dict:
         ]
     }
 
+def with_unit_of_work(node: ToolNode) -> RunnableLambda:
+    """
+    让工具节点的一次执行（其中并行的全部工具调用）共享一个工作单元：节点结束时提交，工具抛出异常时回滚。
+    工作单元只覆盖工具执行，不覆盖模型调用，SQLite 的写锁不会在等待模型时被持有。
+
+    参数:
+        node (ToolNode): 工具节点。
+
+    返回:
+        RunnableLambda: 在工作单元中执行工具节点的节点（同步与异步图执行均适用）。
+    """
+
+    def run(state, config):
+        with unit_of_work():
+            return node.invoke(state, config)
+
+    async def arun(state, config):
+        async with async_unit_of_work():
+            return await node.ainvoke(state, config)
+
+    return RunnableLambda(run, afunc=arun, name=node.name)
+
+
 def create_tool_node_with_fallback(tools: list) -> dict:
     """
     创建一个带有回退机制的工具节点。当指定的工具执行失败时（例如抛出异常），将触发回退操作。
+    工具节点的每次执行在一个工作单元中进行（见 with_unit_of_work），失败时其中的写入随之回滚。
 
     参数:
         tools (list): 工具列表。
@@ -36,7 +62,7 @@ def create_tool_node_with_fallback(tools: list) -> dict:
     返回:
         dict: 带有回退机制的工具节点。
     """
-    return ToolNode(tools).with_fallbacks(
+    return with_unit_of_work(ToolNode(tools)).with_fallbacks(
         # 这里是给 ToolNode 加了一个回退处理：当工具执行过程中抛出异常时，会走 with_fallbacks ，
         # 并把异常写到状态里的 error ，
         # 然后由 RunnableLambda(handle_tool_error) 来生成一条 ToolMessage 作为错误响应
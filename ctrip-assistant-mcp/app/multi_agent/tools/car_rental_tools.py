@@ -5,7 +5,7 @@ from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
 from app.dao.repositories.car_rental_repository import CarRentalRepository
-from .location_trans import transform_location
+from . import services
 
 
 class CarRentalSearchInput(BaseModel):
@@ -18,28 +18,19 @@ class CarRentalSearchInput(BaseModel):
 def search_car_rentals(
     location: str | None = None,
     name: str | None = None,
-) -> list[dict]:
+) -> dict:
     """
     根据位置、名称、价格层级、开始日期和结束日期搜索汽车租赁信息。
+    没有结果时会在本次调用内依次改为部分匹配、去掉名称条件后重新搜索，无需自行重试。
 
     参数:
     - location (Optional[str]): 汽车租赁的位置。默认为None。
     - name (Optional[str]): 汽车租赁公司的名称。默认为None。
     返回:
-    - list[dict]: 包含匹配搜索条件的汽车租赁信息的字典列表。
+    - dict: results 为匹配搜索条件的汽车租赁信息列表；relaxation 为产生结果的放宽步骤
+      （exact 表示按原条件），relaxation_note 说明放宽了哪些条件。
     """
-    repo = CarRentalRepository()
-    location = transform_location(location)
-    rentals = repo.search_car_rentals(
-        location=location,
-        name=name,
-        limit=20,
-    )
-
-    if not rentals:
-        return []
-
-    return [rental.to_dict() for rental in rentals]
+    return services.search_car_rentals(location, name)
 
 
 class CarRentalBookInput(BaseModel):
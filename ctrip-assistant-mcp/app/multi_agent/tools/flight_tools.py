@@ -5,10 +5,10 @@ from typing import Annotated, Optional
 from langchain_core.tools import tool
 from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
-from app.dao.repositories.flight_repository import FlightRepository
 from app.dao.repositories.flight_repository import TicketRepository
 
 from app.multi_agent.state import CtripFlowState
+from app.multi_agent.tools import services
 from config import get_logger
 
 logger = get_logger(__name__)
@@ -27,34 +27,63 @@ def search_flights(
     start_time: date | datetime | None = None,
     end_time: date | datetime | None = None,
     limit: int = 20,
-) -> list[dict]:
+) -> dict:
     """
     根据指定的参数（如出发机场、到达机场、出发时间范围等）搜索航班，并返回匹配的航班列表。
-    可以设置一个限制值来控制返回的结果数量。
+    出发、到达可以填机场代码，也可以直接填城市名或机场名（中文、拼音或英文，如"北京"、"上海浦东"），
+    城市名会展开为该城市的全部机场。可以设置一个限制值来控制返回的结果数量。
+    没有结果时会在本次调用内依次改用同城其他机场、扩大出发时间范围后重新搜索，无需自行重试。
 
     参数:
-    - departure_airport (Optional[str]): 出发机场（可选）。
-    - arrival_airport (Optional[str]): 到达机场（可选）。
+    - departure_airport (Optional[str]): 出发机场代码、机场名或城市名（可选）。
+    - arrival_airport (Optional[str]): 到达机场代码、机场名或城市名（可选）。
     - start_time (Optional[date | datetime]): 出发时间范围的开始时间（可选）。
     - end_time (Optional[date | datetime]): 出发时间范围的结束时间（可选）。
     - limit (int): 返回结果的最大数量，默认为20。
 
     返回:
-        匹配条件的航班信息列表。
+        results 为匹配条件的航班信息列表，每个航班的 seats_left 为各舱位的余座数；
+        relaxation 为产生结果的放宽步骤（exact 表示按原条件），relaxation_note 说明放宽了哪些条件。
     """
-    repo = FlightRepository()
-    flights = repo.search_flights(
-        departure_airport=departure_airport,
-        arrival_airport=arrival_airport,
-        start_time=start_time,
-        end_time=end_time,
+    return services.search_flights(departure_airport, arrival_airport, start_time, end_time, limit)
+
+
+@tool
+def search_connecting_flights(
+    departure_airport: str,
+    arrival_airport: str,
+    departure_date: date | datetime,
+    max_legs: int | None = None,
+    min_connection_minutes: int | None = None,
+    max_connection_minutes: int | None = None,
+    limit: int = 5,
+) -> list[dict]:
+    """
+    搜索指定日期出发、可经中转到达的联程行程（包含直飞），按总耗时从短到长返回。
+    没有合适的直飞航班时使用。出发、到达可以是城市名（会展开为该城市的全部机场）。
+
+    参数:
+    - departure_airport (str): 出发机场代码、机场名或城市名。
+    - arrival_airport (str): 到达机场代码、机场名或城市名。
+    - departure_date (date | datetime): 出发日期（首段航班在当天起飞）。
+    - max_legs (Optional[int]): 最多航段数（可选），默认为3，即最多中转两次。
+    - min_connection_minutes (Optional[int]): 最短中转衔接时间，单位分钟（可选）。
+    - max_connection_minutes (Optional[int]): 最长中转衔接时间，单位分钟（可选）。
+    - limit (int): 返回行程的最大数量，默认为5。
+
+    返回:
+        行程列表，每个行程包含总耗时、中转机场与衔接时间，以及各航段的航班信息。
+    """
+    return services.search_connecting_flights(
+        departure_airport,
+        arrival_airport,
+        departure_date,
+        max_legs=max_legs,
+        min_connection_minutes=min_connection_minutes,
+        max_connection_minutes=max_connection_minutes,
         limit=limit,
     )
 
-    if not flights:
-        return []
-    return [f.to_dict() for f in flights]
-
 
 @tool
 def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
@@ -70,9 +99,7 @@ def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
     if not passenger_id:
         raise ValueError("未配置乘客 ID。")
 
-    repo = TicketRepository()
-    results = repo.fetch_user_flight_information(passenger_id)
-    return results
+    return services.fetch_user_flight_information(passenger_id)
 
 
 @tool
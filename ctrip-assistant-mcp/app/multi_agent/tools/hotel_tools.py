@@ -7,7 +7,7 @@ from pydantic import BaseModel, Field
 
 from app.dao.repositories.hotel_repository import HotelRepository
 
-from .location_trans import transform_location
+from . import services
 
 @tool
 def search_hotels(
@@ -16,27 +16,20 @@ def search_hotels(
         # price_tier: Optional[str] = None,
         # checkin_date: Optional[Union[datetime, date]] = None,
         # checkout_date: Optional[Union[datetime, date]] = None,
-) -> list[dict]:
+) -> dict:
     """
     根据位置、名称、价格层级、入住日期和退房日期搜索酒店。
+    没有结果时会在本次调用内依次改为部分匹配、去掉名称条件后重新搜索，无需自行重试。
 
     参数:
         location (Optional[str]): 酒店的位置。默认为None。
         name (Optional[str]): 酒店的名称。默认为None。
 
     返回:
-        list[dict]: 包含匹配搜索条件的酒店信息的字典列表。
+        dict: results 为匹配搜索条件的酒店信息列表；relaxation 为产生结果的放宽步骤
+        （exact 表示按原条件），relaxation_note 说明放宽了哪些条件。
     """
-    location = transform_location(location)
-    repo = HotelRepository()
-    hotels = repo.search_hotels(
-        location=location,
-        name=name,
-        limit=20,
-    )
-    if not hotels:
-        return []
-    return [h.to_dict() for h in hotels]
+    return services.search_hotels(location, name)
 
 
 @tool
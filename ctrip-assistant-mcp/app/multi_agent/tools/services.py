@@ -0,0 +1,248 @@
+"""查询工具的共用实现（LangGraph 工具与 MCP 处理函数共用）
+
+每个工具一个规格函数（_*_search）决定放宽阶梯、调用的仓储方法与参数，同步入口（search_hotels 等）
+与异步入口（async_search_hotels 等）只负责执行：同步入口使用同步仓储，供 app.multi_agent.tools 中的工具调用；
+异步入口 await 异步仓储，供 mcp_server 调用。两条路径的条件、放宽步骤与返回结构因此保持一致。
+
+每个入口在工作单元中执行（已在工作单元中时加入外层，如 LangGraph 的工具节点）。
+本模块不依赖 langchain，参数的类型转换（如 MCP 的 ISO 日期字符串）由调用方完成。
+"""
+import asyncio
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any
+
+from app.dao.airport_resolver import resolve_airports
+from app.dao.relaxation import RelaxationStep, RelaxedResult, async_run_ladder, flight_steps, run_ladder, text_steps
+from app.dao.repositories.car_rental_repository import AsyncCarRentalRepository, CarRentalRepository
+from app.dao.repositories.flight_repository import (
+    AsyncFlightRepository,
+    AsyncTicketRepository,
+    FlightRepository,
+    TicketRepository,
+)
+from app.dao.repositories.hotel_repository import AsyncHotelRepository, HotelRepository
+from app.dao.repositories.trip_recommendation_repository import (
+    AsyncTripRecommendationRepository,
+    TripRecommendationRepository,
+)
+from app.dao.seat_availability import annotate_seats_left
+from app.dao.session import async_unit_of_work, unit_of_work
+
+from .location_trans import transform_location
+
+
+@dataclass(frozen=True)
+class _LadderSearch:
+    """一次阶梯搜索：放宽步骤、仓储搜索方法名与每一级共用的参数
+
+    Attributes:
+        steps: 放宽步骤
+        method: 仓储的搜索方法名（同步与异步仓储同名）
+        options: 每一级都传入的参数（如 limit、search_mode）
+        renames: 步骤参数名 -> 仓储方法的参数名
+    """
+    steps: list[RelaxationStep]
+    method: str
+    options: dict[str, Any] = field(default_factory=dict)
+    renames: dict[str, str] = field(default_factory=dict)
+
+    def arguments(self, params: dict[str, Any]) -> dict[str, Any]:
+        return {**{self.renames.get(key, key): value for key, value in params.items()}, **self.options}
+
+    def run(self, repository) -> RelaxedResult:
+        search = getattr(repository, self.method)
+        with unit_of_work():
+            return run_ladder(lambda **params: search(**self.arguments(params)), self.steps)
+
+    async def async_run(self, repository) -> RelaxedResult:
+        search = getattr(repository, self.method)
+        async with async_unit_of_work():
+            return await async_run_ladder(lambda **params: search(**self.arguments(params)), self.steps)
+
+
+# ====================
+# 航班
+# ====================
+def _flight_search(
+    departure_airport: str | None,
+    arrival_airport: str | None,
+    start_time: date | datetime | None,
+    end_time: date | datetime | None,
+    limit: int,
+) -> _LadderSearch:
+    return _LadderSearch(
+        flight_steps(departure_airport, arrival_airport, start_time, end_time),
+        "search_flights",
+        {"limit": limit},
+        {"departure_airports": "departure_airport", "arrival_airports": "arrival_airport"},
+    )
+
+
+def search_flights(
+    departure_airport: str | None = None,
+    arrival_airport: str | None = None,
+    start_time: date | datetime | None = None,
+    end_time: date | datetime | None = None,
+    limit: int = 20,
+) -> dict:
+    """搜索航班（出发、到达可以是机场代码、机场名或城市名），没有结果时按阶梯放宽，结果附带各舱位余座 seats_left"""
+    result = _flight_search(departure_airport, arrival_airport, start_time, end_time, limit).run(FlightRepository())
+    return result.to_dict(annotate_seats_left([f.to_dict() for f in result.rows]))
+
+
+async def async_search_flights(
+    departure_airport: str | None = None,
+    arrival_airport: str | None = None,
+    start_time: date | datetime | None = None,
+    end_time: date | datetime | None = None,
+    limit: int = 20,
+) -> dict:
+    """search_flights 的异步入口"""
+    # 解析城市名、查询同城机场可能访问数据库，在线程池中执行
+    search = await asyncio.to_thread(_flight_search, departure_airport, arrival_airport, start_time, end_time, limit)
+    result = await search.async_run(AsyncFlightRepository())
+    # 余座位图未缓存的航班在线程池中加载
+    return result.to_dict(await asyncio.to_thread(annotate_seats_left, [f.to_dict() for f in result.rows]))
+
+
+def _connection_arguments(
+    departure_airport: str,
+    arrival_airport: str,
+    departure_date: date | datetime,
+    max_legs: int | None,
+    min_connection_minutes: int | None,
+    max_connection_minutes: int | None,
+    limit: int,
+) -> dict[str, Any]:
+    return {
+        "departure_airport": resolve_airports(departure_airport),
+        "arrival_airport": resolve_airports(arrival_airport),
+        "departure_date": departure_date,
+        "max_legs": max_legs,
+        "min_connection_minutes": min_connection_minutes,
+        "max_connection_minutes": max_connection_minutes,
+        "limit": limit,
+    }
+
+
+def search_connecting_flights(
+    departure_airport: str,
+    arrival_airport: str,
+    departure_date: date | datetime,
+    max_legs: int | None = None,
+    min_connection_minutes: int | None = None,
+    max_connection_minutes: int | None = None,
+    limit: int = 5,
+) -> list[dict]:
+    """搜索指定日期出发的中转联程行程（含直飞），按总耗时排序；出发、到达可以是城市名"""
+    arguments = _connection_arguments(
+        departure_airport, arrival_airport, departure_date, max_legs, min_connection_minutes,
+        max_connection_minutes, limit,
+    )
+    with unit_of_work():
+        itineraries = FlightRepository().search_connections(**arguments)
+    return [i.to_dict() for i in itineraries]
+
+
+async def async_search_connecting_flights(
+    departure_airport: str,
+    arrival_airport: str,
+    departure_date: date | datetime,
+    max_legs: int | None = None,
+    min_connection_minutes: int | None = None,
+    max_connection_minutes: int | None = None,
+    limit: int = 5,
+) -> list[dict]:
+    """search_connecting_flights 的异步入口"""
+    # 解析器构建时可能访问数据库，在线程池中执行
+    arguments = await asyncio.to_thread(
+        _connection_arguments, departure_airport, arrival_airport, departure_date, max_legs,
+        min_connection_minutes, max_connection_minutes, limit,
+    )
+    async with async_unit_of_work():
+        itineraries = await AsyncFlightRepository().search_connections(**arguments)
+    return [i.to_dict() for i in itineraries]
+
+
+def fetch_user_flight_information(passenger_id: str) -> list[dict]:
+    """获取乘客的所有机票及其航班信息与座位分配"""
+    with unit_of_work():
+        return TicketRepository().fetch_user_flight_information(passenger_id)
+
+
+async def async_fetch_user_flight_information(passenger_id: str) -> list[dict]:
+    """fetch_user_flight_information 的异步入口"""
+    async with async_unit_of_work():
+        return await AsyncTicketRepository().fetch_user_flight_information(passenger_id)
+
+
+# ====================
+# 酒店、租车、旅行推荐
+# ====================
+def _hotel_search(location: str | None, name: str | None) -> _LadderSearch:
+    return _LadderSearch(
+        text_steps(location=transform_location(location), name=name),
+        "search_hotels",
+        {"limit": 20, "search_mode": "fts"},
+    )
+
+
+def search_hotels(location: str | None = None, name: str | None = None) -> dict:
+    """搜索酒店，没有结果时依次改为部分匹配、去掉名称条件"""
+    result = _hotel_search(location, name).run(HotelRepository())
+    return result.to_dict([h.to_dict() for h in result.rows])
+
+
+async def async_search_hotels(location: str | None = None, name: str | None = None) -> dict:
+    """search_hotels 的异步入口"""
+    result = await _hotel_search(location, name).async_run(AsyncHotelRepository())
+    return result.to_dict([h.to_dict() for h in result.rows])
+
+
+def _car_rental_search(location: str | None, name: str | None) -> _LadderSearch:
+    return _LadderSearch(
+        text_steps(location=transform_location(location), name=name),
+        "search_car_rentals",
+        {"limit": 20, "search_mode": "fts"},
+    )
+
+
+def search_car_rentals(location: str | None = None, name: str | None = None) -> dict:
+    """搜索租车服务，没有结果时依次改为部分匹配、去掉名称条件"""
+    result = _car_rental_search(location, name).run(CarRentalRepository())
+    return result.to_dict([r.to_dict() for r in result.rows])
+
+
+async def async_search_car_rentals(location: str | None = None, name: str | None = None) -> dict:
+    """search_car_rentals 的异步入口"""
+    result = await _car_rental_search(location, name).async_run(AsyncCarRentalRepository())
+    return result.to_dict([r.to_dict() for r in result.rows])
+
+
+def _trip_search(location: str | None, name: str | None, keywords: str | None) -> _LadderSearch:
+    return _LadderSearch(
+        text_steps(location=transform_location(location), name=name, keywords=keywords),
+        "search_trip_recommendations",
+        {"search_mode": "fts"},
+    )
+
+
+def search_trip_recommendations(
+    location: str | None = None,
+    name: str | None = None,
+    keywords: str | None = None,
+) -> dict:
+    """搜索旅行推荐，没有结果时依次改为部分匹配、去掉名称条件"""
+    result = _trip_search(location, name, keywords).run(TripRecommendationRepository())
+    return result.to_dict([t.to_dict() for t in result.rows])
+
+
+async def async_search_trip_recommendations(
+    location: str | None = None,
+    name: str | None = None,
+    keywords: str | None = None,
+) -> dict:
+    """search_trip_recommendations 的异步入口"""
+    result = await _trip_search(location, name, keywords).async_run(AsyncTripRecommendationRepository())
+    return result.to_dict([t.to_dict() for t in result.rows])
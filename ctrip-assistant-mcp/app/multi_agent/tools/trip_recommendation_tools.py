@@ -3,7 +3,7 @@ from typing import Annotated
 
 from langchain_core.tools import tool
 from app.dao.repositories.trip_recommendation_repository import TripRecommendationRepository
-from .location_trans import transform_location
+from . import services
 
 
 @tool
@@ -11,9 +11,10 @@ def search_trip_recommendations(
     location: str | None = None,
     name: str | None = None,
     keywords: str | None = None,
-) -> list[dict]:
+) -> dict:
     """
     根据位置、名称和关键词搜索旅行推荐。
+    没有结果时会在本次调用内依次改为部分匹配、去掉名称条件后重新搜索，无需自行重试。
 
     参数:
         location: 旅行推荐的位置。默认为None。
@@ -21,20 +22,10 @@ def search_trip_recommendations(
         keywords: 关联到旅行推荐的关键词。默认为None。
 
     返回:
-        list[dict]: 包含匹配搜索条件的旅行推荐字典列表。
+        dict: results 为匹配搜索条件的旅行推荐列表；relaxation 为产生结果的放宽步骤
+        （exact 表示按原条件），relaxation_note 说明放宽了哪些条件。
     """
-    location = transform_location(location)
-    repo = TripRecommendationRepository()
-    trips = repo.search_trip_recommendations(
-        location=location,
-        name=name,
-        keywords=keywords
-    )
-    
-    if not trips:
-        return []
-    
-    return [trip.to_dict() for trip in trips]
+    return services.search_trip_recommendations(location, name, keywords)
 
 
 @tool
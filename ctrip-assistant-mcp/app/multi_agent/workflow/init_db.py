@@ -3,25 +3,94 @@
 import os
 import shutil
 import sqlite3
-import pandas as pd
 from config import CONFIG,get_logger
+from app.dao import virtual_clock
+from app.dao.session import get_read_engine, get_sync_engine, init_db
 
 logger = get_logger(__name__)
 
+# flights 表需要平移的日期列
+FLIGHT_DATETIME_COLUMNS = ["scheduled_departure", "scheduled_arrival", "actual_departure", "actual_arrival"]
 
+# 导入数据中表示空值的占位符
+_NULL_MARKER = "\\N"
 
-def update_dates():
-    """
-    更新数据库中的日期，使其与当前时间对齐。
+
+def _has_offset(column: str) -> str:
+    """列值是否带 ±HH:MM 时区后缀的 SQL 条件"""
+    return f"(substr({column}, -6, 1) IN ('+', '-') AND substr({column}, -3, 1) = ':')"
+
+
+def _shifted(column: str, shift_seconds: int, utc: bool = False) -> str:
+    """平移日期列的 SQL 表达式
+
+    带 ±HH:MM 时区后缀的值：偏移固定时平移时刻等同于平移本地时间，平移本地时间部分后保留原后缀；
+    utc=True 时由 SQLite 解析后缀换算为 UTC 时间再平移，后缀为 +00:00。
+    输出格式与原先 pandas 写回的格式一致（YYYY-MM-DD HH:MM:SS±HH:MM），占位符 \\N 转为 NULL。
 
     参数:
-        file (str): 要更新的数据库文件路径。
+        column (str): 列名。
+        shift_seconds (int): 平移的秒数。
+        utc (bool): 是否输出 UTC 时间。
 
     返回:
-        str: 更新后的数据库文件路径。
+        str: SQL 表达式。
     """
-    
+    shift = f"'{shift_seconds:+d} seconds'"
+    if utc:
+        with_offset = f"datetime({column}, {shift}) || '+00:00'"
+    else:
+        with_offset = f"datetime(substr({column}, 1, 19), {shift}) || substr({column}, -6)"
+    return (
+        f"CASE WHEN {column} IS NULL OR {column} = '{_NULL_MARKER}' THEN NULL"
+        f" WHEN {_has_offset(column)} THEN {with_offset}"
+        f" ELSE datetime({column}, {shift}) END"
+    )
+
 
+def _wall_clock(column: str) -> str:
+    """去掉 ±HH:MM 时区后缀后的本地时间部分（没有后缀的值原样返回）的 SQL 表达式"""
+    return f"CASE WHEN {_has_offset(column)} THEN substr({column}, 1, length({column}) - 6) ELSE {column} END"
+
+
+def shift_dates(conn: sqlite3.Connection, shift_seconds: int | None = None) -> int:
+    """把航班与预订的日期整体平移，使最晚的实际起飞时间落在当前时间的一天后
+
+    “当前时间”沿用原先 pandas 实现的规则：取本机的本地时间，视为示例时间所在时区的本地时间
+    （pd.to_datetime("now").tz_localize(example_time.tz)），因此平移量为两个本地时间之差，
+    与本机时区和数据时区是否一致无关。
+    平移量由 SQLite 计算，日期列通过 UPDATE 语句原地更新，数据行不经过 Python，表结构与索引保持不变。
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接，由调用方提交。
+        shift_seconds (int | None): 指定平移的秒数；为 0 时只统一日期格式（占位符转为 NULL）。
+
+    返回:
+        int: 平移的秒数；航班表没有实际起飞时间时为 0（不做更新）。
+    """
+    if shift_seconds is None:
+        # 找出示例时间（这里用flights表中最晚的actual_departure），平移到当前时间的一天后
+        example = conn.execute(
+            "SELECT CAST(ROUND((julianday('now', 'localtime', '+1 day') - "
+            f"julianday({_wall_clock('actual_departure')})) * 86400) AS INTEGER) "
+            f"FROM flights WHERE actual_departure IS NOT NULL AND actual_departure != '{_NULL_MARKER}' "
+            "ORDER BY julianday(actual_departure) DESC LIMIT 1"
+        ).fetchone()
+        if example is None:
+            return 0
+        shift_seconds = example[0]
+
+    # 更新bookings表中的book_date（统一为 UTC 时间）
+    conn.execute(f"UPDATE bookings SET book_date = {_shifted('book_date', shift_seconds, utc=True)}")
+
+    # 更新flights表中的日期列
+    assignments = ", ".join(f"{column} = {_shifted(column, shift_seconds)}" for column in FLIGHT_DATETIME_COLUMNS)
+    conn.execute(f"UPDATE flights SET {assignments}")
+    return shift_seconds
+
+
+def _reset_from_backup(shift_seconds: int | None = None) -> str:
+    """使用备份文件覆盖数据库并平移日期，返回数据库文件路径"""
     db_path = os.path.dirname(CONFIG["database"]["url"])
     local_file = os.path.join(db_path, "travel.sqlite")
     backup_file = os.path.join(db_path, "travel_backup.sqlite")
@@ -29,51 +98,63 @@ def update_dates():
     logger.info(f"local_file: {local_file}")
     logger.info(f"backup_file: {backup_file}")
 
+    # 关闭连接池中指向旧文件的连接，并删除遗留的 WAL 文件（引擎以 WAL 模式连接），
+    # 否则旧的 WAL 会被应用到覆盖后的数据库文件上
+    get_sync_engine().dispose()
+    get_read_engine().dispose()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(local_file + suffix):
+            os.remove(local_file + suffix)
+
     # 使用备份文件覆盖现有文件，作为重置步骤
     shutil.copy(backup_file, local_file)  # 如果目标路径已经存在一个同名文件，shutil.copy 会覆盖该文件。
 
     conn = sqlite3.connect(local_file)
-    # cursor = conn.cursor()
+    try:
+        with conn:  # 两条 UPDATE 在同一事务中提交
+            shift_seconds = shift_dates(conn, shift_seconds)
+    finally:
+        conn.close()
+    logger.info(f"日期已平移 {shift_seconds} 秒")
 
-    # 获取所有表名
-    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type='table';", conn).name.tolist()
-    tdf = {}
+    # 备份文件中没有索引，执行迁移创建并校验索引
+    init_db()
 
-    # 读取每个表的数据
-    for t in tables:
-        tdf[t] = pd.read_sql(f"SELECT * from {t}", conn)
+    return local_file
 
-    # 找出示例时间（这里用flights表中的actual_departure的最大值）
-    example_time = pd.to_datetime(tdf["flights"]["actual_departure"].replace("\\N", pd.NaT)).max()
-    current_time = pd.to_datetime("now").tz_localize(example_time.tz)
-    tomorrow_time = current_time + pd.Timedelta(days=1)
-    time_diff = tomorrow_time - example_time
 
-    # 更新bookings表中的book_date
-    tdf["bookings"]["book_date"] = (
-            pd.to_datetime(tdf["bookings"]["book_date"].replace("\\N", pd.NaT), utc=True) + time_diff
-    )
+def prepare_staging_db():
+    """
+    准备虚拟时钟模式使用的数据库：使用备份文件重置数据库，只统一日期格式、不平移，并创建索引。
 
-    # 需要更新的日期列
-    datetime_columns = ["scheduled_departure", "scheduled_arrival", "actual_departure", "actual_arrival"]
-    for column in datetime_columns:
-        tdf["flights"][column] = (
-                pd.to_datetime(tdf["flights"][column].replace("\\N", pd.NaT)) + time_diff
-        )
+    只需执行一次，之后数据库可以只读挂载并在多个进程之间共享，查询时由虚拟时钟平移航班时间。
 
-    # 将更新后的数据写回数据库
-    for table_name, df in tdf.items():
-        df.to_sql(table_name, conn, if_exists="replace", index=False)
-        del df  # 清理内存
-    del tdf  # 清理内存
+    返回:
+        str: 数据库文件路径。
+    """
+    local_file = _reset_from_backup(shift_seconds=0)
+    virtual_clock.reset_clock_offset()
+    return local_file
 
-    conn.commit()
-    conn.close()
 
-    return local_file
+def update_dates():
+    """
+    使用备份文件重置数据库，并更新数据库中的日期，使其与当前时间对齐。
+
+    开启虚拟时钟（database.virtual_clock）时不改写数据库，只计算查询时使用的平移量，
+    数据库需事先由 prepare_staging_db 准备。
+
+    返回:
+        str: 更新后的数据库文件路径。
+    """
+    if virtual_clock.is_enabled():
+        logger.info(f"虚拟时钟模式，跳过日期重写，航班时间平移 {virtual_clock.get_clock_offset()}")
+        return CONFIG["database"]["url"]
+
+    return _reset_from_backup()
 
 
 if __name__ == '__main__':
 
-    # 执行日期更新操作
-    db = update_dates()
+    # 执行日期更新操作（虚拟时钟模式下准备共享的数据库）
+    db = prepare_staging_db() if virtual_clock.is_enabled() else update_dates()
@@ -20,6 +20,7 @@ from utils import handler_error, cors, middlewares
 from api import routers
 from utils.docs_oauth2 import MyOAuth2PasswordBearer
 from mcp_server import mcp
+from app.dao.session import init_db
 
 logger = get_logger(__name__)
 
@@ -48,6 +49,8 @@ class Server:
         middlewares.init_middleware(self.app)
         # 初始化全局CORS跨域的处理
         cors.init_cors(self.app)
+        # 执行数据库迁移（创建并校验索引）
+        init_db()
         # 初始化主路由
         routers.init_routers(self.app)
         # 将 MCP 服务以 SSE 的形式挂载到现有 FastAPI 应用中
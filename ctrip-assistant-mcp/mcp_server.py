@@ -3,83 +3,85 @@ from typing import Optional, Union, List, Dict
 from datetime import datetime, date
 import json
 
-# 导入所有原有的LangChain工具
-from app.multi_agent.tools.flight_tools import (
-    search_flights,
-    fetch_user_flight_information,
-)
-from app.multi_agent.tools.hotel_tools import (
-    search_hotels
-)
-from app.multi_agent.tools.car_rental_tools import (
-    search_car_rentals
-)
-from app.multi_agent.tools.trip_recommendation_tools import (
-    search_trip_recommendations,
-)
+# MCP 处理函数与 LangGraph 工具共用 app.multi_agent.tools.services 中的实现（异步入口 await 异步仓储），
+# 这里只负责参数转换与 JSON 序列化
+from app.multi_agent.tools import services
 
 # 创建 FastMCP 实例
 mcp = FastMCP("ctrip-assistant-mcp-server")
 
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
 # ====================
 # 航班工具
 # ====================
 @mcp.tool()
-def mcp_search_flights(
+async def mcp_search_flights(
     departure_airport: Optional[str] = None,
     arrival_airport: Optional[str] = None,
     start_time: Optional[str] = None,
     end_time: Optional[str] = None,
     limit: int = 20
 ) -> str:
-    """搜索航班"""
+    """搜索航班（出发、到达可以是机场代码、机场名或城市名，城市展开为其全部机场；结果附带各舱位的余座数 seats_left），没有结果时依次改用同城机场、扩大时间范围，relaxation 为产生结果的步骤"""
     # 处理日期格式转换
     st = datetime.fromisoformat(start_time) if start_time else None
     et = datetime.fromisoformat(end_time) if end_time else None
-    
-    result = search_flights.invoke({
-        "departure_airport": departure_airport,
-        "arrival_airport": arrival_airport,
-        "start_time": st,
-        "end_time": et,
-        "limit": limit
-    })
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(await services.async_search_flights(departure_airport, arrival_airport, st, et, limit))
+
+@mcp.tool()
+async def mcp_search_connecting_flights(
+    departure_airport: str,
+    arrival_airport: str,
+    departure_date: str,
+    max_legs: Optional[int] = None,
+    min_connection_minutes: Optional[int] = None,
+    max_connection_minutes: Optional[int] = None,
+    limit: int = 5
+) -> str:
+    """搜索指定日期出发的中转联程行程（含直飞），按总耗时排序；出发、到达可以是城市名"""
+    return _dumps(await services.async_search_connecting_flights(
+        departure_airport,
+        arrival_airport,
+        date.fromisoformat(departure_date[:10]),
+        max_legs=max_legs,
+        min_connection_minutes=min_connection_minutes,
+        max_connection_minutes=max_connection_minutes,
+        limit=limit,
+    ))
 
 @mcp.tool()
-def mcp_fetch_user_flight_information(passenger_id: str) -> str:
+async def mcp_fetch_user_flight_information(passenger_id: str) -> str:
     """获取指定乘客的航班和机票信息"""
-    result = fetch_user_flight_information.invoke({}, config={"configurable": {"passenger_id": passenger_id}})
-    return json.dumps(result, ensure_ascii=False)
+    return _dumps(await services.async_fetch_user_flight_information(passenger_id))
 
 
 # ====================
 # 酒店工具
 # ====================
 @mcp.tool()
-def mcp_search_hotels(location: Optional[str] = None, name: Optional[str] = None) -> str:
-    """搜索酒店"""
-    result = search_hotels.invoke({"location": location, "name": name})
-    return json.dumps(result, ensure_ascii=False)
+async def mcp_search_hotels(location: Optional[str] = None, name: Optional[str] = None) -> str:
+    """搜索酒店，没有结果时依次改为部分匹配、去掉名称条件，relaxation 为产生结果的步骤"""
+    return _dumps(await services.async_search_hotels(location, name))
 
 # ====================
 # 租车工具
 # ====================
 @mcp.tool()
-def mcp_search_car_rentals(location: Optional[str] = None, name: Optional[str] = None) -> str:
-    """搜索租车服务"""
-    result = search_car_rentals.invoke({"location": location, "name": name})
-    return json.dumps(result, ensure_ascii=False)
+async def mcp_search_car_rentals(location: Optional[str] = None, name: Optional[str] = None) -> str:
+    """搜索租车服务，没有结果时依次改为部分匹配、去掉名称条件，relaxation 为产生结果的步骤"""
+    return _dumps(await services.async_search_car_rentals(location, name))
 
 
 # ====================
 # 旅行推荐工具
 # ====================
 @mcp.tool()
-def mcp_search_trip_recommendations(location: Optional[str] = None, name: Optional[str] = None, keywords: Optional[str] = None) -> str:
-    """搜索旅行推荐"""
-    result = search_trip_recommendations.invoke({"location": location, "name": name, "keywords": keywords})
-    return json.dumps(result, ensure_ascii=False)
+async def mcp_search_trip_recommendations(location: Optional[str] = None, name: Optional[str] = None, keywords: Optional[str] = None) -> str:
+    """搜索旅行推荐，没有结果时依次改为部分匹配、去掉名称条件，relaxation 为产生结果的步骤"""
+    return _dumps(await services.async_search_trip_recommendations(location, name, keywords))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+"""测试夹具：在临时目录生成与导入数据同结构的小型 travel.sqlite（表上没有主键与索引），
+执行 init_db 迁移后供各测试共享"""
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+os.environ.setdefault("ENV", "prod")
+
+import pytest
+
+from config import CONFIG
+
+_SCHEMA = """
+CREATE TABLE aircrafts_data(aircraft_code TEXT, model TEXT, range INTEGER);
+CREATE TABLE airports_data(airport_code TEXT, airport_name TEXT, city TEXT, coordinates TEXT, timezone TEXT);
+CREATE TABLE flights(flight_id INTEGER, flight_no TEXT, scheduled_departure TIMESTAMP, scheduled_arrival TIMESTAMP,
+                     departure_airport TEXT, arrival_airport TEXT, status TEXT, aircraft_code TEXT,
+                     actual_departure TIMESTAMP, actual_arrival TIMESTAMP);
+CREATE TABLE seats(aircraft_code TEXT, seat_no TEXT, fare_conditions TEXT);
+CREATE TABLE bookings(book_ref TEXT, book_date TIMESTAMP, total_amount INTEGER);
+CREATE TABLE tickets(ticket_no TEXT, book_ref TEXT, passenger_id TEXT);
+CREATE TABLE ticket_flights(ticket_no TEXT, flight_id INTEGER, fare_conditions TEXT, amount INTEGER);
+CREATE TABLE boarding_passes(ticket_no TEXT, flight_id INTEGER, boarding_no INTEGER, seat_no TEXT);
+CREATE TABLE hotels(id INTEGER, name TEXT, location TEXT, price_tier TEXT, checkin_date TEXT, checkout_date TEXT,
+                    booked INTEGER);
+CREATE TABLE car_rentals(id INTEGER, name TEXT, location TEXT, price_tier TEXT, start_date TEXT, end_date TEXT,
+                         booked INTEGER);
+CREATE TABLE trip_recommendations(id INTEGER, name TEXT, location TEXT, keywords TEXT, details TEXT, booked INTEGER);
+"""
+
+AIRPORTS = [
+    ("SVO", "Sheremetyevo", "Moscow"), ("DME", "Domodedovo", "Moscow"), ("LED", "Pulkovo", "St. Petersburg"),
+    ("BSL", "EuroAirport Basel", "Basel"), ("ZRH", "Zurich Airport", "Zurich"),
+    ("SHA", "Hongqiao", "Shanghai"), ("PVG", "Pudong", "Shanghai"), ("PEK", "Capital", "Beijing"),
+]
+# 乘客 PASSENGER_ID 持有预订 B00001 下的 2 张机票，每张 2 个航段
+PASSENGER_ID = "3442 587242"
+
+
+def _timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] + "-04:00"
+
+
+def build_travel_db(path) -> None:
+    """生成测试用的 travel.sqlite"""
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    conn.executemany(
+        "INSERT INTO airports_data VALUES (?, ?, ?, '(0,0)', 'Europe/Moscow')", AIRPORTS,
+    )
+    conn.execute("INSERT INTO aircrafts_data VALUES ('320', 'Airbus A320', 5700)")
+    conn.executemany(
+        "INSERT INTO seats VALUES ('320', ?, ?)",
+        [(f"{row}{letter}", "Business" if row <= 2 else "Economy") for row in range(1, 11) for letter in "ABCD"],
+    )
+    base = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    codes = [code for code, _, _ in AIRPORTS]
+    flights = []
+    for flight_id in range(1, 41):
+        departure = base + timedelta(hours=flight_id * 3)
+        flights.append((
+            flight_id, f"PG{flight_id:04d}", _timestamp(departure), _timestamp(departure + timedelta(hours=2)),
+            codes[flight_id % len(codes)], codes[(flight_id + 1) % len(codes)], "Scheduled", "320", None, None,
+        ))
+    conn.executemany("INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", flights)
+    for booking in range(1, 6):
+        book_ref = f"B{booking:05d}"
+        conn.execute("INSERT INTO bookings VALUES (?, ?, 10000)", (book_ref, _timestamp(base)))
+        for n in range(2):
+            ticket_no = f"{booking:07d}{n:03d}"
+            passenger_id = PASSENGER_ID if booking == 1 else f"{1000 + booking} {100000 + n}"
+            conn.execute("INSERT INTO tickets VALUES (?, ?, ?)", (ticket_no, book_ref, passenger_id))
+            for flight_id in (booking * 4 + n * 2, booking * 4 + n * 2 + 1):
+                conn.execute("INSERT INTO ticket_flights VALUES (?, ?, 'Economy', 5000)", (ticket_no, flight_id))
+                conn.execute(
+                    "INSERT INTO boarding_passes VALUES (?, ?, ?, ?)", (ticket_no, flight_id, n + 1, f"{5 + n}A"),
+                )
+    locations = ["Basel", "Zurich", "Lucerne", "Shanghai"]
+    conn.executemany(
+        "INSERT INTO hotels VALUES (?, ?, ?, 'Midscale', '2024-04-02', '2024-04-05', 0)",
+        [(i, f"Hotel Hilton {i}", locations[i % len(locations)]) for i in range(1, 21)],
+    )
+    conn.executemany(
+        "INSERT INTO car_rentals VALUES (?, ?, ?, 'Economy', '2024-04-02', '2024-04-05', 0)",
+        [(i, f"Europcar {i}", locations[i % len(locations)]) for i in range(1, 21)],
+    )
+    conn.executemany(
+        "INSERT INTO trip_recommendations VALUES (?, ?, ?, 'art, history', 'details', 0)",
+        [(i, f"Tour {i}", locations[i % len(locations)]) for i in range(1, 21)],
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def travel_db(tmp_path_factory):
+    """生成测试数据库、指向它并执行 init_db（迁移、建索引）"""
+    from app.dao.session import init_db
+
+    path = tmp_path_factory.mktemp("db") / "travel.sqlite"
+    build_travel_db(path)
+    CONFIG["database"]["url"] = str(path)
+    init_db()
+    return path
+
+
+@pytest.fixture
+def passenger_id() -> str:
+    """持有 2 张机票（预订 B00001）的乘客"""
+    return PASSENGER_ID
@@ -0,0 +1,77 @@
+"""城市/机场名称解析：由 airports_data 推导别名，前缀与模糊匹配在放宽阶梯的说明中要求确认"""
+import pytest
+
+from app.dao.airport_resolver import AirportResolver, derive_aliases
+from app.dao.reference_data import AirportRow
+from app.dao.relaxation import RelaxedResult, flight_steps
+
+AIRPORTS = [
+    AirportRow(code, name, city, "(0,0)", "Asia/Shanghai")
+    for code, name, city in (
+        ("SVO", "Sheremetyevo International Airport", "Moscow"),
+        ("DME", "Domodedovo International Airport", "Moscow"),
+        ("LED", "Pulkovo Airport", "St. Petersburg"),
+        ("BSL", "EuroAirport Basel-Mulhouse-Freiburg", "Basel"),
+        ("SHA", "Shanghai Hongqiao International Airport", "Shanghai"),
+        ("PVG", "Shanghai Pudong International Airport", "Shanghai"),
+        ("PEK", "Beijing Capital International Airport", "Beijing"),
+        ("PKX", "Beijing Daxing International Airport", "Beijing"),
+        ("SZX", "Shenzhen Bao'an International Airport", "Shenzhen"),
+    )
+]
+
+
+@pytest.fixture(scope="module")
+def resolver() -> AirportResolver:
+    return AirportResolver(AIRPORTS, aliases={"PVG": ("浦东机场T2",), "Atlantis": ("亚特兰蒂斯",)})
+
+
+def test_derive_aliases():
+    aliases = derive_aliases(AIRPORTS)
+    assert {"pudong", "shanghaipudong"} <= aliases["PVG"]
+    assert {"capital", "beijingcapital"} <= aliases["PEK"]
+    assert {"mulhouse", "freiburg", "euroairport"} <= aliases["BSL"]
+    assert "baoan" in aliases["SZX"]
+    # 通用词与多个机场共有的词不作为别名
+    assert not any("international" in alias for names in aliases.values() for alias in names)
+    assert "Petersburg" in aliases["St. Petersburg"]
+
+
+@pytest.mark.parametrize(("text", "codes", "kind"), [
+    ("PEK", ("PEK",), "exact"),
+    ("pvg airport", ("PVG",), "exact"),
+    ("Shanghai", ("SHA", "PVG"), "exact"),
+    ("Domodedovo International Airport", ("DME",), "exact"),
+    ("北京", ("PEK", "PKX"), "alias"),
+    ("Capital", ("PEK",), "alias"),
+    ("Saint Petersburg", ("LED",), "alias"),
+    ("Mulhouse", ("BSL",), "alias"),
+    ("上海浦东", ("PVG",), "alias"),
+    ("浦东机场T2", ("PVG",), "alias"),
+    ("shang", ("SHA", "PVG"), "prefix"),
+    ("Sheremetevo", ("SVO",), "fuzzy"),
+])
+def test_resolve_kind(resolver, text, codes, kind):
+    resolution = resolver.resolve(text)
+    assert (resolution.airport_codes, resolution.kind) == (codes, kind)
+    assert resolution.is_guess == (kind in ("prefix", "fuzzy"))
+
+
+def test_unresolved(resolver):
+    assert resolver.resolve("s") is None
+    assert resolver.resolve("亚特兰蒂斯") is None
+    assert resolver.airport_codes("XYZ") == ("XYZ",)
+
+
+def test_guess_reported_in_relaxation_note():
+    steps = flight_steps("Sheremetevo", "Pulkovo")
+    assert steps[0].params["departure_airports"] == ("SVO",)
+    assert all("请向客户确认" in step.notice for step in steps)
+    found = RelaxedResult([object()], steps[0], ["exact"], steps[0].notice).to_dict([])
+    assert found["relaxation_note"].startswith("“Sheremetevo”按相近拼写解析为 Moscow（SVO）")
+    missing = RelaxedResult([], None, [step.name for step in steps], steps[0].notice).to_dict([])
+    assert "请向客户确认" in missing["relaxation_note"]
+
+
+def test_exact_names_have_no_notice():
+    assert all(not step.notice for step in flight_steps("Moscow", "LED"))
@@ -0,0 +1,54 @@
+"""update_dates 的日期平移：最晚的实际起飞时间落在本地时间的一天后（按数据时区的本地时间计）"""
+import sqlite3
+from datetime import datetime, timedelta
+
+from app.multi_agent.workflow.init_db import shift_dates
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE bookings(book_ref TEXT, book_date TIMESTAMP, total_amount INTEGER);
+        CREATE TABLE flights(flight_id INTEGER, scheduled_departure TIMESTAMP, scheduled_arrival TIMESTAMP,
+                             actual_departure TIMESTAMP, actual_arrival TIMESTAMP);
+    """)
+    conn.executemany("INSERT INTO flights VALUES (?, ?, ?, ?, ?)", [
+        # 最晚的实际起飞时刻是 2：按时刻比较，而不是按本地时间的字符串
+        (1, "2024-04-01 20:00:00.000-04:00", "2024-04-01 22:00:00.000-04:00",
+         "2024-04-01 20:00:00.000-04:00", "2024-04-01 22:00:00.000-04:00"),
+        (2, "2024-04-02 02:00:00.000+03:00", "2024-04-02 04:00:00.000+03:00",
+         "2024-04-02 03:30:00.000+03:00", "\\N"),
+        (3, "2024-04-03 10:00:00.000-04:00", "2024-04-03 12:00:00.000-04:00", "\\N", "\\N"),
+    ])
+    conn.execute("INSERT INTO bookings VALUES ('B00001', '2024-04-01 12:00:00.000-04:00', 100)")
+    return conn
+
+
+def test_latest_departure_moves_to_local_tomorrow():
+    conn = _connect()
+    before = datetime.now()
+    shift_seconds = shift_dates(conn)
+    after = datetime.now()
+    departure, arrival = conn.execute(
+        "SELECT actual_departure, actual_arrival FROM flights WHERE flight_id = 2"
+    ).fetchone()
+    wall_clock = datetime.fromisoformat(departure[:19])
+    assert departure.endswith("+03:00") and arrival is None
+    assert before + timedelta(days=1, seconds=-1) <= wall_clock <= after + timedelta(days=1, seconds=1)
+    assert conn.execute("SELECT book_date FROM bookings").fetchone()[0] == (
+        datetime(2024, 4, 1, 16) + timedelta(seconds=shift_seconds)
+    ).strftime("%Y-%m-%d %H:%M:%S+00:00")
+
+
+def test_explicit_shift_only_normalizes_format():
+    conn = _connect()
+    assert shift_dates(conn, 0) == 0
+    assert conn.execute("SELECT scheduled_departure, actual_arrival FROM flights WHERE flight_id = 3").fetchone() == (
+        "2024-04-03 10:00:00-04:00", None,
+    )
+
+
+def test_no_actual_departures():
+    conn = _connect()
+    conn.execute("UPDATE flights SET actual_departure = '\\N'")
+    assert shift_dates(conn) == 0
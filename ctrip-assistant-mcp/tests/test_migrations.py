@@ -0,0 +1,40 @@
+"""迁移后热点查询的执行计划：除预期的 LIKE 全表扫描外都命中索引"""
+import pytest
+
+from app.dao.migrations import EXPECTED_SCANS, explain_query_plans, find_full_scans
+from app.dao.session import get_sync_engine
+
+
+@pytest.fixture
+def conn():
+    with get_sync_engine().connect() as conn:
+        yield conn
+
+
+def test_no_unexpected_full_scans(conn):
+    assert find_full_scans(conn) == {}
+
+
+def test_expected_scans_are_the_like_searches(conn):
+    assert find_full_scans(conn, include_expected=True).keys() == EXPECTED_SCANS
+
+
+@pytest.mark.parametrize("name", [
+    "search_flights(route, time)",
+    "search_flights(time)",
+    "search_flights(city route, time)",
+    "fetch_user_flight_information",
+    "fetch_user_flight_information(read model)",
+    "get_ticket_flights",
+    "book_hotel",
+    "update_ticket_to_new_flight",
+    "search_hotels(fts)",
+    "search_car_rentals(fts)",
+    "search_trip_recommendations(fts)",
+    "airport.search_by_city",
+])
+def test_indexed_forms_use_an_index(conn, name):
+    details = explain_query_plans(conn)[name]
+    lookups = [d for d in details if d.startswith(("SCAN", "SEARCH"))]
+    assert lookups, details
+    assert all("INDEX" in d for d in lookups), details
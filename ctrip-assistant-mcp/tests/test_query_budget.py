@@ -0,0 +1,85 @@
+"""语句预算：批量加载预订、机票聚合的语句数固定，与机票、航段数量无关"""
+import asyncio
+
+import pytest
+
+from app.dao.query_budget import QueryBudgetExceeded, statement_budget
+from app.dao.repositories.booking_repository import AsyncBookingRepository, BookingRepository
+from app.dao.repositories.flight_repository import AsyncTicketRepository, TicketRepository
+from config import CONFIG
+
+# 预订、机票、机票航班联航班、登机牌
+BOOKING_STATEMENTS = 4
+# 机票、机票航班联航班、登机牌
+TICKET_STATEMENTS = 3
+
+
+def _loaded(ticket) -> list[tuple]:
+    """会话关闭后访问批量加载的关系（未加载的关系会报错或执行语句）"""
+    return sorted(
+        [(tf.flight_id, tf.flight.flight_no) for tf in ticket.ticket_flights]
+        + [(bp.flight_id, bp.seat_no) for bp in ticket.boarding_passes]
+    )
+
+
+@pytest.mark.parametrize("book_ref", ["B00001", "B00002"])
+def test_booking_get_with_details(book_ref):
+    with statement_budget(BOOKING_STATEMENTS) as budget:
+        booking = BookingRepository().get_with_details(book_ref)
+        details = [_loaded(ticket) for ticket in booking.tickets]
+    assert budget.count == BOOKING_STATEMENTS
+    assert len(details) == 2 and all(len(d) == 4 for d in details)
+
+
+def test_async_booking_get_with_details():
+    async def run():
+        with statement_budget(BOOKING_STATEMENTS) as budget:
+            booking = await AsyncBookingRepository().get_with_details("B00001")
+            details = [_loaded(ticket) for ticket in booking.tickets]
+        return budget.count, details
+
+    count, details = asyncio.run(run())
+    assert count == BOOKING_STATEMENTS
+    assert len(details) == 2 and all(len(d) == 4 for d in details)
+
+
+def test_ticket_get_by_passenger_with_details(passenger_id):
+    repository = TicketRepository()
+    for passenger, tickets in ((passenger_id, 2), ("1002 100000", 1)):
+        with statement_budget(TICKET_STATEMENTS) as budget:
+            details = [_loaded(ticket) for ticket in repository.get_by_passenger_with_details(passenger)]
+        assert budget.count == TICKET_STATEMENTS
+        assert len(details) == tickets
+
+
+def test_async_ticket_get_by_passenger_with_details(passenger_id):
+    async def run():
+        with statement_budget(TICKET_STATEMENTS) as budget:
+            tickets = await AsyncTicketRepository().get_by_passenger_with_details(passenger_id)
+            details = [_loaded(ticket) for ticket in tickets]
+        return budget.count, details
+
+    count, details = asyncio.run(run())
+    assert count == TICKET_STATEMENTS
+    assert len(details) == 2
+
+
+def test_exceeded_budget_reports_repeated_statement(passenger_id):
+    repository = TicketRepository()
+    with pytest.raises(QueryBudgetExceeded) as raised:
+        with statement_budget(2, "per_ticket"):
+            for ticket in repository.get_by_passenger(passenger_id):
+                repository.get_by_passenger_with_details(ticket.passenger_id)
+    budget = raised.value.budget
+    assert budget.count > 2
+    assert budget.most_repeated()[1] >= 2
+    assert "per_ticket" in str(raised.value)
+
+
+def test_declared_budget_checked_when_enabled(monkeypatch, passenger_id):
+    settings = {"enabled": True, "raise_on_exceed": True, "limits": {}}
+    monkeypatch.setitem(CONFIG["database"], "query_budget", settings)
+    TicketRepository().get_by_passenger_with_details(passenger_id)
+    settings["limits"] = {"TicketRepository.get_by_passenger_with_details": TICKET_STATEMENTS - 1}
+    with pytest.raises(QueryBudgetExceeded):
+        TicketRepository().get_by_passenger_with_details(passenger_id)
@@ -0,0 +1,75 @@
+"""查询缓存：工作单元中未提交的写入不能经缓存被其他会话读到"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.dao.query_cache import get_query_cache
+from app.dao.repositories.hotel_repository import AsyncHotelRepository, HotelRepository
+from app.dao.session import async_unit_of_work, unit_of_work
+from config import CONFIG
+
+
+class _Rollback(Exception):
+    pass
+
+
+@pytest.fixture
+def query_cache(monkeypatch):
+    monkeypatch.setitem(CONFIG, "query_cache", {"enabled": True, "max_entries": 128, "ttl_seconds": 60})
+    cache = get_query_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def _read_booked(hotel_id: int) -> int:
+    """在另一个线程（另一个会话，不在工作单元中）读取酒店的预订状态"""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(lambda: HotelRepository().get(hotel_id).booked).result()
+
+
+def test_uncommitted_write_not_cached(query_cache):
+    repository = HotelRepository()
+    assert repository.get(1).booked == 0
+    with pytest.raises(_Rollback):
+        with unit_of_work():
+            assert repository.book_hotel(1)
+            # 工作单元读到自己的写入，但结果不进入缓存
+            assert repository.get(1).booked == 1
+            assert _read_booked(1) == 0
+            raise _Rollback
+    assert repository.get(1).booked == 0
+    assert _read_booked(1) == 0
+
+
+def test_committed_write_visible_through_cache(query_cache):
+    repository = HotelRepository()
+    assert repository.get(2).booked == 0
+    with unit_of_work():
+        repository.book_hotel(2)
+        assert repository.get(2).booked == 1
+    assert _read_booked(2) == 1
+    assert repository.get(2).booked == 1
+    repository.cancel_hotel(2)
+    assert repository.get(2).booked == 0
+
+
+def test_async_uncommitted_write_not_cached(query_cache):
+    repository = AsyncHotelRepository()
+
+    async def run():
+        assert (await repository.get(3)).booked == 0
+        with pytest.raises(_Rollback):
+            async with async_unit_of_work():
+                assert await repository.book_hotel(3)
+                assert (await repository.get(3)).booked == 1
+                # 空上下文中的任务不在工作单元中，相当于另一个请求的会话
+                other = asyncio.create_task(repository.get(3), context=contextvars.Context())
+                assert (await other).booked == 0
+                raise _Rollback
+        assert (await repository.get(3)).booked == 0
+
+    asyncio.run(run())
+    assert _read_booked(3) == 0
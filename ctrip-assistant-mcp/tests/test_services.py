@@ -0,0 +1,36 @@
+"""工具共用实现：同步入口（LangGraph 工具）与异步入口（MCP）返回相同的结果"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.multi_agent.tools import services
+
+_TOMORROW = datetime.now() + timedelta(days=1)
+
+
+@pytest.mark.parametrize(("name", "args"), [
+    ("search_flights", ("Moscow", None, _TOMORROW - timedelta(days=1), _TOMORROW + timedelta(days=5))),
+    ("search_flights", ("SVO", "BSL", None, None)),
+    ("search_connecting_flights", ("莫斯科", "Basel", _TOMORROW.date())),
+    ("search_hotels", ("巴塞尔", "Hilton")),
+    ("search_hotels", ("Basel", "Marriott")),
+    ("search_car_rentals", ("Zurich", None)),
+    ("search_trip_recommendations", ("Lucerne", None, "art")),
+])
+def test_sync_and_async_entry_points_agree(name, args):
+    sync_result = getattr(services, name)(*args)
+    async_result = asyncio.run(getattr(services, f"async_{name}")(*args))
+    assert sync_result == async_result
+
+
+def test_fetch_user_flight_information(passenger_id):
+    rows = services.fetch_user_flight_information(passenger_id)
+    assert len(rows) == 4
+    assert asyncio.run(services.async_fetch_user_flight_information(passenger_id)) == rows
+
+
+def test_relaxed_search_reports_step():
+    result = services.search_hotels("Basel", "Marriott")
+    assert result["relaxation"] == "without_name"
+    assert result["results"] and all(hotel["location"] == "Basel" for hotel in result["results"])